@@ -0,0 +1,705 @@
+"""
+Benchmark the parsers, the pipeline classes and a full update_database tick on the test data.
+
+The fixtures in test_data and qc_database/tests/test_data, plus small generated files for the \
+parsers which have none, are copied into a working directory --replicas times with the run ids \
+changed, e.g. --replicas 50 for something the size of a full flowcell. Then:
+
+- every parsers.parse_* function (and sample_sheet_parser) is run on each of its fixtures
+- every get_* method of the pipeline classes which have fixtures is run for each copy of the run
+- update_database is run on a new database for a raw data directory with a copy of the \
+DragenWGS run for each replica, once with new runs and again with nothing changed
+
+For each benchmark the best time of --repeats, the throughput, the peak Python memory (tracemalloc) \
+and the database queries are written as JSON with --output. Give a previous output with \
+--baseline to compare against it, the script exits with an error if anything is slower or uses \
+more memory by more than --tolerance, or makes more queries.
+
+The update_database tick creates and destroys a test database using the configured DATABASES \
+settings, the same as manage.py test.
+
+python benchmarks/ingestion.py --replicas 50 --output baseline.json
+python benchmarks/ingestion.py --replicas 50 --baseline baseline.json
+
+"""
+import argparse
+import datetime
+import inspect
+import json
+import logging
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+sys.path.insert(0, str(BASE_DIR))
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
+
+import django
+
+django.setup()
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from pipelines import parsers, dragen_pipelines, somatic_pipelines, TSO500_pipeline, ctDNA_pipeline, parse_cache
+from qc_database.models import SampleAnalysis
+from qc_database.tests.test_pipelines import write_interop_files
+
+# change when the format of the output changes
+BENCHMARK_VERSION = 1
+
+FIXTURE_DIRS = {
+	'test_data': BASE_DIR.joinpath('test_data'),
+	'qc_database_test_data': BASE_DIR.joinpath('qc_database', 'tests', 'test_data'),
+}
+
+# the run used for the update_database tick
+TICK_RUN_ID = '210204_A00748_0075_AHVHYCDRXX'
+
+# parser to the glob patterns of its fixtures in a replica, generated/<parser> holds generated fixtures
+PARSER_FIXTURES = {
+	'sample_sheet_parser': ['test_data/**/SampleSheet*.csv'],
+	'parse_interop_data': ['generated/parse_interop_data/*'],
+	'parse_fastqc_file': ['generated/parse_fastqc_file/*'],
+	'parse_fastqc_file_tso500': ['**/*_fastqc.txt'],
+	'parse_fastqc_file_cruk': ['generated/parse_fastqc_file_cruk/*'],
+	'parse_dragen_fastqc_file': ['generated/parse_dragen_fastqc_file/*'],
+	'parse_hs_metrics_file': ['**/*HsMetrics.txt', '**/*_hs_metrics.txt'],
+	'parse_gatk_depth_summary_file': ['**/*_DepthOfCoverage.sample_summary'],
+	'parse_duplication_metrics_file': ['**/*MarkDuplicatesMetrics.txt'],
+	'parse_contamination_metrics': ['**/*.selfSM'],
+	'parse_qc_metrics_file': ['**/*_QC.txt'],
+	'parse_alignment_metrics_file': ['**/*AlignmentSummaryMetrics.txt'],
+	'parse_variant_detail_metrics_file': ['**/*.variant_calling_detail_metrics'],
+	'parse_insert_metrics_file': ['**/*InsertMetrics.txt'],
+	'parse_config': ['generated/parse_config/*'],
+	'parse_dragen_sex_file': ['generated/parse_dragen_sex_file/*'],
+	'parse_dragen_vc_metrics_file': ['**/*.vc_metrics.csv'],
+	'parse_dragen_alignment_metrics_file': ['**/*.mapping_metrics.csv'],
+	'parse_sensitivity_file': ['generated/parse_sensitivity_file/*'],
+	'parse_dragen_wgs_coverage_metrics_file': ['**/*coverage_metrics.csv'],
+	'parse_fusion_contamination_metrics_file': ['**/contamination-*.csv'],
+	'parse_fusion_alignment_metrics_file': ['generated/parse_fusion_alignment_metrics_file/*'],
+	'parse_ploidy_metrics_file': ['**/*.ploidy_estimation_metrics.csv'],
+	'parse_dragen_cnv_metrics_file': ['**/*.cnv_metrics.csv'],
+	'parse_custom_coverage_metrics': ['generated/parse_custom_coverage_metrics/*'],
+	'parse_exome_postprocessing_cnv_qc_metrics': ['**/*.cnv_qc_report.csv'],
+}
+
+# arguments after the file path
+PARSER_ARGS = {
+	'parse_interop_data': (3, 2),
+	'parse_fastqc_file_cruk': ('run1',),
+}
+
+# arguments for pipeline methods which need them
+METHOD_ARGS = {
+	'get_relatedness_metrics': (0.2, 0.02, 0.02, 0.4),
+}
+
+FASTQC_MODULES = [
+	'Basic Statistics',
+	'Per base sequence quality',
+	'Per tile sequence quality',
+	'Per sequence quality scores',
+	'Per base sequence content',
+	'Per sequence GC content',
+	'Per base N content',
+	'Sequence Length Distribution',
+	'Sequence Duplication Levels',
+	'Overrepresented sequences',
+	'Adapter Content',
+]
+
+
+def clone_run_id(run_id, replica):
+	"""
+	A new run id for each replica made by changing the run number e.g. 210204_A00748_0075_AHVHYCDRXX to 210204_A00748_0076_AHVHYCDRXX
+	"""
+
+	if replica == 0:
+
+		return run_id
+
+	parts = run_id.split('_')
+
+	parts[2] = f'{(int(parts[2]) + replica) % 10000:04d}'
+
+	return '_'.join(parts)
+
+
+def find_run_ids(directory):
+
+	return sorted({path.name for path in Path(directory).iterdir() if re.match(r'^\d{6}_[A-Z0-9]+_\d{4}_', path.name)})
+
+
+def link_or_copy(source, destination):
+
+	try:
+
+		os.link(source, destination)
+
+	except OSError:
+
+		shutil.copy2(source, destination)
+
+
+def copy_tree(source, destination, renames):
+	"""
+	Copy a directory, hard linking files where possible, with every run id in renames changed in the path names
+	"""
+
+	for directory, directory_names, file_names in os.walk(source):
+
+		relative = os.path.relpath(directory, source)
+
+		for old, new in renames.items():
+
+			relative = relative.replace(old, new)
+
+		target = os.path.join(destination, relative)
+
+		os.makedirs(target, exist_ok=True)
+
+		for file_name in file_names:
+
+			new_name = file_name
+
+			for old, new in renames.items():
+
+				new_name = new_name.replace(old, new)
+
+			link_or_copy(os.path.join(directory, file_name), os.path.join(target, new_name))
+
+
+def write_generated_fixtures(directory):
+	"""
+	Write small fixtures for the parsers which have none in the test data
+	"""
+
+	directory = Path(directory)
+
+	def write(parser, name, content):
+
+		path = directory.joinpath(parser, name)
+		path.parent.mkdir(parents=True, exist_ok=True)
+
+		with open(path, 'w') as f:
+
+			f.write(content)
+
+	for sample in ['S1', 'S2']:
+
+		for read in ['R1', 'R2']:
+
+			fastq = f'210204_A00748_0075_AHVHYCDRXX_{sample}_L001_{read}.fastq'
+			write('parse_fastqc_file', f'{sample}_{read}_summary.txt', ''.join(f'PASS\t{module}\t{fastq}\n' for module in FASTQC_MODULES))
+
+			fastq = f'{sample}_S1_L001_{read}_001.fastq.gz'
+			write('parse_fastqc_file_cruk', f'{sample}_{read}_summary.txt', ''.join(f'PASS\t{module}\t{fastq}\n' for module in FASTQC_MODULES))
+
+		write('parse_dragen_sex_file', f'{sample}_calculated_sex.txt', f'sample,calculated_sex\n{sample},FEMALE\n')
+		write('parse_custom_coverage_metrics', f'{sample}.depth_summary', 'mean_depth,100\npct_20x,99.5\npct_30x,98.1\n')
+
+	write('parse_dragen_fastqc_file', 'pass-dragen_fastq_qc.txt', 'PASS\n')
+	write('parse_dragen_fastqc_file', 'fail-dragen_fastq_qc.txt', 'FAIL\nToo few reads\nFailed on per base N content\n')
+	write('parse_sensitivity_file', 'run_sensitivity.txt', '[1] "Sensitivity: 0.9987 0.9964-0.9996"\n')
+	write('parse_fusion_alignment_metrics_file', 'alignment_metrics.csv', 'sample,aligned_reads,pct_reads_aligned,unique_reads_aligned,pct_unique_reads_aligned\nS1,1000,99.0,900,90.0\nS2,1100,98.0,950,86.4\n')
+
+	for config in sorted(BASE_DIR.joinpath('config').glob('*.yaml')):
+
+		write('parse_config', config.name, config.read_text())
+
+	write_interop_files(directory.joinpath('parse_interop_data', TICK_RUN_ID), TICK_RUN_ID, {'S1': 4500, 'S2': 2250, 'Undetermined': 100})
+
+
+def make_replicas(work_dir, replicas):
+	"""
+	Returns the replica directories, each with a copy of the fixtures with its own run ids
+	"""
+
+	generated = Path(work_dir).joinpath('generated')
+	write_generated_fixtures(generated)
+
+	run_ids = set()
+
+	for fixture_dir in FIXTURE_DIRS.values():
+
+		run_ids.update(find_run_ids(fixture_dir))
+
+	replica_dirs = []
+
+	for replica in range(replicas):
+
+		replica_dir = Path(work_dir).joinpath('replicas', str(replica))
+
+		renames = {run_id: clone_run_id(run_id, replica) for run_id in run_ids}
+
+		for name, fixture_dir in FIXTURE_DIRS.items():
+
+			copy_tree(fixture_dir, replica_dir.joinpath(name), renames)
+
+		copy_tree(generated, replica_dir.joinpath('generated'), renames)
+
+		replica_dirs.append(replica_dir)
+
+	return replica_dirs
+
+
+def measure(function, repeats, memory):
+	"""
+	Returns the result of function, the best time of repeats and the peak memory allocated in MB
+	"""
+
+	best = None
+
+	for i in range(repeats):
+
+		start = time.perf_counter()
+		result = function()
+		seconds = time.perf_counter() - start
+
+		best = seconds if best is None else min(best, seconds)
+
+	peak_memory_mb = None
+
+	# tracemalloc slows everything down so memory is measured in a separate run
+	if memory:
+
+		tracemalloc.start()
+
+		try:
+
+			function()
+			peak_memory_mb = tracemalloc.get_traced_memory()[1] / 1024 / 1024
+
+		finally:
+
+			tracemalloc.stop()
+
+	return result, best, peak_memory_mb
+
+
+def make_result(seconds, items, unit, peak_memory_mb, queries=None, errors=0, nbytes=None):
+
+	result = {
+		'seconds': seconds,
+		'items': items,
+		'unit': unit,
+		'items_per_second': items / seconds if seconds > 0 else None,
+		'peak_memory_mb': peak_memory_mb,
+		'queries': queries,
+		'errors': errors,
+	}
+
+	if nbytes is not None:
+
+		result['mb_per_second'] = nbytes / 1024 / 1024 / seconds if seconds > 0 else None
+
+	return result
+
+
+def benchmark_parsers(replica_dirs, repeats, memory):
+
+	results = {}
+
+	parser_names = ['sample_sheet_parser'] + sorted(name for name, function in inspect.getmembers(parsers, inspect.isfunction) if name.startswith('parse_'))
+
+	for name in parser_names:
+
+		patterns = PARSER_FIXTURES.get(name)
+
+		if patterns is None:
+
+			print(f'parsers.{name}: no fixtures, add it to PARSER_FIXTURES')
+			continue
+
+		files = sorted({path for replica_dir in replica_dirs for pattern in patterns for path in replica_dir.glob(pattern)})
+
+		parser = getattr(parsers, name)
+		args = PARSER_ARGS.get(name, ())
+
+		def parse_all():
+
+			errors = 0
+
+			for path in files:
+
+				try:
+
+					parser(str(path), *args)
+
+				except Exception:
+
+					errors = errors + 1
+
+			return errors
+
+		errors, seconds, peak_memory_mb = measure(parse_all, repeats, memory)
+
+		nbytes = sum(path.stat().st_size for path in files if path.is_file())
+
+		results[f'parsers.{name}'] = make_result(seconds, len(files), 'files', peak_memory_mb, errors=errors, nbytes=nbytes)
+
+	return results
+
+
+def make_pipelines(replica_dir, replica):
+	"""
+	The pipeline classes which have results in the test data, set up as in test_pipelines
+	"""
+
+	test_data = replica_dir.joinpath('test_data')
+
+	wgs_run_id = clone_run_id(TICK_RUN_ID, replica)
+	amplicon_run_id = clone_run_id('210823_M00766_0416_000000000-JMTTY', replica)
+
+	return [
+		('DragenWGS', dragen_pipelines.DragenWGS(
+			results_dir = test_data.joinpath(wgs_run_id, 'NexteraDNAFlex'),
+			sample_names = ['21M01510', '21M01683', '21M01688', 'NTC'],
+			run_id = wgs_run_id)),
+		('SomaticAmplicon', somatic_pipelines.SomaticAmplicon(
+			results_dir = test_data.joinpath(amplicon_run_id, 'NGHS-102X'),
+			sample_names = ['21M14838'],
+			run_id = amplicon_run_id,
+			sample_expected_files = ['*_VariantReport.txt', '*.bam', '*_DepthOfCoverage.sample_summary', '*_QC.txt', '*_filtered_meta_annotated.vcf'],
+			sample_not_expected_files = ['*_fastqc.zip'],
+			run_expected_files = ['*merged_coverage_report.txt', '*merged_variant_report.txt'],
+			run_not_expected_files = [])),
+		('TSO500_DNA', TSO500_pipeline.TSO500_DNA(
+			results_dir = test_data.joinpath('tso500_test', 'run1'),
+			sample_completed_files = ['*variants.tsv', '*_coverage.json'],
+			sample_valid_files = [],
+			run_completed_files = ['post_processing_finished.txt'],
+			run_expected_files = [],
+			metrics_file = ['*_ntc_cont.txt', '*_fastqc_status.txt', '_read_number.txt'],
+			run_id = 'run1',
+			sample_names = ['Sample1', 'Sample2', 'Sample3', 'NTC-worksheet2'])),
+		('TSO500_RNA', TSO500_pipeline.TSO500_RNA(
+			results_dir = test_data.joinpath('tso500_test', 'run1'),
+			sample_completed_files = ['*_fusion_check.csv'],
+			sample_valid_files = ['RNA_QC_combined.txt'],
+			run_completed_files = ['run_complete.txt'],
+			run_expected_files = ['RNA_QC_combined.txt', 'contamination-*.csv', 'completed_samples.txt'],
+			metrics_file = ['RNA_QC_combined.txt'],
+			sample_names = ['Sample4', 'Sample5', 'Sample6', 'NTC-worksheet1'],
+			run_id = 'run1')),
+		('TSO500_ctDNA', ctDNA_pipeline.TSO500_ctDNA(
+			results_dir = test_data.joinpath('ctDNA_test'),
+			sample_completed_files = ['*_fusion_check.csv', '*_variants.tsv', '*_coverage.json'],
+			run_completed_files = ['postprocessing_complete.txt'],
+			metrics_file = ['QC_combined.txt'],
+			run_id = 'run1',
+			sample_names = ['Sample1', 'Sample2', 'Sample3', 'NTC-TEST'])),
+	]
+
+
+def benchmark_pipelines(replica_dirs, repeats, memory):
+
+	results = {}
+
+	pipeline_names = [name for name, pipeline in make_pipelines(replica_dirs[0], 0)]
+
+	for index, pipeline_name in enumerate(pipeline_names):
+
+		pipeline = make_pipelines(replica_dirs[0], 0)[index][1]
+
+		method_names = [name for name, method in inspect.getmembers(pipeline, inspect.ismethod) if name.startswith('get_')]
+
+		for method_name in method_names:
+
+			args = METHOD_ARGS.get(method_name, ())
+
+			def run_all():
+
+				errors = 0
+				samples = 0
+
+				# a new object for each run as the pipeline classes only read each directory once
+				for replica, replica_dir in enumerate(replica_dirs):
+
+					pipeline = make_pipelines(replica_dir, replica)[index][1]
+
+					samples = samples + len(pipeline.sample_names)
+
+					try:
+
+						getattr(pipeline, method_name)(*args)
+
+					except Exception:
+
+						errors = errors + 1
+
+				return errors, samples
+
+			(errors, samples), seconds, peak_memory_mb = measure(run_all, repeats, memory)
+
+			results[f'pipelines.{pipeline_name}.{method_name}'] = make_result(seconds, samples, 'samples', peak_memory_mb, errors=errors)
+
+	return results
+
+
+def make_raw_data(work_dir, replica_dirs):
+	"""
+	A raw data directory with a run folder for each replica of the DragenWGS run and a config for it
+	"""
+
+	raw_data_dir = Path(work_dir).joinpath('raw_data')
+
+	for replica, replica_dir in enumerate(replica_dirs):
+
+		run_id = clone_run_id(TICK_RUN_ID, replica)
+		run_dir = raw_data_dir.joinpath(run_id)
+		run_dir.mkdir(parents=True)
+
+		shutil.copy(replica_dir.joinpath('test_data', run_id, 'SampleSheet.csv'), run_dir)
+
+		write_interop_files(run_dir, run_id, {'21M01510': 4500, '21M01683': 4000, '21M01688': 3500, 'NTC': 10})
+
+		with open(run_dir.joinpath('RunParameters.xml'), 'w') as f:
+
+			f.write('<?xml version="1.0"?>\n<RunParameters></RunParameters>\n')
+
+		run_dir.joinpath('run_copy_complete.txt').touch()
+
+	# each replica has its own results directory so the config points at a directory of links to them
+	results_dir = Path(work_dir).joinpath('results')
+	results_dir.mkdir()
+
+	for replica, replica_dir in enumerate(replica_dirs):
+
+		run_id = clone_run_id(TICK_RUN_ID, replica)
+		os.symlink(replica_dir.joinpath('test_data', run_id), results_dir.joinpath(run_id))
+
+	config = Path(work_dir).joinpath('config.yaml')
+
+	with open(config, 'w') as f:
+
+		f.write(f'pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    results_dir: {results_dir}/\n')
+
+	return raw_data_dir, config
+
+
+def benchmark_update_database(work_dir, replica_dirs, repeats, memory):
+
+	results = {}
+
+	raw_data_dir, config = make_raw_data(work_dir, replica_dirs)
+
+	cache_dir = Path(work_dir).joinpath('cache')
+
+	def update_database():
+
+		with CaptureQueriesContext(connection) as queries:
+
+			call_command('update_database', '--raw_data_dir', str(raw_data_dir), '--config', str(config), stdout=StringIO())
+
+		return len(queries)
+
+	def new_runs():
+
+		call_command('flush', interactive=False, verbosity=0)
+		shutil.rmtree(cache_dir, ignore_errors=True)
+
+		return update_database()
+
+	old_name = connection.settings_dict['NAME']
+
+	connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+
+	# update_database logs every run and stage, keep the benchmark output readable
+	logging.disable(logging.WARNING)
+
+	try:
+
+		with override_settings(AUTO_QC_CACHE_DIR=str(cache_dir)):
+
+			queries, seconds, peak_memory_mb = measure(new_runs, repeats, memory)
+
+			samples = SampleAnalysis.objects.count()
+
+			results['update_database.new_runs'] = make_result(seconds, len(replica_dirs), 'runs', peak_memory_mb, queries=queries)
+			results['update_database.new_runs']['samples'] = samples
+
+			# nothing has changed since the last update
+			queries, seconds, peak_memory_mb = measure(update_database, repeats, memory)
+
+			results['update_database.unchanged'] = make_result(seconds, len(replica_dirs), 'runs', peak_memory_mb, queries=queries)
+
+	finally:
+
+		logging.disable(logging.NOTSET)
+		parse_cache.configure(None)
+
+		connection.creation.destroy_test_db(old_name, verbosity=0)
+
+	return results
+
+
+def compare(results, baseline, tolerance):
+	"""
+	Print each benchmark against the baseline, returns the names of those which have regressed
+	"""
+
+	regressions = []
+
+	if baseline.get('replicas') != results['replicas']:
+
+		print(f'Warning: the baseline was made with {baseline.get("replicas")} replicas and this run with {results["replicas"]}')
+
+	for name, result in results['benchmarks'].items():
+
+		old = baseline['benchmarks'].get(name)
+
+		if old is None:
+
+			print(f'{name}: new benchmark')
+			continue
+
+		changes = []
+		regressed = False
+
+		if old['seconds'] and result['seconds']:
+
+			ratio = result['seconds'] / old['seconds']
+			changes.append(f'time {ratio:.2f}x')
+			regressed = regressed or ratio > 1 + tolerance
+
+		if old['peak_memory_mb'] and result['peak_memory_mb']:
+
+			ratio = result['peak_memory_mb'] / old['peak_memory_mb']
+			changes.append(f'memory {ratio:.2f}x')
+			regressed = regressed or ratio > 1 + tolerance
+
+		if old['queries'] is not None and result['queries'] is not None:
+
+			changes.append(f'queries {old["queries"]} -> {result["queries"]}')
+			regressed = regressed or result['queries'] > old['queries']
+
+		if result['errors'] > old['errors']:
+
+			changes.append(f'errors {old["errors"]} -> {result["errors"]}')
+			regressed = True
+
+		print(f'{name}: {", ".join(changes)}{" REGRESSION" if regressed else ""}')
+
+		if regressed:
+
+			regressions.append(name)
+
+	return regressions
+
+
+def print_results(results):
+
+	for name, result in results['benchmarks'].items():
+
+		line = f'{name}: {result["seconds"]:.4f}s, {result["items"]} {result["unit"]}'
+
+		if result['items_per_second'] is not None:
+
+			line = line + f', {result["items_per_second"]:.1f} {result["unit"]}/s'
+
+		if result.get('mb_per_second') is not None:
+
+			line = line + f', {result["mb_per_second"]:.1f} MB/s'
+
+		if result['peak_memory_mb'] is not None:
+
+			line = line + f', peak {result["peak_memory_mb"]:.1f} MB'
+
+		if result['queries'] is not None:
+
+			line = line + f', {result["queries"]} queries'
+
+		if result['errors']:
+
+			line = line + f', {result["errors"]} errors'
+
+		print(line)
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--replicas', type=int, default=1, help='Number of copies of each run to benchmark on')
+	parser.add_argument('--repeats', type=int, default=3, help='Take the best time of this many runs of each benchmark')
+	parser.add_argument('--only', choices=['parsers', 'pipelines', 'update_database'], nargs='+', default=['parsers', 'pipelines', 'update_database'])
+	parser.add_argument('--no-memory', action='store_true', help='Do not measure peak memory, which needs an extra run of each benchmark')
+	parser.add_argument('--output', help='Write the results to this JSON file')
+	parser.add_argument('--baseline', help='Compare the results with this JSON file from an earlier run')
+	parser.add_argument('--tolerance', type=float, default=0.2, help='Fraction slower or larger than the baseline allowed before it counts as a regression')
+	parser.add_argument('--work_dir', help='Directory for the replicas, a temporary directory by default')
+	args = parser.parse_args()
+
+	memory = not args.no_memory
+
+	work_dir = tempfile.mkdtemp(dir=args.work_dir)
+
+	try:
+
+		replica_dirs = make_replicas(work_dir, args.replicas)
+
+		benchmarks = {}
+
+		if 'parsers' in args.only:
+
+			benchmarks.update(benchmark_parsers(replica_dirs, args.repeats, memory))
+
+		if 'pipelines' in args.only:
+
+			benchmarks.update(benchmark_pipelines(replica_dirs, args.repeats, memory))
+
+		if 'update_database' in args.only:
+
+			benchmarks.update(benchmark_update_database(work_dir, replica_dirs, args.repeats, memory))
+
+	finally:
+
+		shutil.rmtree(work_dir)
+
+	results = {
+		'version': BENCHMARK_VERSION,
+		'created': datetime.datetime.now().isoformat(timespec='seconds'),
+		'python': platform.python_version(),
+		'replicas': args.replicas,
+		'repeats': args.repeats,
+		'benchmarks': benchmarks,
+	}
+
+	print_results(results)
+
+	if args.output is not None:
+
+		with open(args.output, 'w') as f:
+
+			json.dump(results, f, indent=2)
+
+	if args.baseline is not None:
+
+		with open(args.baseline) as f:
+
+			baseline = json.load(f)
+
+		regressions = compare(results, baseline, args.tolerance)
+
+		if regressions:
+
+			sys.exit(f'{len(regressions)} benchmarks regressed against {args.baseline}: {", ".join(regressions)}')
+
+
+if __name__ == '__main__':
+
+	main()
@@ -0,0 +1,169 @@
+"""
+Compare pipelines.variant_counter with parsers.get_passing_variant_count.
+
+Times both on the VCFs in test_data and on a generated multi sample joint VCF, and checks \
+that they give the same counts.
+
+python benchmarks/variant_count.py --records 200000 --samples 48
+
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pysam
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipelines import parsers, variant_counter
+
+
+def make_vcf(vcf_path, records, samples, seed=1):
+	"""
+	Write a bgzipped VCF with the given number of records and samples, about 80% of records PASS
+	"""
+
+	rng = random.Random(seed)
+
+	sample_names = [f'sample_{i}' for i in range(samples)]
+
+	genotypes = ['0/0', '0/0', '0/0', '0/1', '1/1', './.', '0|1', '1|0']
+	filters = ['PASS', 'PASS', 'PASS', 'PASS', 'LowQual', 'LowDP']
+
+	plain_path = str(vcf_path)[:-3]
+
+	with open(plain_path, 'w') as vcf:
+
+		vcf.write('##fileformat=VCFv4.2\n')
+		vcf.write('##FILTER=<ID=PASS,Description="All filters passed">\n')
+		vcf.write('##FILTER=<ID=LowQual,Description="Low quality">\n')
+		vcf.write('##FILTER=<ID=LowDP,Description="Low depth">\n')
+		vcf.write('##INFO=<ID=DP,Number=1,Type=Integer,Description="Depth">\n')
+		vcf.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+		vcf.write('##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths">\n')
+		vcf.write('##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n')
+		vcf.write('##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype quality">\n')
+		vcf.write('##contig=<ID=1,length=250000000>\n')
+		vcf.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\t' + '\t'.join(sample_names) + '\n')
+
+		for i in range(records):
+
+			sample_fields = '\t'.join(f'{rng.choice(genotypes)}:10,5:15:{rng.randint(1, 99)}' for sample in sample_names)
+
+			vcf.write(f'1\t{i + 1}\t.\tA\tG\t{rng.randint(10, 500)}\t{rng.choice(filters)}\tDP=100\tGT:AD:DP:GQ\t{sample_fields}\n')
+
+	pysam.tabix_compress(plain_path, str(vcf_path), force=True)
+	os.remove(plain_path)
+
+	return sample_names
+
+
+def time_function(function, repeats):
+
+	best = None
+
+	for i in range(repeats):
+
+		start = time.perf_counter()
+		result = function()
+		seconds = time.perf_counter() - start
+
+		best = seconds if best is None else min(best, seconds)
+
+	return result, best
+
+
+def compare(name, vcf_path, samples, repeats, threads):
+
+	try:
+
+		original, original_seconds = time_function(lambda: parsers.get_passing_variant_count(vcf_path, samples), repeats)
+
+	except KeyError as e:
+
+		print(f'{name}: skipped, parsers.get_passing_variant_count cannot read it ({e})')
+		return True
+
+	new, new_seconds = time_function(lambda: variant_counter.get_passing_variant_count(vcf_path, samples, threads), repeats)
+
+	same = original == new
+
+	speedup = original_seconds / new_seconds if new_seconds > 0 else float('inf')
+
+	print(f'{name}: {len(samples)} samples, original {original_seconds:.3f}s, variant_counter {new_seconds:.3f}s, {speedup:.1f}x, same result: {same}')
+
+	return same
+
+
+def compare_per_sample(name, vcf_path, samples, repeats, threads):
+	"""
+	DragenGE used to read the joint VCF once per sample, variant_counter reads it once for all of them
+	"""
+
+	original, original_seconds = time_function(lambda: {sample: parsers.get_passing_variant_count(vcf_path, [sample]) for sample in samples}, repeats)
+
+	def count_once():
+
+		counts = variant_counter.count_passing_variants(vcf_path, samples, threads)
+
+		return {sample: variant_counter.make_count_dict([sample], [count]) for sample, count in zip(samples, counts)}
+
+	new, new_seconds = time_function(count_once, repeats)
+
+	same = original == new
+
+	print(f'{name}: each of {len(samples)} samples, original {original_seconds:.3f}s, variant_counter {new_seconds:.3f}s, {original_seconds / new_seconds:.1f}x, same result: {same}')
+
+	return same
+
+
+def main():
+
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--test_data', default=str(Path(__file__).resolve().parent.parent.joinpath('test_data')))
+	parser.add_argument('--records', type=int, default=50000)
+	parser.add_argument('--samples', type=int, default=24)
+	parser.add_argument('--repeats', type=int, default=3)
+	parser.add_argument('--threads', type=int, default=None)
+	args = parser.parse_args()
+
+	all_same = True
+
+	for vcf_path in sorted(Path(args.test_data).glob('**/*.vcf*')):
+
+		if vcf_path.suffix not in ('.vcf', '.gz') or vcf_path.stat().st_size == 0:
+
+			continue
+
+		with pysam.VariantFile(str(vcf_path)) as vcf:
+
+			samples = list(vcf.header.samples)
+
+		all_same = compare(vcf_path.name, vcf_path, samples, args.repeats, args.threads) and all_same
+
+	with tempfile.TemporaryDirectory() as tmp_dir:
+
+		vcf_path = Path(tmp_dir).joinpath('joint.vcf.gz')
+
+		samples = make_vcf(vcf_path, args.records, args.samples)
+
+		name = f'generated joint VCF ({args.records} records)'
+
+		all_same = compare(name, vcf_path, samples, args.repeats, args.threads) and all_same
+
+		all_same = compare(name + ' one sample', vcf_path, samples[:1], args.repeats, args.threads) and all_same
+
+		all_same = compare_per_sample(name, vcf_path, samples, args.repeats, args.threads) and all_same
+
+	if not all_same:
+
+		sys.exit('variant_counter and parsers.get_passing_variant_count gave different results')
+
+
+if __name__ == '__main__':
+
+	main()
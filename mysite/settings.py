@@ -18,6 +18,10 @@ deploy_location = 'webserver'
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
 CONFIG_PATH = 'config/config_webserver.yaml'
+
+# compiled config files and other caches used by update_database
+AUTO_QC_CACHE_DIR = os.path.join(BASE_DIR, 'cache')
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/2.2/howto/deployment/checklist/
 
@@ -57,6 +61,7 @@ MIDDLEWARE = [
 	'django.contrib.messages.middleware.MessageMiddleware',
 	'django.middleware.clickjacking.XFrameOptionsMiddleware',
 	'auditlog.middleware.AuditlogMiddleware',
+	'qc_database.memo.MemoMiddleware',
 ]
 
 ROOT_URLCONF = 'mysite.urls'
@@ -6,7 +6,8 @@ import os
 import pandas as pd
 import decimal
 
-from pipelines import parsers
+from pipelines import parsers, sample_fetcher
+from pipelines.manifest import Manifest
 
 class TSO500_DNA():
 	"""
@@ -17,6 +18,7 @@ class TSO500_DNA():
 	def __init__(self,results_dir, sample_completed_files, sample_valid_files, run_completed_files, run_expected_files, metrics_file, run_id, sample_names):
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.sample_completed_files=sample_completed_files
 		self.sample_valid_files=sample_valid_files
 		self.run_completed_files=run_completed_files
@@ -38,7 +40,7 @@ class TSO500_DNA():
 		
 		for file in self.run_completed_files:
 
-			found_file = full_results_path.glob(file)
+			found_file = self.manifest.glob(full_results_path, file)
 
 			for file in found_file:
 
@@ -66,7 +68,7 @@ class TSO500_DNA():
 			
 			marker_name=self.run_completed_files[0]
 		
-			marker = full_results_path.glob(marker_name)
+			marker = self.manifest.glob(full_results_path, marker_name)
 			
 			marker = list(marker)[0]
 
@@ -98,7 +100,7 @@ class TSO500_DNA():
 			
 			marker_name=self.run_completed_files[0]
 		
-			marker = full_results_path.glob(marker_name)
+			marker = self.manifest.glob(full_results_path, marker_name)
 			
 			marker = list(marker)[0]
 
@@ -129,7 +131,7 @@ class TSO500_DNA():
 
 		for sample_completed_file in self.sample_completed_files:
 
-			found_file = results_dir_path.joinpath('DNA_Analysis/results/Database').glob(sample_completed_file)
+			found_file = self.manifest.glob(results_dir_path.joinpath('DNA_Analysis/results/Database'), sample_completed_file)
 
 			for file in found_file:
 
@@ -168,7 +170,7 @@ class TSO500_DNA():
 			#First of all capture aligned reads metrics from NTC cont file
 			align_name = sample+"_ntc_cont.txt"
 		
-			align_file = full_results_path.glob(align_name)
+			align_file = self.manifest.glob(full_results_path, align_name)
 			
 			align_file = list(align_file)[0]
 			
@@ -182,7 +184,7 @@ class TSO500_DNA():
 			#Get NTC aligned reads
 			ntc_name = "NTC*_ntc_cont.txt"
 		
-			ntc_file = full_results_path.glob(ntc_name)
+			ntc_file = self.manifest.glob(full_results_path, ntc_name)
 			
 			ntc_file = list(ntc_file)[0]
 			
@@ -197,7 +199,7 @@ class TSO500_DNA():
 			
 			qc_name = sample+"_R1_read_number.txt"
 		
-			qc_file = full_results_path.glob(qc_name)
+			qc_file = self.manifest.glob(full_results_path, qc_name)
 			
 			qc_file = list(qc_file)[0]
 			
@@ -214,7 +216,7 @@ class TSO500_DNA():
 			#Repeat for NTC
 			ntc_qc_name = "NTC*_R1_read_number.txt"
 		
-			ntc_qc_file = full_results_path.glob(ntc_qc_name)
+			ntc_qc_file = self.manifest.glob(full_results_path, ntc_qc_name)
 			
 			ntc_qc_file = list(ntc_qc_file)[0]
 			
@@ -261,14 +263,12 @@ class TSO500_DNA():
 		Get the FASTQC data for TSO500 DNA
 		"""
 
-		fastqc_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_fastqc_data(sample):
 
 			results_dir_path = Path(self.results_dir)
 			full_results_path = results_dir_path.joinpath("DNA_Analysis/results/QC_Checks")
 
-			fastqc_data_files = full_results_path.glob(f'*{sample}*_fastqc_status.txt')
+			fastqc_data_files = self.manifest.glob(full_results_path, f'*{sample}*_fastqc_status.txt')
 
 			sample_fastqc_list = []
 
@@ -299,9 +299,9 @@ class TSO500_DNA():
 				file_fastqc_dict['adapter_content'] = parsed_fastqc_data['Adapter Content']
 				sample_fastqc_list.append(file_fastqc_dict)
 
-			fastqc_dict[sample] = sample_fastqc_list
+			return sample_fastqc_list
 
-		return fastqc_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_fastqc_data)
 
 
 class TSO500_RNA():
@@ -313,6 +313,7 @@ class TSO500_RNA():
 	def __init__(self,results_dir, sample_completed_files, sample_valid_files, run_completed_files, run_expected_files, metrics_file, sample_names, run_id):
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.run_id = run_id
 		self.run_completed_files = run_completed_files
 		self.run_expected_files = run_expected_files
@@ -334,7 +335,7 @@ class TSO500_RNA():
 		found_file_list=[]
 
 		for file in self.run_completed_files:
-			found_file = results_dir_path.glob(file)
+			found_file = self.manifest.glob(results_dir_path, file)
 			for output_file in found_file:
 
 				found_file_list.append(output_file)
@@ -359,7 +360,7 @@ class TSO500_RNA():
 
 		for file in self.run_expected_files:
 
-			found_file = results_path.glob(file)
+			found_file = self.manifest.glob(results_path, file)
 
 			for output_file in found_file:
 
@@ -385,7 +386,7 @@ class TSO500_RNA():
 
 		for sample_completed_file in self.sample_completed_files:
 
-			found_file = results_dir_path.joinpath('Gathered_Results/Database').glob(sample_completed_file)
+			found_file = self.manifest.glob(results_dir_path.joinpath('Gathered_Results/Database'), sample_completed_file)
 
 			for file in found_file:
 
@@ -415,7 +416,7 @@ class TSO500_RNA():
 
 		for file in self.metrics_file:
 
-			found_file = results_dir_path.glob(file)
+			found_file = self.manifest.glob(results_dir_path, file)
 
 			for file in found_file:
 
@@ -441,7 +442,7 @@ class TSO500_RNA():
 
 			for file in self.metrics_file:
 
-				found_file = results_dir_path.glob(file)
+				found_file = self.manifest.glob(results_dir_path, file)
 
 				for file in found_file:
 
@@ -463,13 +464,11 @@ class TSO500_RNA():
 		Get FASTQC data for TS500 RNA
 		"""
 
-		fastqc_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_fastqc_data(sample):
 
 			results_dir_path = Path(self.results_dir)
 
-			fastqc_data_files = results_dir_path.glob(f'analysis/{sample}/FastQC/*{sample}*_fastqc.txt')
+			fastqc_data_files = self.manifest.glob(results_dir_path, f'analysis/{sample}/FastQC/*{sample}*_fastqc.txt')
 
 			sample_fastqc_list = []
 
@@ -501,10 +500,10 @@ class TSO500_RNA():
 				file_fastqc_dict['adapter_content'] = parsed_fastqc_data['Adapter Content']
 				sample_fastqc_list.append(file_fastqc_dict)
 
-			fastqc_dict[sample] = sample_fastqc_list
+			return sample_fastqc_list
 
 
-		return fastqc_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_fastqc_data)
 
 
 
@@ -1,12 +1,12 @@
 
 from pathlib import Path
-import glob
 import re
 import os
 import pandas as pd
 import decimal
 
-from pipelines import parsers
+from pipelines import parsers, sample_fetcher
+from pipelines.manifest import Manifest
 
 class TSO500_ctDNA():
 	"""
@@ -17,6 +17,7 @@ class TSO500_ctDNA():
 	def __init__(self,results_dir, sample_completed_files, run_completed_files, metrics_file, run_id, sample_names):
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.sample_completed_files=sample_completed_files
 		self.run_completed_files=run_completed_files
 		self.metrics_file= metrics_file
@@ -35,7 +36,7 @@ class TSO500_ctDNA():
 
 		for file in self.run_completed_files:
 
-			found_file = results_path.glob(file)
+			found_file = self.manifest.glob(results_path, file)
 
 			for file in found_file:
 
@@ -58,7 +59,7 @@ class TSO500_ctDNA():
 		results_dir_path = Path(self.results_dir)
 		results_path = results_dir_path.joinpath('post_processing')
 
-		found_file = results_path.glob(self.metrics_file[0])
+		found_file = self.manifest.glob(results_path, self.metrics_file[0])
 		
 		try:
 			found_file = list(found_file)[0]
@@ -96,7 +97,7 @@ class TSO500_ctDNA():
 		for sample_completed_file in self.sample_completed_files:
 			
 			#found_files = results_path.joinpath(f'post_processing/database/{sample}').glob(sample_completed_file)
-			found_files = glob.glob(f"{results_path}/post_processing/database/{sample}{sample_completed_file}")
+			found_files = self.manifest.glob(results_path, f'post_processing/database/{sample}{sample_completed_file}')
 
 			if len(found_files) == 0:
 				# we would expect at least one file each for variants, fusions and coverage
@@ -120,7 +121,7 @@ class TSO500_ctDNA():
 
 			for file in self.metrics_file:
 
-				found_file = results_path.glob(file)
+				found_file = self.manifest.glob(results_path, file)
 
 				for file in found_file:
 
@@ -167,7 +168,7 @@ class TSO500_ctDNA():
 		"""
 
 		results_path = Path(self.results_dir)
-		dragen_fastqc_metrics_files = glob.glob(f'{results_path}/post_processing/FastQC/*-dragen_fastq_qc.txt')
+		dragen_fastqc_metrics_files = self.manifest.glob(results_path, 'post_processing/FastQC/*-dragen_fastq_qc.txt')
 
 		if len(dragen_fastqc_metrics_files) >= 1:
 			fastqc_metrics = "DragenFastQC"
@@ -182,13 +183,11 @@ class TSO500_ctDNA():
 		Get the FASTQC data for TSO500 ctDNA from FastQC files
 		"""
 
-		fastqc_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_fastqc_data(sample):
 
 			results_path = Path(self.results_dir)
 
-			fastqc_data_files = results_path.glob(f'post_processing/FastQC/*{sample}*_fastqc.txt')
+			fastqc_data_files = self.manifest.glob(results_path, f'post_processing/FastQC/*{sample}*_fastqc.txt')
 
 			sample_fastqc_list = []
 
@@ -221,18 +220,16 @@ class TSO500_ctDNA():
 				file_fastqc_dict['adapter_content'] = parsed_fastqc_data['Adapter Content']
 				sample_fastqc_list.append(file_fastqc_dict)
 
-			fastqc_dict[sample] = sample_fastqc_list
+			return sample_fastqc_list
 
-		return fastqc_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_fastqc_data)
 
 	def get_dragen_fastqc_data(self):
 		"""
 		Get FastQC data from the dragen FastQC metrics for ctDNA
 		"""
 
-		fastqc_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_dragen_fastqc_data(sample):
 
 			results_path = Path(self.results_dir)
 
@@ -240,8 +237,8 @@ class TSO500_ctDNA():
 
 			parsed_dragen_fastqc_data = parsers.parse_dragen_fastqc_file(dragen_fastqc_metrics_file)
 
-			fastqc_dict[sample] = parsed_dragen_fastqc_data
+			return parsed_dragen_fastqc_data
 		
-		return fastqc_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_dragen_fastqc_data)
 
 
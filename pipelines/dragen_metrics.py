@@ -0,0 +1,91 @@
+"""
+Read the CSV metrics files written by Dragen.
+
+Each row of a Dragen metrics file is section,sample,metric,value and optionally a percentage \
+e.g. MAPPING/ALIGNING SUMMARY,,Total input reads,1000. Metric names are turned into database \
+field names by normalise_key. The vocabulary of metric names is small so each name is only \
+normalised once per process and every later row is a dictionary lookup. Values are kept as strings.
+
+"""
+import csv
+import string
+
+# punctuation other than underscores is removed from metric names
+REMOVE_PUNCTUATION = str.maketrans('', '', string.punctuation.replace('_', ''))
+
+# extra replacements made after the basic normalisation for each style of file
+KEY_REPLACEMENTS = {
+	'default': [],
+	'ploidy': [('__', '_')],
+	'coverage': [
+		('__', '_'),
+		# fix strange NTC results in Dragen 3.7
+		('xinf', 'x_inf'),
+		('20x50x', '20x_50x'),
+		('15x20x', '15x_20x'),
+		('10x15x', '10x_15x'),
+		('3x10x', '3x_10x'),
+		('1x3x', '1x_3x'),
+		('0x1x', '0x_1x'),
+	],
+}
+
+# style to {metric name: normalised key}
+normalised_keys = {style: {} for style in KEY_REPLACEMENTS}
+
+
+def normalise_key(key, style='default'):
+	"""
+	Turn a Dragen metric name into a field name e.g. 'Total input reads' to 'total_input_reads'
+	"""
+
+	keys = normalised_keys[style]
+
+	if key not in keys:
+
+		new_key = key.translate(REMOVE_PUNCTUATION).lower().replace(' ', '_').replace('__', '_')
+
+		for old, new in KEY_REPLACEMENTS[style]:
+
+			new_key = new_key.replace(old, new)
+
+		keys[key] = new_key
+
+	return keys[key]
+
+
+def read_metrics_file(metrics_file, section, by_sample=False, style='default'):
+	"""
+	Returns a dictionary of normalised key to value for the rows in the section, or a dictionary \
+	of sample to those dictionaries if by_sample is set e.g. for the joint caller rows in a vc_metrics file.
+
+	"""
+
+	metrics = {}
+
+	keys = normalised_keys[style]
+
+	with open(metrics_file) as file:
+
+		for row in csv.reader(file, delimiter=','):
+
+			# only the rows for the section are normalised
+			if len(row) == 0 or row[0] != section:
+
+				continue
+
+			key = keys.get(row[2])
+
+			if key is None:
+
+				key = normalise_key(row[2], style)
+
+			if by_sample:
+
+				metrics.setdefault(row[1], {})[key] = row[3]
+
+			else:
+
+				metrics[key] = row[3]
+
+	return metrics
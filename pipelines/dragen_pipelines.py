@@ -2,7 +2,8 @@ from pathlib import Path
 import glob
 import os
 import re
-from pipelines import parsers 
+from pipelines import parsers, variant_counter, sample_fetcher
+from pipelines.manifest import Manifest
 from qc_database.utils import relatedness2 
 
 class DragenGE:
@@ -21,6 +22,7 @@ class DragenGE:
 				):
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.sample_names = sample_names
 		self.run_id = run_id
 		self.run_complete_marker = run_complete_marker
@@ -38,7 +40,7 @@ class DragenGE:
 
 		results_path = Path(self.results_dir)
 		
-		marker = results_path.glob(self.run_complete_marker)
+		marker = self.manifest.glob(results_path, self.run_complete_marker)
 
 		if len(list(marker)) == 1:
 
@@ -58,7 +60,7 @@ class DragenGE:
 
 			results_path = Path(self.results_dir)
 		
-			marker = results_path.glob(self.run_complete_marker)
+			marker = self.manifest.glob(results_path, self.run_complete_marker)
 
 			marker = list(marker)[0]
 
@@ -81,29 +83,25 @@ class DragenGE:
 
 		results_path = Path(self.results_dir)
 
-		run_coverage_metrics_dict = {}
+		def get_sample_coverage_metrics(sample):
 
-		for sample in self.sample_names:
-
-			sample_coverage_metrics_file = results_path.glob(f'post_processing/results/coverage/*{sample}.depth_summary')
+			sample_coverage_metrics_file = self.manifest.glob(results_path, f'post_processing/results/coverage/*{sample}.depth_summary')
 
 			sample_coverage_metrics_file = list(sample_coverage_metrics_file)[0]	
 
 			parsed_coverage_metrics = parsers.parse_custom_coverage_metrics(sample_coverage_metrics_file)
 
-			run_coverage_metrics_dict[sample] = parsed_coverage_metrics
+			return parsed_coverage_metrics
 
-		return run_coverage_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_coverage_metrics)
 	
 	def get_contamination(self):
 
 		results_path = Path(self.results_dir)
 
-		run_contamination_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_contamination(sample):
 
-			sample_contamination_metrics_file = results_path.glob(f'post_processing/results/contamination/*{sample}_contamination.selfSM')
+			sample_contamination_metrics_file = self.manifest.glob(results_path, f'post_processing/results/contamination/*{sample}_contamination.selfSM')
 			
 			#Weird quirk where I need to convert the generator as a list otherwise it breaks further on
 			sample_contamination_metrics_file = list(sample_contamination_metrics_file)
@@ -115,42 +113,40 @@ class DragenGE:
 				
 				parsed_contamination_metrics = parsers.parse_contamination_metrics(sample_contamination_metrics_file)
 
-				run_contamination_metrics_dict[sample] = parsed_contamination_metrics
+				return parsed_contamination_metrics
 				
 			else:
 			
-				run_contamination_metrics_dict[sample] = {}
+				return {}
 
-		return run_contamination_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_contamination)
 	
 	def get_sex_metrics(self):
 		
 		results_path = Path(self.results_dir)
 
-		run_sex_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_sex_metrics(sample):
 
-			sample_sex_metrics_file = results_path.glob(f'post_processing/results/sex/*{sample}_calculated_sex.txt')
+			sample_sex_metrics_file = self.manifest.glob(results_path, f'post_processing/results/sex/*{sample}_calculated_sex.txt')
 
 			try:
 				sample_sex_metrics_file = list(sample_sex_metrics_file)[0]
 			
 				parsed_sex_metrics = parsers.parse_dragen_sex_file(sample_sex_metrics_file)
 
-				run_sex_metrics_dict[sample] = parsed_sex_metrics
+				return parsed_sex_metrics
 
 			except:
 
-				run_sex_metrics_dict[sample] = {'sex': 'Unknown'}
+				return {'sex': 'Unknown'}
 
-		return run_sex_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_sex_metrics)
 	
 	def get_variant_calling_metrics(self):
 		
 		results_path = Path(self.results_dir)
 
-		variant_metrics_file = results_path.glob(f'{self.run_id}.vc_metrics.csv')
+		variant_metrics_file = self.manifest.glob(results_path, f'{self.run_id}.vc_metrics.csv')
 		
 		variant_metrics_file = list(variant_metrics_file)[0]
 		
@@ -162,25 +158,23 @@ class DragenGE:
 		
 		results_path = Path(self.results_dir)
 
-		run_alignment_metrics_dict = {}
+		def get_sample_alignment_metrics(sample):
 
-		for sample in self.sample_names:
-
-			alignment_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.mapping_metrics.csv')
+			alignment_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.mapping_metrics.csv')
 
 			alignment_metrics_file = list(alignment_metrics_file)[0]
 
 			parsed_alignment_metrics = parsers.parse_dragen_alignment_metrics_file(alignment_metrics_file)
 
-			run_alignment_metrics_dict[sample] = parsed_alignment_metrics
+			return parsed_alignment_metrics
 
-		return run_alignment_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_alignment_metrics)
 		
 	def get_sensitivity(self):
 		
 		results_path = Path(self.results_dir)
 
-		sensitivity_file = results_path.glob(f'post_processing/results/sensitivity/{self.run_id}*_sensitivity.txt')
+		sensitivity_file = self.manifest.glob(results_path, f'post_processing/results/sensitivity/{self.run_id}*_sensitivity.txt')
 		
 		sensitivity_file = list(sensitivity_file)
 
@@ -200,15 +194,20 @@ class DragenGE:
 
 		sample_variant_count_dict = {}
 
-		for sample in self.sample_names:
+		if len(self.sample_names) == 0:
+
+			return sample_variant_count_dict
+
+		vcf_file = self.manifest.glob(results_path, f'post_processing/results/annotated_vcf/{self.run_id}*.vcf.gz')
 
-			vcf_file = results_path.glob(f'post_processing/results/annotated_vcf/{self.run_id}*.vcf.gz')
+		vcf_file = list(vcf_file)[0]
 
-			vcf_file = list(vcf_file)[0]
+		# count every sample in the joint vcf in one pass
+		sample_counts = variant_counter.count_passing_variants(vcf_file, self.sample_names)
 
-			vcf_count_metrics = parsers.get_passing_variant_count(vcf_file, [sample])
+		for sample, count in zip(self.sample_names, sample_counts):
 
-			sample_variant_count_dict[sample] = vcf_count_metrics
+			sample_variant_count_dict[sample] = variant_counter.make_count_dict([sample], [count])
 
 		return sample_variant_count_dict
 	
@@ -217,7 +216,7 @@ class DragenGE:
 		try:
 			results_path = Path(self.results_dir)
 
-			cnv_metrics_file = results_path.glob(f'post_processing/results/sv_cnv/qc/{self.run_id}.cnv_qc_report.csv')
+			cnv_metrics_file = self.manifest.glob(results_path, f'post_processing/results/sv_cnv/qc/{self.run_id}.cnv_qc_report.csv')
 
 			cnv_metrics_file = list(cnv_metrics_file)[0]
 
@@ -233,7 +232,7 @@ class DragenGE:
 		
 		results_path = Path(self.results_dir)
 
-		cnv_metrics_file = results_path.glob(f'post_processing/results/sv_cnv/qc/{self.run_id}.cnv_qc_report.csv')
+		cnv_metrics_file = self.manifest.glob(results_path, f'post_processing/results/sv_cnv/qc/{self.run_id}.cnv_qc_report.csv')
 
 		cnv_metrics_file = list(cnv_metrics_file)[0]
 
@@ -245,11 +244,11 @@ class DragenGE:
 
 		results_path = Path(self.results_dir)
 
-		ped_file = results_path.glob(f'post_processing/results/ped/{self.run_id}.ped')
+		ped_file = self.manifest.glob(results_path, f'post_processing/results/ped/{self.run_id}.ped')
 
 		ped_file = list(ped_file)[0]
 	
-		relatedness_file = results_path.glob(f'post_processing/results/relatedness/{self.run_id}.relatedness2')
+		relatedness_file = self.manifest.glob(results_path, f'post_processing/results/relatedness/{self.run_id}.relatedness2')
 
 		relatedness_file = list(relatedness_file)[0]
 
@@ -280,6 +279,7 @@ class DragenWGS:
 				):
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.sample_names = sample_names
 		self.run_id = run_id
 		self.run_complete_marker = run_complete_marker
@@ -318,7 +318,7 @@ class DragenWGS:
 
 			results_path = results_path.joinpath('results')
 
-		marker = results_path.glob(self.sample_complete_marker)
+		marker = self.manifest.glob(results_path, self.sample_complete_marker)
 
 		if len(list(marker)) >= 1:
 
@@ -341,7 +341,7 @@ class DragenWGS:
 		# check files we want to be there are there
 		for file in self.sample_expected_files:
 
-			found_file = sample_path.glob(file)
+			found_file = self.manifest.glob(sample_path, file)
 
 			if len(list(found_file)) == 0:
 
@@ -350,7 +350,7 @@ class DragenWGS:
 		# check file we do not want to be there are not there
 		for file in self.sample_not_expected_files:
 
-			found_file = sample_path.glob(file)
+			found_file = self.manifest.glob(sample_path, file)
 
 			if len(list(found_file)) > 0:
 
@@ -362,7 +362,7 @@ class DragenWGS:
 			
 			joined = f'{sample}'.join(split)
 						
-			found_file = results_path.glob(joined)
+			found_file = self.manifest.glob(results_path, joined)
 			
 			if len(list(found_file)) < 1:
 
@@ -379,7 +379,7 @@ class DragenWGS:
 
 		results_path = Path(self.results_dir)
 
-		marker = results_path.glob(self.run_complete_marker)
+		marker = self.manifest.glob(results_path, self.run_complete_marker)
 		
 		if len(list(marker)) == 1:
 
@@ -397,7 +397,7 @@ class DragenWGS:
 		
 			results_path = Path(self.results_dir)
 			
-			marker = results_path.glob(self.run_complete_marker)
+			marker = self.manifest.glob(results_path, self.run_complete_marker)
 			
 			marker = list(marker)[0]
 			
@@ -459,7 +459,7 @@ class DragenWGS:
 		
 		results_path = Path(self.results_dir)
 
-		variant_metrics_file = results_path.glob(f'{self.run_id}.vc_metrics.csv')
+		variant_metrics_file = self.manifest.glob(results_path, f'{self.run_id}.vc_metrics.csv')
 		
 		variant_metrics_file = list(variant_metrics_file)[0]
 		
@@ -472,11 +472,11 @@ class DragenWGS:
 
 		results_path = Path(self.results_dir)
 
-		ped_file = results_path.glob(f'post_processing/results/ped/{self.run_id}.ped')
+		ped_file = self.manifest.glob(results_path, f'post_processing/results/ped/{self.run_id}.ped')
 
 		ped_file = list(ped_file)[0]
 	
-		relatedness_file = results_path.glob(f'post_processing/results/relatedness/{self.run_id}.relatedness2')
+		relatedness_file = self.manifest.glob(results_path, f'post_processing/results/relatedness/{self.run_id}.relatedness2')
 
 		relatedness_file = list(relatedness_file)[0]
 
@@ -491,56 +491,50 @@ class DragenWGS:
 		
 		results_path = Path(self.results_dir)
 
-		run_alignment_metrics_dict = {}
+		def get_sample_alignment_metrics(sample):
 
-		for sample in self.sample_names:
-
-			alignment_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.mapping_metrics.csv')
+			alignment_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.mapping_metrics.csv')
 
 			alignment_metrics_file = list(alignment_metrics_file)[0]
 			
 			parsed_alignment_metrics = parsers.parse_dragen_alignment_metrics_file(alignment_metrics_file)
 
-			run_alignment_metrics_dict[sample] = parsed_alignment_metrics
+			return parsed_alignment_metrics
 
-		return run_alignment_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_alignment_metrics)
 
 
 	def get_wgs_mapping_metrics(self):
 		
 		results_path = Path(self.results_dir)
 
-		run_wgs_coverage_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_wgs_mapping_metrics(sample):
 
-			wgs_coverage_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.wgs_coverage_metrics.csv')
+			wgs_coverage_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.wgs_coverage_metrics.csv')
 
 			wgs_coverage_metrics_file = list(wgs_coverage_metrics_file)[0]
 			
 			parsed_wgs_coverage_metrics = parsers.parse_dragen_wgs_coverage_metrics_file(wgs_coverage_metrics_file)
 
-			run_wgs_coverage_metrics_dict[sample] = parsed_wgs_coverage_metrics
+			return parsed_wgs_coverage_metrics
 
-		return run_wgs_coverage_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_wgs_mapping_metrics)
 
 	def get_exonic_mapping_metrics(self):
 		
 		results_path = Path(self.results_dir)
 
-		run_wgs_coverage_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_exonic_mapping_metrics(sample):
 
-			wgs_coverage_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.qc-coverage-region-1_coverage_metrics.csv')
+			wgs_coverage_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.qc-coverage-region-1_coverage_metrics.csv')
 
 			wgs_coverage_metrics_file = list(wgs_coverage_metrics_file)[0]
 			
 			parsed_wgs_coverage_metrics = parsers.parse_dragen_wgs_coverage_metrics_file(wgs_coverage_metrics_file)
 
-			run_wgs_coverage_metrics_dict[sample] = parsed_wgs_coverage_metrics
+			return parsed_wgs_coverage_metrics
 
-		return run_wgs_coverage_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_exonic_mapping_metrics)
 
 	def get_ploidy_metrics(self):
 		"""
@@ -549,23 +543,24 @@ class DragenWGS:
 
 		results_path = Path(self.results_dir)
 
-		run_ploidy_metrics_dict = {}
+		def get_sample_ploidy_metrics(sample):
 
-		for sample in self.sample_names:
-
-			run_ploidy_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.ploidy_estimation_metrics.csv')
+			run_ploidy_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.ploidy_estimation_metrics.csv')
 
 			if len(list(run_ploidy_metrics_file)) ==1:
 
-				run_ploidy_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.ploidy_estimation_metrics.csv')
+				run_ploidy_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.ploidy_estimation_metrics.csv')
 
 				run_ploidy_metrics_file = list(run_ploidy_metrics_file)[0]
 				
 				parsed_run_ploidy_metrics = parsers.parse_ploidy_metrics_file(run_ploidy_metrics_file)
 
-				run_ploidy_metrics_dict[sample] = parsed_run_ploidy_metrics
+				return parsed_run_ploidy_metrics
+
+			# samples without a ploidy file are left out
+			return None
 
-		return run_ploidy_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_ploidy_metrics)
 		
 	def get_cnv_metrics(self):
 		"""
@@ -574,26 +569,24 @@ class DragenWGS:
 		
 		results_path = Path(self.results_dir)
 		
-		dragen_cnv_metrics_dict = {}
-		
-		for sample in self.sample_names:
+		def get_sample_cnv_metrics(sample):
 		
-			cnv_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.cnv_metrics.csv')
+			cnv_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.cnv_metrics.csv')
 			
 			
 			if len(list(cnv_metrics_file)) == 1:
 			
-				cnv_metrics_file = results_path.joinpath(sample).glob(f'*{sample}.cnv_metrics.csv')
+				cnv_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}.cnv_metrics.csv')
 				
 				cnv_file = list(cnv_metrics_file)[0]
 				
 				parsed_cnv_metrics = parsers.parse_dragen_cnv_metrics_file(cnv_file)
 				
-				dragen_cnv_metrics_dict[sample] = parsed_cnv_metrics
+				return parsed_cnv_metrics
 				
 			else:
 			
 				#if not CNV metrics file (i.e. NTC) add empty dictionary for sample
-				dragen_cnv_metrics_dict[sample] = {}
+				return {}
 		
-		return dragen_cnv_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_cnv_metrics)
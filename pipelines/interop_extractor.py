@@ -0,0 +1,186 @@
+"""
+Extract the run quality and index metrics from a run folder's InterOp files.
+
+The InterOp files are read once for both the per read and lane summary and the per sample \
+index metrics. Values are pulled out of the interop summary objects in one pass into NumPy \
+arrays and turned into the dictionaries the database loaders use.
+
+"""
+import numpy as np
+from interop import py_interop_run_metrics, py_interop_run, py_interop_summary
+
+# InteropRunQuality fields in the order they are held in the summary array
+SUMMARY_METRICS = [
+	'percent_q30',
+	'density',
+	'density_pf',
+	'cluster_count',
+	'cluster_count_pf',
+	'error_rate',
+	'percent_aligned',
+	'percent_pf',
+	'phasing',
+	'prephasing',
+	'reads',
+	'reads_pf',
+	'yield_g',
+]
+
+INTEGER_METRICS = {'reads', 'reads_pf'}
+
+
+def load_run_metrics(run_folder_dir):
+	"""
+	Read the InterOp files needed for the summary and index metrics in one go
+	"""
+
+	run_metrics = py_interop_run_metrics.run_metrics()
+
+	valid_to_load = py_interop_run.uchar_vector(py_interop_run.MetricCount, 0)
+	py_interop_run_metrics.list_summary_metrics_to_load(valid_to_load)
+	py_interop_run_metrics.list_index_metrics_to_load(valid_to_load)
+
+	run_metrics.read(run_folder_dir, valid_to_load)
+
+	return run_metrics
+
+
+def summarise_reads(run_metrics, num_reads, num_lanes):
+	"""
+	Returns an array of shape (num_reads, num_lanes, len(SUMMARY_METRICS))
+	"""
+
+	summary = py_interop_summary.run_summary()
+	py_interop_summary.summarize_run_metrics(run_metrics, summary)
+
+	values = np.full((num_reads, num_lanes, len(SUMMARY_METRICS)), np.nan)
+
+	for read in range(num_reads):
+
+		read_summary = summary.at(read)
+
+		for lane in range(num_lanes):
+
+			lane_summary = read_summary.at(lane)
+
+			density_pf = lane_summary.density_pf().mean()
+
+			# cluster_count has always been filled from the PF density, kept so values stay comparable
+			values[read, lane] = (
+				lane_summary.percent_gt_q30(),
+				lane_summary.density().mean(),
+				density_pf,
+				density_pf,
+				lane_summary.cluster_count_pf().mean(),
+				lane_summary.error_rate().mean(),
+				lane_summary.percent_aligned().mean(),
+				lane_summary.percent_pf().mean(),
+				lane_summary.phasing().mean(),
+				lane_summary.prephasing().mean(),
+				lane_summary.reads(),
+				lane_summary.reads_pf(),
+				lane_summary.yield_g(),
+			)
+
+	return values
+
+
+def summarise_index(run_metrics):
+	"""
+	Returns the sample ids, an array of the clusters for each sample in each lane and an array of the PF clusters in each lane
+	"""
+
+	index_summary = py_interop_summary.index_flowcell_summary()
+	py_interop_summary.summarize_index_metrics(run_metrics, index_summary)
+
+	num_lanes = index_summary.size()
+
+	sample_ids = []
+	sample_columns = {}
+
+	lane_counts = []
+	total_pf_reads = np.zeros(num_lanes)
+
+	for lane in range(num_lanes):
+
+		lane_summary = index_summary.at(lane)
+
+		total_pf_reads[lane] = lane_summary.total_pf_reads()
+
+		counts = {}
+
+		for i in range(lane_summary.size()):
+
+			count_summary = lane_summary.at(i)
+
+			sample_id = count_summary.sample_id()
+
+			if sample_id not in sample_columns:
+
+				sample_columns[sample_id] = len(sample_ids)
+				sample_ids.append(sample_id)
+
+			counts[sample_columns[sample_id]] = counts.get(sample_columns[sample_id], 0) + count_summary.cluster_count()
+
+		lane_counts.append(counts)
+
+	cluster_counts = np.zeros((num_lanes, len(sample_ids)))
+
+	for lane, counts in enumerate(lane_counts):
+
+		for column, count in counts.items():
+
+			cluster_counts[lane, column] = count
+
+	return sample_ids, cluster_counts, total_pf_reads
+
+
+def to_value(metric, value):
+
+	if np.isnan(value):
+
+		return None
+
+	if metric in INTEGER_METRICS:
+
+		return int(value)
+
+	return float(value)
+
+
+def extract_interop_data(run_folder_dir, num_reads, num_lanes):
+	"""
+	Returns a dictionary with the read_summaries for InteropRunQuality and the index_summaries \
+	(sample id to % of the run's PF reads identified) for InteropIndexMetrics.
+
+	"""
+
+	run_metrics = load_run_metrics(run_folder_dir)
+
+	values = summarise_reads(run_metrics, num_reads, num_lanes)
+
+	read_summaries = {}
+
+	for read in range(num_reads):
+
+		read_summaries[read + 1] = {}
+
+		for lane in range(num_lanes):
+
+			read_summaries[read + 1][lane + 1] = {metric: to_value(metric, value) for metric, value in zip(SUMMARY_METRICS, values[read, lane])}
+
+	sample_ids, cluster_counts, total_pf_reads = summarise_index(run_metrics)
+
+	index_summaries = {}
+
+	run_pf_reads = total_pf_reads.sum()
+
+	if run_pf_reads > 0:
+
+		pct_reads_identified = cluster_counts.sum(axis=0) / run_pf_reads * 100
+
+		for sample_id, pct in zip(sample_ids, pct_reads_identified):
+
+			index_summaries[sample_id] = float(pct)
+
+	return {'read_summaries': read_summaries, 'index_summaries': index_summaries}
@@ -0,0 +1,118 @@
+"""
+An in-memory listing of the directories a pipeline class looks at.
+
+Each directory is read once with os.scandir and every glob, existence and size query after that \
+is answered from the listing. A pipeline object only lives for one check of a run so the \
+listing is at most one update old.
+
+"""
+import fnmatch
+import glob
+import os
+from pathlib import Path
+
+
+class Manifest:
+
+	def __init__(self):
+
+		# directory to {name: os.DirEntry}, empty if the directory does not exist
+		self.listings = {}
+
+	def listdir(self, directory):
+
+		directory = str(directory)
+
+		if directory not in self.listings:
+
+			listing = {}
+
+			try:
+
+				with os.scandir(directory) as entries:
+
+					for entry in entries:
+
+						listing[entry.name] = entry
+
+			except (FileNotFoundError, NotADirectoryError, PermissionError):
+
+				pass
+
+			self.listings[directory] = listing
+
+		return self.listings[directory]
+
+	def is_dir(self, entry):
+
+		try:
+
+			return entry.is_dir()
+
+		except OSError:
+
+			return False
+
+	def glob(self, directory, pattern):
+		"""
+		Returns the same paths as Path(directory).glob(pattern) as a list
+		"""
+
+		directory = Path(directory)
+
+		parts = [part for part in pattern.split('/') if part not in ('', '.')]
+
+		# recursive patterns are not used by the pipelines, leave them to pathlib
+		if '**' in parts or len(parts) == 0:
+
+			return list(directory.glob(pattern))
+
+		matches = [directory]
+
+		for i, part in enumerate(parts):
+
+			last_part = i == len(parts) - 1
+
+			part_matches = []
+
+			for match in matches:
+
+				listing = self.listdir(match)
+
+				if glob.has_magic(part):
+
+					for name, entry in listing.items():
+
+						# only directories can have more parts below them
+						if fnmatch.fnmatchcase(name, part) and (last_part or self.is_dir(entry)):
+
+							part_matches.append(match.joinpath(name))
+
+				elif part in listing and (last_part or self.is_dir(listing[part])):
+
+					part_matches.append(match.joinpath(part))
+
+			matches = part_matches
+
+		return matches
+
+	def exists(self, path):
+
+		path = Path(path)
+
+		return path.name in self.listdir(path.parent)
+
+	def getsize(self, path):
+		"""
+		Size of a file in bytes, the stat is cached with the listing
+		"""
+
+		path = Path(path)
+
+		entry = self.listdir(path.parent).get(path.name)
+
+		if entry is None:
+
+			raise FileNotFoundError(f'No such file: {path}')
+
+		return entry.stat().st_size
@@ -0,0 +1,474 @@
+"""
+Check the demultiplexing and pipeline results of a run analysis and parse its QC metrics.
+
+Nothing in here touches the database so that checks can be run in a separate process. \
+A check takes a task dictionary describing the run analysis (see management_utils.make_run_analysis_task) \
+and returns a result dictionary which management_utils.save_run_analysis_result writes to the database.
+
+"""
+from pathlib import Path
+import logging
+
+from pipelines import dragen_pipelines, quality_pipelines, somatic_pipelines, nextflow_pipelines, TSO500_pipeline, ctDNA_pipeline, timing, parse_cache
+
+
+logger = logging.getLogger(__name__)
+
+
+def setup_logging():
+	"""
+	Log to stderr in the format used by the management commands.
+	"""
+
+	logging.basicConfig(level=logging.DEBUG)
+	root_logger = logging.getLogger()
+	root_logger.handlers.clear()
+	ch = logging.StreamHandler()
+	formatter = logging.Formatter("%(levelname)s\t%(asctime)s\t%(message)s")
+	ch.setFormatter(formatter)
+	root_logger.addHandler(ch)
+
+
+def setup_worker(parse_cache_dir):
+	"""
+	Set up a worker process of update_database
+	"""
+
+	setup_logging()
+
+	parse_cache.configure(parse_cache_dir)
+
+
+def get_run_data_dir(results_dir, run_config_key, run_id, analysis_type):
+	"""
+	Where the pipeline writes its results for this run
+	"""
+
+	if 'TSO500' in run_config_key:
+
+		return Path(results_dir).joinpath(run_id+"/TSO500/")
+
+	elif 'ctdna' in run_config_key:
+
+		return Path(results_dir).joinpath(run_id+"/tso500_ctdna/")
+
+	return Path(results_dir).joinpath(run_id, analysis_type)
+
+
+def get_task_run_data_dir(task, pipeline_config):
+
+	if pipeline_config is not None and pipeline_config.results_dir is not None:
+
+		results_dir = pipeline_config.results_dir
+
+	else:
+
+		results_dir = '/data/results/'
+
+	return get_run_data_dir(results_dir, task['run_config_key'], task['run_id'], task['analysis_type'])
+
+
+def get_watch_dirs(task, config):
+	"""
+	Directories where new files can change the result of check_run_analysis for a task
+	"""
+
+	pipeline_config = config.get(task['run_config_key'])
+
+	watch_dirs = []
+
+	if pipeline_config is not None and pipeline_config.fastq_dir is not None:
+
+		watch_dirs.append(Path(pipeline_config.fastq_dir).joinpath(task['run_id']))
+
+	run_data_dir = get_task_run_data_dir(task, pipeline_config)
+
+	watch_dirs.append(run_data_dir)
+
+	# per sample results folders
+	for sample_id in task['sample_ids']:
+
+		watch_dirs.append(run_data_dir.joinpath(sample_id))
+
+	return watch_dirs
+
+
+def check_demultiplexing(task, pipeline_config):
+	"""
+	Returns a tuple of whether demultiplexing has completed and is valid
+	"""
+
+	run_config_key = task['run_config_key']
+
+	# if we have not given a directory for fastqs then pretend everything is ok
+	if pipeline_config is None or pipeline_config.fastq_dir is None:
+
+		return True, True
+
+	run_fastq_dir = Path(pipeline_config.fastq_dir).joinpath(task['run_id'])
+
+	min_fastq_size = pipeline_config.min_fastq_size
+
+	qc_args = {
+		'fastq_dir': run_fastq_dir,
+		'sample_names': task['sample_ids'],
+		'n_lanes': task['lanes'],
+		'analysis_type': task['analysis_type'],
+		'min_fastq_size': min_fastq_size,
+		'run_id': task['run_id']
+	}
+
+	if 'Dragen' in run_config_key:
+
+		illumina_qc = quality_pipelines.DragenQC(**qc_args)
+
+	if 'TSO500' in run_config_key:
+
+		illumina_qc = quality_pipelines.TSO500_demultiplex(**qc_args)
+
+	else:
+
+		illumina_qc = quality_pipelines.IlluminaQC(**qc_args)
+
+	return illumina_qc.demultiplex_run_is_complete(), illumina_qc.demultiplex_run_is_valid()
+
+
+def make_somatic_amplicon(task, pipeline_config, run_data_dir):
+
+	if pipeline_config is None:
+
+		return somatic_pipelines.SomaticAmplicon(results_dir = run_data_dir,
+												sample_names = task['sample_ids'],
+												run_id = task['run_id'])
+
+	return somatic_pipelines.SomaticAmplicon(results_dir = run_data_dir,
+											sample_names = task['sample_ids'],
+											run_id = task['run_id'],
+											sample_expected_files = pipeline_config.files['sample_expected_files'],
+											sample_not_expected_files = pipeline_config.files['sample_not_expected_files'],
+											run_expected_files = pipeline_config.files['run_expected_files'],
+											run_not_expected_files = pipeline_config.files['run_not_expected_files'])
+
+
+def make_dragen(pipeline_class, task, pipeline_config, run_data_dir):
+
+	try:
+
+		return pipeline_class(results_dir = run_data_dir,
+							sample_names = task['sample_ids'],
+							run_id = task['run_id'],
+							sample_expected_files = pipeline_config.files['sample_expected_files'],
+							sample_not_expected_files = pipeline_config.files['sample_not_expected_files'],
+							run_expected_files = pipeline_config.files['run_expected_files'],
+							run_not_expected_files = pipeline_config.files['run_not_expected_files'],
+							post_sample_files = pipeline_config.files['post_sample_files'])
+
+	except (KeyError, AttributeError):
+
+		return pipeline_class(results_dir = run_data_dir,
+							sample_names = task['sample_ids'],
+							run_id = task['run_id'])
+
+
+def make_tso500_rna(task, pipeline_config, run_data_dir):
+
+	if pipeline_config is None:
+
+		return TSO500_pipeline.TSO500_RNA(results_dir = run_data_dir,
+										sample_names = task['sample_ids'],
+										sample_valid_files = None,
+										run_id = task['run_id'],
+										sample_completed_files = ['*_fusion_check.csv'],
+										run_completed_files = ['contamination-*.csv'],
+										run_expected_files = ['RNA_QC_combined.txt', 'contamination-*.csv' ,'completed_samples.txt'],
+										metrics_file = ['RNA_QC_combined.txt'])
+
+	return TSO500_pipeline.TSO500_RNA(results_dir = run_data_dir,
+									sample_completed_files = pipeline_config.files['sample_completed_files'],
+									sample_valid_files = None,
+									run_completed_files = pipeline_config.files['run_completed_files'],
+									run_expected_files = pipeline_config.files['run_expected_files'],
+									metrics_file = pipeline_config.files['metrics_file'],
+									sample_names = task['sample_ids'],
+									run_id = task['run_id'])
+
+
+def make_tso500_dna(task, pipeline_config, run_data_dir):
+
+	if pipeline_config is None:
+
+		return TSO500_pipeline.TSO500_DNA(results_dir = run_data_dir,
+										sample_names = task['sample_ids'],
+										run_id = task['run_id'],
+										sample_completed_files = ['*variants.tsv', '*_coverage.json'],
+										sample_valid_files = ['DNA_QC_combined.txt'],
+										run_completed_files = ['contamination-*.csv'],
+										run_expected_files = ['DNA_QC_combined.txt','completed_samples.txt'],
+										metrics_file = ['DNA_QC_combined.txt'])
+
+	return TSO500_pipeline.TSO500_DNA(results_dir = run_data_dir,
+									sample_completed_files = pipeline_config.files['sample_completed_files'],
+									sample_valid_files = pipeline_config.files['sample_valid_files'],
+									run_completed_files = pipeline_config.files['run_completed_files'],
+									run_expected_files = pipeline_config.files['run_expected_files'],
+									metrics_file = pipeline_config.files['metrics_file'],
+									run_id = task['run_id'],
+									sample_names = task['sample_ids'])
+
+
+def make_ctdna(task, pipeline_config, run_data_dir):
+
+	if pipeline_config is None:
+
+		return ctDNA_pipeline.TSO500_ctDNA(results_dir = run_data_dir,
+										sample_names = task['sample_ids'],
+										run_id = task['run_id'],
+										sample_completed_files = ['*_fusion_check.csv', '*_variants.tsv', '*_coverage.json'],
+										run_completed_files = ['postprocessing_complete.txt'],
+										metrics_file = ['QC_combined.txt'])
+
+	return ctDNA_pipeline.TSO500_ctDNA(results_dir = run_data_dir,
+									sample_completed_files = pipeline_config.files['sample_completed_files'],
+									run_completed_files = pipeline_config.files['run_completed_files'],
+									metrics_file = pipeline_config.files['metrics_file'],
+									run_id = task['run_id'],
+									sample_names = task['sample_ids'])
+
+
+def get_somatic_amplicon_metrics(somatic_amplicon, task, result):
+
+	return [
+		('fastqc data', 'add_fastqc_data', (somatic_amplicon.get_fastqc_data(),), {}),
+		('hs metrics data', 'add_hs_metrics', (somatic_amplicon.get_hs_metrics(),), {}),
+		('depth metrics data', 'add_depth_of_coverage_metrics', (somatic_amplicon.get_depth_metrics(),), {}),
+		('variant count metrics data', 'add_variant_count_metrics', (somatic_amplicon.get_variant_count(),), {}),
+	]
+
+
+def get_dragen_ge_metrics(dragen_ge, task, result):
+
+	metrics = [
+		('coverage metrics', 'add_custom_coverage_metrics', (dragen_ge.get_coverage_metrics(),), {}),
+		('contamination metrics', 'add_contamination_metrics', (dragen_ge.get_contamination(),), {}),
+		('sex metrics', 'add_sex_metrics', (dragen_ge.get_sex_metrics(),), {'sex_key': 'sex'}),
+		('alignment metrics', 'add_dragen_alignment_metrics', (dragen_ge.get_alignment_metrics(),), {}),
+		('variant calling metrics', 'add_dragen_variant_calling_metrics', (dragen_ge.get_variant_calling_metrics(),), {}),
+		('sensitivity metrics', 'add_sensitivity_metrics', (dragen_ge.get_sensitivity(),), {}),
+	]
+
+	if dragen_ge.display_cnv_qc_metrics():
+
+		result['display_cnv_qc_metrics'] = True
+		metrics.append(('CNV QC metrics', 'add_exome_postprocessing_cnv_qc_metrics', (dragen_ge.get_postprocessing_cnv_qc_metrics(),), {}))
+
+	else:
+
+		logger.info (f'No CNV metrics for this run {task["run_id"]}')
+
+	metrics.append(('relatedness metrics', 'add_relatedness_metrics', dragen_ge.get_relatedness_metrics(*task['relatedness_thresholds']), {}))
+
+	return metrics
+
+
+def get_dragen_wgs_metrics(dragen_wgs, task, result):
+
+	return [
+		('alignment metrics', 'add_dragen_alignment_metrics', (dragen_wgs.get_alignment_metrics(),), {}),
+		('variant calling metrics', 'add_dragen_variant_calling_metrics', (dragen_wgs.get_variant_calling_metrics(),), {}),
+		('relatedness metrics', 'add_relatedness_metrics', dragen_wgs.get_relatedness_metrics(*task['relatedness_thresholds']), {}),
+		('WGS metrics', 'add_dragen_wgs_coverage_metrics', (dragen_wgs.get_wgs_mapping_metrics(),), {}),
+		('exonic coverage metrics', 'add_dragen_exonic_coverage_metrics', (dragen_wgs.get_exonic_mapping_metrics(),), {}),
+		('ploidy metrics', 'add_dragen_ploidy_metrics', (dragen_wgs.get_ploidy_metrics(),), {}),
+		('CNV metrics', 'add_dragen_cnv_metrics', (dragen_wgs.get_cnv_metrics(),), {}),
+	]
+
+
+def get_nextflow_metrics(nextflow, task, result):
+
+	return [
+		('fastqc data', 'add_fastqc_data', (nextflow.get_fastqc_data(),), {}),
+		('hs metrics', 'add_hs_metrics', (nextflow.get_hs_metrics(),), {}),
+		('duplication metrics', 'add_duplication_metrics', (nextflow.get_duplication_metrics(),), {}),
+		('contamination metrics', 'add_contamination_metrics', (nextflow.get_contamination(),), {}),
+		('alignment metrics', 'add_alignment_metrics', (nextflow.get_alignment_metrics(),), {}),
+		('variant calling metrics', 'add_variant_calling_metrics', (nextflow.get_variant_calling_metrics(),), {}),
+		('insert metrics', 'add_insert_metrics', (nextflow.get_insert_metrics(),), {}),
+		('coverage metrics', 'add_custom_coverage_metrics', (nextflow.get_coverage_metrics(),), {}),
+		('sex metrics', 'add_sex_metrics', (nextflow.get_sex_metrics(),), {'sex_key': 'sex'}),
+	]
+
+
+def get_tso500_rna_metrics(tso500, task, result):
+
+	return [
+		('fastqc data', 'add_fastqc_data', (tso500.get_fastqc_data(),), {}),
+		('reads data', 'add_tso500_reads', (tso500.get_reads(),), {}),
+	]
+
+
+def get_tso500_dna_metrics(tso500, task, result):
+
+	return [
+		('fastqc data', 'add_fastqc_data', (tso500.get_fastqc_data(),), {}),
+		('ntc contamination data', 'add_tso500_ntc_contamination', tso500.ntc_contamination(), {}),
+	]
+
+
+def get_ctdna_metrics(ctDNA, task, result):
+
+	metrics = []
+
+	fastqc_metrics = ctDNA.determine_fastqc_metrics()
+
+	if fastqc_metrics == 'FastQC':
+
+		metrics.append(('fastqc data', 'add_fastqc_data', (ctDNA.get_fastqc_data(),), {}))
+
+	elif fastqc_metrics == 'DragenFastQC':
+
+		metrics.append(('fastqc data', 'add_dragen_fastqc_data', (ctDNA.get_dragen_fastqc_data(),), {}))
+
+	metrics.append(('ntc contamination data', 'add_ctdna_ntc_contamination', ctDNA.ntc_contamination(), {}))
+
+	return metrics
+
+
+def check_results(task, pipeline_config, run_data_dir, result):
+	"""
+	Check whether the pipeline has finished for each sample and for the run.
+
+	If the run has newly completed successfully then parse the QC metrics into result['metrics'] \
+	as a list of (description, management_utils function name, args, kwargs).
+
+	"""
+
+	pipeline_id = task['pipeline_id']
+	analysis_type = task['analysis_type']
+
+	# samples assumed valid are only checked at run level
+	all_samples_valid = False
+
+	if 'SomaticAmplicon' in pipeline_id:
+
+		pipeline = make_somatic_amplicon(task, pipeline_config, run_data_dir)
+		run_status = (pipeline.run_is_complete, pipeline.run_is_valid)
+		get_metrics = get_somatic_amplicon_metrics
+
+	elif 'DragenGE' in pipeline_id:
+
+		pipeline = make_dragen(dragen_pipelines.DragenGE, task, pipeline_config, run_data_dir)
+		all_samples_valid = True
+		run_status = (pipeline.run_is_complete, pipeline.run_is_valid)
+		get_metrics = get_dragen_ge_metrics
+
+	elif 'DragenWGS' in pipeline_id:
+
+		pipeline = make_dragen(dragen_pipelines.DragenWGS, task, pipeline_config, run_data_dir)
+		run_status = (pipeline.run_and_samples_complete, pipeline.run_and_samples_valid)
+		get_metrics = get_dragen_wgs_metrics
+
+	elif 'nextflow' in pipeline_id:
+
+		pipeline = nextflow_pipelines.NextflowGermlineEnrichment(results_dir = run_data_dir,
+																sample_names = task['sample_ids'],
+																run_id = task['run_id'])
+		all_samples_valid = True
+		run_status = (pipeline.run_is_complete, pipeline.run_is_valid)
+		get_metrics = get_nextflow_metrics
+
+	elif 'TSO500' in pipeline_id and 'RNA' in analysis_type:
+
+		pipeline = make_tso500_rna(task, pipeline_config, run_data_dir)
+		run_status = (pipeline.run_is_complete, pipeline.run_is_valid)
+		get_metrics = get_tso500_rna_metrics
+
+	elif 'TSO500' in pipeline_id and 'DNA' in analysis_type:
+
+		pipeline = make_tso500_dna(task, pipeline_config, run_data_dir)
+		run_status = (pipeline.run_is_complete, pipeline.run_is_valid)
+		get_metrics = get_tso500_dna_metrics
+
+	elif 'tso500_ctdna' in pipeline_id:
+
+		pipeline = make_ctdna(task, pipeline_config, run_data_dir)
+		# ctDNA run is valid as soon as it is complete
+		run_status = (pipeline.run_is_complete, pipeline.run_is_complete)
+		get_metrics = get_ctdna_metrics
+
+	else:
+
+		return
+
+	labels = {'run': task['run_id'], 'pipeline': task['run_config_key']}
+
+	with timing.stage('results_check', **labels):
+
+		for sample in task['sample_ids']:
+
+			if all_samples_valid:
+
+				result['samples'][sample] = (True, True)
+
+			else:
+
+				result['samples'][sample] = (pipeline.sample_is_complete(sample), pipeline.sample_is_valid(sample))
+
+		run_complete = run_status[0]()
+		run_valid = run_status[1]()
+
+	result['results_completed'] = run_complete
+	result['results_valid'] = run_valid
+
+	# only parse metrics when the run has newly completed successfully
+	if run_complete and run_valid and (task['results_completed'] == False or task['results_valid'] == False):
+
+		# time each parser
+		timed_pipeline = timing.TimedMethods(pipeline, ['get_', 'ntc_contamination'], **labels)
+
+		result['metrics'] = get_metrics(timed_pipeline, task, result)
+
+
+def check_run_analysis(task, config):
+	"""
+	Check demultiplexing and pipeline results for a run analysis task and parse any new QC metrics.
+
+	Returns a result dictionary for management_utils.save_run_analysis_result
+
+	"""
+
+	run_config_key = task['run_config_key']
+	pipeline_config = config.get(run_config_key)
+
+	if pipeline_config is None or pipeline_config.results_dir is None:
+
+		logger.warning(f'No results directory configured for this pipeline {run_config_key}')
+
+	run_data_dir = get_task_run_data_dir(task, pipeline_config)
+
+	labels = {'run': task['run_id'], 'pipeline': run_config_key}
+
+	timings_start = timing.mark()
+
+	with timing.stage('check_run_analysis', **labels):
+
+		with timing.stage('demultiplex_check', **labels):
+
+			demultiplexing_completed, demultiplexing_valid = check_demultiplexing(task, pipeline_config)
+
+		result = {
+			'pk': task['pk'],
+			'demultiplexing_completed': demultiplexing_completed,
+			'demultiplexing_valid': demultiplexing_valid,
+			'samples': {},
+			'results_completed': None,
+			'results_valid': None,
+			'display_cnv_qc_metrics': False,
+			'metrics': [],
+		}
+
+		check_results(task, pipeline_config, run_data_dir, result)
+
+	# sent back with the result so the timings of worker processes are in the summary
+	result['timings'] = timing.take(timings_start)
+
+	return result
@@ -1,7 +1,8 @@
 from pathlib import Path
 import glob
 import re
-from pipelines import parsers
+from pipelines import parsers, sample_fetcher
+from pipelines.manifest import Manifest
 
 
 class NextflowGermlineEnrichment:
@@ -14,6 +15,7 @@ class NextflowGermlineEnrichment:
 				):
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.sample_names = sample_names
 		self.run_id = run_id
 		self.run_complete_marker = run_complete_marker		
@@ -25,7 +27,7 @@ class NextflowGermlineEnrichment:
 
 		results_path = Path(self.results_dir)
 		
-		marker = results_path.glob(self.run_complete_marker)
+		marker = self.manifest.glob(results_path, self.run_complete_marker)
 
 		if len(list(marker)) == 1:
 
@@ -46,7 +48,7 @@ class NextflowGermlineEnrichment:
 
 			results_path = Path(self.results_dir)
 		
-			marker = results_path.glob(self.run_complete_marker)
+			marker = self.manifest.glob(results_path, self.run_complete_marker)
 
 			marker = list(marker)[0]
 
@@ -67,13 +69,11 @@ class NextflowGermlineEnrichment:
 
 	def get_fastqc_data(self):
 
-		fastqc_dict = {}
-
 		results_path = Path(self.results_dir)
 
-		for sample in self.sample_names:
+		def get_sample_fastqc_data(sample):
 
-			fastqc_data_files = results_path.glob(f'post_processing/results/fastqc/*{sample}*/summary.txt')
+			fastqc_data_files = self.manifest.glob(results_path, f'post_processing/results/fastqc/*{sample}*/summary.txt')
 
 			sample_fastqc_list = []
 
@@ -113,66 +113,60 @@ class NextflowGermlineEnrichment:
 
 				sample_fastqc_list.append(file_fastqc_dict)
 
-			fastqc_dict[sample] = sample_fastqc_list
+			return sample_fastqc_list
 
-		return fastqc_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_fastqc_data)
 
 
 	def get_hs_metrics(self):
 
 		results_path = Path(self.results_dir)
 
-		run_hs_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_hs_metrics(sample):
 
-			hs_metrics_file = results_path.glob(f'post_processing/results/metrics/*{sample}_hs_metrics.txt')
+			hs_metrics_file = self.manifest.glob(results_path, f'post_processing/results/metrics/*{sample}_hs_metrics.txt')
 
 			hs_metrics_file = list(hs_metrics_file)[0]
 
 			parsed_hs_metrics_data  = parsers.parse_hs_metrics_file(hs_metrics_file)
 
-			run_hs_metrics_dict[sample] = parsed_hs_metrics_data
+			return parsed_hs_metrics_data
 
-		return run_hs_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_hs_metrics)
 
 
 	def get_duplication_metrics(self):
 
 		results_path = Path(self.results_dir)
 
-		run_duplication_metrics_dict = {}
+		def get_sample_duplication_metrics(sample):
 
-		for sample in self.sample_names:
-
-			sample_duplication_metrics_file = results_path.glob(f'post_processing/results/metrics/*{sample}_markduplicate_metrics.txt')
+			sample_duplication_metrics_file = self.manifest.glob(results_path, f'post_processing/results/metrics/*{sample}_markduplicate_metrics.txt')
 
 			sample_duplication_metrics_file = list(sample_duplication_metrics_file)[0]	
 
 			parsed_duplication_metrics = parsers.parse_duplication_metrics_file(sample_duplication_metrics_file)
 
-			run_duplication_metrics_dict[sample] = parsed_duplication_metrics
+			return parsed_duplication_metrics
 
-		return run_duplication_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_duplication_metrics)
 
 
 	def get_alignment_metrics(self):
 
 		results_path = Path(self.results_dir)
 
-		alignment_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_alignment_metrics(sample):
 
-			alignment_metrics_file = results_path.glob(f'post_processing/results/metrics/*{sample}_alignment_summary_metrics.txt')
+			alignment_metrics_file = self.manifest.glob(results_path, f'post_processing/results/metrics/*{sample}_alignment_summary_metrics.txt')
 
 			alignment_metrics_file = list(alignment_metrics_file)[0]
 
 			parsed_alignment_metrics_file = parsers.parse_alignment_metrics_file(alignment_metrics_file)
 
-			alignment_metrics_dict[sample] = parsed_alignment_metrics_file
+			return parsed_alignment_metrics_file
 
-		return alignment_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_alignment_metrics)
 
 
 	def get_variant_calling_metrics(self):
@@ -181,7 +175,7 @@ class NextflowGermlineEnrichment:
 
 		variant_metrics_dict = {}
 
-		variant_detail_metrics_file = results_path.glob(f'post_processing/results/metrics/*.variant_calling_detail_metrics')
+		variant_detail_metrics_file = self.manifest.glob(results_path, f'post_processing/results/metrics/*.variant_calling_detail_metrics')
 
 		variant_detail_metrics_file = list(variant_detail_metrics_file)[0]
 
@@ -194,68 +188,60 @@ class NextflowGermlineEnrichment:
 
 		results_path = Path(self.results_dir)
 
-		insert_metrics_dict = {}
+		def get_sample_insert_metrics(sample):
 
-		for sample in self.sample_names:
-
-			insert_metrics_file = results_path.glob(f'post_processing/results/metrics/*{sample}_insert_metrics.txt')
+			insert_metrics_file = self.manifest.glob(results_path, f'post_processing/results/metrics/*{sample}_insert_metrics.txt')
 
 			insert_metrics_file = list(insert_metrics_file)[0]
 
 			parsed_insert_metrics_file = parsers.parse_insert_metrics_file(insert_metrics_file)
 
-			insert_metrics_dict[sample] = parsed_insert_metrics_file
+			return parsed_insert_metrics_file
 
-		return insert_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_insert_metrics)
 
 
 	def get_contamination(self):
 
 		results_path = Path(self.results_dir)
 
-		run_contamination_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_contamination(sample):
 
-			sample_contamination_metrics_file = results_path.glob(f'post_processing/results/contamination/*{sample}_contamination.selfSM')
+			sample_contamination_metrics_file = self.manifest.glob(results_path, f'post_processing/results/contamination/*{sample}_contamination.selfSM')
 
 			sample_contamination_metrics_file = list(sample_contamination_metrics_file)[0]	
 
 			parsed_contamination_metrics = parsers.parse_contamination_metrics(sample_contamination_metrics_file)
 
-			run_contamination_metrics_dict[sample] = parsed_contamination_metrics
+			return parsed_contamination_metrics
 
-		return run_contamination_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_contamination)
 
 
 	def get_coverage_metrics(self):
 
 		results_path = Path(self.results_dir)
 
-		run_coverage_metrics_dict = {}
+		def get_sample_coverage_metrics(sample):
 
-		for sample in self.sample_names:
-
-			sample_coverage_metrics_file = results_path.glob(f'post_processing/results/coverage/*{sample}.depth_summary')
+			sample_coverage_metrics_file = self.manifest.glob(results_path, f'post_processing/results/coverage/*{sample}.depth_summary')
 
 			sample_coverage_metrics_file = list(sample_coverage_metrics_file)[0]	
 
 			parsed_coverage_metrics = parsers.parse_custom_coverage_metrics(sample_coverage_metrics_file)
 
-			run_coverage_metrics_dict[sample] = parsed_coverage_metrics
+			return parsed_coverage_metrics
 
-		return run_coverage_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_coverage_metrics)
 
 
 	def get_sex_metrics(self):
 		
 		results_path = Path(self.results_dir)
 
-		run_sex_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_sex_metrics(sample):
 
-			sample_sex_metrics_file = results_path.glob(f'post_processing/results/sex/*{sample}_calculated_sex.txt')
+			sample_sex_metrics_file = self.manifest.glob(results_path, f'post_processing/results/sex/*{sample}_calculated_sex.txt')
 
 			try:
 
@@ -263,10 +249,10 @@ class NextflowGermlineEnrichment:
 
 				parsed_sex_metrics = parsers.parse_dragen_sex_file(sample_sex_metrics_file)
 
-				run_sex_metrics_dict[sample] = parsed_sex_metrics
+				return parsed_sex_metrics
 
 			except:
 
-				run_sex_metrics_dict[sample] = {'sex': 'Unknown'}
+				return {'sex': 'Unknown'}
 
-		return run_sex_metrics_dict   
\ No newline at end of file
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_sex_metrics)
\ No newline at end of file
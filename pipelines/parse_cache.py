@@ -0,0 +1,277 @@
+"""
+A persistent cache of parsed QC metric files.
+
+Parsers decorated with cached(version) keep their result in a local directory keyed by the \
+parser, its version, the file path and any other arguments. An entry is used while the file's \
+size and mtime are unchanged, so a hit only stats the file and never reads it. Bump a parser's \
+version when its output changes.
+
+Parsers decorated with cached(version, check_contents=True) also keep a hash of the file and \
+an entry is used while the contents are unchanged, whatever the mtime. This is for small files \
+such as sample sheets which can be edited in place without the mtime changing, or copied again \
+unchanged with a new mtime.
+
+The cache is off until configure is called with a directory, so the parsers behave as before \
+when used on their own. prune removes entries which have not been used for max_age seconds and \
+then the least recently used entries until the cache is under max_bytes.
+
+"""
+import functools
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# change when the format of the entries changes
+PARSE_CACHE_VERSION = 2
+
+MAX_BYTES = 1024 * 1024 * 1024
+
+MAX_AGE = 90 * 24 * 60 * 60
+
+# directory of the cache, None when the cache is off
+cache_dir = None
+
+stats = {'hits': 0, 'misses': 0}
+
+# the pipeline classes parse several samples' files at once on threads
+stats_lock = threading.Lock()
+
+
+def configure(directory):
+	"""
+	Use the cache in directory, or turn it off if directory is None
+	"""
+
+	global cache_dir
+
+	cache_dir = None if directory is None else str(directory)
+
+
+def get_entry_path(key):
+
+	return os.path.join(cache_dir, key[:2], key + '.pickle')
+
+
+def make_key(function, version, file_path, args, kwargs):
+
+	key = repr((PARSE_CACHE_VERSION, function.__module__, function.__qualname__, version, os.path.abspath(file_path), args, sorted(kwargs.items())))
+
+	return hashlib.sha1(key.encode()).hexdigest()
+
+
+def file_digest(file_path):
+
+	with open(file_path, 'rb') as file:
+
+		return hashlib.sha256(file.read()).hexdigest()
+
+
+def load_entry(entry_path, file_stat, digest=None):
+	"""
+	Returns the entry's result if it is still valid for the file, if digest is given the entry is \
+	valid while the contents match otherwise while the size and mtime match.
+
+	"""
+
+	try:
+
+		with open(entry_path, 'rb') as entry_file:
+
+			size, mtime_ns, entry_digest, result = pickle.load(entry_file)
+
+	except FileNotFoundError:
+
+		return None
+
+	except Exception as e:
+
+		logger.warning(f'Could not read parse cache entry {entry_path}: {e}')
+		return None
+
+	if digest is not None:
+
+		if entry_digest != digest:
+
+			return None
+
+		# same contents with a new mtime, keep the entry up to date so it is not rehashed as changed
+		if size != file_stat.st_size or mtime_ns != file_stat.st_mtime_ns:
+
+			save_entry(entry_path, file_stat, result, digest)
+
+	elif size != file_stat.st_size or mtime_ns != file_stat.st_mtime_ns:
+
+		return None
+
+	# the mtime of an entry is when it was last used, for pruning
+	try:
+
+		os.utime(entry_path)
+
+	except OSError:
+
+		pass
+
+	return result
+
+
+def save_entry(entry_path, file_stat, result, digest=None):
+
+	try:
+
+		os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+		# write then rename so other processes never read half an entry
+		with tempfile.NamedTemporaryFile(dir=os.path.dirname(entry_path), suffix='.tmp', delete=False) as entry_file:
+
+			pickle.dump((file_stat.st_size, file_stat.st_mtime_ns, digest, result), entry_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+		os.replace(entry_file.name, entry_path)
+
+	except Exception as e:
+
+		logger.warning(f'Could not write parse cache entry {entry_path}: {e}')
+
+		try:
+
+			os.remove(entry_file.name)
+
+		except Exception:
+
+			pass
+
+
+def cached(version, check_contents=False):
+	"""
+	Decorator for parsers whose first argument is the path of the file they read
+	"""
+
+	def decorator(function):
+
+		@functools.wraps(function)
+		def wrapper(file_path, *args, **kwargs):
+
+			if cache_dir is None:
+
+				return function(file_path, *args, **kwargs)
+
+			try:
+
+				file_stat = os.stat(file_path)
+
+				digest = file_digest(file_path) if check_contents else None
+
+			except OSError:
+
+				# let the parser raise its usual error
+				return function(file_path, *args, **kwargs)
+
+			entry_path = get_entry_path(make_key(function, version, file_path, args, kwargs))
+
+			result = load_entry(entry_path, file_stat, digest)
+
+			if result is not None:
+
+				with stats_lock:
+
+					stats['hits'] = stats['hits'] + 1
+
+				return result
+
+			with stats_lock:
+
+				stats['misses'] = stats['misses'] + 1
+
+			result = function(file_path, *args, **kwargs)
+
+			# don't keep a result if the file changed while it was being parsed
+			try:
+
+				new_stat = os.stat(file_path)
+
+			except OSError:
+
+				return result
+
+			if new_stat.st_size == file_stat.st_size and new_stat.st_mtime_ns == file_stat.st_mtime_ns:
+
+				save_entry(entry_path, file_stat, result, digest)
+
+			return result
+
+		wrapper.uncached = function
+
+		return wrapper
+
+	return decorator
+
+
+def prune(max_bytes=MAX_BYTES, max_age=MAX_AGE):
+	"""
+	Remove old entries and then the least recently used until the cache is under max_bytes.
+
+	Returns the number of entries removed.
+
+	"""
+
+	if cache_dir is None or not os.path.isdir(cache_dir):
+
+		return 0
+
+	entries = []
+
+	for directory, directory_names, file_names in os.walk(cache_dir):
+
+		for file_name in file_names:
+
+			entry_path = os.path.join(directory, file_name)
+
+			try:
+
+				entry_stat = os.stat(entry_path)
+
+			except FileNotFoundError:
+
+				continue
+
+			entries.append((entry_stat.st_mtime, entry_stat.st_size, entry_path))
+
+	# most recently used first
+	entries.sort(reverse=True)
+
+	now = time.time()
+	total_bytes = 0
+	removed = 0
+
+	for mtime, size, entry_path in entries:
+
+		if entry_path.endswith('.tmp'):
+
+			# temporary files left by a process which died while writing, or still being written
+			keep = mtime >= now - 3600
+
+		else:
+
+			total_bytes = total_bytes + size
+			keep = mtime >= now - max_age and total_bytes <= max_bytes
+
+		if keep:
+
+			continue
+
+		try:
+
+			os.remove(entry_path)
+			removed = removed + 1
+
+		except FileNotFoundError:
+
+			pass
+
+	return removed
@@ -3,12 +3,10 @@ import xmltodict
 from datetime import date, datetime
 import json
 import yaml
-import math
-import string
 
-from interop import py_interop_run_metrics, py_interop_run, py_interop_summary
-from pysam import VariantFile
+from pipelines import parse_cache, picard_metrics, dragen_metrics
 
+@parse_cache.cached(version=1, check_contents=True)
 def sample_sheet_parser(sample_sheet_path):
 	"""
 	Parse the sample sheet into a dictionary
@@ -197,70 +195,17 @@ def extract_data_from_run_info_dict(run_info_dict):
 
 def parse_interop_data(run_folder_dir, num_reads, num_lanes):
 	"""
-	Parses summary statistics out of interops data using the Illumina interops package
+	Parses summary statistics and index metrics out of interops data using the Illumina interops package, \
+	see interop_extractor
 	"""
 
-	# make empty dict to store output
-	interop_dict = {'read_summaries': {}}
+	# imported here so only the commands which read run folders load the interop package
+	from pipelines import interop_extractor
 
-
-	# taken from illumina interops package documentation, all of this is required, 
-	# even though only the summary variable is used further on
-	run_metrics = py_interop_run_metrics.run_metrics()
-	valid_to_load = py_interop_run.uchar_vector(py_interop_run.MetricCount, 0)
-	py_interop_run_metrics.list_summary_metrics_to_load(valid_to_load)
-	run_folder = run_metrics.read(run_folder_dir, valid_to_load)
-	summary = py_interop_summary.run_summary()
-	py_interop_summary.summarize_run_metrics(run_metrics, summary)
-
-
-	for read in range(num_reads):
-
-		new_read = read + 1
-
-		if new_read not in interop_dict['read_summaries']:
-
-			interop_dict['read_summaries'][new_read] = {}
-
-
-		for lane in range(num_lanes):
-
-			new_lane = lane + 1
-
-			if new_lane not in interop_dict['read_summaries'][new_read]:
-
-				interop_dict['read_summaries'][new_read][new_lane] = {}
-
-			interop_dict['read_summaries'][read+1][lane+1]['percent_q30'] = summary.at(read).at(lane).percent_gt_q30()
-			interop_dict['read_summaries'][read+1][lane+1]['density'] = summary.at(read).at(lane).density().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['density_pf'] = summary.at(read).at(lane).density_pf().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['cluster_count'] = summary.at(read).at(lane).density_pf().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['cluster_count_pf'] = summary.at(read).at(lane).cluster_count_pf().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['error_rate'] = summary.at(read).at(lane).error_rate().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['percent_aligned'] = summary.at(read).at(lane).percent_aligned().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['percent_pf'] = summary.at(read).at(lane).percent_pf().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['phasing'] = summary.at(read).at(lane).phasing().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['prephasing'] = summary.at(read).at(lane).prephasing().mean()
-			interop_dict['read_summaries'][read+1][lane+1]['reads'] = summary.at(read).at(lane).reads()
-			interop_dict['read_summaries'][read+1][lane+1]['reads_pf'] = summary.at(read).at(lane).reads_pf()
-			interop_dict['read_summaries'][read+1][lane+1]['yield_g'] = summary.at(read).at(lane).yield_g()
-
-			for key in interop_dict['read_summaries'][read+1][lane+1]:
-
-				if math.isnan(interop_dict['read_summaries'][read+1][lane+1][key]):
-
-					interop_dict['read_summaries'][read+1][lane+1][key] = None
-
-
-	run_metrics = py_interop_run_metrics.run_metrics()
-	valid_to_load = py_interop_run.uchar_vector(py_interop_run.MetricCount, 0)
-	py_interop_run_metrics.list_index_metrics_to_load(valid_to_load)
-	run_folder = run_metrics.read(run_folder_dir, valid_to_load)
-
-
-	return interop_dict
+	return interop_extractor.extract_interop_data(run_folder_dir, num_reads, num_lanes)
 
 
+@parse_cache.cached(version=1)
 def parse_fastqc_file(fastqc_text_file):
 
 	with open (fastqc_text_file) as file:
@@ -289,6 +234,7 @@ def parse_fastqc_file(fastqc_text_file):
 		return fqcdict
 
 
+@parse_cache.cached(version=1)
 def parse_fastqc_file_tso500(fastqc_text_file):
 
 	with open (fastqc_text_file) as file:
@@ -315,6 +261,7 @@ def parse_fastqc_file_tso500(fastqc_text_file):
 		return fqcdict
 
 
+@parse_cache.cached(version=1)
 def parse_fastqc_file_cruk(fastqc_text_file, run_id):
 
 	with open (fastqc_text_file) as file:
@@ -340,6 +287,7 @@ def parse_fastqc_file_cruk(fastqc_text_file, run_id):
 		return fqcdict
 	
 
+@parse_cache.cached(version=1)
 def parse_dragen_fastqc_file(dragen_fastqc_file):
 
 	with open(dragen_fastqc_file, "r") as f:
@@ -384,46 +332,19 @@ def parse_dragen_fastqc_file(dragen_fastqc_file):
 		return fastqcdict
 
 
+@parse_cache.cached(version=1)
 def parse_hs_metrics_file(hs_metrics_file):
 
-	hs_metrics_dict = {}
+	rows = picard_metrics.read_metrics_file(hs_metrics_file)
 
-	with open (hs_metrics_file) as file:
+	if len(rows) == 0:
 
-		hs_metrics_file = csv.reader(file, delimiter='\t')
+		return {}
 
-		next_keys = False
-		next_values = False
-
-		keys = []
-		values = []
-
-		for row in hs_metrics_file:
-
-			if len(row) != 0:
-
-				if next_values == True:
-
-					values = row
-					break
-
-				if next_keys == True:
-
-					keys = row
-					next_keys = False
-					next_values = True
-
-				if row[0] == '## METRICS CLASS':
-
-					next_keys = True
-
-	for key, value in zip(keys, values):
-
-		hs_metrics_dict[key.lower()] = value
-
-	return hs_metrics_dict
+	return rows[0]
 
 
+@parse_cache.cached(version=1)
 def parse_gatk_depth_summary_file(gatk_depth_summary_file):
 
 	gatk_depth_summary_dict = {}
@@ -458,46 +379,19 @@ def parse_gatk_depth_summary_file(gatk_depth_summary_file):
 	return gatk_depth_summary_dict
 
 
+@parse_cache.cached(version=1)
 def parse_duplication_metrics_file(duplication_metrics_file):
 
-	duplication_metrics_dict = {}
-
-	with open (duplication_metrics_file) as file:
-
-		duplication_metrics_file = csv.reader(file, delimiter='\t')
-
-		next_keys = False
-		next_values = False
+	rows = picard_metrics.read_metrics_file(duplication_metrics_file)
 
-		keys = []
-		values = []
-
-		for row in duplication_metrics_file:
-
-			if len(row) != 0:
-
-				if next_values == True:
+	if len(rows) == 0:
 
-					values = row
-					break
+		return {}
 
-				if next_keys == True:
-
-					keys = row
-					next_keys = False
-					next_values = True
-
-				if row[0] == '## METRICS CLASS':
-
-					next_keys = True
-
-	for key, value in zip(keys, values):
-
-		duplication_metrics_dict[key.lower()] = value
-
-	return duplication_metrics_dict
+	return rows[0]
 
 
+@parse_cache.cached(version=1)
 def parse_contamination_metrics(self_sm_contamination_file):
 
 	contamination_metrics_dict = {}
@@ -547,6 +441,7 @@ def parse_contamination_metrics(self_sm_contamination_file):
 	return contamination_metrics_dict
 
 
+@parse_cache.cached(version=1)
 def parse_qc_metrics_file(qc_metrics_file):
 
 	qc_metrics_dict = {}
@@ -579,134 +474,38 @@ def parse_qc_metrics_file(qc_metrics_file):
 	return qc_metrics_dict
 
 
+@parse_cache.cached(version=1)
 def parse_alignment_metrics_file(alignments_metric_file):
 
-	alignment_metrics_dicts = []
-
-	with open (alignments_metric_file) as file:
-
-		alignments_metric_file = csv.reader(file, delimiter='\t')
-
-		next_keys = False
-		next_values = False
-
-		keys = []
-		values = []
-
-		for row in alignments_metric_file:
+	# one row per category e.g. FIRST_OF_PAIR, SECOND_OF_PAIR and PAIR
+	return picard_metrics.read_metrics_file(alignments_metric_file, exclude=['read_group', 'sample', 'library'])
 
-			if len(row) != 0:
-
-				if next_values == True:
-
-					row_dict = {}
-
-					values = row
-
-					for key, value in zip(keys, values):
-
-						if key.lower() not in ['read_group',  'sample', 'library']:
-
-							row_dict[key.lower()] = value
-
-					alignment_metrics_dicts.append(row_dict)
-
-				if next_keys == True:
-
-					keys = row
-					next_keys = False
-					next_values = True
-
-				if row[0] == '## METRICS CLASS':
-
-					next_keys = True
-
-	return alignment_metrics_dicts
-	
 
+@parse_cache.cached(version=1)
 def parse_variant_detail_metrics_file(variant_detail_metrics_file):
 
 	variant_detail_metrics_dict = {}
 
-	with open (variant_detail_metrics_file) as file:
-
-		variant_detail_metrics_file = csv.reader(file, delimiter='\t')
-
-		next_keys = False
-		next_values = False
-
-		keys = []
-		values = []
-
-		for row in variant_detail_metrics_file:
-
-			if len(row) != 0:
-
-				if next_values == True:
-
-					sample_details_dict = {}
-
-					for key, value in zip(keys, row):
-
-						if key.lower() not in ['sample_alias']:
-
-							sample_details_dict[key.lower()] = value
-					
-					variant_detail_metrics_dict[row[0]] = sample_details_dict
-
-				if next_keys == True:
-
-					keys = row
-					next_keys = False
-					next_values = True
+	# one row per sample
+	for row in picard_metrics.read_metrics_file(variant_detail_metrics_file):
 
-				if row[0] == '## METRICS CLASS':
+		sample_alias = row.pop('sample_alias')
 
-					next_keys = True
+		variant_detail_metrics_dict[sample_alias] = row
 
 	return variant_detail_metrics_dict
 
 
+@parse_cache.cached(version=1)
 def parse_insert_metrics_file(insert_metrics_file):
 
-	insert_metrics_dict = {}
-
-	with open (insert_metrics_file) as file:
-
-		insert_metrics_file = csv.reader(file, delimiter='\t')
-
-		next_keys = False
-		next_values = False
-
-		keys = []
-		values = []
-
-		for row in insert_metrics_file:
-
-			if len(row) != 0:
-
-				if next_values == True:
+	rows = picard_metrics.read_metrics_file(insert_metrics_file, exclude=['read_group', 'sample', 'library'])
 
-					values = row
-					break
+	if len(rows) == 0:
 
-				if next_keys == True:
+		return {}
 
-					keys = row
-					next_keys = False
-					next_values = True
-
-				if row[0] == '## METRICS CLASS':
-
-					next_keys = True
-
-	for key, value in zip(keys, values):
-
-		if key.lower() not in ['read_group',  'sample', 'library']:
-
-			insert_metrics_dict[key.lower()] = value
-
-	return insert_metrics_dict
+	return rows[0]
 
 
 def parse_config(config_location):
@@ -722,6 +521,8 @@ def get_passing_variant_count(vcf_path, samples):
 	count number of passing variants in vcf
 
 	"""
+
+	from pysam import VariantFile
 	
 	bcf_in = VariantFile(vcf_path)
 
@@ -772,6 +573,7 @@ def get_passing_variant_count(vcf_path, samples):
 	return count_dict
 
 
+@parse_cache.cached(version=1)
 def parse_dragen_sex_file(dragen_sex_file):
 	"""
 	Parse the calculated sex file from the post processing pipeline.
@@ -791,69 +593,27 @@ def parse_dragen_sex_file(dragen_sex_file):
 	return sex_dict
 
 
+@parse_cache.cached(version=1)
 def parse_dragen_vc_metrics_file(dragen_vc_metrics_file):
 	"""
 	Parse the dragen variant calling metrics file.
 	
 	"""
-	
-	dragen_vc_metrics_file_dict = {}
 
-	with open (dragen_vc_metrics_file) as file:
-
-		dragen_vc_metrics_file = csv.reader(file, delimiter=',')
-		
-		for row in dragen_vc_metrics_file:
-						
-			prefix = row[0]
-			sample = row[1]
-			key = row[2]
-			value = row[3]
-	
-			new_key = key.translate(str.maketrans('', '', string.punctuation.replace('_' ,'')))
-			
-			new_key = new_key.lower().replace(' ', '_').replace('__', '_')
-			
-			if prefix == 'JOINT CALLER PREFILTER':
-								
-				if sample not in dragen_vc_metrics_file_dict:
-					
-					dragen_vc_metrics_file_dict[sample] = {}
-					
-				dragen_vc_metrics_file_dict[sample][new_key] = value
-				
-	return dragen_vc_metrics_file_dict
+	return dragen_metrics.read_metrics_file(dragen_vc_metrics_file, 'JOINT CALLER PREFILTER', by_sample=True)
 
 
+@parse_cache.cached(version=1)
 def parse_dragen_alignment_metrics_file(dragen_alignment_metrics_file):
 	"""
 	Parse the dragen alignment metrics file.
 	
 	"""
-	
-	dragen_alignment_metrics_file_dict = {}
 
-	with open (dragen_alignment_metrics_file) as file:
-
-		dragen_alignment_metrics_file = csv.reader(file, delimiter=',')
-		
-		for row in dragen_alignment_metrics_file:
-						
-			prefix = row[0]
-			key = row[2]
-			value = row[3]
-	
-			new_key = key.translate(str.maketrans('', '', string.punctuation.replace('_' ,'')))
-			
-			new_key = new_key.lower().replace(' ', '_').replace('__', '_')
-			
-			if prefix == 'MAPPING/ALIGNING SUMMARY':
-								
-				dragen_alignment_metrics_file_dict[new_key] = value
-				
-	return dragen_alignment_metrics_file_dict
+	return dragen_metrics.read_metrics_file(dragen_alignment_metrics_file, 'MAPPING/ALIGNING SUMMARY')
 
 
+@parse_cache.cached(version=1)
 def parse_sensitivity_file(sensitivity_file):
 	"""
 	Parse the sensitivity calculation file.
@@ -877,58 +637,26 @@ def parse_sensitivity_file(sensitivity_file):
 	return sensitivity_dict
 
 
+@parse_cache.cached(version=1)
 def parse_dragen_wgs_coverage_metrics_file(dragen_wgs_coverage_metrics_file):
 	"""
 	Parse the dragen alignment metrics file.
 	
 	"""
-	
-	dragen_wgs_coverage_metrics_file_dict = {}
 
-	with open (dragen_wgs_coverage_metrics_file) as file:
+	dragen_wgs_coverage_metrics_file_dict = dragen_metrics.read_metrics_file(dragen_wgs_coverage_metrics_file, 'COVERAGE SUMMARY', style='coverage')
 
-		dragen_wgs_file = csv.reader(file, delimiter=',')
-		
-		for row in dragen_wgs_file:
-						
-			prefix = row[0]
-			key = row[2]
-			value = row[3]
-						
-			new_key = key.translate(str.maketrans('', '', string.punctuation.replace('_' ,'')))
-			
-			new_key = new_key.lower().replace(' ', '_').replace('__', '_')
+	# Replace any NaN value to a decimal, as that's what the models need
+	for key, value in dragen_wgs_coverage_metrics_file_dict.items():
 
-			new_key = new_key.replace('__', '_')
+		if value == 'nan':
 
-			# fix strange NTC results in Dragen 3.7
+			dragen_wgs_coverage_metrics_file_dict[key] = 0.0
 
-			new_key = new_key.replace('xinf', 'x_inf')
-
-			new_key = new_key.replace('20x50x', '20x_50x')
-
-			new_key = new_key.replace('15x20x', '15x_20x')
-
-			new_key = new_key.replace('10x15x', '10x_15x')
-
-			new_key = new_key.replace('3x10x', '3x_10x')
-
-			new_key = new_key.replace('1x3x', '1x_3x')
-
-			new_key = new_key.replace('0x1x', '0x_1x')
-
-			# Replace any NaN value to a decimal, as that's what the models need
-			if value == "nan":
-
-				value = 0.0
-			
-			if prefix == 'COVERAGE SUMMARY':
-								
-				dragen_wgs_coverage_metrics_file_dict[new_key] = value
-				
 	return dragen_wgs_coverage_metrics_file_dict
 
 
+@parse_cache.cached(version=1)
 def parse_fusion_contamination_metrics_file(fusion_contamination_metrics_file):
 
 	fusion_contamination_metrics_dict = {}
@@ -976,6 +704,7 @@ def parse_fusion_contamination_metrics_file(fusion_contamination_metrics_file):
 	return fusion_contamination_metrics_dict
 
 
+@parse_cache.cached(version=1)
 def parse_fusion_alignment_metrics_file(fusion_alignment_metrics_file):
 
 	fusion_alignment_metrics_dict = {}
@@ -1010,65 +739,25 @@ def parse_fusion_alignment_metrics_file(fusion_alignment_metrics_file):
 	return fusion_alignment_metrics_dict
 
 
+@parse_cache.cached(version=1)
 def parse_ploidy_metrics_file(ploidy_metrics_file):
 	"""
 	Parse the dragen ploidy metrics file.
 	
 	"""
-	
-	dragen_ploidy_metrics_file_dict = {}
-
-	with open (ploidy_metrics_file) as file:
 
-		dragen_ploidy_file = csv.reader(file, delimiter=',')
-		
-		for row in dragen_ploidy_file:
-						
-			prefix = row[0]
-			key = row[2]
-			value = row[3]
+	return dragen_metrics.read_metrics_file(ploidy_metrics_file, 'PLOIDY ESTIMATION', style='ploidy')
 	
-			new_key = key.translate(str.maketrans('', '', string.punctuation.replace('_' ,'')))
-			
-			new_key = new_key.lower().replace(' ', '_').replace('__', '_')
 
-			new_key = new_key.replace('__', '_')
-			
-			if prefix == 'PLOIDY ESTIMATION':
-								
-				dragen_ploidy_metrics_file_dict[new_key] = value
-				
-	return dragen_ploidy_metrics_file_dict
-	
+@parse_cache.cached(version=1)
 def parse_dragen_cnv_metrics_file(cnv_file):
 	"""
 	Parse the dragen sample level CNV metrics file
 	"""
-	
-	dragen_cnv_metrics_file_dict = {}
-	
-	with open(cnv_file) as file:
-	
-		dragen_cnv_file = csv.reader(file, delimiter=',')
-		
-		for row in dragen_cnv_file:
-		
-			prefix = row[0]
-			key = row[2]
-			value = row[3]
-			
-			#Reformat key to remove spaces and brackets and make lower case
-			
-			new_key = key.translate(str.maketrans('', '', string.punctuation.replace('_','')))
-			
-			new_key = new_key.lower().replace(' ', '_').replace('__','_')
-			
-			if prefix == 'CNV SUMMARY':
-			
-				dragen_cnv_metrics_file_dict[new_key] = value
-	
-	return dragen_cnv_metrics_file_dict
 
+	return dragen_metrics.read_metrics_file(cnv_file, 'CNV SUMMARY')
+
+@parse_cache.cached(version=1)
 def parse_custom_coverage_metrics(custom_coverage_file):
 	"""
 	Parse the coverage summary file from germline enrichment nextflow
@@ -1089,6 +778,7 @@ def parse_custom_coverage_metrics(custom_coverage_file):
 	return custom_coverage_dict
 
 
+@parse_cache.cached(version=1)
 def parse_exome_postprocessing_cnv_qc_metrics(cnv_qc_metrics_file):
 	"""
 	Parse the CNV QC metrics from the Dragen post-processing pipeline
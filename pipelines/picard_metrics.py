@@ -0,0 +1,76 @@
+"""
+Read the metrics block of Picard metrics files.
+
+A Picard metrics file has a header, a metrics block starting with a ## METRICS CLASS line \
+followed by a row of column names and one or more rows of values, and optionally a histogram. \
+read_metrics_file reads down to the end of the metrics block and stops, so the histogram is \
+never read.
+
+Column names are lower cased and values are kept as strings.
+
+"""
+METRICS_CLASS = '## METRICS CLASS'
+
+
+def read_metrics_file(metrics_file, exclude=()):
+	"""
+	Returns a list with a dictionary for each row of the metrics block, one for most classes \
+	and several for classes such as AlignmentSummaryMetrics which have a row per category.
+
+	"""
+
+	rows = []
+
+	with open(metrics_file) as file:
+
+		# skip the header
+		for line in file:
+
+			if line.startswith(METRICS_CLASS):
+
+				break
+
+		else:
+
+			return rows
+
+		keys = None
+
+		for line in file:
+
+			line = line.rstrip('\r\n')
+
+			if keys is None:
+
+				if len(line) == 0:
+
+					continue
+
+				keys = [key.lower() for key in line.split('\t')]
+
+				# which columns to keep, worked out once per file
+				columns = [(i, key) for i, key in enumerate(keys) if key not in exclude]
+
+				continue
+
+			# a blank line or the histogram ends the metrics block
+			if len(line) == 0 or line.startswith('#'):
+
+				break
+
+			values = line.split('\t')
+
+			row = {}
+
+			for i, key in columns:
+
+				if i >= len(values):
+
+					continue
+
+				row[key] = values[i]
+
+			rows.append(row)
+
+	return rows
+
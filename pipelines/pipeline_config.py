@@ -0,0 +1,240 @@
+"""
+Compile the YAML config into a PipelineConfig object per run_config_key.
+
+The config is validated when it is loaded so a missing threshold fails before anything is written \
+to the database. Compiled configs are cached on disk keyed by the config file's mtime, size and hash.
+
+"""
+import hashlib
+import os
+import pickle
+from pathlib import Path
+
+from pipelines import parsers
+
+# bump when PipelineConfig changes so old cached configs are not used
+CONFIG_CACHE_VERSION = 1
+
+# SampleAnalysis field set from the config for each qc check, as (config key, field)
+SAMPLE_THRESHOLDS = {
+	'contamination': [('contamination_cutoff', 'contamination_cutoff')],
+	'ntc_contamination': [('ntc_contamination_cutoff', 'ntc_contamination_cutoff')],
+	'max_cnv_calls': [('max_cnvs_called_cutoff', 'max_cnvs_called_cutoff')],
+	'cnv_call_range': [('max_cnvs_called_cutoff', 'max_cnvs_called_cutoff'),
+						('min_cnvs_called_cutoff', 'min_cnvs_called_cutoff')],
+	'min_average_coverage': [('min_average_coverage', 'min_average_coverage_cutoff')],
+}
+
+# RunAnalysis fields set from the config for each qc check, as (config key, field)
+RUN_THRESHOLDS = {
+	'pct_q30': [('min_q30_score', 'min_q30_score')],
+	'variant_check': [('min_variants', 'min_variants'),
+						('max_variants', 'max_variants')],
+	'sensitivity': [('min_sensitivity', 'min_sensitivity')],
+	'titv': [('min_titv', 'min_titv'),
+			('max_titv', 'max_titv')],
+	'coverage': [('min_coverage', 'min_coverage')],
+	'reads_tso500': [('min_on_target_reads', 'min_on_target_reads')],
+	'relatedness': [('min_relatedness_parents', 'min_relatedness_parents'),
+					('max_relatedness_unrelated', 'max_relatedness_unrelated'),
+					('max_relatedness_between_parents', 'max_relatedness_between_parents'),
+					('max_child_parent_relatedness', 'max_child_parent_relatedness')],
+	'ntc_contamination_TSO500': [('max_ntc_contamination', 'max_ntc_contamination')],
+	'max_cnv_calls': [('max_cnvs_called_cutoff', 'max_cnv_calls')],
+	'cnv_call_range': [('max_cnvs_called_cutoff', 'max_cnv_calls'),
+						('min_cnvs_called_cutoff', 'min_cnv_calls')],
+	'min_average_coverage': [('min_average_coverage', 'min_average_coverage_cutoff')],
+	'pct_on_target': [('min_pct_on_target', 'min_aligned_reads_warning')],
+}
+
+# checks which do not need a threshold from the config
+OTHER_CHECKS = ['fastqc', 'sex_match', 'fusion_contamination', 'fusion_alignment']
+
+QC_CHECKS = set(SAMPLE_THRESHOLDS) | set(RUN_THRESHOLDS) | set(OTHER_CHECKS)
+
+# lists of file patterns passed to the pipeline classes
+FILE_KEYS = [
+	'sample_expected_files',
+	'sample_not_expected_files',
+	'run_expected_files',
+	'run_not_expected_files',
+	'post_sample_files',
+	'sample_completed_files',
+	'sample_valid_files',
+	'run_completed_files',
+	'metrics_file',
+]
+
+
+class ConfigError(Exception):
+	pass
+
+
+class PipelineConfig:
+	"""
+	The config for one run_config_key e.g. DragenWGS-master-NexteraDNAFlex
+
+	"""
+
+	def __init__(self, run_config_key, config):
+
+		self.run_config_key = run_config_key
+
+		if not isinstance(config, dict):
+
+			raise ConfigError(f'ERROR: {run_config_key} in config file is not a mapping')
+
+		self.qc_checks = config.get('qc_checks')
+		self.results_dir = config.get('results_dir')
+		self.fastq_dir = config.get('fastq_dir')
+		self.min_fastq_size = config.get('min_fastq_size', 100000)
+
+		self.files = {}
+
+		for key in FILE_KEYS:
+
+			if key in config:
+
+				if not isinstance(config[key], list):
+
+					raise ConfigError(f'ERROR: {key} for {run_config_key} in config file is not a list')
+
+				self.files[key] = config[key]
+
+		self.sample_thresholds = {}
+		self.run_thresholds = {}
+
+		if self.qc_checks is None:
+
+			return
+
+		if not isinstance(self.qc_checks, list):
+
+			raise ConfigError(f'ERROR: qc_checks for {run_config_key} in config file is not a list')
+
+		for check in self.qc_checks:
+
+			if check not in QC_CHECKS:
+
+				raise ConfigError(f'ERROR: Unknown qc check {check} for {run_config_key} in config file')
+
+			for thresholds, model_thresholds in [(SAMPLE_THRESHOLDS, self.sample_thresholds), (RUN_THRESHOLDS, self.run_thresholds)]:
+
+				for config_key, field in thresholds.get(check, []):
+
+					if config_key not in config:
+
+						raise ConfigError(f'ERROR: {config_key} for {run_config_key} not in config file')
+
+					value = config[config_key]
+
+					if isinstance(value, bool) or not isinstance(value, (int, float)):
+
+						raise ConfigError(f'ERROR: {config_key} for {run_config_key} in config file is not a number')
+
+					model_thresholds[field] = value
+
+	def get_auto_qc_checks(self):
+		"""
+		The checks as stored on RunAnalysis.auto_qc_checks
+		"""
+
+		if self.qc_checks is None:
+
+			return None
+
+		return ','.join(self.qc_checks)
+
+
+class Config:
+	"""
+	A compiled config file
+	"""
+
+	def __init__(self, config_dict):
+
+		if not isinstance(config_dict, dict) or not isinstance(config_dict.get('pipelines'), dict):
+
+			raise ConfigError('ERROR: config file has no pipelines section')
+
+		self.pipelines = {}
+
+		for run_config_key, config in config_dict['pipelines'].items():
+
+			self.pipelines[run_config_key] = PipelineConfig(run_config_key, config)
+
+	def get(self, run_config_key):
+
+		return self.pipelines.get(run_config_key)
+
+
+def load_config(config_location, cache_dir=None):
+	"""
+	Load and compile a config file, using the cached compiled config if the file has not changed.
+
+	"""
+
+	config_location = Path(config_location)
+	stat = config_location.stat()
+
+	if cache_dir is None:
+
+		return Config(parsers.parse_config(config_location))
+
+	cache_file = Path(cache_dir).joinpath('config_' + hashlib.sha1(str(config_location.resolve()).encode()).hexdigest() + '.pickle')
+
+	cached = None
+
+	try:
+
+		with open(cache_file, 'rb') as f:
+
+			cached = pickle.load(f)
+
+	except Exception:
+
+		cached = None
+
+	if cached is not None and cached['version'] == CONFIG_CACHE_VERSION:
+
+		# unchanged file
+		if cached['mtime'] == stat.st_mtime and cached['size'] == stat.st_size:
+
+			return cached['config']
+
+	with open(config_location, 'rb') as f:
+
+		content = f.read()
+
+	config_hash = hashlib.sha256(content).hexdigest()
+
+	if cached is not None and cached['version'] == CONFIG_CACHE_VERSION and cached['hash'] == config_hash:
+
+		config = cached['config']
+
+	else:
+
+		config = Config(parsers.parse_config(config_location))
+
+	try:
+
+		os.makedirs(cache_dir, exist_ok=True)
+
+		# write then rename so a concurrent reader never sees a partial file
+		tmp_file = cache_file.with_suffix(f'.{os.getpid()}.tmp')
+
+		with open(tmp_file, 'wb') as f:
+
+			pickle.dump({'version': CONFIG_CACHE_VERSION,
+						'mtime': stat.st_mtime,
+						'size': stat.st_size,
+						'hash': config_hash,
+						'config': config}, f)
+
+		os.replace(tmp_file, cache_file)
+
+	except OSError:
+
+		pass
+
+	return config
@@ -2,6 +2,7 @@ from pathlib import Path
 import glob
 import re
 from pipelines import parsers
+from pipelines.manifest import Manifest
 
 class IlluminaQC:
 
@@ -16,6 +17,7 @@ class IlluminaQC:
 				run_complete_marker = '1_IlluminaQC.sh.e*'):
 
 		self.fastq_dir = fastq_dir
+		self.manifest = Manifest()
 		self.sample_names = sample_names
 		self.n_lanes = n_lanes
 		self.run_id = run_id
@@ -28,7 +30,7 @@ class IlluminaQC:
 
 		results_path = Path(self.fastq_dir)
 
-		marker = results_path.glob(self.run_complete_marker)
+		marker = self.manifest.glob(results_path, self.run_complete_marker)
 
 		if len(list(marker)) >= 1:
 
@@ -60,9 +62,9 @@ class IlluminaQC:
 			# check fastqs created
 			for lane in range(1,self.n_lanes+1):
 
-				fastq_r1 = sample_fastq_path.glob(f'{sample}*L00{lane}_R1_001.fastq.gz')
-				fastq_r2 = sample_fastq_path.glob(f'{sample}*L00{lane}_R2_001.fastq.gz')
-				variables = sample_fastq_path.glob(f'{sample}.variables')
+				fastq_r1 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R1_001.fastq.gz')
+				fastq_r2 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R2_001.fastq.gz')
+				variables = self.manifest.glob(sample_fastq_path, f'{sample}.variables')
 
 
 				if len(list(fastq_r1)) != 1:
@@ -75,17 +77,17 @@ class IlluminaQC:
 				elif len(list(variables)) != 1:
 					return False
 
-				fastq_r1 = sample_fastq_path.glob(f'{sample}*L00{lane}_R1_001.fastq.gz')
-				fastq_r2 = sample_fastq_path.glob(f'{sample}*L00{lane}_R2_001.fastq.gz')
+				fastq_r1 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R1_001.fastq.gz')
+				fastq_r2 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R2_001.fastq.gz')
 				
 				fastq_r1 = list(fastq_r1)[0]
 				fastq_r2 = list(fastq_r2)[0]
 
 
-				if fastq_r1.stat().st_size < self.min_fastq_size and is_negative_control == False:
+				if self.manifest.getsize(fastq_r1) < self.min_fastq_size and is_negative_control == False:
 					return False
 
-				elif fastq_r2.stat().st_size < self.min_fastq_size  and is_negative_control == False:
+				elif self.manifest.getsize(fastq_r2) < self.min_fastq_size  and is_negative_control == False:
 					return False
 
 
@@ -129,9 +131,9 @@ class DragenQC(IlluminaQC):
 			# check fastqs created
 			for lane in range(1,self.n_lanes+1):
 
-				fastq_r1 = sample_fastq_path.glob(f'{sample}*L00{lane}_R1_001.fastq.gz')
-				fastq_r2 = sample_fastq_path.glob(f'{sample}*L00{lane}_R2_001.fastq.gz')
-				variables = sample_fastq_path.glob(f'{sample}.variables')
+				fastq_r1 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R1_001.fastq.gz')
+				fastq_r2 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R2_001.fastq.gz')
+				variables = self.manifest.glob(sample_fastq_path, f'{sample}.variables')
 
 
 				if len(list(fastq_r1)) != 1:
@@ -144,16 +146,16 @@ class DragenQC(IlluminaQC):
 				elif len(list(variables)) != 1:
 					return False
 
-				fastq_r1 = sample_fastq_path.glob(f'{sample}*L00{lane}_R1_001.fastq.gz')
-				fastq_r2 = sample_fastq_path.glob(f'{sample}*L00{lane}_R2_001.fastq.gz')
+				fastq_r1 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R1_001.fastq.gz')
+				fastq_r2 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R2_001.fastq.gz')
 				
 				fastq_r1 = list(fastq_r1)[0]
 				fastq_r2 = list(fastq_r2)[0]
 
-				if fastq_r1.stat().st_size < self.min_fastq_size and is_negative_control == False:
+				if self.manifest.getsize(fastq_r1) < self.min_fastq_size and is_negative_control == False:
 					return False
 
-				elif fastq_r2.stat().st_size < self.min_fastq_size  and is_negative_control == False:
+				elif self.manifest.getsize(fastq_r2) < self.min_fastq_size  and is_negative_control == False:
 					return False
 
 
@@ -176,6 +178,7 @@ class TSO500_demultiplex:
 				run_complete_marker = 'FastqGeneration*.stderr'):
 
 		self.fastq_dir = fastq_dir
+		self.manifest = Manifest()
 		self.sample_names = sample_names
 		self.n_lanes = n_lanes
 		self.run_id = run_id
@@ -191,7 +194,7 @@ class TSO500_demultiplex:
 
 		fastq_data_path = results_path.joinpath('Demultiplex_Output/Log_Intermediates/FastqGeneration/')
 
-		marker = fastq_data_path.glob(self.run_complete_marker)
+		marker = self.manifest.glob(fastq_data_path, self.run_complete_marker)
 
 		if len(list(marker)) >= 1:
 
@@ -223,9 +226,9 @@ class TSO500_demultiplex:
 			# check fastqs created
 			for lane in range(1,self.n_lanes+1):
 
-				fastq_r1 = sample_fastq_path.glob(f'{sample}*L00{lane}_R1_001.fastq.gz')
-				fastq_r2 = sample_fastq_path.glob(f'{sample}*L00{lane}_R2_001.fastq.gz')
-				variables = sample_fastq_path.glob(f'{sample}.variables')
+				fastq_r1 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R1_001.fastq.gz')
+				fastq_r2 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R2_001.fastq.gz')
+				variables = self.manifest.glob(sample_fastq_path, f'{sample}.variables')
 
 
 				if len(list(fastq_r1)) != 1:
@@ -238,17 +241,17 @@ class TSO500_demultiplex:
 				elif len(list(variables)) != 1:
 					return False
 
-				fastq_r1 = sample_fastq_path.glob(f'{sample}*L00{lane}_R1_001.fastq.gz')
-				fastq_r2 = sample_fastq_path.glob(f'{sample}*L00{lane}_R2_001.fastq.gz')
+				fastq_r1 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R1_001.fastq.gz')
+				fastq_r2 = self.manifest.glob(sample_fastq_path, f'{sample}*L00{lane}_R2_001.fastq.gz')
 				
 				fastq_r1 = list(fastq_r1)[0]
 				fastq_r2 = list(fastq_r2)[0]
 
 
-				if fastq_r1.stat().st_size < self.min_fastq_size and is_negative_control == False:
+				if self.manifest.getsize(fastq_r1) < self.min_fastq_size and is_negative_control == False:
 					return False
 
-				elif fastq_r2.stat().st_size < self.min_fastq_size  and is_negative_control == False:
+				elif self.manifest.getsize(fastq_r2) < self.min_fastq_size  and is_negative_control == False:
 					return False
 
 
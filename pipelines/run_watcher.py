@@ -0,0 +1,247 @@
+"""
+Watch directories for new and changed files.
+
+InotifyWatcher uses the Linux inotify API through libc so no extra packages are needed. \
+inotify does not see changes made by other hosts on network filesystems, so PollingWatcher \
+can be used instead - it compares the mtimes of the watched directories and files every interval.
+
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import time
+
+logger = logging.getLogger(__name__)
+
+# from sys/inotify.h
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+
+WATCH_MASK = IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher:
+	"""
+	Watch directories with inotify.
+
+	"""
+
+	def __init__(self):
+
+		libc_name = ctypes.util.find_library('c')
+
+		if libc_name is None:
+
+			raise OSError('Could not find libc')
+
+		self.libc = ctypes.CDLL(libc_name, use_errno=True)
+
+		self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+
+		if self.fd < 0:
+
+			error = ctypes.get_errno()
+			raise OSError(error, os.strerror(error))
+
+		# watch descriptor to path and back
+		self.paths = {}
+		self.wds = {}
+
+	def add_watch(self, path, files=()):
+		"""
+		Watch a directory, files are ignored as inotify reports changes to every file in it
+		"""
+
+		path = str(path)
+
+		if path in self.wds:
+
+			return
+
+		wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+
+		if wd < 0:
+
+			error = ctypes.get_errno()
+			raise OSError(error, os.strerror(error), path)
+
+		self.paths[wd] = path
+		self.wds[path] = wd
+
+	def remove_watch(self, path):
+
+		wd = self.wds.pop(str(path), None)
+
+		if wd is not None:
+
+			self.paths.pop(wd, None)
+			self.libc.inotify_rm_watch(self.fd, wd)
+
+	def watched(self):
+
+		return set(self.wds)
+
+	def wait(self, timeout):
+		"""
+		Wait up to timeout seconds and return the set of watched directories which changed
+		"""
+
+		readable, _, _ = select.select([self.fd], [], [], timeout)
+
+		changed = set()
+
+		if not readable:
+
+			return changed
+
+		while True:
+
+			try:
+
+				data = os.read(self.fd, 65536)
+
+			except BlockingIOError:
+
+				break
+
+			offset = 0
+
+			while offset < len(data):
+
+				wd, mask, cookie, name_length = EVENT_HEADER.unpack_from(data, offset)
+				offset = offset + EVENT_HEADER.size + name_length
+
+				# events were dropped so anything may have changed
+				if mask & IN_Q_OVERFLOW:
+
+					logger.warning('inotify event queue overflowed')
+					changed.update(self.wds)
+					continue
+
+				path = self.paths.get(wd)
+
+				if path is None:
+
+					continue
+
+				changed.add(path)
+
+				# directory deleted or unmounted
+				if mask & IN_IGNORED:
+
+					self.paths.pop(wd, None)
+					self.wds.pop(path, None)
+
+		return changed
+
+	def close(self):
+
+		os.close(self.fd)
+
+
+class PollingWatcher:
+	"""
+	Watch directories by comparing mtimes every interval seconds.
+
+	A directory's mtime only changes when files are added or removed, so files \
+	which are modified in place should be passed to add_watch.
+
+	"""
+
+	def __init__(self, interval=30):
+
+		self.interval = interval
+
+		# path to (files, snapshot)
+		self.watches = {}
+
+	def snapshot(self, path, files):
+
+		mtimes = []
+
+		for name in ('',) + tuple(files):
+
+			try:
+
+				mtimes.append(os.stat(os.path.join(path, name)).st_mtime_ns)
+
+			except OSError:
+
+				mtimes.append(None)
+
+		return tuple(mtimes)
+
+	def add_watch(self, path, files=()):
+
+		path = str(path)
+
+		if path in self.watches:
+
+			return
+
+		if not os.path.isdir(path):
+
+			raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+		self.watches[path] = (files, self.snapshot(path, files))
+
+	def remove_watch(self, path):
+
+		self.watches.pop(str(path), None)
+
+	def watched(self):
+
+		return set(self.watches)
+
+	def wait(self, timeout):
+		"""
+		Wait up to timeout seconds and return the set of watched directories which changed
+		"""
+
+		time.sleep(max(0, min(self.interval, timeout)))
+
+		changed = set()
+
+		for path, (files, snapshot) in list(self.watches.items()):
+
+			new_snapshot = self.snapshot(path, files)
+
+			if new_snapshot != snapshot:
+
+				changed.add(path)
+				self.watches[path] = (files, new_snapshot)
+
+		return changed
+
+	def close(self):
+
+		self.watches = {}
+
+
+def make_watcher(poll=False, interval=30):
+	"""
+	Use inotify unless polling is requested or inotify is not available
+	"""
+
+	if not poll:
+
+		try:
+
+			return InotifyWatcher()
+
+		except (OSError, AttributeError) as e:
+
+			logger.warning(f'Could not start inotify, polling every {interval} seconds instead: {e}')
+
+	return PollingWatcher(interval)
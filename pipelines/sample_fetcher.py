@@ -0,0 +1,72 @@
+"""
+Fetch the metrics for each sample of a run on a small thread pool.
+
+Most of the time spent getting a sample's metrics is waiting on the filesystem, which for the \
+archive mounts can be a long way away, so the pipeline classes find and parse every sample's \
+files at the same time rather than one after another. The results come back in sample order \
+and an error is raised for the first sample, in sample order, whose fetch failed.
+
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# the most samples fetched at once
+MAX_THREADS = 8
+
+
+def default_threads():
+
+	return min(MAX_THREADS, (os.cpu_count() or 1) * 2)
+
+
+def fetch_samples(samples, fetch, threads=None):
+	"""
+	Returns a dictionary of sample to fetch(sample) in the same order as samples.
+
+	Samples for which fetch returns None are left out. If fetch raises an exception for a \
+	sample an exception naming the sample is raised from it.
+
+	"""
+
+	samples = list(samples)
+
+	if threads is None:
+
+		threads = default_threads()
+
+	if len(samples) <= 1 or threads <= 1:
+
+		results = []
+
+		for sample in samples:
+
+			try:
+
+				results.append(fetch(sample))
+
+			except Exception as e:
+
+				raise Exception(f'Could not get metrics for sample {sample}: {e!r}') from e
+
+	else:
+
+		with ThreadPoolExecutor(max_workers=min(threads, len(samples))) as executor:
+
+			futures = [executor.submit(fetch, sample) for sample in samples]
+
+			results = []
+
+			for sample, future in zip(samples, futures):
+
+				try:
+
+					results.append(future.result())
+
+				except Exception as e:
+
+					# don't start the samples which are still waiting
+					executor.shutdown(wait=True, cancel_futures=True)
+
+					raise Exception(f'Could not get metrics for sample {sample}: {e!r}') from e
+
+	return {sample: result for sample, result in zip(samples, results) if result is not None}
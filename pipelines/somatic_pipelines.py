@@ -2,7 +2,8 @@ from pathlib import Path
 import glob
 import re
 import os
-from pipelines import parsers
+from pipelines import parsers, variant_counter, sample_fetcher
+from pipelines.manifest import Manifest
 
 class SomaticAmplicon:
 
@@ -10,6 +11,7 @@ class SomaticAmplicon:
 
 
 		self.results_dir = results_dir
+		self.manifest = Manifest()
 		self.sample_names = sample_names
 		self.run_id = run_id
 		self.ntc_patterns = ['NTC', 'ntc']
@@ -31,7 +33,7 @@ class SomaticAmplicon:
 
 		sample_path = results_path.joinpath(sample)
 
-		marker = sample_path.glob(self.sample_complete_marker)
+		marker = self.manifest.glob(sample_path, self.sample_complete_marker)
 
 		if len(list(marker)) >= 1:
 
@@ -55,7 +57,7 @@ class SomaticAmplicon:
 		# check files we want to be there are there
 		for file in self.sample_expected_files:
 
-			found_file = sample_path.glob(file)
+			found_file = self.manifest.glob(sample_path, file)
 
 			if len(list(found_file)) != 1:
 
@@ -64,7 +66,7 @@ class SomaticAmplicon:
 		# check file we do not want to be there are not there
 		for file in self.sample_not_expected_files:
 
-			found_file = sample_path.glob(file)
+			found_file = self.manifest.glob(sample_path, file)
 
 			if len(list(found_file)) > 0:
 
@@ -102,20 +104,18 @@ class SomaticAmplicon:
 				return False
 
 		for file in self.run_expected_files:
-			found_file = results_path.glob(file)
+			found_file = self.manifest.glob(results_path, file)
 			if len(list(found_file)) == 0:
 				return False
 		return True
 
 	def get_fastqc_data(self):
 
-		fastqc_dict = {}
-
 		results_path = Path(self.results_dir)
 
-		for sample in self.sample_names:
+		def get_sample_fastqc_data(sample):
 
-			fastqc_data_files = results_path.joinpath(sample).glob(f'*{sample}*fastqc/summary.txt')
+			fastqc_data_files = self.manifest.glob(results_path.joinpath(sample), f'*{sample}*fastqc/summary.txt')
 
 			sample_fastqc_list = []
 
@@ -147,63 +147,57 @@ class SomaticAmplicon:
 				file_fastqc_dict['adapter_content'] = parsed_fastqc_data['Adapter Content']
 				sample_fastqc_list.append(file_fastqc_dict)
 
-			fastqc_dict[sample] = sample_fastqc_list
+			return sample_fastqc_list
 
 
-		return fastqc_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_fastqc_data)
 
 	def get_hs_metrics(self):
 
 		results_path = Path(self.results_dir)
 
-		run_hs_metrics_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_hs_metrics(sample):
 
-			hs_metrics_file = results_path.joinpath(sample).glob(f'*{sample}*_hs_metrics.txt')
+			hs_metrics_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}*_hs_metrics.txt')
 
 			hs_metrics_file = list(hs_metrics_file)[0]
 
 			parsed_hs_metrics_data  = parsers.parse_hs_metrics_file(hs_metrics_file)
 
-			run_hs_metrics_dict[sample] = parsed_hs_metrics_data
+			return parsed_hs_metrics_data
 
-		return run_hs_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_hs_metrics)
 
 	def get_depth_metrics(self):
 
 		results_path = Path(self.results_dir)
 
-		run_depth_metrics_dict = {}
+		def get_sample_depth_metrics(sample):
 
-		for sample in self.sample_names:
-
-			sample_depth_summary_file = results_path.joinpath(sample).glob(f'*{sample}*_DepthOfCoverage.sample_summary')
+			sample_depth_summary_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}*_DepthOfCoverage.sample_summary')
 
 			sample_depth_summary_file = list(sample_depth_summary_file)[0]	
 
 			parsed_depth_metrics = parsers.parse_gatk_depth_summary_file(sample_depth_summary_file)
 
-			run_depth_metrics_dict[sample] = parsed_depth_metrics
+			return parsed_depth_metrics
 
-		return run_depth_metrics_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_depth_metrics)
 
 
 	def get_variant_count(self):
 
 		results_path = Path(self.results_dir)
 
-		sample_variant_count_dict = {}
-
-		for sample in self.sample_names:
+		def get_sample_variant_count(sample):
 
-			vcf_file = results_path.joinpath(sample).glob(f'*{sample}*_filtered_meta_annotated.vcf')
+			vcf_file = self.manifest.glob(results_path.joinpath(sample), f'*{sample}*_filtered_meta_annotated.vcf')
 
 			vcf_file = list(vcf_file)[0]	
 
-			vcf_count_metrics = parsers.get_passing_variant_count(vcf_file, [sample])
+			vcf_count_metrics = variant_counter.get_passing_variant_count(vcf_file, [sample])
 
-			sample_variant_count_dict[sample] = vcf_count_metrics
+			return vcf_count_metrics
 
-		return sample_variant_count_dict
+		return sample_fetcher.fetch_samples(self.sample_names, get_sample_variant_count)
 
@@ -0,0 +1,155 @@
+"""
+Time the stages of an update and log them as JSON lines.
+
+Each stage is logged at DEBUG level as it finishes, for example:
+
+{"event": "stage_timing", "stage": "results_check", "run": "210204_A00748_0075_AHVHYCDRXX", "pipeline": "DragenWGS-master-NexteraDNAFlex", "seconds": 0.0123, "depth": 1}
+
+and log_summary logs the totals per stage, run and pipeline at the end of an update. \
+Stages can be nested, the run and pipeline totals only count the outermost stages (depth 0).
+
+"""
+import contextlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# timings recorded in this process which have not been collected yet
+records = []
+
+_local = threading.local()
+
+
+@contextlib.contextmanager
+def stage(name, **labels):
+	"""
+	Time the code inside the with block as stage name, labels such as run and pipeline are added to the record
+	"""
+
+	depth = getattr(_local, 'depth', 0)
+	_local.depth = depth + 1
+
+	start = time.perf_counter()
+
+	try:
+
+		yield
+
+	finally:
+
+		_local.depth = depth
+
+		record = {'stage': name, **labels, 'seconds': round(time.perf_counter() - start, 6), 'depth': depth}
+		records.append(record)
+
+		logger.debug(json.dumps({'event': 'stage_timing', **record}))
+
+
+class TimedMethods:
+	"""
+	Wrap an object so that calls to its methods starting with one of prefixes are timed as stages.
+
+	"""
+
+	def __init__(self, wrapped, prefixes, **labels):
+
+		self._wrapped = wrapped
+		self._prefixes = tuple(prefixes)
+		self._labels = labels
+
+	def __getattr__(self, name):
+
+		attribute = getattr(self._wrapped, name)
+
+		if not callable(attribute) or not name.startswith(self._prefixes):
+
+			return attribute
+
+		def timed(*args, **kwargs):
+
+			with stage(name, **self._labels):
+
+				return attribute(*args, **kwargs)
+
+		return timed
+
+
+def mark():
+
+	return len(records)
+
+
+def take(start):
+	"""
+	Remove and return the records made since mark() returned start, e.g. to send them back from a worker process
+	"""
+
+	taken = records[start:]
+	del records[start:]
+
+	return taken
+
+
+def add(new_records):
+
+	records.extend(new_records)
+
+
+def collect():
+	"""
+	Remove and return all records
+	"""
+
+	return take(0)
+
+
+def summarise(stage_records):
+
+	stages = {}
+	runs = {}
+	pipelines = {}
+
+	for record in stage_records:
+
+		totals = stages.setdefault(record['stage'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+		totals['count'] = totals['count'] + 1
+		totals['seconds'] = totals['seconds'] + record['seconds']
+		totals['max_seconds'] = max(totals['max_seconds'], record['seconds'])
+
+		if record['depth'] != 0:
+
+			continue
+
+		if record.get('run') is not None:
+
+			runs[record['run']] = runs.get(record['run'], 0.0) + record['seconds']
+
+		if record.get('pipeline') is not None:
+
+			pipelines[record['pipeline']] = pipelines.get(record['pipeline'], 0.0) + record['seconds']
+
+	def rounded(totals):
+
+		return {key: round(value, 6) for key, value in sorted(totals.items(), key=lambda item: item[1], reverse=True)}
+
+	for totals in stages.values():
+
+		totals['seconds'] = round(totals['seconds'], 6)
+
+	return {
+		'stages': dict(sorted(stages.items(), key=lambda item: item[1]['seconds'], reverse=True)),
+		'runs': rounded(runs),
+		'pipelines': rounded(pipelines),
+	}
+
+
+def log_summary(stage_records):
+
+	if len(stage_records) == 0:
+
+		return
+
+	logger.info(json.dumps({'event': 'timing_summary', **summarise(stage_records)}))
@@ -25,6 +25,7 @@ admin.site.register(APIKey, APIKeyAdmin)
 # Register other models normally
 admin.site.register(Instrument)
 admin.site.register(InteropRunQuality)
+admin.site.register(RunScanState)
 admin.site.register(WorkSheet)
 admin.site.register(Sample)
 admin.site.register(Pipeline)
@@ -3,3 +3,10 @@ from django.apps import AppConfig
 
 class QcDatabaseConfig(AppConfig):
     name = 'qc_database'
+
+    def ready(self):
+
+        from qc_database import auto_qc, memo
+
+        auto_qc.connect_signals()
+        memo.connect_signals()
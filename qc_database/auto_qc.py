@@ -0,0 +1,989 @@
+"""
+Work out the auto QC checks for run analyses with one query per metric table.
+
+The SampleAnalysis passes_* methods each query their metric tables for one sample, so checking \
+a run analysis with them costs several queries per sample per check. Here the sample analyses \
+of every run analysis given and then each metric table needed by their checks are loaded once, \
+and the checks are worked out from those rows in the same way as the SampleAnalysis methods. \
+RunAnalysis.passes_auto_qc uses this, call evaluate_run_analyses directly to check a page of \
+run analyses at once.
+
+Verdicts are stored in AutoQCVerdict so pages only work out the checks when something has \
+changed. update_database refreshes the verdicts of the run analyses it writes metrics for, saving \
+a sample analysis or metric row anywhere else removes the verdicts which may depend on it, and a \
+verdict whose settings_hash no longer matches its run analysis is worked out again when read. \
+Checks which raise an exception are stored in the same way, with passes set to None.
+
+"""
+import hashlib
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+
+from qc_database.models import *
+
+# the metric tables each check reads
+CHECK_MODELS = {
+	'contamination': [DragenAlignmentMetrics, ContaminationMetrics],
+	'ntc_contamination': [SampleHsMetrics, DragenAlignmentMetrics, ctDNAReads],
+	'min_average_coverage': [DragenWGSCoverageMetrics, CustomCoverageMetrics],
+	'max_cnv_calls': [CNVMetrics],
+	'ntc_contamination_TSO500': [Tso500Reads],
+	'reads_tso500': [Tso500Reads],
+	'sex_match': [DragenWGSCoverageMetrics, DragenPloidyMetrics, CalculatedSexMetrics],
+	'variant_check': [DragenVariantCallingMetrics, VariantCallingMetrics, VCFVariantCount],
+	'coverage': [DragenRegionCoverageMetrics, CustomCoverageMetrics],
+	'titv': [DragenVariantCallingMetrics],
+	'fastqc': [SampleFastqcData, SampleDragenFastqcData],
+	'fusion_contamination': [FusionContamination],
+	'fusion_alignment': [FusionAlignmentMetrics],
+}
+
+
+# run analysis fields which change the verdict, the sign off fields are included so the verdict is fresh at sign off
+VERDICT_FIELDS = [
+	'auto_qc_checks',
+	'demultiplexing_completed',
+	'demultiplexing_valid',
+	'results_completed',
+	'results_valid',
+	'min_q30_score',
+	'min_variants',
+	'max_variants',
+	'min_titv',
+	'max_titv',
+	'min_coverage',
+	'min_sensitivity',
+	'sensitivity',
+	'sensitivity_lower_ci',
+	'sensitivity_higher_ci',
+	'min_fusion_aligned_reads_unique',
+	'min_on_target_reads',
+	'max_cnv_calls',
+	'max_ntc_contamination',
+	'manual_approval',
+	'watching',
+	'signoff_user_id',
+	'signoff_date',
+]
+
+# tables other than the metric tables whose rows change verdicts
+VERDICT_MODELS = [SampleAnalysis, InteropRunQuality, RelatednessQuality]
+
+
+def get_checks(run_analysis):
+
+	if run_analysis.auto_qc_checks == None:
+
+		return None
+
+	return run_analysis.auto_qc_checks.split(',')
+
+
+class MetricRows:
+	"""
+	The rows of a set of metric tables for some sample analyses, loaded with one query per table
+	"""
+
+	def __init__(self, sample_analyses, models):
+
+		# model to {sample analysis pk: [rows]}
+		self.rows = {}
+
+		for model in models:
+
+			rows = {}
+
+			for row in model.objects.filter(sample_analysis__in=sample_analyses).order_by('pk'):
+
+				rows.setdefault(row.sample_analysis_id, []).append(row)
+
+			self.rows[model] = rows
+
+	def filter(self, model, sample):
+
+		return self.rows[model].get(sample.pk, [])
+
+	def get(self, model, sample):
+		"""
+		The same as model.objects.get(sample_analysis=sample), including the exceptions raised
+		"""
+
+		rows = self.filter(model, sample)
+
+		if len(rows) == 0:
+
+			raise model.DoesNotExist(f'No {model.__name__} for {sample.pk}')
+
+		if len(rows) > 1:
+
+			raise model.MultipleObjectsReturned(f'{len(rows)} {model.__name__} rows for {sample.pk}')
+
+		return rows[0]
+
+
+class AutoQC:
+	"""
+	Loads everything needed to check the run analyses, then passes_auto_qc(run_analysis) gives \
+	the same result as the old per sample version of RunAnalysis.passes_auto_qc
+
+	"""
+
+	def __init__(self, run_analyses):
+
+		self.run_analyses = list(run_analyses)
+
+		# the sample analyses' run analysis for the checks which use its thresholds
+		self.run_analysis_keys = {(run_analysis.run_id, run_analysis.pipeline_id, run_analysis.analysis_type_id): run_analysis for run_analysis in self.run_analyses}
+
+		# the run analyses which get as far as checking their samples
+		to_check = [run_analysis for run_analysis in self.run_analyses
+					if get_checks(run_analysis) != None and run_analysis.results_completed and run_analysis.results_valid]
+
+		self.samples = {}
+		self.worksheet_samples = {}
+		self.interop_qualities = {}
+		self.relatedness = {}
+		self.metrics = MetricRows([], [])
+
+		if len(to_check) == 0:
+
+			return
+
+		sample_filter = Q(pk__in=[])
+		linked_run_analyses = []
+		models = []
+
+		for run_analysis in to_check:
+
+			checks = get_checks(run_analysis)
+
+			# DragenWGS NTCs may be in another analysis type of the run, see RunAnalysis.get_ntc_sample
+			if 'ntc_contamination' in checks and 'DragenWGS' in run_analysis.pipeline_id:
+
+				sample_filter = sample_filter | Q(run=run_analysis.run_id, pipeline=run_analysis.pipeline_id)
+
+			else:
+
+				linked_run_analyses.append(run_analysis.pk)
+
+			for check in checks:
+
+				for model in CHECK_MODELS.get(check, []):
+
+					if model not in models:
+
+						models.append(model)
+
+		sample_analyses = SampleAnalysis.objects.filter(sample_filter | Q(run_analysis__in=linked_run_analyses))
+
+		for sample in sample_analyses.select_related('sample').order_by('pk'):
+
+			self.samples.setdefault((sample.run_id, sample.pipeline_id, sample.analysis_type_id), []).append(sample)
+			self.worksheet_samples.setdefault((sample.run_id, sample.pipeline_id, sample.worksheet_id), []).append(sample)
+
+		self.metrics = MetricRows(sample_analyses.values('pk'), models)
+
+		q30_runs = [run_analysis.run_id for run_analysis in to_check if 'pct_q30' in get_checks(run_analysis)]
+
+		for interop_quality in InteropRunQuality.objects.filter(run__in=q30_runs):
+
+			self.interop_qualities.setdefault(interop_quality.run_id, []).append(interop_quality)
+
+		relatedness_run_analyses = [run_analysis.pk for run_analysis in to_check if 'relatedness' in get_checks(run_analysis)]
+
+		for relatedness in RelatednessQuality.objects.filter(run_analysis__in=relatedness_run_analyses):
+
+			self.relatedness.setdefault(relatedness.run_analysis_id, []).append(relatedness)
+
+	def get_samples(self, run_analysis):
+
+		return self.samples.get((run_analysis.run_id, run_analysis.pipeline_id, run_analysis.analysis_type_id), [])
+
+	def get_run_analysis(self, sample):
+
+		return self.run_analysis_keys.get((sample.run_id, sample.pipeline_id, sample.analysis_type_id))
+
+	def passes_run_level_qc(self, run_analysis):
+
+		for interop_quality in self.interop_qualities.get(run_analysis.run_id, []):
+
+			if interop_quality.percent_q30 < (run_analysis.min_q30_score*100):
+
+				return False
+
+		return True
+
+	def passes_relatedness(self, run_analysis):
+
+		relatedness_obj = self.relatedness.get(run_analysis.pk, [])
+
+		if len(relatedness_obj) == 1:
+
+			return relatedness_obj[0].results_valid, relatedness_obj[0].comment
+
+		return False, 'Oops'
+
+	def get_ntc_sample(self, run_analysis, worksheet_id):
+
+		if 'DragenWGS' in run_analysis.pipeline_id:
+
+			samples = self.worksheet_samples.get((run_analysis.run_id, run_analysis.pipeline_id, worksheet_id), [])
+
+		else:
+
+			samples = [sample for sample in self.get_samples(run_analysis) if sample.worksheet_id == worksheet_id]
+
+		ntc_samples = []
+
+		for sample in samples:
+
+			for ntc_marker in ['ntc', 'NTC']:
+
+				if ntc_marker in sample.sample_id:
+
+					ntc_samples.append(sample)
+
+		return ntc_samples
+
+	def get_total_reads(self, sample):
+
+		try:
+
+			return self.metrics.get(SampleHsMetrics, sample).total_reads
+
+		except:
+
+			try:
+
+				return self.metrics.get(DragenAlignmentMetrics, sample).total_input_reads
+
+			except:
+
+				return None
+
+	def get_contamination(self, sample):
+
+		if 'DragenWGS' in sample.pipeline_id:
+
+			return self.metrics.get(DragenAlignmentMetrics, sample).estimated_sample_contamination
+
+		elif 'DragenGE' in sample.pipeline_id:
+
+			try:
+
+				return self.metrics.get(ContaminationMetrics, sample).freemix
+
+			except:
+
+				return self.metrics.get(DragenAlignmentMetrics, sample).estimated_sample_contamination
+
+		try:
+
+			contamination_obj = self.metrics.get(ContaminationMetrics, sample)
+
+		except:
+
+			return 'NA'
+
+		return contamination_obj.freemix
+
+	def passes_contamination(self, sample):
+
+		try:
+
+			contamination = self.get_contamination(sample)
+
+		except:
+
+			return None
+
+		if contamination is None:
+
+			return False
+
+		if contamination > sample.contamination_cutoff:
+
+			return False
+
+		return True
+
+	def passes_ntc_contamination(self, sample):
+
+		if 'ctdna' not in sample.pipeline_id:
+
+			run_analysis = self.get_run_analysis(sample)
+
+			total_reads = self.get_total_reads(sample)
+
+			if total_reads == None:
+
+				return 'Cannot count reads for sample.'
+
+			ntc_objs = self.get_ntc_sample(run_analysis, sample.worksheet_id)
+
+			if len(ntc_objs) == 0:
+
+				return False
+
+			for ntc in ntc_objs:
+
+				ntc_reads = self.get_total_reads(ntc)
+
+				if sample == ntc:
+
+					return 'NA'
+
+				if ntc_reads == None:
+
+					return 'Cannot count reads for sample.'
+
+				if (ntc_reads * sample.ntc_contamination_cutoff) > total_reads:
+
+					return False
+
+			return True
+
+		ctDNA_aligned_reads = self.metrics.filter(ctDNAReads, sample)
+
+		if len(ctDNA_aligned_reads) != 1:
+
+			return None
+
+		if ctDNA_aligned_reads[0].percent_ntc_contamination < sample.ntc_contamination_cutoff:
+
+			return True
+
+		return False
+
+	def passes_average_coverage(self, sample):
+
+		if sample.min_average_coverage_cutoff is None:
+
+			return None
+
+		if 'DragenWGS' in sample.pipeline_id:
+
+			try:
+				average_coverage = self.metrics.get(DragenWGSCoverageMetrics, sample).average_alignment_coverage_over_genome
+			except:
+				return None
+
+		elif 'DragenGE' in sample.pipeline_id:
+
+			try:
+				average_coverage = self.metrics.get(CustomCoverageMetrics, sample).mean_depth
+			except:
+				return None
+
+		else:
+
+			return None
+
+		return average_coverage > sample.min_average_coverage_cutoff
+
+	def passes_cnv_calling(self, sample):
+
+		if 'DragenGE' in sample.pipeline_id:
+
+			run_analysis = self.get_run_analysis(sample)
+
+			cnv_calling_metrics = self.metrics.get(CNVMetrics, sample)
+
+			total_cnv_count = cnv_calling_metrics.exome_depth_count + cnv_calling_metrics.exome_depth_xcount
+
+			if cnv_calling_metrics.max_over_threshold and not \
+				cnv_calling_metrics.cnv_fail and \
+				total_cnv_count <= run_analysis.max_cnv_calls and \
+				cnv_calling_metrics.exome_depth_autosomal_reference_count >= 4 and \
+				cnv_calling_metrics.exome_depth_x_reference_count >= 4:
+				return True
+
+			return False
+
+	def passes_percent_ntc_tso500(self, sample):
+
+		run_analysis = self.get_run_analysis(sample)
+
+		if run_analysis == None:
+
+			return False
+
+		try:
+
+			tso500_reads = self.metrics.filter(Tso500Reads, sample)
+
+			percent_ntc = tso500_reads[0].percent_ntc_reads if len(tso500_reads) == 1 else None
+
+			if percent_ntc < run_analysis.max_ntc_contamination:
+
+				return True
+
+		except:
+
+			return None
+
+		return False
+
+	def passes_reads_tso500(self, sample):
+
+		run_analysis = self.get_run_analysis(sample)
+
+		try:
+
+			tso500_reads = self.metrics.filter(Tso500Reads, sample)
+
+			reads = tso500_reads[0].total_on_target_reads if len(tso500_reads) == 1 else None
+
+			if reads < run_analysis.min_on_target_reads:
+
+				return False
+
+		except:
+
+			return None
+
+		return True
+
+	def get_calculated_sex(self, sample):
+
+		if 'DragenWGS' in sample.pipeline_id:
+
+			wgs_obj = self.metrics.get(DragenWGSCoverageMetrics, sample)
+
+			if wgs_obj.predicted_sex_chromosome_ploidy is None:
+
+				ploidy_estimation = self.metrics.get(DragenPloidyMetrics, sample).ploidy_estimation
+
+			else:
+
+				ploidy_estimation = wgs_obj.predicted_sex_chromosome_ploidy
+
+			return {'XX': 'female', 'XY': 'male'}.get(ploidy_estimation, ploidy_estimation)
+
+		try:
+			sex_obj = self.metrics.get(CalculatedSexMetrics, sample)
+		except:
+			return 'NA'
+
+		return sex_obj.calculated_sex.lower()
+
+	def passes_sex_check(self, sample):
+
+		calculated_sex = self.get_calculated_sex(sample)
+
+		if calculated_sex == 'unknown':
+
+			return False
+
+		return calculated_sex == sample.get_sex()
+
+	def get_variant_count(self, sample):
+
+		if 'DragenWGS' in sample.pipeline_id or 'DragenGE' in sample.pipeline_id:
+
+			return self.metrics.get(DragenVariantCallingMetrics, sample).total
+
+		try:
+
+			variant_calling_metrics = self.metrics.get(VariantCallingMetrics, sample)
+
+			return variant_calling_metrics.total_snps + variant_calling_metrics.total_indels + variant_calling_metrics.total_complex_indels
+
+		except:
+
+			try:
+
+				return self.metrics.get(VCFVariantCount, sample).variant_count
+
+			except:
+
+				pass
+
+		return 'NA'
+
+	def passes_variant_count_check(self, sample):
+
+		run_analysis = self.get_run_analysis(sample)
+
+		if run_analysis == None:
+
+			return False
+
+		variant_count = self.get_variant_count(sample)
+
+		if variant_count == 'NA':
+
+			return False
+
+		return variant_count > run_analysis.min_variants and variant_count < run_analysis.max_variants
+
+	def get_region_coverage_over_20(self, sample):
+
+		try:
+
+			return self.metrics.get(DragenRegionCoverageMetrics, sample).pct_of_qc_coverage_region_with_coverage_20x_inf
+
+		except:
+
+			coverage = self.metrics.filter(CustomCoverageMetrics, sample)
+
+			if len(coverage) != 1:
+
+				return None
+
+			return coverage[0].pct_greater_20x
+
+	def passes_region_coverage_over_20(self, sample):
+
+		run_analysis = self.get_run_analysis(sample)
+
+		if run_analysis == None:
+
+			return False
+
+		cov_gtr_20 = self.get_region_coverage_over_20(sample)
+
+		if cov_gtr_20 == None:
+
+			return False
+
+		return cov_gtr_20 >= run_analysis.min_coverage
+
+	def passes_titv(self, sample):
+
+		titv = self.metrics.filter(DragenVariantCallingMetrics, sample)
+
+		titv = titv[0].titv_ratio if len(titv) == 1 else None
+
+		run_analysis = self.get_run_analysis(sample)
+
+		if run_analysis == None:
+
+			return False
+
+		if titv < run_analysis.min_titv:
+
+			return False
+
+		if titv > run_analysis.max_titv:
+
+			return False
+
+		return True
+
+	def passes_fastqc(self, sample):
+
+		fastqc_objs = self.metrics.filter(SampleFastqcData, sample)
+
+		if len(fastqc_objs) == 0:
+
+			fastqc_objs = self.metrics.filter(SampleDragenFastqcData, sample)
+
+			if len(fastqc_objs) == 0:
+
+				return None
+
+			for fastqc in fastqc_objs:
+
+				if fastqc.overall_pass_fail == 'FAIL':
+
+					return False
+
+			return True
+
+		for fastqc in fastqc_objs:
+
+			for result in [fastqc.basic_statistics, fastqc.per_base_sequencing_quality, fastqc.per_sequence_quality_scores, fastqc.per_base_n_content]:
+
+				if result == 'FAIL':
+
+					return False
+
+		return True
+
+	def passes_fusion_contamination(self, sample):
+
+		contamination_metrics = self.metrics.filter(FusionContamination, sample)
+
+		if len(contamination_metrics) != 1:
+
+			return True
+
+		if contamination_metrics[0].contamination == True or contamination_metrics[0].contamination_referral == True:
+
+			return False
+
+		return True
+
+	def passes_fusion_aligned_reads_duplicates(self, sample):
+
+		run_analysis = self.get_run_analysis(sample)
+
+		alignment_metrics = self.metrics.filter(FusionAlignmentMetrics, sample)
+
+		if len(alignment_metrics) != 1:
+
+			return False
+
+		if alignment_metrics[0].unique_reads_aligned < run_analysis.min_fusion_aligned_reads_unique:
+
+			return False
+
+		return True
+
+	def passes_auto_qc(self, run_analysis):
+		"""
+		Check whether the run analysis passes all QC checks, see RunAnalysis.passes_auto_qc
+		"""
+
+		checks_to_do = get_checks(run_analysis)
+
+		if checks_to_do == None:
+
+			return False, ['No Configuration For this Pipeline.']
+
+		reasons_to_fail = []
+
+		if run_analysis.demultiplexing_completed == False:
+
+			reasons_to_fail.append('Demultiplexing not complete for some samples')
+
+		if run_analysis.demultiplexing_valid == False:
+
+			reasons_to_fail.append('Demultiplexing not valid for some samples')
+
+		if run_analysis.results_completed == False:
+
+			return False, ['Run results not completed']
+
+		if run_analysis.results_valid == False:
+
+			return False, ['Run results not valid']
+
+		samples = self.get_samples(run_analysis)
+
+		new_samples_list = []
+
+		fail_samples = []
+
+		for sample in samples:
+
+			if sample.results_completed == False:
+
+				reasons_to_fail.append('Results not complete for some samples')
+				fail_samples.append(sample.sample_id)
+
+			if sample.results_valid == False:
+
+				reasons_to_fail.append('Results not valid for some samples')
+				fail_samples.append(sample.sample_id)
+
+			if sample.sample.is_ntc() == False:
+
+				new_samples_list.append(sample)
+
+		if 'pct_q30' in checks_to_do:
+
+			if self.passes_run_level_qc(run_analysis) == False:
+
+				reasons_to_fail.append('Q30 Fail')
+
+				for sample in new_samples_list:
+
+					fail_samples.append(sample.sample_id)
+
+		if 'relatedness' in checks_to_do:
+
+			passes_relatedness, comment = self.passes_relatedness(run_analysis)
+
+			if passes_relatedness == False:
+
+				reasons_to_fail.append(comment)
+
+		if 'contamination' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_contamination(sample) == False:
+
+					reasons_to_fail.append('Contamination Fail')
+					fail_samples.append(sample.sample_id)
+
+		if 'ntc_contamination' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_ntc_contamination(sample) != True:
+
+					reasons_to_fail.append('NTC Contamination Fail')
+					fail_samples.append(sample.sample_id)
+
+		# CNV checks are only a hard failure for GE, just a warning in WGS
+		if 'DragenGE' in run_analysis.pipeline_id:
+
+			if 'min_average_coverage' in checks_to_do:
+
+				for sample in new_samples_list:
+
+					if self.passes_average_coverage(sample) != True:
+
+						reasons_to_fail.append('CNV Coverage Fail')
+
+			if 'max_cnv_calls' in checks_to_do:
+
+				for sample in new_samples_list:
+
+					try:
+
+						if self.passes_cnv_calling(sample) != True:
+
+							reasons_to_fail.append('CNV Calling Fail')
+
+					except ObjectDoesNotExist:
+						# handles old runs where the check exists but CNV calling hasn't been run
+						pass
+
+		if 'min_average_coverage' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_average_coverage(sample) == False:
+
+					reasons_to_fail.append('Average Coverage Fail')
+
+		# DNA
+		if 'ntc_contamination_TSO500' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_percent_ntc_tso500(sample) != True:
+
+					reasons_to_fail.append('NTC Contamination Fail')
+					fail_samples.append(sample.sample_id)
+
+		# RNA
+		if 'reads_tso500' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_reads_tso500(sample) != True:
+
+					reasons_to_fail.append('TSO500 Read Fail')
+					fail_samples.append(sample.sample_id)
+
+		if 'sex_match' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_sex_check(sample) == False:
+
+					reasons_to_fail.append('Sex Match Fail')
+					fail_samples.append(sample.sample_id)
+
+		if 'variant_check' in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if self.passes_variant_count_check(sample) == False:
+
+					reasons_to_fail.append('Variant Count Fail')
+
+		if 'sensitivity' in checks_to_do:
+
+			if run_analysis.passes_sensitivity() == False:
+
+				reasons_to_fail.append('Low Sensitivity')
+
+		sample_checks = [
+			('coverage', self.passes_region_coverage_over_20, 'Low Coverage >20x'),
+			('titv', self.passes_titv, 'Titv Ratio out of range for at least one sample'),
+			('fastqc', self.passes_fastqc, 'FASTQC Fail'),
+			('fusion_contamination', self.passes_fusion_contamination, 'Fusion Contamination Fail'),
+			('fusion_alignment', self.passes_fusion_aligned_reads_duplicates, 'Fusion Aligned Reads Unique Fail'),
+		]
+
+		for check, passes_check, reason in sample_checks:
+
+			if check in checks_to_do:
+
+				for sample in new_samples_list:
+
+					if passes_check(sample) == False:
+
+						reasons_to_fail.append(reason)
+						fail_samples.append(sample.sample_id)
+
+		if len(reasons_to_fail) == 0:
+
+			return True, ['All Pass']
+
+		return False, list(set(reasons_to_fail)), fail_samples
+
+
+def evaluate_run_analyses(run_analyses):
+	"""
+	Returns a dictionary of run analysis pk to the result of passes_auto_qc for each run analysis
+	"""
+
+	auto_qc = AutoQC(run_analyses)
+
+	return {run_analysis.pk: auto_qc.passes_auto_qc(run_analysis) for run_analysis in auto_qc.run_analyses}
+
+
+def settings_hash(run_analysis):
+
+	values = [str(getattr(run_analysis, field)) for field in VERDICT_FIELDS]
+
+	return hashlib.sha256('|'.join(values).encode()).hexdigest()
+
+
+def refresh_verdicts(run_analyses):
+	"""
+	Work out and store the verdict of each run analysis.
+
+	Returns a dictionary of run analysis pk to the result of passes_auto_qc, and a dictionary of \
+	run analysis pk to the exception raised by the checks for those which could not be worked \
+	out, e.g. as a threshold is missing. The exception is stored in place of their verdict.
+
+	"""
+
+	auto_qc = AutoQC(run_analyses)
+
+	results = {}
+	errors = {}
+
+	for run_analysis in auto_qc.run_analyses:
+
+		try:
+
+			result = auto_qc.passes_auto_qc(run_analysis)
+
+		except Exception as e:
+
+			errors[run_analysis.pk] = e
+
+			AutoQCVerdict.objects.update_or_create(run_analysis=run_analysis,
+													defaults={'passes': None,
+															'reasons': [f'{type(e).__name__}: {e}'],
+															'fail_samples': None,
+															'settings_hash': settings_hash(run_analysis)})
+			continue
+
+		AutoQCVerdict.objects.update_or_create(run_analysis=run_analysis,
+												defaults={'passes': result[0],
+														'reasons': result[1],
+														'fail_samples': result[2] if len(result) == 3 else None,
+														'settings_hash': settings_hash(run_analysis)})
+
+		results[run_analysis.pk] = result
+
+	return results, errors
+
+
+def get_stored_verdicts(run_analyses):
+	"""
+	The stored verdicts of the run analyses which are up to date, without working out any checks.
+
+	Returns the same as refresh_verdicts, with the stored exceptions as plain Exceptions, and a list \
+	of the run analyses whose verdicts are missing or out of date.
+
+	"""
+
+	run_analyses = list(run_analyses)
+
+	verdicts = {verdict.run_analysis_id: verdict for verdict in AutoQCVerdict.objects.filter(run_analysis__in=[run_analysis.pk for run_analysis in run_analyses])}
+
+	results = {}
+	errors = {}
+	stale = []
+
+	for run_analysis in run_analyses:
+
+		verdict = verdicts.get(run_analysis.pk)
+
+		if verdict is None or verdict.settings_hash != settings_hash(run_analysis):
+
+			stale.append(run_analysis)
+
+		elif verdict.passes is None:
+
+			errors[run_analysis.pk] = Exception(' '.join(verdict.reasons))
+
+		else:
+
+			results[run_analysis.pk] = verdict.get_result()
+
+	return results, errors, stale
+
+
+def get_verdicts(run_analyses):
+	"""
+	The stored verdicts of the run analyses, working out and storing those which are missing or out of date.
+
+	Returns the same as refresh_verdicts.
+
+	"""
+
+	results, errors, stale = get_stored_verdicts(run_analyses)
+
+	if len(stale) > 0:
+
+		new_results, new_errors = refresh_verdicts(stale)
+		results.update(new_results)
+		errors.update(new_errors)
+
+	return results, errors
+
+
+def remove_verdicts(sender, instance, raw=False, created=False, **kwargs):
+	"""
+	Remove the stored verdicts which may depend on a saved or deleted row, they are worked out again when next read
+	"""
+
+	# fixtures, and new sample analyses which update_database adds with their run
+	if raw or (sender is SampleAnalysis and created):
+
+		return
+
+	if sender is InteropRunQuality:
+
+		verdicts = AutoQCVerdict.objects.filter(run_analysis__run=instance.run_id)
+
+	elif sender is RelatednessQuality:
+
+		verdicts = AutoQCVerdict.objects.filter(run_analysis=instance.run_analysis_id)
+
+	# DragenWGS NTCs are shared between the analysis types of a run so every analysis type is included
+	elif sender is SampleAnalysis:
+
+		verdicts = AutoQCVerdict.objects.filter(run_analysis__run=instance.run_id, run_analysis__pipeline=instance.pipeline_id)
+
+	else:
+
+		verdicts = AutoQCVerdict.objects.filter(run_analysis__run__sampleanalysis=instance.sample_analysis_id,
+												run_analysis__pipeline__sampleanalysis=instance.sample_analysis_id)
+
+	verdicts.delete()
+
+
+def connect_signals():
+	"""
+	Remove stored verdicts when the rows they depend on change, called when the app is ready
+	"""
+
+	models = list(VERDICT_MODELS)
+
+	for check_models in CHECK_MODELS.values():
+
+		for model in check_models:
+
+			if model not in models:
+
+				models.append(model)
+
+	for model in models:
+
+		post_save.connect(remove_verdicts, sender=model, dispatch_uid=f'auto_qc_save_{model.__name__}')
+		post_delete.connect(remove_verdicts, sender=model, dispatch_uid=f'auto_qc_delete_{model.__name__}')
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+
+from qc_database.models import *
+
+
+class Command(BaseCommand):
+	"""
+	Link sample analyses to the run analysis with the same run, pipeline and analysis type.
+
+	Run once after migrating to the SampleAnalysis.run_analysis field, sample analyses saved \
+	afterwards are linked when they or their run analysis are saved.
+
+	"""
+
+	help = 'Link sample analyses to their run analysis'
+
+	def handle(self, *args, **options):
+
+		run_analyses = RunAnalysis.objects.filter(run = OuterRef('run'),
+												pipeline = OuterRef('pipeline'),
+												analysis_type = OuterRef('analysis_type'))
+
+		with transaction.atomic():
+
+			# one update for every unlinked sample analysis, signals are not sent so nothing else changes
+			linked = SampleAnalysis.objects.filter(run_analysis = None).update(run_analysis = Subquery(run_analyses.values('pk')[:1]))
+
+		unlinked = SampleAnalysis.objects.filter(run_analysis = None).count()
+
+		self.stdout.write(f'Checked {linked} sample analyses, {unlinked} have no run analysis')
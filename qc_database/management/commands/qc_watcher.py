@@ -0,0 +1,340 @@
+import os
+import time
+import logging
+from pathlib import Path
+
+from django.core.management.base import CommandError
+from django.db import close_old_connections
+
+from qc_database.models import *
+from qc_database.management.commands.update_database import Command as UpdateDatabaseCommand
+from pipelines import monitoring, run_watcher, parse_cache
+
+logger = logging.getLogger(__name__)
+
+# files in a run folder which decide whether and how it is added
+RUN_FILES = ('SampleSheet.csv', 'run_copy_complete.txt')
+
+
+class Command(UpdateDatabaseCommand):
+	"""
+	Stay running and update the database as run folders are copied and pipeline results are written.
+
+	Run folders are added when their run_copy_complete.txt appears and watched run analyses \
+	are checked when files appear in their fastq or results directories. A full scan, the same \
+	as update_database, is done at startup and every --full_scan_interval seconds to pick up \
+	anything the watcher missed.
+
+	"""
+
+	help = 'Watch raw data directories and pipeline results and update the database as they change'
+
+	def add_arguments(self, parser):
+
+		parser.add_argument('--raw_data_dir', nargs = '+', type = str, required=True, help='One or more directories of run folders')
+
+		parser.add_argument('--config', nargs =1, type = str, required=True)
+
+		parser.add_argument('--workers', type = int, default = 1, help='Number of processes used to check results and parse metrics for watched run analyses')
+
+		parser.add_argument('--no-parse-cache', action='store_true', help='Parse every metrics file again instead of using the parse cache')
+
+		parser.add_argument('--poll', action='store_true', help='Poll for changes instead of using inotify, inotify does not see changes made by other hosts on network filesystems')
+
+		parser.add_argument('--poll_interval', type = float, default = 30, help='Seconds between polls when polling for changes')
+
+		parser.add_argument('--full_scan_interval', type = float, default = 900, help='Seconds between full scans of every run folder and watched run analysis')
+
+	def handle(self, *args, **options):
+
+		monitoring.setup_logging()
+
+		self.roots = [Path(raw_data_dir) for raw_data_dir in options['raw_data_dir']]
+		self.config_location = options['config'][0]
+		self.workers = options['workers']
+
+		# fail now if the config is invalid, later edits are checked when the file changes
+		self.config = self.load_config(self.config_location)
+		self.config_mtime = os.stat(self.config_location).st_mtime
+
+		# held while running so update_database from cron skips its updates
+		lock = self.acquire_lock()
+
+		if lock is None:
+
+			raise CommandError('Another update is already running')
+
+		self.configure_parse_cache(options['no_parse_cache'])
+
+		self.watcher = run_watcher.make_watcher(poll=options['poll'], interval=options['poll_interval'])
+
+		# watched directory to what it is - ('root', None), ('run', None) or ('results', set of run analysis pks)
+		self.watch_targets = {}
+
+		# the root and run folder targets and the results targets, each only worked out again when they may have changed
+		self.run_targets = {}
+		self.results_targets = {}
+
+		# directories which could not be watched, only logged the first time
+		self.watch_errors = set()
+
+		logger.info(f'Watching {", ".join(str(root) for root in self.roots)} with {type(self.watcher).__name__}')
+
+		next_full_scan = time.monotonic()
+
+		try:
+
+			while True:
+
+				# the database may have closed the connection while we were waiting
+				close_old_connections()
+
+				self.reload_config()
+
+				if time.monotonic() >= next_full_scan:
+
+					self.full_scan()
+					next_full_scan = time.monotonic() + options['full_scan_interval']
+
+					self.update_watches()
+
+				else:
+
+					changed = self.watcher.wait(next_full_scan - time.monotonic())
+
+					if len(changed) == 0:
+
+						continue
+
+					self.update_watches(*self.process_changes(changed))
+
+		except KeyboardInterrupt:
+
+			logger.info('Stopping')
+
+		finally:
+
+			self.watcher.close()
+			parse_cache.configure(None)
+			lock.close()
+
+	def reload_config(self):
+		"""
+		Reload the config file if it has changed, an invalid config is logged and the previous one kept
+		"""
+
+		try:
+
+			config_mtime = os.stat(self.config_location).st_mtime
+
+		except OSError as e:
+
+			logger.error(f'Could not read config file, using the previous config: {e}')
+			return
+
+		if config_mtime == self.config_mtime:
+
+			return
+
+		try:
+
+			self.config = self.load_config(self.config_location)
+
+		except CommandError as e:
+
+			logger.error(f'Invalid config file, using the previous config: {e}')
+
+		else:
+
+			logger.info(f'Reloaded config file {self.config_location}')
+
+		self.config_mtime = config_mtime
+
+	def log_failed(self):
+
+		try:
+
+			self.finish_update()
+
+		except CommandError as e:
+
+			logger.error(str(e))
+
+	def full_scan(self):
+
+		self.start_update()
+
+		self.scan_run_folders(self.roots, self.config)
+
+		self.check_run_analyses(self.config, self.workers)
+
+		self.log_failed()
+		self.log_timings()
+		self.prune_parse_cache()
+
+	def process_changes(self, changed):
+		"""
+		Add the run folders and check the run analyses whose watched directories have changed.
+
+		Returns whether the root and run folder targets and whether the results targets may have changed.
+
+		"""
+
+		self.start_update()
+
+		runs_to_scan = set()
+		run_analysis_pks = set()
+		runs_changed = False
+
+		for path in changed:
+
+			kind, pks = self.watch_targets.get(path, (None, None))
+
+			if kind in ('root', 'run'):
+
+				runs_changed = True
+
+			if kind == 'root':
+
+				# new run folders
+				for raw_data in Path(path).glob('*/'):
+
+					if str(raw_data) not in self.scan_states:
+
+						runs_to_scan.add(raw_data)
+
+			elif kind == 'run':
+
+				runs_to_scan.add(Path(path))
+
+			elif kind == 'results':
+
+				run_analysis_pks.update(pks)
+
+		for raw_data in runs_to_scan:
+
+			self.scan_run_folder(raw_data, self.config)
+
+		# check run analyses added by the scan straight away
+		if len(runs_to_scan) > 0:
+
+			run_analysis_pks.update(RunAnalysis.objects.filter(watching = True, run_id__in = [raw_data.name for raw_data in runs_to_scan]).values_list('pk', flat=True))
+
+		if len(run_analysis_pks) > 0:
+
+			self.check_run_analyses(self.config, self.workers, run_analysis_pks)
+
+		self.log_failed()
+		self.log_timings()
+
+		return runs_changed, len(run_analysis_pks) > 0
+
+	def update_watches(self, runs=True, results=True):
+		"""
+		Watch the raw data roots, run folders which have not been added yet or are still being watched, \
+		and the fastq and results directories of watched run analyses.
+
+		The root and run folder targets list every run folder so are only worked out again when runs \
+		is set, i.e. after a full scan or a change to a root or run folder, and the results targets \
+		when results is set, i.e. after run analyses were checked.
+
+		"""
+
+		if runs:
+
+			self.run_targets = self.get_run_targets()
+
+		if results:
+
+			self.results_targets = self.get_results_targets()
+
+		# run folder targets take precedence over results directories in the same place
+		targets = dict(self.results_targets)
+		targets.update(self.run_targets)
+
+		for path in self.watcher.watched() - set(targets):
+
+			self.watcher.remove_watch(path)
+
+		for path, (kind, pks) in targets.items():
+
+			try:
+
+				self.watcher.add_watch(path, files = RUN_FILES if kind == 'run' else ())
+
+			except OSError as e:
+
+				if path not in self.watch_errors:
+
+					logger.warning(f'Could not watch {path}, changes will be picked up by the next full scan: {e}')
+					self.watch_errors.add(path)
+
+		self.watch_targets = targets
+
+	def get_run_targets(self):
+		"""
+		The raw data roots and the run folders which have not been added yet or whose run is still watched
+		"""
+
+		targets = {}
+
+		scanned_runs = dict(RunScanState.objects.values_list('run_path', 'run_id'))
+
+		watched_runs = set(RunAnalysis.objects.filter(watching = True).values_list('run_id', flat=True))
+
+		for root in self.roots:
+
+			targets[str(root)] = ('root', None)
+
+			for raw_data in root.glob('*/'):
+
+				run_id = scanned_runs.get(str(raw_data))
+
+				if raw_data.is_dir() and (str(raw_data) not in scanned_runs or run_id in watched_runs):
+
+					targets[str(raw_data)] = ('run', None)
+
+		return targets
+
+	def get_results_targets(self):
+		"""
+		The fastq and results directories of watched run analyses, or the closest directories to them which exist
+		"""
+
+		targets = {}
+
+		watched_run_analyses = list(RunAnalysis.objects.filter(watching = True).select_related('pipeline', 'analysis_type'))
+
+		watched_runs = set(run_analysis.run_id for run_analysis in watched_run_analyses)
+
+		sample_ids = {}
+
+		for run_id, pipeline_id, analysis_type_id, sample_id in SampleAnalysis.objects.filter(run_id__in = watched_runs).values_list('run_id', 'pipeline_id', 'analysis_type_id', 'sample_id'):
+
+			sample_ids.setdefault((run_id, pipeline_id, analysis_type_id), []).append(sample_id)
+
+		for run_analysis in watched_run_analyses:
+
+			task = {
+				'run_id': run_analysis.run_id,
+				'analysis_type': run_analysis.analysis_type_id,
+				'run_config_key': run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type_id,
+				'sample_ids': sample_ids.get((run_analysis.run_id, run_analysis.pipeline_id, run_analysis.analysis_type_id), []),
+			}
+
+			for watch_dir in monitoring.get_watch_dirs(task, self.config):
+
+				# directories which do not exist yet are found through the closest one which does
+				while not watch_dir.is_dir() and watch_dir.parent != watch_dir:
+
+					watch_dir = watch_dir.parent
+
+				if watch_dir.parent == watch_dir:
+
+					continue
+
+				kind, pks = targets.setdefault(str(watch_dir), ('results', set()))
+
+				pks.add(run_analysis.pk)
+
+		return targets
@@ -1,1468 +1,585 @@
 import csv
 import os
+import io
+import fcntl
+import cProfile
+import pstats
 from pathlib import Path
 import datetime
 import logging
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
 from django.db import transaction
 
 from qc_database.models import *
-from pipelines import dragen_pipelines, parsers, quality_pipelines, somatic_pipelines, nextflow_pipelines, TSO500_pipeline, ctDNA_pipeline
+from pipelines import parsers, monitoring, pipeline_config, timing, parse_cache
 from qc_database import management_utils
 
+logger = logging.getLogger(__name__)
+
 class Command(BaseCommand):
 
 	def add_arguments(self, parser):
 
-		parser.add_argument('--raw_data_dir', nargs =1, type = str, required=True)
+		parser.add_argument('--raw_data_dir', nargs = '+', type = str, required=True, help='One or more directories of run folders')
 
 		parser.add_argument('--config', nargs =1, type = str, required=True)
-	
-	def handle(self, *args, **options):
-
-		logging.basicConfig(level=logging.DEBUG)
-		logger = logging.getLogger()
-		logger.handlers.clear()
-		ch = logging.StreamHandler()
-		formatter = logging.Formatter("%(levelname)s\t%(asctime)s\t%(message)s")
-		ch.setFormatter(formatter)
-		logger.addHandler(ch)
-
-		# Make or get initial model instances
-		raw_data_dir = options['raw_data_dir'][0]
-		config = options['config'][0]
-
-		# Read config file and create dictionary
-		config_dict = parsers.parse_config(config)
-
-		# don't process existing runs
-		existing_runs = Run.objects.all()
-		existing_runs = [run.pk for run in existing_runs]
-
-		# get runs in existing archive directory
-		raw_data_dir = list(Path(raw_data_dir).glob('*/'))
-
-		sample_sheet_dict = {}
-
-		with transaction.atomic():
-
-			# for each folder in  archive directory
-			for raw_data in raw_data_dir:
-
-				# skip non directory items
-				if raw_data.is_dir() == False:
-					continue
-
-				sample_sheet = raw_data.joinpath('SampleSheet.csv')
-
-				# skip if no sample sheet
-				if sample_sheet.exists() == False:
-
-					logger.info(f'Could not find sample sheet for {raw_data}')
-					continue
-
-				# skip if we don't have marker file
-				copy_complete = raw_data.joinpath('run_copy_complete.txt')
-
-				if copy_complete.exists() == False:
-
-					continue
-
-				run_id = raw_data.name
-				run_obj, created = Run.objects.get_or_create(run_id=run_id)
-			
-				if run_id not in existing_runs:
-
-					logger.info (f'A new run has been detected: {run_id}')
-
-					# parse runlog data 
-					run_info = raw_data.joinpath('RunInfo.xml')
-					run_parameters = raw_data.joinpath('runParameters.xml')
-
-					if run_parameters.exists() == False:
-
-						run_parameters = raw_data.joinpath('RunParameters.xml')
-
-						if run_parameters.exists() == False:
-
-							logger.warn (f'Can\'t find run parameters file for {run_id}')
-							continue
-
-					if run_info.exists() == False or run_parameters.exists() == False:
-
-						logger.warn (f'Can\'t find required XML files for {run_id}')
-						continue
-
-					# add runlog stats to database
-					interop_data = management_utils.add_run_log_info(run_info, run_parameters, run_obj, raw_data)
-
-				else:
-
-					interop_data = None
-				
-				try:
-					# parse sample sheet
-					sample_sheet_data = parsers.sample_sheet_parser(sample_sheet)
-
-					sample_sheet_dict[run_id] = sample_sheet_data
-
-
-				except Exception as e:
-
-					logger.exception(e)
-
-					logger.warn(f'Could not parse sample sheet for run {run_id}')
-					continue
-				
-				# set to hold different pipeline combinations
-				run_analyses_to_create = set()
-
-				# create sample analysis objects for each sample
-
-				for sample in sample_sheet_data:
-
-					sample_obj, created = Sample.objects.get_or_create(sample_id=sample)
-					pipeline = sample_sheet_data[sample]['pipelineName']
-					pipeline_version = sample_sheet_data[sample]['pipelineVersion']
-
-					if pipeline == 'TSO500':
-
-						panel = sample_sheet_data[sample]['Sample_Type']
-						panel = 'TSO500_' + panel
-						
-					elif pipeline == 'tso500_ctdna':
-					
-						panel = 'ctDNA'
-
-					else:
-
-						panel = sample_sheet_data[sample]['panel']					
-
-					sex = sample_sheet_data[sample].get('sex', None)
-
-					worksheet = sample_sheet_data[sample].get('Sample_Plate', 'Unknown')
-
-					pipeline_and_version = pipeline + '-' + pipeline_version
-
-					pipeline_obj, created = Pipeline.objects.get_or_create(pipeline_id= pipeline_and_version)
-					worksheet_obj, created = WorkSheet.objects.get_or_create(worksheet_id= worksheet)
-					analysis_type_obj, created = AnalysisType.objects.get_or_create(analysis_type_id=panel)
-
-					run_config_key = pipeline_obj.pipeline_id + '-' + analysis_type_obj.analysis_type_id
-
-					try:
-
-						#put checks to try into dictionary
-
-						checks_to_try = config_dict['pipelines'][run_config_key]['qc_checks']
-						checks_to_try_dict=dict(zip(checks_to_try, checks_to_try))
-						checks_to_try=','.join(checks_to_try)
-
-
-					except:
-
-						checks_to_try = None
-
-					new_sample_analysis_obj, created = SampleAnalysis.objects.get_or_create(sample=sample_obj,
-																			run = run_obj,
-																			pipeline = pipeline_obj,
-																			analysis_type = analysis_type_obj,
-																			worksheet = worksheet_obj)
-
-
-					if checks_to_try is not None:
 
-						for key in checks_to_try_dict.keys():
+		parser.add_argument('--workers', type = int, default = 1, help='Number of processes used to check results and parse metrics for watched run analyses')
 
-							if 'contamination' == key :
+		parser.add_argument('--rescan', action='store_true', help='Rescan every run folder even if it has not changed since the last scan')
 
-								try:
+		parser.add_argument('--profile', type = str, help='Write cProfile stats for the update to this file, worker processes are not included')
 
-									contamination_cutoff = config_dict['pipelines'][run_config_key]['contamination_cutoff']
+		parser.add_argument('--no-parse-cache', action='store_true', help='Parse every metrics file again instead of using the parse cache')
 
-									if created:
+	def handle(self, *args, **options):
 
-										new_sample_analysis_obj.contamination_cutoff = contamination_cutoff
+		monitoring.setup_logging()
 
-								except:
+		# Make or get initial model instances
+		raw_data_dirs = [Path(raw_data_dir) for raw_data_dir in options['raw_data_dir']]
+		config = self.load_config(options['config'][0])
 
-									raise Exception ("ERROR: Contamination cutoff not in config file")
+		# only one update at a time, so watched run analyses are not checked and saved by two processes
+		lock = self.acquire_lock()
 
-							if 'ntc_contamination' == key :
+		if lock is None:
 
-								try:
+			logger.warning('Another update is already running, skipping this update')
+			return
 
-									ntc_contamination_cutoff = config_dict['pipelines'][run_config_key]['ntc_contamination_cutoff']
+		self.configure_parse_cache(options['no_parse_cache'])
 
-									if created:
+		if options['profile'] is not None:
 
-										new_sample_analysis_obj.ntc_contamination_cutoff = ntc_contamination_cutoff
+			profiler = cProfile.Profile()
+			profiler.enable()
 
-								except:
+		try:
 
-									raise Exception ("ERROR: NTC contamination cutoff not in config file")
-								
-							if 'max_cnv_calls' == key:
+			self.start_update(rescan=options['rescan'])
 
-								try:
+			self.scan_run_folders(raw_data_dirs, config)
 
-									max_cnvs_called_cutoff = config_dict['pipelines'][run_config_key]['max_cnvs_called_cutoff']
+			# watched run analyses are checked once for all the raw data directories
+			self.check_run_analyses(config, options['workers'])
 
-									if created:
+			self.finish_update()
 
-										new_sample_analysis_obj.max_cnvs_called_cutoff = max_cnvs_called_cutoff
+		finally:
 
-								except:
+			if options['profile'] is not None:
 
-									raise Exception ("ERROR: Max CNVs called cutoff not in config file")
-									
-							if 'cnv_call_range' == key:
+				profiler.disable()
+				self.write_profile(profiler, options['profile'])
 
-								try:
+			self.log_timings()
 
-									max_cnvs_called_cutoff = config_dict['pipelines'][run_config_key]['max_cnvs_called_cutoff']
-									min_cnvs_called_cutoff = config_dict['pipelines'][run_config_key]['min_cnvs_called_cutoff']
+			self.prune_parse_cache()
+			parse_cache.configure(None)
 
-									if created:
+			lock.close()
 
-										new_sample_analysis_obj.max_cnvs_called_cutoff = max_cnvs_called_cutoff
-										new_sample_analysis_obj.min_cnvs_called_cutoff = min_cnvs_called_cutoff
+	def log_timings(self):
+		"""
+		Log the time spent in each stage of the update
+		"""
 
-								except:
+		timing.log_summary(timing.collect())
 
-									raise Exception ("ERROR: Min or Max CNVs called cutoff not in config file")
-									
-							if 'min_average_coverage' == key:
-							
-								try:
-									min_average_coverage_cutoff = config_dict['pipelines'][run_config_key]['min_average_coverage']
+	def configure_parse_cache(self, no_parse_cache):
+		"""
+		Keep parsed metrics files in AUTO_QC_CACHE_DIR unless --no-parse-cache was given
+		"""
 
-									if created:
+		if no_parse_cache:
 
-										new_sample_analysis_obj.min_average_coverage_cutoff = min_average_coverage_cutoff
+			parse_cache.configure(None)
 
-								except:
+		else:
 
-									raise Exception ("ERROR: Min Average Coverage cutoff not in config file")
-								
+			parse_cache.configure(os.path.join(settings.AUTO_QC_CACHE_DIR, 'parse_cache'))
 
-					new_sample_analysis_obj.sex = sex
-					new_sample_analysis_obj.save()
+	def prune_parse_cache(self):
 
-					run_analyses_to_create.add((pipeline_and_version, panel ))
+		removed = parse_cache.prune()
 
-				# now create a corresponding run analysis object
-				for run_analysis in run_analyses_to_create:
+		logger.info(f'Parse cache: {parse_cache.stats["hits"]} hits, {parse_cache.stats["misses"]} misses in this process, {removed} old entries removed')
 
-					pipeline = run_analysis[0]
-					analysis_type = run_analysis[1]
+	def write_profile(self, profiler, profile_location):
 
-					pipeline_obj = Pipeline.objects.get(pipeline_id = pipeline)
-					analysis_type_obj = AnalysisType.objects.get(analysis_type_id = analysis_type)
+		profiler.dump_stats(profile_location)
 
-					run_config_key = pipeline_obj.pipeline_id + '-' + analysis_type_obj.analysis_type_id
+		stats_output = io.StringIO()
+		pstats.Stats(profiler, stream=stats_output).sort_stats('cumulative').print_stats(30)
 
-					new_run_analysis_obj, created = RunAnalysis.objects.get_or_create(run = run_obj,
-																			pipeline = pipeline_obj,
-																			analysis_type = analysis_type_obj)
+		logger.info(f'Profile written to {profile_location}, top 30 functions by cumulative time:\n{stats_output.getvalue()}')
 
-					try:
+	def acquire_lock(self):
+		"""
+		Returns the open lock file, or None if another update holds the lock
+		"""
 
-						#put checks to try into dictionary
+		os.makedirs(settings.AUTO_QC_CACHE_DIR, exist_ok=True)
 
-						checks_to_try = config_dict['pipelines'][run_config_key]['qc_checks']
-						checks_to_try_dict=dict(zip(checks_to_try, checks_to_try))
-						checks_to_try=','.join(checks_to_try)
+		lock = open(os.path.join(settings.AUTO_QC_CACHE_DIR, 'update_database.lock'), 'w')
 
+		try:
 
-					except:
+			fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
 
-						checks_to_try = None
+		except BlockingIOError:
 
+			lock.close()
+			return None
 
-					if checks_to_try is not None:
+		return lock
 
-						new_run_analysis_obj.auto_qc_checks = checks_to_try
-						new_run_analysis_obj.start_date = datetime.datetime.now()
+	def load_config(self, config_location):
+		"""
+		Read and validate the config file, compiled once per change to the file
+		"""
 
-						for key in checks_to_try_dict.keys():
+		try:
 
-							if 'pct_q30' in checks_to_try_dict:
+			return pipeline_config.load_config(config_location, settings.AUTO_QC_CACHE_DIR)
 
+		except pipeline_config.ConfigError as e:
 
-								try: 
-						
-									min_q30_score = config_dict['pipelines'][run_config_key]['min_q30_score']
+			raise CommandError(str(e))
 
-									if created:
-										new_run_analysis_obj.min_q30_score = min_q30_score
+	def start_update(self, rescan=False):
+		"""
+		Read the state needed to decide which run folders to add.
 
-								except:
-
-									raise Exception ("ERROR: min_q30_score not in config file")
+		"""
 
+		# don't process existing runs
+		self.existing_runs = set(Run.objects.values_list('run_id', flat=True))
 
-							if 'variant_check' in checks_to_try_dict:
+		# runs with a run analysis still being watched are always rescanned
+		self.watched_runs = set(RunAnalysis.objects.filter(watching=True).values_list('run_id', flat=True))
 
-								try:
+		# state of each run folder at the last scan
+		if rescan:
 
-									min_variants =  config_dict['pipelines'][run_config_key]['min_variants']
-									max_variants =  config_dict['pipelines'][run_config_key]['max_variants']
+			self.scan_states = {}
 
-									if created:
-										new_run_analysis_obj.min_variants = min_variants
-										new_run_analysis_obj.max_variants = max_variants
+		else:
 
-								except:
+			self.scan_states = {scan_state.run_path: scan_state for scan_state in RunScanState.objects.all()}
 
-									raise Exception ("ERROR: Min or max variants not in config file")
+		# pipelines, analysis types, worksheets and samples shared by all runs in this update
+		self.dimension_cache = management_utils.DimensionCache()
+		self.dimension_cache.preload(Pipeline)
+		self.dimension_cache.preload(AnalysisType)
 
+		# units of work which failed and will be retried on the next update
+		self.failed = []
 
-							if 'sensitivity' in checks_to_try_dict:
+	def finish_update(self):
 
-								try:
+		if len(self.failed) > 0:
 
-									min_sensitivity = config_dict['pipelines'][run_config_key]['min_sensitivity']
+			raise CommandError(f'Could not update {len(self.failed)} runs or run analyses: {", ".join(self.failed)}')
 
-									if created:
-										new_run_analysis_obj.min_sensitivity = min_sensitivity
+	def get_run_folder_state(self, raw_data):
+		"""
+		Returns the sample sheet and run_copy_complete.txt mtimes of a run folder which is ready to add, otherwise None.
 
-								except:
+		Only reads the filesystem so it can be used from several threads.
 
-									raise Exception ("ERROR: Sensitivity not in config file")
+		"""
 
+		# skip non directory items
+		if raw_data.is_dir() == False:
+			return None
 
-							if 'titv' in checks_to_try_dict:
+		sample_sheet = raw_data.joinpath('SampleSheet.csv')
 
-								try:
+		# skip if no sample sheet
+		if sample_sheet.exists() == False:
 
-									min_titv =  config_dict['pipelines'][run_config_key]['min_titv']
-									max_titv =  config_dict['pipelines'][run_config_key]['max_titv']
+			logger.info(f'Could not find sample sheet for {raw_data}')
+			return None
 
-									if created:
+		# skip if we don't have marker file
+		copy_complete = raw_data.joinpath('run_copy_complete.txt')
 
-										new_run_analysis_obj.min_titv = min_titv
-										new_run_analysis_obj.max_titv = max_titv
+		if copy_complete.exists() == False:
 
-								except:
-									raise Exception ("ERROR: Titv values not in config file")
+			return None
 
+		return sample_sheet.stat().st_mtime, copy_complete.stat().st_mtime
 
-							if 'coverage' in checks_to_try_dict:
+	def list_run_folders(self, raw_data_dir):
+		"""
+		Returns (run folder, state) for each run folder in a raw data directory which is ready to add
+		"""
 
-								try:
+		run_folders = []
 
-									min_coverage = config_dict['pipelines'][run_config_key]['min_coverage']
+		with timing.stage('discovery', raw_data_dir=str(raw_data_dir)):
 
-									if created:
+			for raw_data in Path(raw_data_dir).glob('*/'):
 
-										new_run_analysis_obj.min_coverage = min_coverage
+				run_folder_state = self.get_run_folder_state(raw_data)
 
-								except:
+				if run_folder_state is not None:
 
-									raise Exception ("ERROR: Coverage values not in config file")
+					run_folders.append((raw_data, run_folder_state))
 
+		return run_folders
 
+	def scan_run_folders(self, raw_data_dirs, config):
+		"""
+		Add the run folders in several raw data directories.
 
-							if 'reads_tso500' in checks_to_try_dict:
+		The directories are listed concurrently, the runs are added to the database by this thread \
+		while the other directories are still being listed.
 
-								try:
+		"""
 
-									min_on_target_reads = config_dict['pipelines'][run_config_key]['min_on_target_reads']
+		with ThreadPoolExecutor(max_workers=len(raw_data_dirs)) as executor:
 
-									if created:
+			for run_folders in executor.map(self.list_run_folders, raw_data_dirs):
 
-										new_run_analysis_obj.min_on_target_reads = min_on_target_reads
+				for raw_data, run_folder_state in run_folders:
 
-								except:
+					self.add_run_folder(raw_data, run_folder_state, config)
 
-									raise Exception ("ERROR: TSO500 reads not in config file")
+	def scan_run_folder(self, raw_data, config):
+		"""
+		Add a run folder to the database if it is ready and has changed since the last scan.
 
+		"""
 
-							if 'relatedness' in checks_to_try_dict:
+		run_folder_state = self.get_run_folder_state(raw_data)
 
-								try:
+		if run_folder_state is not None:
 
-									min_relatedness_parents = config_dict['pipelines'][run_config_key]['min_relatedness_parents']
-									max_relatedness_unrelated = config_dict['pipelines'][run_config_key]['max_relatedness_unrelated']
-									max_relatedness_between_parents = config_dict['pipelines'][run_config_key]['max_relatedness_between_parents']
-									max_child_parent_relatedness = config_dict['pipelines'][run_config_key]['max_child_parent_relatedness']
+			self.add_run_folder(raw_data, run_folder_state, config)
 
-									if created:
-										new_run_analysis_obj.min_relatedness_parents = min_relatedness_parents
-										new_run_analysis_obj.max_relatedness_unrelated = max_relatedness_unrelated
-										new_run_analysis_obj.max_relatedness_between_parents = max_relatedness_between_parents
-										new_run_analysis_obj.max_child_parent_relatedness = max_child_parent_relatedness
+	def add_run_folder(self, raw_data, run_folder_state, config):
 
-								except:
+		run_id = raw_data.name
 
-									raise Exception ("ERROR: Relatedness values not in config file")
+		sample_sheet_mtime, copy_complete_mtime = run_folder_state
 
+		# skip runs which are no longer watched and have not changed since the last scan
+		scan_state = self.scan_states.get(str(raw_data))
 
-							if 'ntc_contamination_TSO500' in checks_to_try_dict:
+		if scan_state is not None and run_id not in self.watched_runs and scan_state.is_unchanged(sample_sheet_mtime, copy_complete_mtime):
 
-								try:
+			return
 
-									max_ntc_contamination = config_dict['pipelines'][run_config_key]['max_ntc_contamination']
+		# each run is added in its own transaction, the scan state saved with it is the checkpoint
+		try:
 
-									if created:
+			with timing.stage('add_run', run=run_id), transaction.atomic():
 
-										new_run_analysis_obj.max_ntc_contamination = max_ntc_contamination
+				self.add_run(raw_data, run_id, config, self.existing_runs, self.dimension_cache, sample_sheet_mtime, copy_complete_mtime)
 
-								except:
+		except Exception as e:
 
-									raise Exception ("ERROR: max_ntc_contamination not in config file")
-								
-							if 'max_cnv_calls' in checks_to_try_dict:
+			logger.exception(e)
+			logger.error(f'Could not add run {run_id}, it will be retried on the next update')
+			self.failed.append(run_id)
 
-								try:
+			# objects created in the rolled back transaction no longer exist
+			self.dimension_cache.clear()
 
-									max_cnvs_called_cutoff = config_dict['pipelines'][run_config_key]['max_cnvs_called_cutoff']
+			return
 
-									if created:
+		self.existing_runs.add(run_id)
 
-										new_run_analysis_obj.max_cnv_calls = max_cnvs_called_cutoff
-								
-								except:
+	def check_run_analyses(self, config, workers, run_analysis_pks=None):
+		"""
+		Check the demultiplexing and pipeline results of the watched run analyses and save any new metrics.
 
-									raise Exception("ERROR: max_cnv_calls_cutoff not in config file")
-									
-							if 'cnv_call_range' in checks_to_try_dict:
+		"""
 
-								try:
+		# Loop through existing run analysis objects
+		existing_run_analyses = RunAnalysis.objects.filter(watching = True).select_related('run', 'pipeline', 'analysis_type')
 
-									max_cnvs_called_cutoff = config_dict['pipelines'][run_config_key]['max_cnvs_called_cutoff']
-									min_cnvs_called_cutoff = config_dict['pipelines'][run_config_key]['min_cnvs_called_cutoff']
+		if run_analysis_pks is not None:
 
-									if created:
+			existing_run_analyses = existing_run_analyses.filter(pk__in = run_analysis_pks)
 
-										new_run_analysis_obj.max_cnv_calls = max_cnvs_called_cutoff
-										new_run_analysis_obj.min_cnv_calls = min_cnvs_called_cutoff
+		# the sample analyses of every watched run analysis in one query
+		watched_sample_analyses = {}
 
-								except:
+		for sample_analysis in SampleAnalysis.objects.filter(run_analysis__in = existing_run_analyses).order_by('pk'):
 
-									raise Exception ("ERROR: Min or Max CNVs called cutoff not in config file")
-									
-							if 'min_average_coverage' == key:
-							
-								try:
-									min_average_coverage_cutoff = config_dict['pipelines'][run_config_key]['min_average_coverage']
+			watched_sample_analyses.setdefault(sample_analysis.run_analysis_id, []).append(sample_analysis)
 
-									if created:
+		run_analyses = {}
+		tasks = []
 
-										new_run_analysis_obj.min_average_coverage_cutoff = min_average_coverage_cutoff
+		for run_analysis in existing_run_analyses:
 
-								except:
+			sample_analyses = watched_sample_analyses.get(run_analysis.pk, [])
 
-									raise Exception ("ERROR: Min Average Coverage cutoff not in config file")
-								
-							if 'pct_on_target' in checks_to_try_dict:
+			run_analyses[run_analysis.pk] = (run_analysis, sample_analyses)
+			tasks.append(management_utils.make_run_analysis_task(run_analysis, sample_analyses))
 
-								try:
+		failed = self.failed
 
-									min_pct_on_target = config_dict['pipelines'][run_config_key]['min_pct_on_target']
+		# check results and parse metrics in worker processes, only the parent writes to the database
+		if workers > 1 and len(tasks) > 1:
 
-									if created:
+			with ProcessPoolExecutor(max_workers=workers, initializer=monitoring.setup_worker, initargs=(parse_cache.cache_dir,)) as executor:
 
-										new_run_analysis_obj.min_aligned_reads_warning = min_pct_on_target
+				futures = {executor.submit(monitoring.check_run_analysis, task, config): task['pk'] for task in tasks}
 
-								except:
+				for future in as_completed(futures):
 
+					run_analysis, sample_analyses = run_analyses[futures[future]]
 
+					try:
 
-									raise Exception ("ERROR: min_pct_on_target not in config file")
+						result = future.result()
 
-					new_run_analysis_obj.save()
+					except Exception as e:
 
-			# Loop through existing run analysis objects
-			existing_run_analyses = RunAnalysis.objects.filter(watching = True)
+						logger.exception(e)
+						logger.error(f'Could not check results for {run_analysis}, it will be retried on the next update')
+						failed.append(str(run_analysis))
+						continue
 
-			for run_analysis in existing_run_analyses:
+					timing.add(result['timings'])
 
-				# make IlluminaQC object
-				run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
+					self.save_result(result, run_analysis, sample_analyses, failed)
 
-				samples = SampleAnalysis.objects.filter(run = run_analysis.run,
-												 pipeline= run_analysis.pipeline,
-												 analysis_type= run_analysis.analysis_type)
+		else:
 
+			for task in tasks:
 
-				sample_ids = [sample.sample.sample_id for sample in samples]
+				run_analysis, sample_analyses = run_analyses[task['pk']]
 
-				# have we configured a fastq folder
 				try:
 
-					has_fastqs = config_dict['pipelines'][run_config_key].get('fastq_dir')
+					result = monitoring.check_run_analysis(task, config)
 
-				except:
-
-					has_fastqs = None
+				except Exception as e:
 
-				try:
+					logger.exception(e)
+					logger.error(f'Could not check results for {run_analysis}, it will be retried on the next update')
+					failed.append(str(run_analysis))
+					continue
 
-					results_dir = config_dict['pipelines'][run_config_key]['results_dir']
+				timing.add(result['timings'])
 
-				except:
+				self.save_result(result, run_analysis, sample_analyses, failed)
 
-					logger.warn(f'No results directory configured for this pipeline {run_config_key}')
-					results_dir = '/data/results/'
+	def save_result(self, result, run_analysis, sample_analyses, failed):
+		"""
+		Save the result for a run analysis in its own transaction.
 
+		The run analysis state saved with its metrics is the checkpoint - \
+		if the transaction fails the metrics are loaded again on the next update.
 
+		"""
 
-				if has_fastqs is not None:
-					
-					fastq_data_dir = config_dict['pipelines'][run_config_key]['fastq_dir']
-					run_fastq_dir = Path(fastq_data_dir).joinpath(run_analysis.run.run_id)
+		try:
 
-				else:
+			with timing.stage('save_result', run=run_analysis.run_id, pipeline=run_analysis.pipeline_id + '-' + run_analysis.analysis_type_id), transaction.atomic():
 
-					run_fastq_dir = 'test'
+				management_utils.save_run_analysis_result(result, run_analysis, sample_analyses)
 
-				if 'TSO500' in run_config_key:
+		except Exception as e:
 
-					run_data_dir = Path(results_dir).joinpath(run_analysis.run.run_id+"/TSO500/")
+			logger.exception(e)
+			logger.error(f'Could not save results for {run_analysis}, it will be retried on the next update')
+			failed.append(str(run_analysis))
 
-				elif 'ctdna' in run_config_key:
-				
-					run_data_dir = Path(results_dir).joinpath(run_analysis.run.run_id+"/tso500_ctdna/")
-				
-				else:
+	def add_run(self, raw_data, run_id, config, existing_runs, dimension_cache, sample_sheet_mtime, copy_complete_mtime):
+		"""
+		Add a run folder's run, sample analyses and run analyses to the database.
 
-					run_data_dir = Path(results_dir).joinpath(run_analysis.run.run_id, run_analysis.analysis_type.analysis_type_id)
+		"""
 
-				lanes = run_analysis.run.lanes
+		sample_sheet = raw_data.joinpath('SampleSheet.csv')
 
-				try:
+		run_obj, created = Run.objects.get_or_create(run_id=run_id)
+	
+		if run_id not in existing_runs:
 
-					min_fastq_size = config_dict['pipelines'][run_config_key]['min_fastq_size']
+			logger.info (f'A new run has been detected: {run_id}')
 
-				except:
+			# parse runlog data 
+			run_info = raw_data.joinpath('RunInfo.xml')
+			run_parameters = raw_data.joinpath('runParameters.xml')
 
-					min_fastq_size = 100000
+			if run_parameters.exists() == False:
 
-				if 'Dragen' in run_config_key:
+				run_parameters = raw_data.joinpath('RunParameters.xml')
 
-					illumina_qc = quality_pipelines.DragenQC(fastq_dir= run_fastq_dir,
-										sample_names = sample_ids,
-										n_lanes = lanes,
-										analysis_type = run_analysis.analysis_type.analysis_type_id,
-										min_fastq_size = min_fastq_size,
-										run_id = run_analysis.run.run_id)
+				if run_parameters.exists() == False:
 
+					logger.warn (f'Can\'t find run parameters file for {run_id}')
+					return
 
-				if 'TSO500' in run_config_key:
+			if run_info.exists() == False or run_parameters.exists() == False:
 
-					illumina_qc = quality_pipelines.TSO500_demultiplex(fastq_dir= run_fastq_dir,
-											sample_names = sample_ids,
-											n_lanes = lanes,
-											analysis_type = run_analysis.analysis_type.analysis_type_id,
-											min_fastq_size = min_fastq_size,
-											run_id = run_analysis.run.run_id)
+				logger.warn (f'Can\'t find required XML files for {run_id}')
+				return
 
-				else:
+			# add runlog stats to database
+			with timing.stage('run_log', run=run_id):
 
-					illumina_qc = quality_pipelines.IlluminaQC(fastq_dir= run_fastq_dir,
-											sample_names = sample_ids,
-											n_lanes = lanes,
-											analysis_type = run_analysis.analysis_type.analysis_type_id,
-											min_fastq_size = min_fastq_size,
-											run_id = run_analysis.run.run_id)
+				interop_data = management_utils.add_run_log_info(run_info, run_parameters, run_obj, raw_data)
 
+		else:
 
-				# if we have not given a directory for fastqs then pretend everything is ok
-				if has_fastqs == None:
+			interop_data = None
+		
+		try:
+			# parse sample sheet
+			with timing.stage('sample_sheet_parse', run=run_id):
 
-					has_completed = True
-					is_valid = True
+				sample_sheet_data = parsers.sample_sheet_parser(sample_sheet)
 
-				else:
+		except Exception as e:
 
-					has_completed = illumina_qc.demultiplex_run_is_complete()
+			logger.exception(e)
 
-					is_valid = illumina_qc.demultiplex_run_is_valid()
+			logger.warn(f'Could not parse sample sheet for run {run_id}')
+			return
+		
+		# work out the pipeline, panel and worksheet for each sample
+		sample_details = {}
 
-				if run_analysis.demultiplexing_completed == False and has_completed == True:
+		for sample in sample_sheet_data:
 
-					if is_valid == True:
+			pipeline = sample_sheet_data[sample]['pipelineName']
+			pipeline_version = sample_sheet_data[sample]['pipelineVersion']
 
-						logger.info(f'Run {run_analysis} {run_analysis.analysis_type.analysis_type_id} has now completed demultiplexing')
-						
-					else:
+			if pipeline == 'TSO500':
 
-						logger.info(f'Run {run_analysis} {run_analysis.analysis_type.analysis_type_id} has now failed demultiplexing')
-						run_analysis.demultiplexing_completed = has_completed
-						run_analysis.demultiplexing_valid = is_valid
-						run_analysis.save()
-						
-				run_analysis.demultiplexing_completed = has_completed
-				run_analysis.demultiplexing_valid = is_valid
-				run_analysis.save()
+				panel = sample_sheet_data[sample]['Sample_Type']
+				panel = 'TSO500_' + panel
 				
-				if 'SomaticAmplicon' in run_analysis.pipeline.pipeline_id:
-
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
-
-					if run_config_key not in config_dict['pipelines']:
-
-						somatic_amplicon = somatic_pipelines.SomaticAmplicon(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id
-															)
-					else:
-
-						sample_expected_files = config_dict['pipelines'][run_config_key]['sample_expected_files']
-						sample_not_expected_files = config_dict['pipelines'][run_config_key]['sample_not_expected_files']
-						run_expected_files = config_dict['pipelines'][run_config_key]['run_expected_files']
-						run_not_expected_files = config_dict['pipelines'][run_config_key]['run_not_expected_files']
-
-						somatic_amplicon = somatic_pipelines.SomaticAmplicon(results_dir = run_data_dir,
-																sample_names = sample_ids,
-																run_id = run_analysis.run.run_id,
-																sample_expected_files = sample_expected_files,
-																sample_not_expected_files = sample_not_expected_files,
-																run_expected_files = run_expected_files,
-																run_not_expected_files = run_not_expected_files
-																)
-
-
-					for sample in sample_ids:
-
-						sample_complete = somatic_amplicon.sample_is_complete(sample)
-						sample_valid = somatic_amplicon.sample_is_valid(sample)
-
-						sample_obj = Sample.objects.get(sample_id = sample)
-
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline,
-																		analysis_type = run_analysis.analysis_type)
-
-						if sample_analysis_obj.results_completed == False and sample_complete == True:
-
-							if sample_valid == True:
-
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has finished sample level SomaticAmplicon successfully.')
-
-							else:
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has failed sample level SomaticAmplicon.')
-
-						elif sample_analysis_obj.results_valid == False and sample_valid == True and sample_complete == True:
-
-							logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now completed successfully.')
-
-			
-						sample_analysis_obj.results_completed = sample_complete
-						sample_analysis_obj.results_valid = sample_valid
-						sample_analysis_obj.save()
-
-					run_complete = somatic_amplicon.run_is_complete()
-					run_valid = somatic_amplicon.run_is_valid()
-
-					if run_analysis.results_completed == False and run_complete == True:
-
-						if run_valid == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = somatic_amplicon.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting hs metrics data into db for run {run_analysis.run.run_id}')
-							hs_metrics_dict = somatic_amplicon.get_hs_metrics()
-							management_utils.add_hs_metrics(hs_metrics_dict, run_analysis)
-
-							logger.info (f'Putting depth metrics data into db for run {run_analysis.run.run_id}')
-							depth_metrics_dict = somatic_amplicon.get_depth_metrics()
-							management_utils.add_depth_of_coverage_metrics(depth_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant count metrics data into db for run {run_analysis.run.run_id}')
-							variant_count_metrics_dict = somatic_amplicon.get_variant_count()
-							management_utils.add_variant_count_metrics(variant_count_metrics_dict, run_analysis)
-
-						else:
-
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
-
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
-
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = somatic_amplicon.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting hs metrics data into db for run {run_analysis.run.run_id}')
-							hs_metrics_dict = somatic_amplicon.get_hs_metrics()
-							management_utils.add_hs_metrics(hs_metrics_dict, run_analysis)
-
-							logger.info (f'Putting depth metrics data into db for run {run_analysis.run.run_id}')
-							depth_metrics_dict = somatic_amplicon.get_depth_metrics()
-							management_utils.add_depth_of_coverage_metrics(depth_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant count metrics data into db for run {run_analysis.run.run_id}')
-							variant_count_metrics_dict = somatic_amplicon.get_variant_count()
-							management_utils.add_variant_count_metrics(variant_count_metrics_dict, run_analysis)
-
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
-
-					run_analysis.save()
-
-				# for germline enrichment
-				elif 'DragenGE' in run_analysis.pipeline.pipeline_id:
-
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
-
-					try:
-
-						sample_expected_files = config_dict['pipelines'][run_config_key]['sample_expected_files']
-						post_sample_files = config_dict['pipelines'][run_config_key]['post_sample_files']
-						sample_not_expected_files = config_dict['pipelines'][run_config_key]['sample_not_expected_files']
-						run_expected_files = config_dict['pipelines'][run_config_key]['run_expected_files']
-						run_not_expected_files = config_dict['pipelines'][run_config_key]['run_not_expected_files']
-
-						dragen_ge = dragen_pipelines.DragenGE(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id,
-															sample_expected_files = sample_expected_files,
-															sample_not_expected_files = sample_not_expected_files,
-															run_expected_files = run_expected_files,
-															run_not_expected_files = run_not_expected_files,
-															post_sample_files = post_sample_files
-															)
-
-					except:
-
-						dragen_ge = dragen_pipelines.DragenGE(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id
-															)
-
-					# just say all samples are valid - we only check run level here
-					for sample in sample_ids:
-
-						sample_obj = Sample.objects.get(sample_id = sample)
-
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline,
-																		analysis_type = run_analysis.analysis_type)
-
-
-						sample_analysis_obj.results_completed = True
-						sample_analysis_obj.results_valid = True
-						sample_analysis_obj.save()
-
-
-					run_complete = dragen_ge.run_is_complete()
-					run_valid = dragen_ge.run_is_valid()
-					display_cnv_qc = dragen_ge.display_cnv_qc_metrics()
-
-					if run_analysis.results_completed == False and run_complete == True:
-
-						if run_valid == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting coverage metrics into db for run {run_analysis.run.run_id}')
-							coverage_metrics_dict = dragen_ge.get_coverage_metrics()
-							management_utils.add_custom_coverage_metrics(coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting contamination metrics into db for run {run_analysis.run.run_id}')
-							contamination_metrics_dict = dragen_ge.get_contamination()
-							management_utils.add_contamination_metrics(contamination_metrics_dict, run_analysis)
-														
-							logger.info (f'Putting sex metrics into db for run {run_analysis.run.run_id}')
-							sex_dict = dragen_ge.get_sex_metrics()
-							management_utils.add_sex_metrics(sex_dict, run_analysis, 'sex')
-
-							logger.info (f'Putting alignment metrics into db for run {run_analysis.run.run_id}')
-							alignment_metrics_dict = dragen_ge.get_alignment_metrics()
-							management_utils.add_dragen_alignment_metrics(alignment_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant calling metrics into db for run {run_analysis.run.run_id}')
-							variant_calling_metrics_dict = dragen_ge.get_variant_calling_metrics()
-							management_utils.add_dragen_variant_calling_metrics(variant_calling_metrics_dict, run_analysis)
-
-							logger.info (f'Putting sensitivity metrics into db for run {run_analysis.run.run_id}')
-							sensitivity_metrics = dragen_ge.get_sensitivity()
-							management_utils.add_sensitivity_metrics(sensitivity_metrics, run_analysis)
-							
-							if display_cnv_qc:
-								logger.info (f'Putting CNV QC metrics into db for run {run_analysis.run.run_id}')
-								run_analysis.display_cnv_qc_metrics = True
-								run_analysis.save()
-								cnv_qc_metrics = dragen_ge.get_postprocessing_cnv_qc_metrics()
-								management_utils.add_exome_postprocessing_cnv_qc_metrics(cnv_qc_metrics, run_analysis)
-							else:
-								logger.info (f'No CNV metrics for this run {run_analysis.run.run_id}')
-
-							logger.info (f'Putting relatedness metrics into db for run {run_analysis.run.run_id}')
-							parsed_relatedness, parsed_relatedness_comment = dragen_ge.get_relatedness_metrics(run_analysis.min_relatedness_parents,
-																												run_analysis.max_relatedness_unrelated,
-																												run_analysis.max_relatedness_between_parents,
-																												run_analysis.max_child_parent_relatedness)
-
-							management_utils.add_relatedness_metrics(parsed_relatedness, parsed_relatedness_comment, run_analysis)
-
-						else:
-
-							logger.info (f'Run {run_analysis.run.run_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
-
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting coverage metrics into db for run {run_analysis.run.run_id}')
-							coverage_metrics_dict = dragen_ge.get_coverage_metrics()
-							management_utils.add_custom_coverage_metrics(coverage_metrics_dict, run_analysis)
-							
-							logger.info (f'Putting contamination metrics into db for run {run_analysis.run.run_id}')
-							contamination_metrics_dict = dragen_ge.get_contamination()
-							management_utils.add_contamination_metrics(contamination_metrics_dict, run_analysis)
-
-							logger.info (f'Putting sex metrics into db for run {run_analysis.run.run_id}')
-							sex_dict = dragen_ge.get_sex_metrics()
-							management_utils.add_sex_metrics(sex_dict, run_analysis, 'sex')
-
-							logger.info (f'Putting alignment metrics into db for run {run_analysis.run.run_id}')
-							alignment_metrics_dict = dragen_ge.get_alignment_metrics()
-							management_utils.add_dragen_alignment_metrics(alignment_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant calling metrics into db for run {run_analysis.run.run_id}')
-							variant_calling_metrics_dict = dragen_ge.get_variant_calling_metrics()
-							management_utils.add_dragen_variant_calling_metrics(variant_calling_metrics_dict, run_analysis)
-
-							logger.info (f'Putting sensitivity metrics into db for run {run_analysis.run.run_id}')
-							sensitivity_metrics = dragen_ge.get_sensitivity()
-							management_utils.add_sensitivity_metrics(sensitivity_metrics, run_analysis)
-
-							if display_cnv_qc:
-								logger.info (f'Putting CNV QC metrics into db for run {run_analysis.run.run_id}')
-								run_analysis.display_cnv_qc_metrics = True
-								run_analysis.save()
-								cnv_qc_metrics = dragen_ge.get_postprocessing_cnv_qc_metrics()
-								management_utils.add_exome_postprocessing_cnv_qc_metrics(cnv_qc_metrics, run_analysis)
-							else:
-								logger.info (f'No CNV metrics for this run {run_analysis.run.run_id}')
-
-							logger.info (f'Putting relatedness metrics into db for run {run_analysis.run.run_id}')
-							parsed_relatedness, parsed_relatedness_comment = dragen_ge.get_relatedness_metrics(run_analysis.min_relatedness_parents,
-																												run_analysis.max_relatedness_unrelated,
-																												run_analysis.max_relatedness_between_parents,
-																												run_analysis.max_child_parent_relatedness)
-
-							management_utils.add_relatedness_metrics(parsed_relatedness, parsed_relatedness_comment, run_analysis)
-
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
-
-					run_analysis.save()
-
-
-				# for germline enrichment
-				elif 'DragenWGS' in run_analysis.pipeline.pipeline_id:
-
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
-
-					try:
-
-						sample_expected_files = config_dict['pipelines'][run_config_key]['sample_expected_files']
-						post_sample_files = config_dict['pipelines'][run_config_key]['post_sample_files']
-						sample_not_expected_files = config_dict['pipelines'][run_config_key]['sample_not_expected_files']
-						run_expected_files = config_dict['pipelines'][run_config_key]['run_expected_files']
-						run_not_expected_files = config_dict['pipelines'][run_config_key]['run_not_expected_files']
-
-						dragen_wgs = dragen_pipelines.DragenWGS(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id,
-															sample_expected_files = sample_expected_files,
-															sample_not_expected_files = sample_not_expected_files,
-															run_expected_files = run_expected_files,
-															run_not_expected_files = run_not_expected_files,
-															post_sample_files = post_sample_files
-															)
-
-					except:
-
-						dragen_wgs = dragen_pipelines.DragenWGS(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id
-															)
-
-					for sample in sample_ids:
-
-						sample_complete = dragen_wgs.sample_is_complete(sample)
-						sample_valid = dragen_wgs.sample_is_valid(sample)
-
-						sample_obj = Sample.objects.get(sample_id = sample)
-
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline)
-
-						if sample_analysis_obj.results_completed == False and sample_complete == True:
-
-							if sample_valid == True:
-
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} has finished DragenWGS pipelines successfully.')
-
-							else:
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} has failed DragenWGS pipeline.')
-
-						elif sample_analysis_obj.results_valid == False and sample_valid == True and sample_complete == True:
-
-							logger.info (f'Sample {sample} on run {run_analysis.run.run_id} has now completed successfully.')
-
-
-						sample_analysis_obj.results_completed = sample_complete
-						sample_analysis_obj.results_valid = sample_valid
-						sample_analysis_obj.save()
-
-					run_complete = dragen_wgs.run_and_samples_complete()
-					run_valid = dragen_wgs.run_and_samples_valid()
-
-					if run_analysis.results_completed == False and run_complete == True:
-
-						if run_valid == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting alignment metrics into db for run {run_analysis.run.run_id}')
-							alignment_metrics_dict = dragen_wgs.get_alignment_metrics()
-							management_utils.add_dragen_alignment_metrics(alignment_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant calling metrics into db for run {run_analysis.run.run_id}')
-							variant_calling_metrics_dict = dragen_wgs.get_variant_calling_metrics()
-							management_utils.add_dragen_variant_calling_metrics(variant_calling_metrics_dict, run_analysis)
-
-							logger.info (f'Putting relatedness metrics into db for run {run_analysis.run.run_id}')
-							parsed_relatedness, parsed_relatedness_comment = dragen_wgs.get_relatedness_metrics(run_analysis.min_relatedness_parents,
-																												run_analysis.max_relatedness_unrelated,
-																												run_analysis.max_relatedness_between_parents,
-																												run_analysis.max_child_parent_relatedness)
-
-							management_utils.add_relatedness_metrics(parsed_relatedness, parsed_relatedness_comment, run_analysis)
-
-							logger.info (f'Putting WGS metrics into db for run {run_analysis.run.run_id}')
-							wgs_coverage_metrics_dict = dragen_wgs.get_wgs_mapping_metrics()
-							management_utils.add_dragen_wgs_coverage_metrics(wgs_coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting exonic coverage metrics into db for run {run_analysis.run.run_id}')
-							exonic_coverage_metrics_dict = dragen_wgs.get_exonic_mapping_metrics()
-							management_utils.add_dragen_exonic_coverage_metrics(exonic_coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting ploidy metrics into db for run {run_analysis.run.run_id}')
-							dragen_ploidy_metrics_dict = dragen_wgs.get_ploidy_metrics()
-							management_utils.add_dragen_ploidy_metrics(dragen_ploidy_metrics_dict, run_analysis)
-							
-							logger.info(f'Putting CNV metrics into db for run {run_analysis.run.run_id}')
-							dragen_cnv_metrics_dict = dragen_wgs.get_cnv_metrics()
-							management_utils.add_dragen_cnv_metrics(dragen_cnv_metrics_dict, run_analysis)
-
-						else:
-
-							logger.info (f'Run {run_analysis.run.run_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
-
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting alignment metrics into db for run {run_analysis.run.run_id}')
-							alignment_metrics_dict = dragen_wgs.get_alignment_metrics()
-							management_utils.add_dragen_alignment_metrics(alignment_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant calling metrics into db for run {run_analysis.run.run_id}')
-							variant_calling_metrics_dict = dragen_wgs.get_variant_calling_metrics()
-							management_utils.add_dragen_variant_calling_metrics(variant_calling_metrics_dict, run_analysis)
-
-							
-							logger.info (f'Putting relatedness metrics into db for run {run_analysis.run.run_id}')
-							parsed_relatedness, parsed_relatedness_comment = dragen_wgs.get_relatedness_metrics(run_analysis.min_relatedness_parents,
-																												run_analysis.max_relatedness_unrelated,
-																												run_analysis.max_relatedness_between_parents,
-																												run_analysis.max_child_parent_relatedness)
-							management_utils.add_relatedness_metrics(parsed_relatedness, parsed_relatedness_comment, run_analysis)
-
-							logger.info (f'Putting WGS metrics into db for run {run_analysis.run.run_id}')
-							wgs_coverage_metrics_dict = dragen_wgs.get_wgs_mapping_metrics()
-							management_utils.add_dragen_wgs_coverage_metrics(wgs_coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting exonic coverage metrics into db for run {run_analysis.run.run_id}')
-							exonic_coverage_metrics_dict = dragen_wgs.get_exonic_mapping_metrics()
-							management_utils.add_dragen_exonic_coverage_metrics(exonic_coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting ploidy metrics into db for run {run_analysis.run.run_id}')
-							dragen_ploidy_metrics_dict = dragen_wgs.get_ploidy_metrics()
-							management_utils.add_dragen_ploidy_metrics(dragen_ploidy_metrics_dict, run_analysis)
-							
-							logger.info(f'Putting CNV metrics into db for run {run_analysis.run.run_id}')
-							dragen_cnv_metrics_dict = dragen_wgs.get_cnv_metrics()
-							management_utils.add_dragen_cnv_metrics(dragen_cnv_metrics_dict, run_analysis)
-
-
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
-
-					run_analysis.save()
-
-
-				# for nextflow piplines
-				elif 'nextflow' in run_analysis.pipeline.pipeline_id:
-
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
-
-					try:
-
-						nextflow = nextflow_pipelines.NextflowGermlineEnrichment(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id,
-															)
-
-					except:
-
-						nextflow = nextflow_pipelines.NextflowGermlineEnrichment(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id
-															)
-
-					# kust say all samples are valid - we only check run level here
-					for sample in sample_ids:
-
-						sample_obj = Sample.objects.get(sample_id = sample)
-
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline)
-
-
-						sample_analysis_obj.results_completed = True
-						sample_analysis_obj.results_valid = True
-						sample_analysis_obj.save()
-
-
-					run_complete = nextflow.run_is_complete()
-					run_valid = nextflow.run_is_valid()
-
-					if run_analysis.results_completed == False and run_complete == True:
-
-						if run_valid == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							# put qc here
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = nextflow.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-
-							logger.info(f'Putting hs metrics into db for run {run_analysis.run.run_id}')
-							hs_metrics_dict = nextflow.get_hs_metrics()
-							management_utils.add_hs_metrics(hs_metrics_dict, run_analysis)
-
-							logger.info (f'Putting duplication into db for run {run_analysis.run.run_id}')
-							duplication_metrics_dict = nextflow.get_duplication_metrics()
-							management_utils.add_duplication_metrics(duplication_metrics_dict, run_analysis)
-
-							logger.info (f'Putting contamination metrics into db for run {run_analysis.run.run_id}')
-							contamination_metrics_dict = nextflow.get_contamination()
-							management_utils.add_contamination_metrics(contamination_metrics_dict, run_analysis)
-
-							logger.info (f'Putting alignment metrics into db for run {run_analysis.run.run_id}')
-							alignment_metrics_dict = nextflow.get_alignment_metrics()
-							management_utils.add_alignment_metrics(alignment_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant calling metrics into db for run {run_analysis.run.run_id}')
-							variant_calling_metrics_dict = nextflow.get_variant_calling_metrics()
-							management_utils.add_variant_calling_metrics(variant_calling_metrics_dict, run_analysis)
-
-							logger.info (f'Putting insert metrics into db for run {run_analysis.run.run_id}')
-							insert_metrics_dict = nextflow.get_insert_metrics()
-							management_utils.add_insert_metrics(insert_metrics_dict, run_analysis)
-
-							logger.info (f'Putting coverage metrics into db for run {run_analysis.run.run_id}')
-							coverage_metrics_dict = nextflow.get_coverage_metrics()
-							management_utils.add_custom_coverage_metrics(coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting sex metrics into db for run {run_analysis.run.run_id}')
-							sex_dict = nextflow.get_sex_metrics()
-							management_utils.add_sex_metrics(sex_dict, run_analysis, 'sex')
-
-						else:
-
-							logger.info (f'Run {run_analysis.run.run_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
-
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-
-							# put qc here
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = nextflow.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-
-							logger.info(f'Putting hs metrics into db for run {run_analysis.run.run_id}')
-							hs_metrics_dict = nextflow.get_hs_metrics()
-							management_utils.add_hs_metrics(hs_metrics_dict, run_analysis)
-
-							logger.info (f'Putting duplication into db for run {run_analysis.run.run_id}')
-							duplication_metrics_dict = nextflow.get_duplication_metrics()
-							management_utils.add_duplication_metrics(duplication_metrics_dict, run_analysis)
-
-							logger.info (f'Putting contamination metrics into db for run {run_analysis.run.run_id}')
-							contamination_metrics_dict = nextflow.get_contamination()
-							management_utils.add_contamination_metrics(contamination_metrics_dict, run_analysis)
-
-							logger.info (f'Putting alignment metrics into db for run {run_analysis.run.run_id}')
-							alignment_metrics_dict = nextflow.get_alignment_metrics()
-							management_utils.add_alignment_metrics(alignment_metrics_dict, run_analysis)
-
-							logger.info (f'Putting variant calling metrics into db for run {run_analysis.run.run_id}')
-							variant_calling_metrics_dict = nextflow.get_variant_calling_metrics()
-							management_utils.add_variant_calling_metrics(variant_calling_metrics_dict, run_analysis)
-
-							logger.info (f'Putting insert metrics into db for run {run_analysis.run.run_id}')
-							insert_metrics_dict = nextflow.get_insert_metrics()
-							management_utils.add_insert_metrics(insert_metrics_dict, run_analysis)
-
-							logger.info (f'Putting coverage metrics into db for run {run_analysis.run.run_id}')
-							coverage_metrics_dict = nextflow.get_coverage_metrics()
-							management_utils.add_custom_coverage_metrics(coverage_metrics_dict, run_analysis)
-
-							logger.info (f'Putting sex metrics into db for run {run_analysis.run.run_id}')
-							sex_dict = nextflow.get_sex_metrics()
-							management_utils.add_sex_metrics(sex_dict, run_analysis, 'sex')
-
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
-
-					run_analysis.save()
-
-				# TSO500 RNA
-				elif 'TSO500' in run_analysis.pipeline.pipeline_id and 'RNA' in run_analysis.analysis_type.analysis_type_id:
-					
-					run_id=run_analysis.run.run_id
-					dna_or_rna="RNA"
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
-
-					if run_config_key not in config_dict['pipelines']:
-
-						tso500 = TSO500_pipeline.TSO500_RNA(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															sample_valid_files=None,
-															run_id = run_analysis.run.run_id,
-															sample_completed_files = ['*_fusion_check.csv'],
-															run_completed_files = ['contamination-*.csv'],
-															run_expected_files = ['RNA_QC_combined.txt', 'contamination-*.csv' ,'completed_samples.txt'],
-															metrics_file = ['RNA_QC_combined.txt']
-
-															)
-					else:
-
-						sample_completed_files = config_dict['pipelines'][run_config_key]['sample_completed_files']
-						run_completed_files = config_dict['pipelines'][run_config_key]['run_completed_files']
-						run_expected_files = config_dict['pipelines'][run_config_key]['run_expected_files']
-						metrics_file = config_dict['pipelines'][run_config_key]['metrics_file']
-
-						tso500 = TSO500_pipeline.TSO500_RNA(results_dir = run_data_dir,
-    															sample_completed_files=sample_completed_files,
-    															sample_valid_files=None,
-    															run_completed_files=run_completed_files,
-    															run_expected_files=run_expected_files,
-    															metrics_file=metrics_file,
-																sample_names = sample_ids,
-																run_id = run_analysis.run.run_id
-																)
-
-					for sample in sample_ids:
-
-						sample_complete = tso500.sample_is_complete(sample)
-
-						sample_valid = tso500.sample_is_valid(sample)
-
-						sample_obj = Sample.objects.get(sample_id = sample)
-
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline,
-																		analysis_type = run_analysis.analysis_type)
-
-						if sample_analysis_obj.results_completed == False and sample_complete == True:
-
-							if sample_valid == True:
-
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has finished sample level TSO500 successfully.')
-
-							else:
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has failed sample level TSO500.')
-
-						elif sample_analysis_obj.results_valid == False and sample_valid == True and sample_complete == True:
-
-							logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now completed successfully.')
-
+			elif pipeline == 'tso500_ctdna':
 			
-						sample_analysis_obj.results_completed = sample_complete
-						sample_analysis_obj.results_valid = sample_valid
-						sample_analysis_obj.save()
-
-					run_complete = tso500.run_is_complete()
-					run_valid = tso500.run_is_valid()
-
-					if run_analysis.results_completed == False and run_complete == True:
+				panel = 'ctDNA'
 
-						if run_valid == True:
+			else:
 
-							logger.info (f'Run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
+				panel = sample_sheet_data[sample]['panel']					
 
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = tso500.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting reads data into db for run {run_analysis.run.run_id}')
-							reads_dict = tso500.get_reads()
-							management_utils.add_tso500_reads(reads_dict, run_analysis)
+			sex = sample_sheet_data[sample].get('sex', None)
 
-						else:
+			worksheet = sample_sheet_data[sample].get('Sample_Plate', 'Unknown')
 
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
+			sample_details[sample] = (pipeline + '-' + pipeline_version, panel, worksheet, sex)
 
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
+		# get or create the objects for the whole sample sheet at once
+		dimension_cache.get_many(Sample, sample_details.keys())
+		dimension_cache.get_many(Pipeline, [details[0] for details in sample_details.values()])
+		dimension_cache.get_many(AnalysisType, [details[1] for details in sample_details.values()])
+		dimension_cache.get_many(WorkSheet, [details[2] for details in sample_details.values()])
 
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
+		# index metrics need the samples so are added once they exist
+		if interop_data is not None:
 
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = tso500.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting reads data into db for run {run_analysis.run.run_id}')
-							reads_dict = tso500.get_reads()
-							management_utils.add_tso500_reads(reads_dict, run_analysis)
+			management_utils.add_interop_index_metrics(interop_data, run_obj, sample_details.keys())
 
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
+		# create a run analysis object for each pipeline and panel first so the sample analyses can be linked to them
+		run_analyses_to_create = set((details[0], details[1]) for details in sample_details.values())
+		run_analysis_objs = {}
 
-					run_analysis.save()
+		for run_analysis in run_analyses_to_create:
 
-				# TS500 DNA
-				elif 'TSO500' in run_analysis.pipeline.pipeline_id and 'DNA' in run_analysis.analysis_type.analysis_type_id:
+			pipeline = run_analysis[0]
+			analysis_type = run_analysis[1]
 
-					run_id=run_analysis.run.run_id
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
-					dna_or_rna=run_analysis.analysis_type.analysis_type_id
+			pipeline_obj = dimension_cache.get(Pipeline, pipeline)
+			analysis_type_obj = dimension_cache.get(AnalysisType, analysis_type)
 
-					if run_config_key not in config_dict['pipelines']:
+			run_config = config.get(pipeline_obj.pipeline_id + '-' + analysis_type_obj.analysis_type_id)
 
-						tso500 = TSO500_pipeline.TSO500_DNA(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id,
-															sample_completed_files=['*variants.tsv', '*_coverage.json'],
-															sample_valid_files= ['DNA_QC_combined.txt'],
-															run_completed_files = ['contamination-*.csv'],
-															run_expected_files = ['DNA_QC_combined.txt','completed_samples.txt'],
-															metrics_file =['DNA_QC_combined.txt']
+			new_run_analysis_obj, created = RunAnalysis.objects.get_or_create(run = run_obj,
+																	pipeline = pipeline_obj,
+																	analysis_type = analysis_type_obj)
 
-															)
-					else:
+			if run_config is not None and run_config.qc_checks is not None:
 
-						sample_completed_files = config_dict['pipelines'][run_config_key]['sample_completed_files']
-						sample_valid_files = config_dict['pipelines'][run_config_key]['sample_valid_files']
-						run_expected_files = config_dict['pipelines'][run_config_key]['run_expected_files']
-						run_completed_files = config_dict['pipelines'][run_config_key]['run_completed_files']
-						metrics_file = config_dict['pipelines'][run_config_key]['metrics_file']
+				new_run_analysis_obj.auto_qc_checks = run_config.get_auto_qc_checks()
+				new_run_analysis_obj.start_date = datetime.datetime.now()
 
-						tso500 = TSO500_pipeline.TSO500_DNA(results_dir = run_data_dir,
-    															sample_completed_files=sample_completed_files,
-    															sample_valid_files=sample_valid_files,
-    															run_completed_files=run_completed_files,
-    															run_expected_files=run_expected_files,
-    															metrics_file= metrics_file,
-																run_id = run_analysis.run.run_id,
-																sample_names=sample_ids,
-																)
+				# thresholds are only set when the run analysis is first created
+				if created:
 
-					for sample in sample_ids:
+					for field, value in run_config.run_thresholds.items():
 
-						sample_complete = tso500.sample_is_complete(sample)
+						setattr(new_run_analysis_obj, field, value)
 
-						sample_valid = tso500.sample_is_valid(sample)
+			new_run_analysis_obj.save()
 
-						sample_obj = Sample.objects.get(sample_id = sample)
+			run_analysis_objs[run_analysis] = new_run_analysis_obj
 
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline,
-																		analysis_type_id=run_analysis.analysis_type)
+		existing_sample_analyses = {}
 
-						if sample_analysis_obj.results_completed == False and sample_complete == True:
+		for sample_analysis in SampleAnalysis.objects.filter(run = run_obj):
 
-							if sample_valid == True:
+			existing_sample_analyses[(sample_analysis.sample_id, sample_analysis.pipeline_id, sample_analysis.analysis_type_id, sample_analysis.worksheet_id)] = sample_analysis
 
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has finished sample level TSO500 successfully.')
+		# pipelines with a new, changed or newly linked sample analysis
+		changed_pipelines = set()
 
-							else:
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has failed sample level TSO500.')
+		# create sample analysis objects for each sample
 
-						elif sample_analysis_obj.results_valid == False and sample_valid == True and sample_complete == True:
+		for sample in sample_sheet_data:
 
-							logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now completed successfully.')
+			pipeline_and_version, panel, worksheet, sex = sample_details[sample]
 
-			
-						sample_analysis_obj.results_completed = sample_complete
-						sample_analysis_obj.results_valid = sample_valid
-						sample_analysis_obj.save()
-
-					run_complete = tso500.run_is_complete()
-					run_valid = tso500.run_is_valid()
-
-					if run_analysis.results_completed == False and run_complete == True:
-
-						if run_valid == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = tso500.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting ntc contamination data into db for run {run_analysis.run.run_id}')
-							ntc_contamination_dict, total_pf_reads_dict, aligned_reads_dict, ntc_contamination_aligned_reads_dict= tso500.ntc_contamination()
-							management_utils.add_tso500_ntc_contamination(ntc_contamination_dict, total_pf_reads_dict, aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis)
-
-						else:
-
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
-
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
+			sample_obj = dimension_cache.get(Sample, sample)
+			pipeline_obj = dimension_cache.get(Pipeline, pipeline_and_version)
+			worksheet_obj = dimension_cache.get(WorkSheet, worksheet)
+			analysis_type_obj = dimension_cache.get(AnalysisType, panel)
 
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
+			run_config = config.get(pipeline_obj.pipeline_id + '-' + analysis_type_obj.analysis_type_id)
 
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_dict = tso500.get_fastqc_data()
-							management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting ntc contamination data into db for run {run_analysis.run.run_id}')
-							ntc_contamination_dict, total_pf_reads_dict, aligned_reads_dict, ntc_contamination_aligned_reads_dict= tso500.ntc_contamination()
-							management_utils.add_tso500_ntc_contamination(ntc_contamination_dict, total_pf_reads_dict, aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis)
+			new_sample_analysis_obj = existing_sample_analyses.get((sample, pipeline_and_version, panel, worksheet))
 
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
+			created = new_sample_analysis_obj is None
 
-					run_analysis.save()
+			if created:
 
-				# ctDNA
-				elif 'tso500_ctdna' in run_analysis.pipeline.pipeline_id:
+				new_sample_analysis_obj = SampleAnalysis(sample=sample_obj,
+														run = run_obj,
+														pipeline = pipeline_obj,
+														analysis_type = analysis_type_obj,
+														worksheet = worksheet_obj,
+														run_analysis = run_analysis_objs[(pipeline_and_version, panel)])
 
-					run_id = run_analysis.run.run_id
-					run_config_key = run_analysis.pipeline.pipeline_id + '-' + run_analysis.analysis_type.analysis_type_id
+				# thresholds are only set when the sample analysis is first created
+				if run_config is not None:
 
-					if run_config_key not in config_dict['pipelines']:
+					for field, value in run_config.sample_thresholds.items():
 
-						ctDNA = ctDNA_pipeline.TSO500_ctDNA(results_dir = run_data_dir,
-															sample_names = sample_ids,
-															run_id = run_analysis.run.run_id,
-															sample_completed_files=['*_fusion_check.csv', '*_variants.tsv', '*_coverage.json'],
-															run_completed_files = ['postprocessing_complete.txt'],
-															metrics_file =['QC_combined.txt']
-															)
-					else:
+						setattr(new_sample_analysis_obj, field, value)
 
-						sample_completed_files = config_dict['pipelines'][run_config_key]['sample_completed_files']
-						run_completed_files = config_dict['pipelines'][run_config_key]['run_completed_files']
-						metrics_file = config_dict['pipelines'][run_config_key]['metrics_file']
+			# only write new sample analyses, changed sexes or sample analyses added before they were linked to their run analysis
+			if created or new_sample_analysis_obj.sex != sex or new_sample_analysis_obj.run_analysis_id is None:
 
-						ctDNA = ctDNA_pipeline.TSO500_ctDNA(results_dir = run_data_dir,
-    															sample_completed_files=sample_completed_files,
-    															run_completed_files=run_completed_files,
-    															metrics_file= metrics_file,
-															run_id = run_analysis.run.run_id,
-															sample_names=sample_ids,
-															)
+				new_sample_analysis_obj.sex = sex
+				new_sample_analysis_obj.run_analysis = run_analysis_objs[(pipeline_and_version, panel)]
+				new_sample_analysis_obj.save()
 
-					for sample in sample_ids:
+				changed_pipelines.add(pipeline_obj.pipeline_id)
 
-						sample_complete = ctDNA.sample_is_complete(sample)
+		# new sample analyses or sexes change the verdicts of the run analyses, they are worked out again when read
+		if len(changed_pipelines) > 0:
 
-						sample_valid = ctDNA.sample_is_valid(sample)
-						
-						sample_obj = Sample.objects.get(sample_id = sample)
+			AutoQCVerdict.objects.filter(run_analysis__run=run_obj, run_analysis__pipeline__in=changed_pipelines).delete()
 
-						sample_analysis_obj = SampleAnalysis.objects.get(sample=sample,
-																		run = run_analysis.run,
-																		pipeline = run_analysis.pipeline,
-																		analysis_type_id=run_analysis.analysis_type)
-
-						if sample_analysis_obj.results_completed == False and sample_complete == True:
-
-							if sample_valid == True:
-
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has finished sample level successfully.')
-
-							else:
-								logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has failed sample level.')
-
-						elif sample_analysis_obj.results_valid == False and sample_valid == True and sample_complete == True:
-
-							logger.info (f'Sample {sample} on run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now completed successfully.')
-
-			
-						sample_analysis_obj.results_completed = sample_complete
-						sample_analysis_obj.results_valid = sample_valid
-						sample_analysis_obj.save()
-
-					run_complete = ctDNA.run_is_complete()
-					
-					if run_complete == True:
-					
-						run_valid = True
-						
-					else:
-					
-						run_valid = False
-
-					if run_analysis.results_completed == False and run_complete == True:
-
-						if run_valid == True:
-
-							logger.info (f'Run {run_analysis.run.run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_metrics = ctDNA.determine_fastqc_metrics()
-							if fastqc_metrics == "FastQC":
-								fastqc_dict = ctDNA.get_fastqc_data()
-								management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							elif fastqc_metrics == "DragenFastQC":
-								fastqc_dict = ctDNA.get_dragen_fastqc_data()
-								management_utils.add_dragen_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting ntc contamination data into db for run {run_analysis.run.run_id}')
-							aligned_reads_dict, ntc_contamination_aligned_reads_dict= ctDNA.ntc_contamination()
-							management_utils.add_ctdna_ntc_contamination(aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis)
-
-						else:
-
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has failed pipeline {run_analysis.pipeline.pipeline_id}')
-
-					elif run_analysis.results_valid == False and run_valid == True and run_complete == True:
-
-							logger.info (f'Run {run_id} {run_analysis.analysis_type.analysis_type_id} has now successfully completed pipeline {run_analysis.pipeline.pipeline_id}')
-							
-							logger.info (f'Putting fastqc data into db for run {run_analysis.run.run_id}')
-							fastqc_metrics = ctDNA.determine_fastqc_metrics()
-							if fastqc_metrics == "FastQC":
-								fastqc_dict = ctDNA.get_fastqc_data()
-								management_utils.add_fastqc_data(fastqc_dict, run_analysis)
-							elif fastqc_metrics == "DragenFastQC":
-								fastqc_dict = ctDNA.get_dragen_fastqc_data()
-								management_utils.add_dragen_fastqc_data(fastqc_dict, run_analysis)
-							
-							logger.info (f'Putting ntc contamination data into db for run {run_analysis.run.run_id}')
-							aligned_reads_dict, ntc_contamination_aligned_reads_dict= ctDNA.ntc_contamination()
-							management_utils.add_ctdna_ntc_contamination(aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis)
-
-					run_analysis.results_completed = run_complete
-					run_analysis.results_valid = run_valid
-
-					run_analysis.save()
+		# record the scan as a checkpoint so the run can be skipped once it is no longer watched
+		RunScanState.objects.update_or_create(run_path=str(raw_data),
+												defaults={'run': run_obj,
+														'sample_sheet_mtime': sample_sheet_mtime,
+														'copy_complete_mtime': copy_complete_mtime})
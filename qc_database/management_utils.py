@@ -1,7 +1,12 @@
-from pipelines import parsers
+import logging
+
+from pipelines import parsers, timing
+from qc_database import auto_qc
 from qc_database.models import *
 from django.contrib.auth.models import User
 
+logger = logging.getLogger(__name__)
+
 
 def add_run_log_info(run_info, run_parameters, run_obj, raw_data_dir):
 	"""
@@ -59,6 +64,8 @@ def add_run_log_info(run_info, run_parameters, run_obj, raw_data_dir):
 	
 	interop_dict = parsers.parse_interop_data(str(raw_data_dir), int(num_reads) + int(num_indexes), int(lane_count))
 
+	interop_quality_objs = []
+
 	for read in interop_dict['read_summaries']:
 
 		read_dict = interop_dict['read_summaries'][read]
@@ -67,7 +74,7 @@ def add_run_log_info(run_info, run_parameters, run_obj, raw_data_dir):
 
 			lane_read_summary = read_dict[lane]
 
-			new_interop_quality_obj = InteropRunQuality(
+			interop_quality_objs.append(InteropRunQuality(
 					run = run_obj,
 					read_number = read,
 					lane_number = lane,
@@ -84,480 +91,401 @@ def add_run_log_info(run_info, run_parameters, run_obj, raw_data_dir):
 					reads = lane_read_summary['reads'],
 					reads_pf = lane_read_summary['reads_pf'],
 					yield_g = lane_read_summary['yield_g']
-				)
-			new_interop_quality_obj.save()
+				))
 
+	InteropRunQuality.objects.bulk_create(interop_quality_objs)
 
 	run_obj.save()
 
 	return interop_dict
 
 
-def add_fastqc_data(fastqc_dict, run_analysis_obj):
+def add_interop_index_metrics(interop_dict, run_obj, sample_ids):
 	"""
-	Add data from fastqc files to database.
+	Add the % of reads identified for each sample in the sample sheet from the index metrics \
+	parsed by add_run_log_info. Samples which already have index metrics for the run are left alone.
 
 	"""
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	existing_samples = set(InteropIndexMetrics.objects.filter(run = run_obj).values_list('sample_id', flat=True))
 
-	for key in fastqc_dict:
+	index_metric_objs = []
 
-		sample_obj = Sample.objects.get(sample_id=key)
+	for sample_id in sample_ids:
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
+		pct_reads_identified = interop_dict['index_summaries'].get(sample_id)
 
-		sample_data = fastqc_dict[key]
+		if pct_reads_identified is None or sample_id in existing_samples:
 
-		for read in sample_data:
+			continue
 
-			existing_data = SampleFastqcData.objects.filter(sample_analysis= sample_analysis_obj,
-													read_number = read['read_number'],
-													lane = read['lane'])
-			
-			if len(existing_data) < 1:
+		index_metric_objs.append(InteropIndexMetrics(sample_id = sample_id, run = run_obj, pct_reads_identified = round(pct_reads_identified, 3)))
 
-				read['sample_analysis'] = sample_analysis_obj
-				
-				new_fastqc_obj = SampleFastqcData(**read)
-				new_fastqc_obj.save()
+	InteropIndexMetrics.objects.bulk_create(index_metric_objs)
 
 
-def add_dragen_fastqc_data(dragen_fastqc_dict, run_analysis_obj):
+class DimensionCache:
 	"""
-	Add data from dragen fastqc metrics to the database
+	Ingestion scoped cache of the Pipeline, WorkSheet, AnalysisType and Sample objects keyed by primary key.
+
+	Missing objects are fetched in one query per model and any which do not exist are created with bulk_create.
+
 	"""
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	def __init__(self):
 
-	for key in dragen_fastqc_dict:
+		self.objects = {}
 
-		sample_obj = Sample.objects.get(sample_id=key)
+	def preload(self, model):
+		"""
+		Load every object for a small table e.g. Pipeline
+		"""
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline=pipeline,
-														analysis_type=run_analysis_obj.analysis_type)
-		
-		sample_data = dragen_fastqc_dict[key]
+		cache = self.objects.setdefault(model, {})
 
-		existing_data = SampleDragenFastqcData.objects.filter(sample_analysis=sample_analysis_obj)
+		for obj in model.objects.all():
 
-		if len(existing_data) < 1:
-			sample_data['sample_analysis'] = sample_analysis_obj
-			new_dragen_fastqc_obj = SampleDragenFastqcData(**sample_data)
-			new_dragen_fastqc_obj.save()
+			cache[obj.pk] = obj
 
+	def get_many(self, model, pks):
+		"""
+		Get or create the objects with these primary keys
+		"""
 
-def add_hs_metrics(hs_metrics_dict, run_analysis_obj):
-	"""
-	Add data from picard hs metrics files to database.
-	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-	
-	for sample_id in hs_metrics_dict:
-		sample_obj = Sample.objects.get(sample_id=sample_id)
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline=pipeline,
-														analysis_type=run_analysis_obj.analysis_type)
-		existing_data = SampleHsMetrics.objects.filter(sample_analysis=sample_analysis_obj)
-			
-		if len(existing_data) < 1:
-			# Create a copy of the dictionary to avoid modifying the original
-			sample_data = hs_metrics_dict[sample_id].copy()
-			
-			# Remove keys that need to be deleted
-			if 'sample' in sample_data:
-				del sample_data['sample']
-			if 'library' in sample_data:
-				del sample_data['library']
-			if 'read_group' in sample_data:
-				del sample_data['read_group']
-				
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			# Process other fields - iterate over a static list of keys
-			for field_key in list(sample_data.keys()):
-				if sample_data[field_key] == '?' or sample_data[field_key] == '':
-					sample_data[field_key] = None
-					
-			new_hsmetrics_obj = SampleHsMetrics(**sample_data)
-			new_hsmetrics_obj.save()
+		cache = self.objects.setdefault(model, {})
 
+		missing = set(pks) - set(cache)
 
-def add_depth_of_coverage_metrics(depth_metrics_dict, run_analysis_obj):
-	"""
-	Add data from depth of coverage summary files to database.
-	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-	
-	for sample_id in depth_metrics_dict:
-		sample_obj = Sample.objects.get(sample_id=sample_id)
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline=pipeline,
-														analysis_type=run_analysis_obj.analysis_type)
-		existing_data = SampleDepthofCoverageMetrics.objects.filter(sample_analysis=sample_analysis_obj)
-		
-		if len(existing_data) < 1:
-			# Create a copy of the dictionary to avoid modifying the original
-			sample_data = depth_metrics_dict[sample_id].copy()
-			
-			# Remove the sample_id key safely
-			if 'sample_id' in sample_data:
-				del sample_data['sample_id']
-				
-			sample_data['sample_analysis'] = sample_analysis_obj
-			new_depth_obj = SampleDepthofCoverageMetrics(**sample_data)
-			new_depth_obj.save()
+		if len(missing) == 0:
 
+			return
 
-def add_duplication_metrics(duplication_metrics_dict, run_analysis_obj):
-	"""
-	Add data from picard mark duplicates summary files to database.
+		for obj in model.objects.filter(pk__in=missing):
 
-	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+			cache[obj.pk] = obj
+			missing.discard(obj.pk)
 
-	for key in duplication_metrics_dict:
+		new_objs = [model(pk=pk) for pk in sorted(missing)]
 
-		sample_obj = Sample.objects.get(sample_id=key)
+		model.objects.bulk_create(new_objs)
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = DuplicationMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+		for obj in new_objs:
 
-			sample_data = duplication_metrics_dict[key]
+			cache[obj.pk] = obj
 
-			sample_data['sample_analysis'] = sample_analysis_obj
+	def get(self, model, pk):
 
-			for key in sample_data:
+		self.get_many(model, [pk])
 
-				if sample_data[key] == '?' or sample_data[key] == '':
+		return self.objects[model][pk]
 
-					sample_data[key] = None
+	def clear(self):
+		"""
+		Forget everything e.g. after a rolled back transaction which may have created objects
+		"""
 
-			new_duplication_obj = DuplicationMetrics(**sample_data)
-			new_duplication_obj.save()
+		self.objects = {}
 
 
-def add_contamination_metrics(contamination_metrics_dict, run_analysis_obj):
+def get_sample_analyses(run_analysis_obj):
 	"""
-	Add data from contamination summary files to database.
+	Get the sample analyses for a run analysis in one query as a dictionary keyed by sample id.
+
+	Raises SampleAnalysis.MultipleObjectsReturned if a sample is on more than one worksheet in the \
+	run analysis as its metrics could not be told apart.
 
 	"""
 
+	sample_analyses = {}
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	for sample_analysis in SampleAnalysis.objects.filter(run_analysis = run_analysis_obj):
 
-	for key in contamination_metrics_dict:
+		if sample_analysis.sample_id in sample_analyses:
 
-		sample_obj = Sample.objects.get(sample_id=key)
+			raise SampleAnalysis.MultipleObjectsReturned(f'Sample {sample_analysis.sample_id} has more than one sample analysis in {run_analysis_obj}')
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
+		sample_analyses[sample_analysis.sample_id] = sample_analysis
 
+	return sample_analyses
 
-		existing_data = ContaminationMetrics.objects.filter(sample_analysis= sample_analysis_obj)
 
-		if len(existing_data) < 1:
-			
-			sample_data = contamination_metrics_dict[key]
+def bulk_add_metrics(model, metrics, run_analysis_obj, key_fields=[]):
+	"""
+	Add metric rows for the samples in a run analysis to the database.
 
-			if sample_data:
-			
-				sample_data['sample_analysis'] = sample_analysis_obj
-	
-				for key in sample_data:
+	metrics is a list of (sample_id, dictionary of field values) tuples. Rows which already exist for a \
+	sample analysis (with the same key_fields values) are skipped. The sample analyses and the existing \
+	rows are each fetched in one query and the new rows are written with bulk_create.
 
-					if sample_data[key] == '?' or sample_data[key] == '':
+	"""
 
-						sample_data[key] = None
+	sample_analyses = get_sample_analyses(run_analysis_obj)
 
-				new_contamination_obj = ContaminationMetrics(**sample_data)
-				new_contamination_obj.save()
+	key_field_objs = [model._meta.get_field(field) for field in key_fields]
 
+	existing_rows = model.objects.filter(sample_analysis__run_analysis = run_analysis_obj)
 
-def add_sex_metrics(qc_metrics_dict, run_analysis_obj, sex_key):
-	"""
-	Add data from sex calculation files to database.
+	existing_keys = set(existing_rows.values_list('sample_analysis_id', *key_fields))
 
-	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	new_objs = []
 
-	for key in qc_metrics_dict:
+	for sample_id, sample_data in metrics:
 
-		sample_obj = Sample.objects.get(sample_id=key)
+		sample_analysis_obj = sample_analyses.get(sample_id)
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = CalculatedSexMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+		if sample_analysis_obj is None:
 
-			sample_data = qc_metrics_dict[key]
+			raise SampleAnalysis.DoesNotExist(f'No sample analysis for sample {sample_id} in {run_analysis_obj}')
 
-			new_depth_obj = CalculatedSexMetrics(sample_analysis = sample_analysis_obj,
-												calculated_sex = sample_data[sex_key])
-			new_depth_obj.save()
+		row_key = (sample_analysis_obj.pk,) + tuple(field.to_python(sample_data[field.name]) for field in key_field_objs)
 
+		if row_key in existing_keys:
 
-def add_alignment_metrics(alignment_metrics_dict, run_analysis_obj):
+			continue
+
+		existing_keys.add(row_key)
+
+		new_objs.append(model(sample_analysis=sample_analysis_obj, **sample_data))
+
+	model.objects.bulk_create(new_objs)
+
+	return new_objs
+
+
+# model to {field name: function converting a parsed string to the field's type}
+field_types = {}
+
+
+def get_field_types(model):
 	"""
-	Add data from picard alignment metrics files to database.
+	The conversion function for each field of a metrics model
+	"""
+
+	if model not in field_types:
+
+		field_types[model] = {field.name: field.to_python for field in model._meta.concrete_fields if not field.is_relation}
+
+	return field_types[model]
+
 
+def coerce_values(sample_data, model, missing_values):
+	"""
+	Replace values which mean no data e.g. '?' with None and convert the rest to the model's field types in one pass
 	"""
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	types = get_field_types(model)
 
-	for key in alignment_metrics_dict:
+	for key, value in sample_data.items():
 
-		sample_obj = Sample.objects.get(sample_id=key)
+		if value in missing_values:
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
+			sample_data[key] = None
 
-		for metric in alignment_metrics_dict[key]:
+		elif isinstance(value, str) and key in types:
 
+			sample_data[key] = types[key](value)
 
-			existing_data = AlignmentMetrics.objects.filter(sample_analysis= sample_analysis_obj,
-															category = metric['category'])
+	return sample_data
 
-			if len(existing_data) < 1:
-				
-				sample_data = metric
 
-				sample_data['sample_analysis'] = sample_analysis_obj
+def replace_missing_values(sample_data, missing_values):
+	"""
+	Replace values which mean no data e.g. '?' with None
+	"""
 
-				for key in sample_data:
+	for key in sample_data:
 
-					if sample_data[key] == '?' or sample_data[key] == '':
+		if sample_data[key] in missing_values:
 
-						sample_data[key] = None
+			sample_data[key] = None
 
-				new_alignment_obj = AlignmentMetrics(**sample_data)
-				new_alignment_obj.save()
+	return sample_data
 
 
-def add_dragen_alignment_metrics(alignment_metrics_dict, run_analysis_obj):
+def add_fastqc_data(fastqc_dict, run_analysis_obj):
 	"""
-	Add data from dragen mapping metrics files to database.
+	Add data from fastqc files to database.
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
 
-	for key in alignment_metrics_dict:
+	metrics = [(key, read) for key in fastqc_dict for read in fastqc_dict[key]]
 
-		sample_obj = Sample.objects.get(sample_id=key)
+	bulk_add_metrics(SampleFastqcData, metrics, run_analysis_obj, key_fields=['read_number', 'lane'])
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
 
-		existing_data = DragenAlignmentMetrics.objects.filter(sample_analysis= sample_analysis_obj)
+def add_dragen_fastqc_data(dragen_fastqc_dict, run_analysis_obj):
+	"""
+	Add data from dragen fastqc metrics to the database
+	"""
+
+	metrics = [(key, dragen_fastqc_dict[key]) for key in dragen_fastqc_dict]
+
+	bulk_add_metrics(SampleDragenFastqcData, metrics, run_analysis_obj)
+
+
+def add_hs_metrics(hs_metrics_dict, run_analysis_obj):
+	"""
+	Add data from picard hs metrics files to database.
+	"""
 
-		if len(existing_data) < 1:
+	metrics = []
 
-			sample_data = alignment_metrics_dict[key]
-			
-			sample_data['sample_analysis'] = sample_analysis_obj
+	for sample_id in hs_metrics_dict:
 
-			for key in sample_data:
+		# Create a copy of the dictionary to avoid modifying the original
+		sample_data = hs_metrics_dict[sample_id].copy()
 
-				if sample_data[key] == 'NA' or sample_data[key] == '':
+		for key in ['sample', 'library', 'read_group']:
 
-					sample_data[key] = None
+			sample_data.pop(key, None)
 
-			new_dragen_alignment_obj = DragenAlignmentMetrics(**sample_data)
-			new_dragen_alignment_obj.save()
+		metrics.append((sample_id, coerce_values(sample_data, SampleHsMetrics, ['?', ''])))
 
+	bulk_add_metrics(SampleHsMetrics, metrics, run_analysis_obj)
 
-def add_variant_calling_metrics(variant_metrics_dict, run_analysis_obj):
+
+def add_depth_of_coverage_metrics(depth_metrics_dict, run_analysis_obj):
 	"""
-	Add data from picard variant calling metrics files to database.
+	Add data from depth of coverage summary files to database.
+	"""
+
+	metrics = []
+
+	for sample_id in depth_metrics_dict:
+
+		# Create a copy of the dictionary to avoid modifying the original
+		sample_data = depth_metrics_dict[sample_id].copy()
+		sample_data.pop('sample_id', None)
+
+		metrics.append((sample_id, sample_data))
+
+	bulk_add_metrics(SampleDepthofCoverageMetrics, metrics, run_analysis_obj)
+
+
+def add_duplication_metrics(duplication_metrics_dict, run_analysis_obj):
+	"""
+	Add data from picard mark duplicates summary files to database.
 
 	"""
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	metrics = [(key, coerce_values(duplication_metrics_dict[key], DuplicationMetrics, ['?', ''])) for key in duplication_metrics_dict]
 
+	bulk_add_metrics(DuplicationMetrics, metrics, run_analysis_obj)
 
-	for key in variant_metrics_dict:
 
-		sample_obj = Sample.objects.get(sample_id=key)
+def add_contamination_metrics(contamination_metrics_dict, run_analysis_obj):
+	"""
+	Add data from contamination summary files to database.
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = VariantCallingMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+	"""
 
-			sample_data = variant_metrics_dict[key]
+	metrics = []
 
-			sample_data['sample_analysis'] = sample_analysis_obj
+	for key in contamination_metrics_dict:
 
-			for key in sample_data:
+		sample_data = contamination_metrics_dict[key]
 
-				if sample_data[key] == '?' or sample_data[key] == '':
+		if sample_data:
 
-					sample_data[key] = None
+			metrics.append((key, replace_missing_values(sample_data, ['?', ''])))
 
-			new_variant_obj = VariantCallingMetrics(**sample_data)
-			new_variant_obj.save()
+	bulk_add_metrics(ContaminationMetrics, metrics, run_analysis_obj)
 
 
-def add_insert_metrics(insert_metrics_dict, run_analysis_obj):
+def add_sex_metrics(qc_metrics_dict, run_analysis_obj, sex_key):
 	"""
-	Add data from picard insert metrics files to database.
+	Add data from sex calculation files to database.
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
 
-	for key in insert_metrics_dict:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
+	metrics = [(key, {'calculated_sex': qc_metrics_dict[key][sex_key]}) for key in qc_metrics_dict]
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = InsertMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+	bulk_add_metrics(CalculatedSexMetrics, metrics, run_analysis_obj)
 
-			sample_data = insert_metrics_dict[key]
 
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			for key in sample_data:
+def add_alignment_metrics(alignment_metrics_dict, run_analysis_obj):
+	"""
+	Add data from picard alignment metrics files to database.
 
-				if sample_data[key] == '?' or sample_data[key] == '':
+	"""
 
-					sample_data[key] = None
+	metrics = [(key, coerce_values(metric, AlignmentMetrics, ['?', ''])) for key in alignment_metrics_dict for metric in alignment_metrics_dict[key]]
 
-			new_insert_obj = InsertMetrics(**sample_data)
-			new_insert_obj.save()
+	bulk_add_metrics(AlignmentMetrics, metrics, run_analysis_obj, key_fields=['category'])
 
 
-def add_variant_count_metrics(variant_count_metrics_dict, run_analysis_obj):
+def add_dragen_alignment_metrics(alignment_metrics_dict, run_analysis_obj):
+	"""
+	Add data from dragen mapping metrics files to database.
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	"""
 
-	for key in variant_count_metrics_dict:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
+	metrics = [(key, coerce_values(alignment_metrics_dict[key], DragenAlignmentMetrics, ['NA', ''])) for key in alignment_metrics_dict]
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = VCFVariantCount.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+	bulk_add_metrics(DragenAlignmentMetrics, metrics, run_analysis_obj)
+
+
+def add_variant_calling_metrics(variant_metrics_dict, run_analysis_obj):
+	"""
+	Add data from picard variant calling metrics files to database.
 
-			sample_data = variant_count_metrics_dict[key][key]
+	"""
 
-			new_count_obj = VCFVariantCount(sample_analysis = sample_analysis_obj, variant_count= sample_data)
-			new_count_obj.save()
+	metrics = [(key, coerce_values(variant_metrics_dict[key], VariantCallingMetrics, ['?', ''])) for key in variant_metrics_dict]
 
+	bulk_add_metrics(VariantCallingMetrics, metrics, run_analysis_obj)
 
-def add_dragen_variant_calling_metrics(variant_metrics_dict, run_analysis_obj):
+
+def add_insert_metrics(insert_metrics_dict, run_analysis_obj):
 	"""
-	Add data from the Dragen Variant Calling metrics files to database.
+	Add data from picard insert metrics files to database.
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
 
-	for key in variant_metrics_dict:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
+	metrics = [(key, coerce_values(insert_metrics_dict[key], InsertMetrics, ['?', ''])) for key in insert_metrics_dict]
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = DragenVariantCallingMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+	bulk_add_metrics(InsertMetrics, metrics, run_analysis_obj)
+
+
+def add_variant_count_metrics(variant_count_metrics_dict, run_analysis_obj):
 
-			sample_data = variant_metrics_dict[key]
+	metrics = [(key, {'variant_count': variant_count_metrics_dict[key][key]}) for key in variant_count_metrics_dict]
 
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			for key in sample_data:
+	bulk_add_metrics(VCFVariantCount, metrics, run_analysis_obj)
 
-				if sample_data[key] == 'NA' or sample_data[key] == '':
 
-					sample_data[key] = None
+def add_dragen_variant_calling_metrics(variant_metrics_dict, run_analysis_obj):
+	"""
+	Add data from the Dragen Variant Calling metrics files to database.
+
+	"""
 
-			new_dragen_vc_obj = DragenVariantCallingMetrics(**sample_data)
-			new_dragen_vc_obj.save()
+	metrics = [(key, coerce_values(variant_metrics_dict[key], DragenVariantCallingMetrics, ['NA', ''])) for key in variant_metrics_dict]
+
+	bulk_add_metrics(DragenVariantCallingMetrics, metrics, run_analysis_obj)
 
 
 def add_exome_postprocessing_cnv_qc_metrics(cnv_qc_dict, run_analysis_obj):
 	"""
 	Add data from the Dragen CNV QC metrics file to the database
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+
+	metrics = []
 
 	for key in cnv_qc_dict:
 
-		sample_obj = Sample.objects.get(sample_id=key)
+		# skip samples with unexpected fields
+		try:
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample = sample_obj,
-						   run = run,
-						   pipeline = pipeline,
-						   analysis_type = run_analysis_obj.analysis_type)
+			CNVMetrics(**cnv_qc_dict[key])
 
-		existing_data = CNVMetrics.objects.filter(sample_analysis = sample_analysis_obj)
+		except:
 
-		try:
-			if len(existing_data) < 1:
+			continue
 
-				sample_data = cnv_qc_dict[key]
-				sample_data["sample_analysis"] = sample_analysis_obj
+		metrics.append((key, cnv_qc_dict[key]))
 
-				new_dragen_cnv_qc_obj = CNVMetrics(**sample_data)
-				new_dragen_cnv_qc_obj.save()
-		
-		except:
-			pass
+	bulk_add_metrics(CNVMetrics, metrics, run_analysis_obj)
 
 
 def add_sensitivity_metrics(sensitivity_metrics, run_analysis_obj):
@@ -587,74 +515,43 @@ def add_dragen_wgs_coverage_metrics(dragen_wgs_coverage_metrics, run_analysis_ob
 	"""
 	Add data from the Dragen Variant Calling WGS coverage files to database.
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+
+	metrics = []
 
 	for sample_id in dragen_wgs_coverage_metrics:
-		
-		sample_obj = Sample.objects.get(sample_id=sample_id)
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline=pipeline,
-														analysis_type=run_analysis_obj.analysis_type)
-		
-		existing_data = DragenWGSCoverageMetrics.objects.filter(sample_analysis=sample_analysis_obj)
-		
-		if len(existing_data) < 1:
-			
-			sample_data = dragen_wgs_coverage_metrics[sample_id].copy()  # Make a copy
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			# Handle the renamed field before iteration
-			if 'pct_of_genome_with_coverage_50x_100x' in sample_data:
 
-				sample_data['pct_of_genome_with_coverage_50x100x'] = sample_data['pct_of_genome_with_coverage_50x_100x']
-				del sample_data['pct_of_genome_with_coverage_50x_100x']
-			
-			# Process other fields
-			for field_key in list(sample_data.keys()):  # Create a list of keys
+		sample_data = dragen_wgs_coverage_metrics[sample_id].copy()  # Make a copy
+
+		# Handle the renamed field
+		if 'pct_of_genome_with_coverage_50x_100x' in sample_data:
 
-				if sample_data[field_key] == 'NA' or sample_data[field_key] == '' or sample_data[field_key] == 'inf':
+			sample_data['pct_of_genome_with_coverage_50x100x'] = sample_data.pop('pct_of_genome_with_coverage_50x_100x')
 
-					sample_data[field_key] = None
-			
-			new_dragen_wgs_cov_obj = DragenWGSCoverageMetrics(**sample_data)
-			new_dragen_wgs_cov_obj.save()
+		metrics.append((sample_id, coerce_values(sample_data, DragenWGSCoverageMetrics, ['NA', '', 'inf'])))
+
+	bulk_add_metrics(DragenWGSCoverageMetrics, metrics, run_analysis_obj)
 
 
 def add_dragen_exonic_coverage_metrics(dragen_exonic_coverage_metrics, run_analysis_obj):
 	"""
 	Add data from the Dragen Variant Calling WGS coverage files to database.
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-	
+
+	metrics = []
+
 	for sample_id in dragen_exonic_coverage_metrics:
-		sample_obj = Sample.objects.get(sample_id=sample_id)
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline=pipeline,
-														analysis_type=run_analysis_obj.analysis_type)
-		
-		existing_data = DragenRegionCoverageMetrics.objects.filter(sample_analysis=sample_analysis_obj)
-		
-		if len(existing_data) < 1:
-			# Create a copy of the dictionary to avoid modifying the original
-			sample_data = dragen_exonic_coverage_metrics[sample_id].copy()
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			# Handle the field renaming before the main iteration
-			if 'pct_of_qc_coverage_region_with_coverage_50x_100x' in sample_data:
-				sample_data['pct_of_qc_coverage_region_with_coverage_50x100x'] = sample_data['pct_of_qc_coverage_region_with_coverage_50x_100x']
-				del sample_data['pct_of_qc_coverage_region_with_coverage_50x_100x']
-			
-			# Process other fields using a static list of keys
-			for field_key in list(sample_data.keys()):
-				if sample_data[field_key] == 'NA' or sample_data[field_key] == '' or sample_data[field_key] == 'inf':
-					sample_data[field_key] = None
-			
-			new_dragen_region_cov_obj = DragenRegionCoverageMetrics(**sample_data)
-			new_dragen_region_cov_obj.save()
+
+		# Create a copy of the dictionary to avoid modifying the original
+		sample_data = dragen_exonic_coverage_metrics[sample_id].copy()
+
+		# Handle the renamed field
+		if 'pct_of_qc_coverage_region_with_coverage_50x_100x' in sample_data:
+
+			sample_data['pct_of_qc_coverage_region_with_coverage_50x100x'] = sample_data.pop('pct_of_qc_coverage_region_with_coverage_50x_100x')
+
+		metrics.append((sample_id, coerce_values(sample_data, DragenRegionCoverageMetrics, ['NA', '', 'inf'])))
+
+	bulk_add_metrics(DragenRegionCoverageMetrics, metrics, run_analysis_obj)
 
 
 def add_dragen_ploidy_metrics(dragen_ploidy_metrics, run_analysis_obj):
@@ -663,89 +560,37 @@ def add_dragen_ploidy_metrics(dragen_ploidy_metrics, run_analysis_obj):
 	Add data from the Dragen ploidy files to database.
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
 
-	for key in dragen_ploidy_metrics:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
+	metrics = []
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = DragenPloidyMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+	for key in dragen_ploidy_metrics:
 
-			sample_data = dragen_ploidy_metrics[key]
+		sample_data = replace_missing_values(dragen_ploidy_metrics[key], ['NA', '', 'inf'])
 
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			for key in sample_data:
+		metrics.append((key, {'ploidy_estimation': sample_data['ploidy_estimation']}))
 
-				if sample_data[key] == 'NA' or sample_data[key] == ''  or sample_data[key] == 'inf':
+	bulk_add_metrics(DragenPloidyMetrics, metrics, run_analysis_obj)
 
-					sample_data[key] = None
 
-			new_dragen_ploidy_metrics_obj = DragenPloidyMetrics(sample_analysis=sample_analysis_obj, ploidy_estimation=sample_data['ploidy_estimation'])
-			new_dragen_ploidy_metrics_obj.save()
-			
 def add_dragen_cnv_metrics(dragen_cnv_metrics_dict, run_analysis_obj):
 	"""
 	Add data from dragen sample CNV metrics file to database
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-	
-	for key in dragen_cnv_metrics_dict:
-	
-		sample_obj = Sample.objects.get(sample_id=key)
-		
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-									run=run,
-									pipeline=pipeline,
-									analysis_type=run_analysis_obj.analysis_type)
 
-		existing_data = DragenCNVMetrics.objects.filter(sample_analysis=sample_analysis_obj)
-		
-		if len(existing_data) < 1:
-			
-			sample_data = dragen_cnv_metrics_dict[key]
-			
-			sample_data['sample_analysis'] = sample_analysis_obj
-			
-			new_dragen_cnv_metrics_obj = DragenCNVMetrics(**sample_data)
-			new_dragen_cnv_metrics_obj.save()
-				
+	metrics = [(key, dragen_cnv_metrics_dict[key]) for key in dragen_cnv_metrics_dict]
+
+	bulk_add_metrics(DragenCNVMetrics, metrics, run_analysis_obj)
+
+
 def add_fusion_contamination_metrics(contamination_metrics_dict, run_analysis_obj):
 	"""
 	Add data from fusion contamination file to database
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-
-	for key in contamination_metrics_dict:
-
-		sample_obj = Sample.objects.get(sample_id=key)
-
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = FusionContamination.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
-
-			sample_data = contamination_metrics_dict[key]
 
-			sample_data['sample_analysis'] = sample_analysis_obj
+	metrics = [(key, contamination_metrics_dict[key]) for key in contamination_metrics_dict]
 
-			new_fusion_contamination_obj = FusionContamination(**sample_data)
-			new_fusion_contamination_obj.save()
+	bulk_add_metrics(FusionContamination, metrics, run_analysis_obj)
 
 
 def add_fusion_alignment_metrics(alignment_metrics_dict, run_analysis_obj):
@@ -753,28 +598,10 @@ def add_fusion_alignment_metrics(alignment_metrics_dict, run_analysis_obj):
 	Add data from fusion alignments file to database
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-
-	for key in alignment_metrics_dict:
-
-		sample_obj = Sample.objects.get(sample_id=key)
-
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = FusionAlignmentMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
 
-			sample_data = alignment_metrics_dict[key]
+	metrics = [(key, alignment_metrics_dict[key]) for key in alignment_metrics_dict]
 
-			sample_data['sample_analysis'] = sample_analysis_obj
-
-			new_fusion_alignments_obj = FusionAlignmentMetrics(**sample_data)
-			new_fusion_alignments_obj.save()
+	bulk_add_metrics(FusionAlignmentMetrics, metrics, run_analysis_obj)
 
 
 def add_custom_coverage_metrics(coverage_metrics_dict, run_analysis_obj):
@@ -782,28 +609,10 @@ def add_custom_coverage_metrics(coverage_metrics_dict, run_analysis_obj):
 	Add data from custom coverage metrics file to database
 
 	"""
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-
-	for key in coverage_metrics_dict:
 
-		sample_obj = Sample.objects.get(sample_id=key)
+	metrics = [(key, coverage_metrics_dict[key]) for key in coverage_metrics_dict]
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-
-		existing_data = CustomCoverageMetrics.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
-
-			sample_data = coverage_metrics_dict[key]
-
-			sample_data['sample_analysis'] = sample_analysis_obj
-
-			new_custom_coverage_obj = CustomCoverageMetrics(**sample_data)
-			new_custom_coverage_obj.save()
+	bulk_add_metrics(CustomCoverageMetrics, metrics, run_analysis_obj)
 
 
 def add_relatedness_metrics(parsed_relatedness, parsed_relatedness_comment, run_analysis_obj):
@@ -823,83 +632,171 @@ def add_relatedness_metrics(parsed_relatedness, parsed_relatedness_comment, run_
 
 def add_tso500_reads(reads_dict, run_analysis_obj):
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	metrics = [(key, {'total_on_target_reads': reads_dict[key]}) for key in reads_dict]
 
-	for key in reads_dict:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
+	bulk_add_metrics(Tso500Reads, metrics, run_analysis_obj)
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = Tso500Reads.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
 
-			reads= reads_dict[key]
+def add_tso500_ntc_contamination(ntc_contamination_dict, total_pf_reads_dict, aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis_obj):
 
-			new_reads_obj = Tso500Reads(sample_analysis = sample_analysis_obj, total_on_target_reads= reads)
-			
-			new_reads_obj.save()
+	metrics = []
 
+	for key in ntc_contamination_dict:
 
-def add_tso500_ntc_contamination(ntc_contamination_dict, total_pf_reads_dict, aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis_obj):
+		metrics.append((key, {'aligned_reads': aligned_reads_dict[key],
+							'percent_ntc_contamination': ntc_contamination_aligned_reads_dict[key],
+							'total_pf_reads': total_pf_reads_dict[key],
+							'percent_ntc_reads': ntc_contamination_dict[key]}))
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
+	bulk_add_metrics(Tso500Reads, metrics, run_analysis_obj)
 
-	for key in ntc_contamination_dict:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
 
+def add_ctdna_ntc_contamination(aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis_obj):
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = Tso500Reads.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
+	metrics = []
 
-			sample_data = ntc_contamination_dict[key]
+	for key in aligned_reads_dict:
 
-			total_pf_reads=total_pf_reads_dict[key]
+		metrics.append((key, {'aligned_reads': aligned_reads_dict[key],
+							'percent_ntc_contamination': ntc_contamination_aligned_reads_dict[key]}))
 
-			aligned_reads=aligned_reads_dict[key]
+	bulk_add_metrics(ctDNAReads, metrics, run_analysis_obj)
 
-			ntc_contamination_aligned_reads=ntc_contamination_aligned_reads_dict[key]
 
-			new_reads_obj = Tso500Reads(sample_analysis = sample_analysis_obj, aligned_reads=aligned_reads, percent_ntc_contamination=ntc_contamination_aligned_reads, total_pf_reads=total_pf_reads, percent_ntc_reads= sample_data)
+def make_run_analysis_task(run_analysis_obj, sample_analyses):
+	"""
+	Describe a run analysis for pipelines.monitoring.check_run_analysis.
 
-			new_reads_obj.save()
-			
-def add_ctdna_ntc_contamination(aligned_reads_dict, ntc_contamination_aligned_reads_dict, run_analysis_obj):
+	Only holds plain values so it can be sent to a worker process.
 
-	pipeline = run_analysis_obj.pipeline
-	run = run_analysis_obj.run
-	
-	for key in aligned_reads_dict:
-		
-		sample_obj = Sample.objects.get(sample_id=key)
+	"""
 
+	return {
+		'pk': run_analysis_obj.pk,
+		'run_id': run_analysis_obj.run.run_id,
+		'pipeline_id': run_analysis_obj.pipeline.pipeline_id,
+		'analysis_type': run_analysis_obj.analysis_type.analysis_type_id,
+		'run_config_key': run_analysis_obj.pipeline.pipeline_id + '-' + run_analysis_obj.analysis_type.analysis_type_id,
+		'lanes': run_analysis_obj.run.lanes,
+		'sample_ids': [sample_analysis.sample_id for sample_analysis in sample_analyses],
+		'results_completed': run_analysis_obj.results_completed,
+		'results_valid': run_analysis_obj.results_valid,
+		'relatedness_thresholds': (run_analysis_obj.min_relatedness_parents,
+									run_analysis_obj.max_relatedness_unrelated,
+									run_analysis_obj.max_relatedness_between_parents,
+									run_analysis_obj.max_child_parent_relatedness),
+	}
 
-		sample_analysis_obj = SampleAnalysis.objects.get(sample=sample_obj,
-														run=run,
-														pipeline = pipeline,
-														analysis_type = run_analysis_obj.analysis_type)
-		
-		existing_data = ctDNAReads.objects.filter(sample_analysis= sample_analysis_obj)
-		
-		if len(existing_data) < 1:
 
-			aligned_reads = aligned_reads_dict[key]
+def save_run_analysis_result(result, run_analysis_obj, sample_analyses):
+	"""
+	Write the result of pipelines.monitoring.check_run_analysis to the database.
+
+	"""
+
+	run_id = run_analysis_obj.run.run_id
+	pipeline_id = run_analysis_obj.pipeline.pipeline_id
+	analysis_type = run_analysis_obj.analysis_type.analysis_type_id
+
+	if run_analysis_obj.demultiplexing_completed == False and result['demultiplexing_completed'] == True:
+
+		if result['demultiplexing_valid'] == True:
+
+			logger.info(f'Run {run_analysis_obj} {analysis_type} has now completed demultiplexing')
+
+		else:
+
+			logger.info(f'Run {run_analysis_obj} {analysis_type} has now failed demultiplexing')
+
+	run_analysis_obj.demultiplexing_completed = result['demultiplexing_completed']
+	run_analysis_obj.demultiplexing_valid = result['demultiplexing_valid']
+
+	samples_changed = False
+
+	for sample_analysis_obj in sample_analyses:
+
+		sample = sample_analysis_obj.sample_id
+
+		if sample not in result['samples']:
+
+			continue
+
+		sample_complete, sample_valid = result['samples'][sample]
+
+		if sample_analysis_obj.results_completed == False and sample_complete == True:
+
+			if sample_valid == True:
+
+				logger.info (f'Sample {sample} on run {run_id} {analysis_type} has finished sample level {pipeline_id} successfully.')
+
+			else:
+
+				logger.info (f'Sample {sample} on run {run_id} {analysis_type} has failed sample level {pipeline_id}.')
+
+		elif sample_analysis_obj.results_valid == False and sample_valid == True and sample_complete == True:
+
+			logger.info (f'Sample {sample} on run {run_id} {analysis_type} has now completed successfully.')
+
+		if sample_analysis_obj.results_completed != sample_complete or sample_analysis_obj.results_valid != sample_valid:
+
+			sample_analysis_obj.results_completed = sample_complete
+			sample_analysis_obj.results_valid = sample_valid
+			sample_analysis_obj.save()
+			samples_changed = True
+
+	# pipelines without a results check only record demultiplexing
+	if result['results_completed'] is None:
+
+		run_analysis_obj.save()
+		return
+
+	run_complete = result['results_completed']
+	run_valid = result['results_valid']
+
+	if run_analysis_obj.results_completed == False and run_complete == True and run_valid == False:
+
+		logger.info (f'Run {run_id} {analysis_type} has failed pipeline {pipeline_id}')
+
+	elif run_complete == True and run_valid == True and (run_analysis_obj.results_completed == False or run_analysis_obj.results_valid == False):
+
+		logger.info (f'Run {run_id} {analysis_type} has now successfully completed pipeline {pipeline_id}')
+
+	if result['display_cnv_qc_metrics']:
+
+		run_analysis_obj.display_cnv_qc_metrics = True
+
+	for description, add_function, args, kwargs in result['metrics']:
+
+		logger.info (f'Putting {description} into db for run {run_id}')
+
+		with timing.stage(add_function, run=run_id, pipeline=pipeline_id + '-' + analysis_type):
+
+			globals()[add_function](*args, run_analysis_obj, **kwargs)
+
+	run_analysis_obj.results_completed = run_complete
+	run_analysis_obj.results_valid = run_valid
+	run_analysis_obj.save()
+
+	# a run analysis whose settings changed without new data is worked out again when its verdict is read
+	if len(result['metrics']) > 0 or samples_changed:
+
+		refresh_auto_qc_verdicts(run_analysis_obj)
+
+
+def refresh_auto_qc_verdicts(run_analysis_obj):
+	"""
+	Work out the stored auto QC verdicts again after new metrics have been saved for a run analysis.
+
+	The run's other analysis types for the pipeline are included as DragenWGS NTCs are shared between them.
+
+	"""
+
+	run_analyses = RunAnalysis.objects.filter(run=run_analysis_obj.run, pipeline=run_analysis_obj.pipeline)
+
+	results, errors = auto_qc.refresh_verdicts(run_analyses)
 
-			ntc_contamination_aligned_reads=ntc_contamination_aligned_reads_dict[key]
+	for run_analysis in run_analyses:
 
-			new_reads_obj = ctDNAReads(sample_analysis = sample_analysis_obj, aligned_reads=aligned_reads, percent_ntc_contamination=ntc_contamination_aligned_reads)
+		if run_analysis.pk in errors:
 
-			new_reads_obj.save()
+			logger.warning(f'Could not work out the auto QC verdict for {run_analysis}: {errors[run_analysis.pk]!r}')
@@ -0,0 +1,126 @@
+"""
+Memoise the QC helper methods on the models for one request.
+
+The view_run_analysis template and the checks call the same helper for a sample analysis \
+several times, e.g. get_contamination, and each call queries its metric tables again. Methods \
+decorated with memoise keep their result for the rest of the scope, keyed by the model and \
+primary key of the instance so different instances of the same row share it.
+
+Nothing is kept outside a scope, MemoMiddleware opens one for each request. Saving or deleting \
+any row in a scope forgets the results of that row and of the rows its foreign keys point to, \
+so a metric row saved for a sample analysis forgets the results of the sample analysis. \
+Queryset update() and bulk_create() do not send signals, open a new scope after using them.
+
+"""
+import contextvars
+import functools
+from contextlib import contextmanager
+
+from django.db.models import ForeignKey
+from django.db.models.signals import post_save, post_delete
+
+# {(model label, pk): {method name: (returned, result or exception)}} for the current scope, None outside a scope
+_results = contextvars.ContextVar('qc_memo_results', default=None)
+
+@contextmanager
+def scope():
+	"""
+	Memoise the decorated methods until the block ends
+	"""
+
+	token = _results.set({})
+
+	try:
+
+		yield
+
+	finally:
+
+		_results.reset(token)
+
+
+def memoise(method):
+	"""
+	Keep the result of a method without arguments for the rest of the scope.
+
+	Exceptions are kept as well, so a missing metric row is only looked for once.
+
+	"""
+
+	name = method.__qualname__
+
+	@functools.wraps(method)
+	def wrapper(self):
+
+		results = _results.get()
+
+		if results is None or self.pk is None:
+
+			return method(self)
+
+		instance_results = results.setdefault((self._meta.label, self.pk), {})
+
+		if name not in instance_results:
+
+			try:
+
+				instance_results[name] = (True, method(self))
+
+			except Exception as e:
+
+				instance_results[name] = (False, e)
+
+		returned, result = instance_results[name]
+
+		if returned:
+
+			return result
+
+		raise result
+
+	return wrapper
+
+
+def forget(sender, instance, **kwargs):
+	"""
+	Forget the results of a saved or deleted row and the rows its foreign keys point to
+	"""
+
+	results = _results.get()
+
+	if not results:
+
+		return
+
+	results.pop((sender._meta.label, instance.pk), None)
+
+	for field in sender._meta.concrete_fields:
+
+		if isinstance(field, ForeignKey):
+
+			results.pop((field.related_model._meta.label, getattr(instance, field.attname)), None)
+
+
+def connect_signals():
+	"""
+	Forget results when rows are saved or deleted, called when the app is ready
+	"""
+
+	post_save.connect(forget, dispatch_uid='qc_memo_save')
+	post_delete.connect(forget, dispatch_uid='qc_memo_delete')
+
+
+class MemoMiddleware:
+	"""
+	Open a memoisation scope for each request
+	"""
+
+	def __init__(self, get_response):
+
+		self.get_response = get_response
+
+	def __call__(self, request):
+
+		with scope():
+
+			return self.get_response(request)
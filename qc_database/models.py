@@ -1,11 +1,12 @@
 from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
 from django.conf import settings
 from auditlog.registry import auditlog
 from auditlog.models import AuditlogHistoryField
 from django.contrib.auth.models import User
 import secrets
 
+from qc_database.memo import memoise
+
 class Instrument(models.Model):
 	"""
 	Model to hold a sequencer
@@ -45,10 +46,39 @@ class Run(models.Model):
 	num_indexes = models.IntegerField(blank=True, null=True)
 	length_index1 = models.IntegerField(blank=True, null=True)
 	length_index2 = models.IntegerField(blank=True, null=True)
+
+	class Meta:
+		# KPIs and the downloader select runs by date
+		indexes = [models.Index(fields=['instrument_date'], name='run_instrument_date_idx')]
 	
 	def __str__(self):
 		return str(self.run_id)
-	
+
+
+class RunScanState(models.Model):
+	"""
+	The state of a run folder in the raw data directory the last time update_database scanned it.
+
+	Used to skip run folders whose marker files have not changed since the last scan.
+
+	"""
+
+	run_path = models.CharField(max_length=1000, unique=True)
+	run = models.ForeignKey(Run, on_delete=models.CASCADE, null=True, blank=True)
+	sample_sheet_mtime = models.FloatField()
+	copy_complete_mtime = models.FloatField()
+	last_scanned = models.DateTimeField(auto_now=True)
+
+	def __str__(self):
+		return self.run_path
+
+	def is_unchanged(self, sample_sheet_mtime, copy_complete_mtime):
+		"""
+		Are the marker file modification times the same as at the last scan.
+		"""
+
+		return self.sample_sheet_mtime == sample_sheet_mtime and self.copy_complete_mtime == copy_complete_mtime
+
 
 class InteropRunQuality(models.Model):
 	"""
@@ -198,18 +228,32 @@ class RunAnalysis(models.Model):
 
 	class Meta:
 		unique_together = [['run', 'pipeline', 'analysis_type']]
+		# the home page and update_database select the watched run analyses, most run analyses are not watched
+		indexes = [models.Index(fields=['run'], condition=models.Q(watching=True), name='runanalysis_watching_idx')]
 
 	def __str__(self):
 		return self.run.run_id + '_' + self.pipeline.pipeline_id + '_' + self.analysis_type.analysis_type_id
 
+	def save(self, *args, **kwargs):
+
+		adding = self._state.adding
+
+		super().save(*args, **kwargs)
+
+		# link the sample analyses which were created before the run analysis
+		if adding:
+
+			SampleAnalysis.objects.filter(run = self.run_id,
+										pipeline = self.pipeline_id,
+										analysis_type = self.analysis_type_id,
+										run_analysis = None
+										).update(run_analysis = self)
+
 	def get_n_samples_completed(self):
 
 		count = 0
 
-		sample_analyses = SampleAnalysis.objects.filter(run = self.run,
-														pipeline = self.pipeline,
-														analysis_type = self.analysis_type
-														)
+		sample_analyses = SampleAnalysis.objects.filter(run_analysis = self)
 
 		completed = [x.results_completed for x in sample_analyses]
 
@@ -219,10 +263,7 @@ class RunAnalysis(models.Model):
 
 		count = 0
 
-		sample_analyses = SampleAnalysis.objects.filter(run = self.run,
-														pipeline = self.pipeline,
-														analysis_type = self.analysis_type
-														)
+		sample_analyses = SampleAnalysis.objects.filter(run_analysis = self)
 
 		completed = [x.results_valid for x in sample_analyses]
 
@@ -253,9 +294,7 @@ class RunAnalysis(models.Model):
 												)
 		else:
 
-			samples = SampleAnalysis.objects.filter(run = self.run,
-												pipeline = self.pipeline,
-												analysis_type = self.analysis_type,
+			samples = SampleAnalysis.objects.filter(run_analysis = self,
 												worksheet = worksheet
 												)
 		ntc_samples = []
@@ -274,15 +313,11 @@ class RunAnalysis(models.Model):
 
 		worksheets = []
 
-		samples = SampleAnalysis.objects.filter(
-			run = self.run,
-			pipeline = self.pipeline,
-			analysis_type = self.analysis_type
-			)
+		samples = SampleAnalysis.objects.filter(run_analysis = self)
 
 		for sample in samples:
 
-			worksheets.append(sample.worksheet.worksheet_id)
+			worksheets.append(sample.worksheet_id)
 
 		return '|'.join(list(set(worksheets)))
 
@@ -314,6 +349,7 @@ class RunAnalysis(models.Model):
 
 				return False
 
+	@memoise
 	def passes_relatedness(self):
 
 		relatedness_obj = RelatednessQuality.objects.filter(run_analysis = self)
@@ -328,249 +364,69 @@ class RunAnalysis(models.Model):
 		"""
 		Check whether the run analysis passes all QC checks.
 
-		Reads from config file to find out which checks to complete.
+		Reads from config file to find out which checks to complete. The checks are worked out by \
+		qc_database/auto_qc.py, which loads each metric table once for the whole run analysis, and \
+		the verdict is stored in AutoQCVerdict until the data or settings it depends on change.
 
 		"""
 
-		checks_to_do = self.auto_qc_checks
-
-		if checks_to_do == None:
-
-			return False, ['No Configuration For this Pipeline.']
-
-		checks_to_do = checks_to_do.split(',')
-
-		samples = SampleAnalysis.objects.filter(run = self.run,
-												pipeline = self.pipeline,
-												analysis_type = self.analysis_type)
-
-
-		# check is complete and valid
-
-		new_samples_list = []
-
-		reasons_to_fail = []
-
-		if self.demultiplexing_completed == False:
-
-			reasons_to_fail.append('Demultiplexing not complete for some samples')
-
-		if self.demultiplexing_valid == False:
-
-			reasons_to_fail.append( 'Demultiplexing not valid for some samples')
-
-		if self.results_completed == False:
-
-			return False,['Run results not completed']
-
-		if self.results_valid == False:
-
-			return False,['Run results not valid']
-
-
-		fail_samples = []
-
-		for sample in samples:
-
-			if sample.results_completed == False:
-
-				reasons_to_fail.append('Results not complete for some samples')
-				fail_samples.append(sample.sample.sample_id)
-
-			if sample.results_valid == False:
-
-				reasons_to_fail.append('Results not valid for some samples')
-				fail_samples.append(sample.sample.sample_id)
-
-
-			if sample.sample.is_ntc() == False:
-
-				new_samples_list.append(sample)
-
-		if 'pct_q30' in checks_to_do:
-
-			if self.passes_run_level_qc() == False:
-
-				reasons_to_fail.append('Q30 Fail')
-
-				for sample in new_samples_list:
-
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'relatedness' in checks_to_do:
-			
-			if self.passes_relatedness()[0] == False:
-				
-				reasons_to_fail.append(self.passes_relatedness()[1])
-
-		if 'contamination' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				if sample.passes_contamination() == False:
-
-					reasons_to_fail.append('Contamination Fail')
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'ntc_contamination' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				if sample.passes_ntc_contamination() != True:
-
-					reasons_to_fail.append('NTC Contamination Fail')
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'min_average_coverage' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				#Only hard failure for GE, just a warning in WGS
-
-				if 'DragenGE' in self.pipeline.pipeline_id:
-					try:
-						if sample.passes_average_coverage() != True:
-
-							reasons_to_fail.append('CNV Coverage Fail')
-				
-					except ObjectDoesNotExist:
-						# handles old runs where the check exists but CNV calling hasn't been run
-						pass 
-		
-		if 'max_cnv_calls' in checks_to_do:
-
-			for sample in new_samples_list:
-				
-				#Only hard failure for GE, just a warning in WGS
-				if 'DragenGE' in self.pipeline.pipeline_id:
-					try:
-						if sample.passes_cnv_calling() != True:
-
-							reasons_to_fail.append('CNV Calling Fail')
-				
-					except ObjectDoesNotExist:
-						# handles old runs where the check exists but CNV calling hasn't been run
-						pass
-						
-		#Coverage check for WGSCNV calls only
-		if 'min_average_coverage' in checks_to_do:
-		
-			for sample in new_samples_list:
-			
-				if sample.passes_average_coverage() == False:
-				
-					reasons_to_fail.append('Average Coverage Fail')
-
-		# DNA
-		if 'ntc_contamination_TSO500' in checks_to_do:
-
-			for sample_object in new_samples_list:
-
-				if "NTC" not in sample_object.sample_id:
+		# imported here as auto_qc imports the models
+		from qc_database import auto_qc
 
-					if sample_object.passes_percent_ntc_tso500() != True:
+		results, errors = auto_qc.get_verdicts([self])
 
-						reasons_to_fail.append('NTC Contamination Fail')
-						fail_samples.append(sample.sample.sample_id)
+		if self.pk in errors:
 
-		# RNA
-		if 'reads_tso500' in checks_to_do:
+			raise errors[self.pk]
 
-			for sample in new_samples_list:
+		return results[self.pk]
 
-				if sample.passes_reads_tso500() != True:
-
-					reasons_to_fail.append('TSO500 Read Fail')
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'sex_match' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				if sample.passes_sex_check() == False:
-
-					reasons_to_fail.append('Sex Match Fail')
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'variant_check' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				if sample.passes_variant_count_check() == False:
-
-					reasons_to_fail.append('Variant Count Fail')
-
-		if 'sensitivity' in checks_to_do:
-
-			if self.passes_sensitivity() == False:
-
-				reasons_to_fail.append('Low Sensitivity')
-				
-		if 'coverage' in checks_to_do:
-			
-			for sample in new_samples_list:
-
-				if sample.passes_region_coverage_over_20() == False:
-
-					reasons_to_fail.append('Low Coverage >20x')
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'titv' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				if sample.passes_titv() == False:
-
-					reasons_to_fail.append('Titv Ratio out of range for at least one sample')
-					fail_samples.append(sample.sample.sample_id)
-
-		if 'fastqc' in checks_to_do:
-
-			for sample in new_samples_list:
-
-				if sample.passes_fastqc() == False:
-
-					reasons_to_fail.append('FASTQC Fail')
-					fail_samples.append(sample.sample.sample_id)
 
+class RelatednessQuality(models.Model):
+	"""
+	Model to calculate whether relatedness passes or fails
+	"""
+	run_analysis = models.ForeignKey(RunAnalysis, on_delete=models.CASCADE)
+	results_valid = models.BooleanField(default=False)
+	comment = models.TextField(null=True, blank=True)
 
-		if 'fusion_contamination' in checks_to_do:
+	def __str__(self):
+		return str(self.run_analysis) + " - " + str(self.results_valid)
 
-			for sample in new_samples_list:
 
-				if sample.passes_fusion_contamination() == False:
+class AutoQCVerdict(models.Model):
+	"""
+	The stored result of RunAnalysis.passes_auto_qc, see qc_database/auto_qc.py.
 
-					reasons_to_fail.append('Fusion Contamination Fail')
-					fail_samples.append(sample.sample.sample_id)
+	Worked out again by update_database when it saves new metrics or sample results for the run \
+	analysis, removed when a sample analysis or metric row is saved anywhere else and ignored \
+	once the run analysis's checks, thresholds or sign off no longer match settings_hash.
 
-		if 'fusion_alignment' in checks_to_do:
+	If the checks raised an exception, e.g. as a threshold is missing, passes is None and reasons \
+	holds the exception so the checks are not worked out again until something changes.
 
-			for sample in new_samples_list:
+	"""
 
-				if sample.passes_fusion_aligned_reads_duplicates() == False:
+	run_analysis = models.OneToOneField(RunAnalysis, on_delete=models.CASCADE, related_name='auto_qc_verdict')
+	passes = models.BooleanField(null=True)
+	reasons = models.JSONField(default=list)
+	fail_samples = models.JSONField(null=True, blank=True)
+	settings_hash = models.CharField(max_length=64)
+	updated = models.DateTimeField(auto_now=True)
 
-					reasons_to_fail.append('Fusion Aligned Reads Unique Fail')
-					fail_samples.append(sample.sample.sample_id)
+	def __str__(self):
+		return str(self.run_analysis) + " - " + str(self.passes)
 
-		if len(reasons_to_fail) ==0:
+	def get_result(self):
+		"""
+		The verdict in the same form as RunAnalysis.passes_auto_qc returns it
+		"""
 
-			return True, ['All Pass']
+		if self.fail_samples is None:
 
-		else:
+			return self.passes, self.reasons
 
-			return False, list(set(reasons_to_fail)), fail_samples
-
-
-class RelatednessQuality(models.Model):
-	"""
-	Model to calculate whether relatedness passes or fails
-	"""
-	run_analysis = models.ForeignKey(RunAnalysis, on_delete=models.CASCADE)
-	results_valid = models.BooleanField(default=False)
-	comment = models.TextField(null=True, blank=True)
-
-	def __str__(self):
-		return str(self.run_analysis) + " - " + str(self.results_valid)
+		return self.passes, self.reasons, self.fail_samples
 
 
 class SampleAnalysis(models.Model):
@@ -585,6 +441,8 @@ class SampleAnalysis(models.Model):
 	pipeline = models.ForeignKey(Pipeline, on_delete=models.CASCADE)
 	analysis_type = models.ForeignKey(AnalysisType, on_delete=models.CASCADE)
 	worksheet = models.ForeignKey(WorkSheet, on_delete=models.CASCADE)
+	# the run analysis with the same run, pipeline and analysis type, linked by save
+	run_analysis = models.ForeignKey(RunAnalysis, on_delete=models.SET_NULL, null=True, blank=True)
 	results_completed = models.BooleanField(default = False)
 	results_valid = models.BooleanField(default=False)
 	sex = models.CharField(max_length=10, null=True, blank=True)
@@ -603,6 +461,19 @@ class SampleAnalysis(models.Model):
 	def __str__(self):
 		return f'{self.run.run_id}_{self.pipeline.pipeline_id}_{self.analysis_type.analysis_type_id}_{self.sample.sample_id}'
 
+	def save(self, *args, **kwargs):
+
+		# link the run analysis if it was created before the sample analysis
+		if self.run_analysis_id is None:
+
+			self.run_analysis = RunAnalysis.objects.filter(run = self.run_id,
+															pipeline = self.pipeline_id,
+															analysis_type = self.analysis_type_id
+															).first()
+
+		super().save(*args, **kwargs)
+
+	@memoise
 	def passes_fastqc(self):
 		"""
 		Does the sample have a PASS for the key FASTQC metrics?
@@ -672,6 +543,7 @@ class SampleAnalysis(models.Model):
 		
 		return worst_consequence
 
+	@memoise
 	def display_fastqc_checks(self):
 		"""
 		Give Exact Metrics for FastQC
@@ -711,6 +583,7 @@ class SampleAnalysis(models.Model):
 
 				return None			
 
+	@memoise
 	def get_total_reads(self):
 
 
@@ -732,6 +605,7 @@ class SampleAnalysis(models.Model):
 
 		return None
 
+	@memoise
 	def get_contamination(self):
 
 
@@ -791,10 +665,7 @@ class SampleAnalysis(models.Model):
 
 		if "ctdna" not in str(self.pipeline):
 		
-			run_analysis = RunAnalysis.objects.get(run = self.run,
-											pipeline = self.pipeline,
-											analysis_type = self.analysis_type
-												)
+			run_analysis = self.run_analysis
 
 			total_reads = self.get_total_reads()
 
@@ -847,6 +718,7 @@ class SampleAnalysis(models.Model):
 					
 					return False
 
+	@memoise
 	def get_reads_tso500(self):
 
 		try:
@@ -901,6 +773,7 @@ class SampleAnalysis(models.Model):
 
 			return 'NA'
 
+	@memoise
 	def get_calculated_sex(self):
 
 		if 'DragenWGS' in self.pipeline.pipeline_id:
@@ -958,20 +831,9 @@ class SampleAnalysis(models.Model):
 
 	def get_run_analysis(self):
 
-		try:
-
-			run_analysis = RunAnalysis.objects.get(
-				run = self.run,
-				pipeline = self.pipeline,
-				analysis_type = self.analysis_type
-				)
-
-		except:
-
-			return None
-
-		return run_analysis
+		return self.run_analysis
 
+	@memoise
 	def get_variant_count(self):
 
 		if 'DragenWGS' in self.pipeline.pipeline_id or 'DragenGE' in self.pipeline.pipeline_id:
@@ -1027,6 +889,7 @@ class SampleAnalysis(models.Model):
 
 		return False
 
+	@memoise
 	def get_region_coverage_over_20(self):
 
 		try:
@@ -1073,6 +936,7 @@ class SampleAnalysis(models.Model):
 
 		return False
 
+	@memoise
 	def get_titv(self):
 
 		try:
@@ -1111,6 +975,7 @@ class SampleAnalysis(models.Model):
 
 		return True
 
+	@memoise
 	def get_aligned_reads_fusion(self):
 
 		try:
@@ -1126,6 +991,7 @@ class SampleAnalysis(models.Model):
 
 			return alignment_metrics[0]
 
+	@memoise
 	def get_percent_ntc_tso500(self):
 
 		try:
@@ -1141,6 +1007,7 @@ class SampleAnalysis(models.Model):
 
 			return tso500_reads[0].percent_ntc_reads
 
+	@memoise
 	def get_percent_ntc_aligned_tso500(self):
 
 		try:
@@ -1203,6 +1070,7 @@ class SampleAnalysis(models.Model):
 
 		return False
 
+	@memoise
 	def get_total_pf_reads_tso500(self):
 
 		try:
@@ -1218,6 +1086,7 @@ class SampleAnalysis(models.Model):
 
 			return tso500_reads_DNA[0].total_pf_reads
 
+	@memoise
 	def get_total_aligned_reads_tso500(self):
 
 		try:
@@ -1233,6 +1102,7 @@ class SampleAnalysis(models.Model):
 
 			return tso500_aligned_reads_DNA[0].aligned_reads
 
+	@memoise
 	def get_contamination_fusion(self):
 
 		try:
@@ -1248,6 +1118,7 @@ class SampleAnalysis(models.Model):
 
 			return contamination_metrics[0].contamination
 
+	@memoise
 	def get_contamination_referral_fusion(self):
 
 		try:
@@ -1293,6 +1164,7 @@ class SampleAnalysis(models.Model):
 
 		return True
 		
+	@memoise
 	def get_exome_cnv_qc_metrics(self):
 		if 'DragenGE' in self.pipeline.pipeline_id:
 			cnv_calling_metrics = CNVMetrics.objects.get(sample_analysis=self)
@@ -1315,6 +1187,7 @@ class SampleAnalysis(models.Model):
 			else:
 				return False
       
+	@memoise
 	def get_ctDNA_aligned_reads(self):
 	
 		try:
@@ -1330,6 +1203,7 @@ class SampleAnalysis(models.Model):
 
 			return ctDNA_aligned_reads[0].aligned_reads
 
+	@memoise
 	def get_average_coverage(self):
 		"""
 		Average coverage metric for CNV calling
@@ -1396,6 +1270,7 @@ class SampleAnalysis(models.Model):
 			return None
 				
 			
+	@memoise
 	def get_cnv_count(self):
 		"""
 		Combination of passing amplifications and passing deletions
@@ -1438,6 +1313,7 @@ class SampleAnalysis(models.Model):
 			return False
 		
 
+	@memoise
 	def get_pct_on_target(self):
 		"""
 		Returns the percentage of reads aligned for this sample
@@ -1471,6 +1347,9 @@ class SampleFastqcData(models.Model):
 	adapter_content = models.CharField(max_length=10)
 	kmer_content = models.CharField(max_length=10, null=True, blank=True)
 
+	class Meta:
+		unique_together = [['sample_analysis', 'read_number', 'lane']]
+
 	def __str__(self):
 		return f'{self.sample_analysis}_{self.read_number}_{self.lane}'
 
@@ -1479,7 +1358,7 @@ class SampleDragenFastqcData(models.Model):
 	"""
 	Model to store data from the Dragen FastQC output, there will be a single entry per sample analysis
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE, null=True)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE, null=True)
 	overall_pass_fail = models.CharField(max_length=10, null=True)
 	coverage_pass_fail = models.CharField(max_length=10, null=True)
 	per_base_sequence_quality = models.CharField(max_length=10, null=True)
@@ -1496,7 +1375,7 @@ class SampleHsMetrics(models.Model):
 	One per sample.
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 
 	bait_set = models.CharField(max_length=255)
 	genome_size = models.BigIntegerField(null=True)
@@ -1566,7 +1445,7 @@ class SampleDepthofCoverageMetrics(models.Model):
 
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	total = models.BigIntegerField()
 	mean = models.DecimalField(max_digits=20, decimal_places=4, null=True)
 	granular_first_quartile = models.IntegerField()
@@ -1586,7 +1465,7 @@ class DuplicationMetrics(models.Model):
 
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	library = models.CharField(max_length=255)
 	unpaired_reads_examined = models.IntegerField()
 	read_pairs_examined = models.BigIntegerField()
@@ -1607,7 +1486,7 @@ class ContaminationMetrics(models.Model):
 	Metrics from the Contamination program
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	num_snps = models.IntegerField()
 	num_reads = models.IntegerField()
 	avg_dp = models.DecimalField(max_digits=20, decimal_places=4)
@@ -1624,7 +1503,7 @@ class CalculatedSexMetrics(models.Model):
 	Store the calculated sex
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	calculated_sex = models.CharField(max_length=10)
 
 	def __str__(self):
@@ -1663,6 +1542,9 @@ class AlignmentMetrics(models.Model):
 	pct_chimeras = models.DecimalField(max_digits=6, decimal_places=4)
 	pct_adapter = models.DecimalField(max_digits=6, decimal_places=4)
 
+	class Meta:
+		unique_together = [['sample_analysis', 'category']]
+
 	def __str__(self):
 		return str(self.sample_analysis) + '_' + self.category
 
@@ -1673,7 +1555,7 @@ class VariantCallingMetrics(models.Model):
 
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	het_homvar_ratio = models.DecimalField(max_digits=7, decimal_places=3, null=True, blank=True)
 	pct_gq0_variants = models.DecimalField(max_digits=6, decimal_places=3, null=True, blank=True)
 	total_gq0_variants  = models.IntegerField()
@@ -1709,7 +1591,7 @@ class InsertMetrics(models.Model):
 
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	mode_insert_size = models.IntegerField(null=True, blank=True) 
 	median_insert_size = models.DecimalField(null=True, blank=True, max_digits=10, decimal_places=3)
 	median_absolute_deviation = models.DecimalField(null=True, blank=True, max_digits=10, decimal_places=3)
@@ -1740,7 +1622,7 @@ class VCFVariantCount(models.Model):
 	Store a count of the variants in a VCF
 
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	variant_count = models.IntegerField()
 
 
@@ -1762,7 +1644,7 @@ class DragenAlignmentMetrics(models.Model):
 	Store the dragen alignments metrics file
 	"""
 
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	total_input_reads = models.BigIntegerField(null=True, blank=True)
 	number_of_duplicate_marked_reads = models.BigIntegerField(null=True, blank=True)
 	number_of_duplicate_marked_and_mate_reads_removed = models.BigIntegerField(null=True, blank=True)
@@ -1845,7 +1727,7 @@ class DragenVariantCallingMetrics(models.Model):
 	"""
 	Store the dragen variant calling metrics file
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	total = models.IntegerField(null=True, blank=True)
 	biallelic = models.IntegerField(null=True, blank=True)
 	multiallelic = models.IntegerField(null=True, blank=True)
@@ -1872,7 +1754,7 @@ class DragenWGSCoverageMetrics(models.Model):
 	"""
 	Store the dragen WGS coverage metrics file
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	aligned_bases = models.BigIntegerField(null=True, blank=True)
 	aligned_bases_in_genome = models.BigIntegerField(null=True, blank=True)
 	average_alignment_coverage_over_genome = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
@@ -1917,7 +1799,7 @@ class DragenRegionCoverageMetrics(models.Model):
 	"""
 	Store the dragen region coverage metrics file
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	aligned_bases  = models.BigIntegerField(null=True, blank=True)
 	aligned_bases_in_qc_coverage_region  = models.BigIntegerField(null=True, blank=True)
 	average_alignment_coverage_over_qc_coverage_region = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
@@ -1963,7 +1845,7 @@ class FusionContamination(models.Model):
 	Data for the SomaticFusion pipelines contamination metric
 
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	contamination = models.BooleanField()
 	contamination_referral = models.BooleanField()
 
@@ -1973,7 +1855,7 @@ class FusionAlignmentMetrics(models.Model):
 	Data on SomaticFusion alignment metrics
 
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	aligned_reads = models.IntegerField()
 	pct_reads_aligned = models.DecimalField(max_digits=6, decimal_places=2)
 	unique_reads_aligned = models.IntegerField()
@@ -1985,7 +1867,7 @@ class Tso500Reads(models.Model):
 	Data on SomaticFusion alignment metrics
 
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	total_on_target_reads= models.IntegerField(null=True)
 	total_pf_reads = models.IntegerField(null=True)
 	percent_ntc_reads = models.IntegerField(null=True)
@@ -1997,7 +1879,7 @@ class ctDNAReads(models.Model):
 	"""
 	Parsed read numbers from ctDNA samples
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	aligned_reads = models.IntegerField(null=True)
 	percent_ntc_contamination = models.IntegerField(null=True)
 
@@ -2007,7 +1889,7 @@ class DragenPloidyMetrics(models.Model):
 	Data for Dragen V7 Sex Metrics
 
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	ploidy_estimation = models.CharField(max_length=10, blank=True, null=True)
 
 
@@ -2016,7 +1898,7 @@ class CustomCoverageMetrics(models.Model):
 	Model for custom coverage metrics from nextflow pipeline
 
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	mean_depth = models.DecimalField(max_digits=8, decimal_places=1, null=True)
 	min_depth = models.DecimalField(max_digits=8, decimal_places=1, null=True)
 	max_depth = models.DecimalField(max_digits=8, decimal_places=1, null=True)
@@ -2031,7 +1913,7 @@ class CNVMetrics(models.Model):
 	"""
 	Model for sample-level CNV calling metrics for Dragen GE postprocessing workflows
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	max_corr = models.DecimalField(max_digits=8, decimal_places=3, null=True)
 	max_over_threshold = models.BooleanField()
 	n_over_threshold = models.IntegerField(null=True)
@@ -2048,7 +1930,7 @@ class DragenCNVMetrics(models.Model):
 	"""
 	Model for sample level CNV calling metrics from DragenWGS
 	"""
-	sample_analysis = models.ForeignKey(SampleAnalysis, on_delete=models.CASCADE)
+	sample_analysis = models.OneToOneField(SampleAnalysis, on_delete=models.CASCADE)
 	bases_in_reference_genome = models.BigIntegerField(null=True, blank=True)
 	average_alignment_coverage_over_genome = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
 	number_of_alignment_records = models.BigIntegerField(null=True, blank=True)
@@ -1,12 +1,51 @@
 from rest_framework import serializers
 from .models import RunAnalysis, SampleAnalysis
+from . import auto_qc
+
+class RunAnalysisListSerializer(serializers.ListSerializer):
+    """
+    Reads the auto QC verdicts of all the run analyses in the list at once.
+
+    Only the verdicts of watched run analyses, or of every run analysis when the view sets \
+    refresh_auto_qc in the context, are worked out if missing or out of date. The others are \
+    returned as stored so listing every run analysis does not work out the checks for the \
+    whole database.
+
+    """
+
+    def to_representation(self, data):
+        run_analyses = list(data.all() if hasattr(data, 'all') else data)
+        results, errors, stale = auto_qc.get_stored_verdicts(run_analyses)
+        to_refresh = [run_analysis for run_analysis in stale if run_analysis.watching or self.context.get('refresh_auto_qc')]
+        if len(to_refresh) > 0:
+            new_results, new_errors = auto_qc.refresh_verdicts(to_refresh)
+            results.update(new_results)
+            errors.update(new_errors)
+        self.context['auto_qc_verdicts'] = (results, errors)
+        return super().to_representation(run_analyses)
 
 class RunAnalysisSerializer(serializers.ModelSerializer):
+    # the stored auto QC verdict, None if there is none, passes is None if the checks raised an exception
+    auto_qc = serializers.SerializerMethodField()
+
     class Meta:
         model = RunAnalysis
         fields = '__all__'
+        list_serializer_class = RunAnalysisListSerializer
+
+    def get_auto_qc(self, run_analysis):
+        verdicts = self.context.get('auto_qc_verdicts')
+        if verdicts is None:
+            verdicts = auto_qc.get_verdicts([run_analysis])
+        results, errors = verdicts
+        if run_analysis.pk in errors:
+            return {'passes': None, 'reasons': [str(errors[run_analysis.pk])], 'fail_samples': None}
+        result = results.get(run_analysis.pk)
+        if result is None:
+            return None
+        return {'passes': result[0], 'reasons': result[1], 'fail_samples': result[2] if len(result) == 3 else None}
 
 class SampleAnalysisSerializer(serializers.ModelSerializer):
     class Meta:
         model = SampleAnalysis
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
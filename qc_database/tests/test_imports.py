@@ -0,0 +1,62 @@
+import json
+import subprocess
+import sys
+import unittest
+
+# modules which should only be loaded by the code which needs them
+HEAVY_MODULES = ['pandas', 'numpy', 'plotly', 'pysam', 'interop', 'openpyxl']
+
+# seconds allowed for importing a module after django is set up
+IMPORT_BUDGET = 2
+
+IMPORT_SCRIPT = '''
+import json
+import sys
+import time
+
+import django
+
+django.setup()
+
+start = time.perf_counter()
+
+__import__(sys.argv[1])
+
+elapsed = time.perf_counter() - start
+
+print(json.dumps({'elapsed': elapsed, 'loaded': [module for module in sys.argv[2:] if module in sys.modules]}))
+'''
+
+
+def time_import(module):
+	"""
+	Import module in a new interpreter, returns the seconds taken and which heavy modules it loaded
+	"""
+
+	output = subprocess.run([sys.executable, '-c', IMPORT_SCRIPT, module] + HEAVY_MODULES, capture_output=True, text=True, check=True)
+
+	result = json.loads(output.stdout.strip().splitlines()[-1])
+
+	return result['elapsed'], result['loaded']
+
+
+class TestImportTime(unittest.TestCase):
+
+	def check_import(self, module):
+
+		elapsed, loaded = time_import(module)
+
+		self.assertEqual(loaded, [], f'{module} loaded {loaded}')
+		self.assertLess(elapsed, IMPORT_BUDGET, f'{module} took {elapsed:.2f}s to import')
+
+	def test_web(self):
+
+		self.check_import('mysite.urls')
+
+	def test_parsers(self):
+
+		self.check_import('pipelines.parsers')
+
+	def test_generate_samplesheet(self):
+
+		self.check_import('sample_sheet.management.commands.generate_samplesheet')
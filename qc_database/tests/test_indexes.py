@@ -0,0 +1,120 @@
+import re
+import datetime
+
+from django.db import connection
+from django.test import TestCase
+
+from qc_database import auto_qc
+from qc_database.models import *
+
+
+def get_query_plan(queryset):
+	"""
+	The database's query plan for a queryset.
+
+	Postgres prefers sequential scans of small tables so they are turned off for the test \
+	transaction, a table without a usable index is then still scanned.
+
+	"""
+
+	if connection.vendor == 'postgresql':
+
+		with connection.cursor() as cursor:
+
+			cursor.execute('SET LOCAL enable_seqscan = off')
+
+	return queryset.explain()
+
+
+def get_full_scans(plan):
+	"""
+	The tables a query plan reads without an index
+	"""
+
+	if connection.vendor == 'postgresql':
+
+		return re.findall(r'Seq Scan on (\w+)', plan)
+
+	return re.findall(r'SCAN (\w+)$', plan, re.MULTILINE)
+
+
+def get_indexes_used(plan):
+
+	if connection.vendor == 'postgresql':
+
+		return re.findall(r'(?:Index Scan using|Index Only Scan using|Bitmap Index Scan on) (\w+)', plan)
+
+	return re.findall(r'USING (?:COVERING )?INDEX (\w+)', plan)
+
+
+class TestIndexes(TestCase):
+	"""
+	Test that the hot queries use an index rather than reading the whole table
+	"""
+
+	fixtures = ['test_data']
+
+	def assertUsesIndex(self, queryset, index=None):
+
+		plan = get_query_plan(queryset)
+
+		self.assertEqual(get_full_scans(plan), [], plan)
+
+		if index is not None:
+
+			self.assertIn(index, get_indexes_used(plan), plan)
+
+	def test_metrics_by_sample_analysis(self):
+
+		sample_analysis = SampleAnalysis.objects.first()
+
+		models = set(model for check_models in auto_qc.CHECK_MODELS.values() for model in check_models)
+		models.update([SampleHsMetrics, SampleDepthofCoverageMetrics, DuplicationMetrics, InsertMetrics, AlignmentMetrics])
+
+		for model in models:
+
+			with self.subTest(model=model.__name__):
+
+				self.assertUsesIndex(model.objects.filter(sample_analysis=sample_analysis))
+
+	def test_fastqc_by_read_and_lane(self):
+
+		fastqc = SampleFastqcData.objects.first()
+
+		self.assertUsesIndex(SampleFastqcData.objects.filter(sample_analysis=fastqc.sample_analysis, read_number=fastqc.read_number, lane=fastqc.lane))
+
+	def test_runs_by_date(self):
+
+		runs = Run.objects.filter(instrument_date__range=(datetime.date(2019, 1, 1), datetime.date(2019, 12, 31))).order_by('instrument_date', 'experiment')
+
+		self.assertUsesIndex(runs, 'run_instrument_date_idx')
+
+	def test_kpi_queries(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		self.assertUsesIndex(RunAnalysis.objects.filter(run=run_analysis.run_id))
+		self.assertUsesIndex(SampleAnalysis.objects.filter(run_analysis=run_analysis))
+
+	def test_downloader_samples(self):
+
+		samples = SampleAnalysis.objects.filter(
+				analysis_type__in=['IlluminaTruSightCancer'],
+				run__instrument_date__gte=datetime.date(2019, 1, 1),
+				run__instrument_date__lte=datetime.date(2019, 12, 31)
+			).select_related('run', 'sample', 'run__instrument')
+
+		self.assertUsesIndex(samples)
+
+	def test_watched_run_analyses(self):
+
+		self.assertUsesIndex(RunAnalysis.objects.filter(watching=True), 'runanalysis_watching_idx')
+		self.assertUsesIndex(RunAnalysis.objects.filter(watching=True).order_by('-run', '-pk'), 'runanalysis_watching_idx')
+
+	def test_one_row_per_sample(self):
+
+		hs_metrics = SampleHsMetrics.objects.first()
+
+		self.assertEqual(hs_metrics.sample_analysis.samplehsmetrics, hs_metrics)
+		self.assertTrue(SampleHsMetrics._meta.get_field('sample_analysis').one_to_one)
+		self.assertFalse(AlignmentMetrics._meta.get_field('sample_analysis').one_to_one)
@@ -0,0 +1,135 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from qc_database.models import *
+from qc_database import management_utils
+
+
+class TestBulkAddMetrics(TestCase):
+	"""
+	Test the metric loaders in management_utils
+	"""
+
+	fixtures = ['test_data']
+
+	def setUp(self):
+
+		self.run_analysis = RunAnalysis.objects.get(pk=16)
+
+		self.sample_analyses = SampleAnalysis.objects.filter(run = self.run_analysis.run,
+															pipeline = self.run_analysis.pipeline,
+															analysis_type = self.run_analysis.analysis_type)
+
+		self.sample_ids = [sample_analysis.sample_id for sample_analysis in self.sample_analyses]
+
+	def test_add_sex_metrics(self):
+
+		CalculatedSexMetrics.objects.filter(sample_analysis__in=self.sample_analyses).delete()
+
+		sex_dict = {sample_id: {'sex': 'FEMALE'} for sample_id in self.sample_ids}
+
+		# sample analyses, existing rows and one insert
+		with self.assertNumQueries(3):
+
+			management_utils.add_sex_metrics(sex_dict, self.run_analysis, 'sex')
+
+		self.assertEqual(CalculatedSexMetrics.objects.filter(sample_analysis__in=self.sample_analyses).count(), len(self.sample_ids))
+
+		# existing rows are not added again
+		management_utils.add_sex_metrics(sex_dict, self.run_analysis, 'sex')
+
+		self.assertEqual(CalculatedSexMetrics.objects.filter(sample_analysis__in=self.sample_analyses).count(), len(self.sample_ids))
+
+	def test_add_fastqc_data_per_read(self):
+
+		SampleFastqcData.objects.filter(sample_analysis__in=self.sample_analyses).delete()
+
+		sample_id = self.sample_ids[0]
+
+		fastqc_dict = {sample_id: [{'read_number': 'R1', 'lane': 'L001', 'basic_statistics': 'PASS'},
+									{'read_number': 'R2', 'lane': 'L001', 'basic_statistics': 'PASS'}]}
+
+		management_utils.add_fastqc_data(fastqc_dict, self.run_analysis)
+
+		fastqc_dict[sample_id].append({'read_number': 'R1', 'lane': 'L002', 'basic_statistics': 'PASS'})
+
+		management_utils.add_fastqc_data(fastqc_dict, self.run_analysis)
+
+		self.assertEqual(SampleFastqcData.objects.filter(sample_analysis__sample_id=sample_id, sample_analysis__run=self.run_analysis.run).count(), 3)
+
+	def test_add_insert_metrics_coerces_values(self):
+
+		InsertMetrics.objects.filter(sample_analysis__in=self.sample_analyses).delete()
+
+		sample_id = self.sample_ids[0]
+
+		insert_dict = {sample_id: {'mode_insert_size': '175', 'mean_insert_size': '185.3', 'standard_deviation': '?', 'pair_orientation': 'FR'}}
+
+		management_utils.add_insert_metrics(insert_dict, self.run_analysis)
+
+		# converted to the field types before they are written
+		self.assertEqual(insert_dict[sample_id]['mode_insert_size'], 175)
+		self.assertIsNone(insert_dict[sample_id]['standard_deviation'])
+		self.assertNotIn('sample_analysis', insert_dict[sample_id])
+
+		insert_metrics = InsertMetrics.objects.get(sample_analysis__sample_id=sample_id, sample_analysis__run=self.run_analysis.run)
+
+		self.assertEqual(insert_metrics.mode_insert_size, 175)
+		self.assertEqual(insert_metrics.mean_insert_size, Decimal('185.3'))
+		self.assertIsNone(insert_metrics.standard_deviation)
+
+	def test_unknown_sample(self):
+
+		with self.assertRaises(SampleAnalysis.DoesNotExist):
+
+			management_utils.add_sex_metrics({'not_a_sample': {'sex': 'MALE'}}, self.run_analysis, 'sex')
+
+	def test_sample_on_two_worksheets(self):
+
+		sample_analysis = self.sample_analyses.first()
+
+		sample_analysis.pk = None
+		sample_analysis._state.adding = True
+		sample_analysis.worksheet = WorkSheet.objects.create(worksheet_id='other_worksheet')
+		sample_analysis.save()
+
+		with self.assertRaises(SampleAnalysis.MultipleObjectsReturned):
+
+			management_utils.add_sex_metrics({sample_analysis.sample_id: {'sex': 'MALE'}}, self.run_analysis, 'sex')
+
+
+class TestDimensionCache(TestCase):
+	"""
+	Test the ingestion lookup cache
+	"""
+
+	def test_get_many(self):
+
+		Sample.objects.create(sample_id='21M00001')
+
+		dimension_cache = management_utils.DimensionCache()
+
+		# one query for existing samples and one insert for the new one
+		with self.assertNumQueries(2):
+
+			dimension_cache.get_many(Sample, ['21M00001', '21M00002'])
+
+		self.assertTrue(Sample.objects.filter(sample_id='21M00002').exists())
+
+		with self.assertNumQueries(0):
+
+			sample_obj = dimension_cache.get(Sample, '21M00002')
+
+		self.assertEqual(sample_obj.sample_id, '21M00002')
+
+	def test_preload(self):
+
+		Pipeline.objects.create(pipeline_id='DragenWGS-master')
+
+		dimension_cache = management_utils.DimensionCache()
+		dimension_cache.preload(Pipeline)
+
+		with self.assertNumQueries(0):
+
+			dimension_cache.get(Pipeline, 'DragenWGS-master')
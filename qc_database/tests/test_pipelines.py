@@ -1,5 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
 import unittest
-from pipelines import nextflow_pipelines, somatic_pipelines, dragen_pipelines, TSO500_pipeline, ctDNA_pipeline
+from pathlib import Path
+from unittest import mock
+
+import pysam
+from interop import py_interop_run, py_interop_run_metrics, py_interop_metrics, py_interop_comm
+
+from pipelines import nextflow_pipelines, somatic_pipelines, TSO500_pipeline, ctDNA_pipeline, monitoring, parsers, pipeline_config, run_watcher, manifest, variant_counter, parse_cache, interop_extractor, picard_metrics, dragen_metrics, sample_fetcher
+
+
+INTEROP_RUN_INFO = """<?xml version="1.0"?>
+<RunInfo Version="5">
+	<Run Id="{run_id}" Number="75">
+		<Flowcell>AHVHYCDRXX</Flowcell>
+		<Instrument>A00748</Instrument>
+		<Date>2/4/2021 12:00:00 PM</Date>
+		<Reads>
+			<Read Number="1" NumCycles="4" IsIndexedRead="N" />
+			<Read Number="2" NumCycles="2" IsIndexedRead="Y" />
+			<Read Number="3" NumCycles="4" IsIndexedRead="N" />
+		</Reads>
+		<FlowcellLayout LaneCount="2" SurfaceCount="1" SwathCount="1" TileCount="2">
+			<TileSet TileNamingConvention="FourDigit">
+				<Tiles>
+					<Tile>1_1101</Tile>
+					<Tile>1_1102</Tile>
+					<Tile>2_1101</Tile>
+					<Tile>2_1102</Tile>
+				</Tiles>
+			</TileSet>
+		</FlowcellLayout>
+		<ImageChannels>
+			<Name>red</Name>
+			<Name>green</Name>
+		</ImageChannels>
+	</Run>
+</RunInfo>
+"""
+
+
+def write_interop_files(run_folder, run_id, sample_clusters):
+	"""
+	Write a RunInfo.xml and InterOp files for a 2 lane run with 3 reads, 10000 clusters (9000 PF) per tile \
+	and the given number of clusters per sample in each tile
+	"""
+
+	os.makedirs(os.path.join(run_folder, 'InterOp'), exist_ok=True)
+
+	with open(os.path.join(run_folder, 'RunInfo.xml'), 'w') as f:
+
+		f.write(INTEROP_RUN_INFO.format(run_id=run_id))
+
+	run_metrics = py_interop_run_metrics.run_metrics()
+	run_metrics.read_run_info(str(run_folder))
+
+	tile_metrics = run_metrics.tile_metric_set()
+	error_metrics = run_metrics.error_metric_set()
+	q_metrics = run_metrics.q_metric_set()
+	index_metrics = run_metrics.index_metric_set()
+
+	for lane in [1, 2]:
+
+		for tile in [1101, 1102]:
+
+			tile_metrics.insert(py_interop_metrics.tile_metric(lane, tile, 1000.0 * lane, 900.0, 10000.0, 9000.0, py_interop_metrics.read_metric_vector()))
+
+			for cycle in range(1, 11):
+
+				error_metrics.insert(py_interop_metrics.error_metric(lane, tile, cycle, 0.1, float('nan')))
+
+				q_histogram = py_interop_run.uint_vector(50, 0)
+				q_histogram[34] = 9000
+				q_metrics.insert(py_interop_metrics.q_metric(lane, tile, cycle, q_histogram))
+
+			index_info = py_interop_metrics.index_info_vector()
+
+			for sample, clusters in sample_clusters.items():
+
+				index_info.push_back(py_interop_metrics.index_info('ACGTACGT', sample, 'project', clusters))
+
+			index_metrics.insert(py_interop_metrics.index_metric(lane, tile, 2, index_info))
+
+	for metric_set in [tile_metrics, error_metrics, q_metrics, index_metrics]:
+
+		metric_set.set_version(2 if metric_set is tile_metrics else metric_set.LATEST_VERSION)
+		py_interop_comm.write_interop(str(run_folder), metric_set)
 
 
 class TestPipelineMonitoring(unittest.TestCase):
@@ -353,3 +442,609 @@ class TestPipelineMonitoring(unittest.TestCase):
 			self.assertEqual(ntc_contamination[0].get('NTC-TEST'), 71)
 			self.assertEqual(ntc_contamination[1].get('NTC-TEST'), 100)
 			
+
+
+	def test_check_run_analysis(self):
+
+			config = pipeline_config.Config({'pipelines': {'SomaticAmplicon-master-NGHS-102X': {'results_dir': 'test_data/',
+																				'sample_expected_files': ['*_VariantReport.txt', '*.bam', '*_DepthOfCoverage.sample_summary', '*_QC.txt', '*_filtered_meta_annotated.vcf'],
+																				'sample_not_expected_files': ['*_fastqc.zip'],
+																				'run_expected_files': ['*merged_coverage_report.txt', '*merged_variant_report.txt'],
+																				'run_not_expected_files': []}}})
+
+			task = {'pk': 1,
+					'run_id': '210823_M00766_0416_000000000-JMTTY',
+					'pipeline_id': 'SomaticAmplicon-master',
+					'analysis_type': 'NGHS-102X',
+					'run_config_key': 'SomaticAmplicon-master-NGHS-102X',
+					'lanes': 1,
+					'sample_ids': ['21M14838'],
+					'results_completed': True,
+					'results_valid': True,
+					'relatedness_thresholds': (None, None, None, None)}
+
+			result = monitoring.check_run_analysis(task, config)
+
+			# no fastq directory configured so demultiplexing is assumed ok
+			self.assertEqual(result['demultiplexing_completed'], True)
+			self.assertEqual(result['demultiplexing_valid'], True)
+
+			self.assertEqual(result['samples'], {'21M14838': (True, True)})
+			self.assertEqual(result['results_completed'], True)
+			self.assertEqual(result['results_valid'], True)
+
+			# metrics are only parsed when the run has newly completed
+			self.assertEqual(result['metrics'], [])
+
+
+class TestPipelineConfig(unittest.TestCase):
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+		self.cache_dir = Path(self.tmp_dir).joinpath('cache')
+		self.config = Path(self.tmp_dir).joinpath('config.yaml')
+
+		with open(self.config, 'w') as f:
+
+			f.write('pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    qc_checks: [pct_q30, contamination]\n    min_q30_score: 0.8\n    contamination_cutoff: 0.1\n')
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def test_config_files(self):
+
+		for config_file in Path('config').glob('*.yaml'):
+
+			config = pipeline_config.load_config(config_file)
+
+			self.assertIn('DragenWGS-master-WGS', config.pipelines)
+
+	def test_thresholds(self):
+
+		config = pipeline_config.load_config(self.config, self.cache_dir)
+		run_config = config.get('DragenWGS-master-NexteraDNAFlex')
+
+		self.assertEqual(run_config.get_auto_qc_checks(), 'pct_q30,contamination')
+		self.assertEqual(run_config.run_thresholds, {'min_q30_score': 0.8})
+		self.assertEqual(run_config.sample_thresholds, {'contamination_cutoff': 0.1})
+		self.assertEqual(run_config.min_fastq_size, 100000)
+		self.assertEqual(config.get('DragenWGS-master-Unknown'), None)
+
+	def test_missing_threshold(self):
+
+		with open(self.config, 'w') as f:
+
+			f.write('pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    qc_checks: [titv]\n    min_titv: 1.5\n')
+
+		with self.assertRaises(pipeline_config.ConfigError):
+
+			pipeline_config.load_config(self.config, self.cache_dir)
+
+	def test_unknown_check(self):
+
+		with open(self.config, 'w') as f:
+
+			f.write('pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    qc_checks: [pct_q3]\n')
+
+		with self.assertRaises(pipeline_config.ConfigError):
+
+			pipeline_config.load_config(self.config, self.cache_dir)
+
+	def test_cache(self):
+
+		pipeline_config.load_config(self.config, self.cache_dir)
+
+		with mock.patch.object(parsers, 'parse_config', wraps=parsers.parse_config) as parse_config:
+
+			# unchanged file is not parsed again
+			config = pipeline_config.load_config(self.config, self.cache_dir)
+
+			parse_config.assert_not_called()
+			self.assertEqual(config.get('DragenWGS-master-NexteraDNAFlex').run_thresholds, {'min_q30_score': 0.8})
+
+			# changed file is
+			with open(self.config, 'a') as f:
+
+				f.write('    min_titv: 1.5\n')
+
+			config = pipeline_config.load_config(self.config, self.cache_dir)
+
+			self.assertEqual(parse_config.call_count, 1)
+
+
+class TestRunWatcher(unittest.TestCase):
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def check_watcher(self, watcher):
+
+		run_dir = Path(self.tmp_dir).joinpath('run')
+		run_dir.mkdir()
+		run_dir.joinpath('SampleSheet.csv').touch()
+
+		watcher.add_watch(self.tmp_dir)
+		watcher.add_watch(run_dir, files=('SampleSheet.csv',))
+
+		self.assertEqual(watcher.wait(0), set())
+
+		run_dir.joinpath('run_copy_complete.txt').touch()
+
+		self.assertEqual(watcher.wait(1), {str(run_dir)})
+
+		watcher.remove_watch(run_dir)
+		Path(self.tmp_dir).joinpath('run2').mkdir()
+
+		self.assertEqual(watcher.wait(1), {self.tmp_dir})
+		self.assertEqual(watcher.watched(), {self.tmp_dir})
+
+		watcher.close()
+
+	def test_polling_watcher(self):
+
+		self.check_watcher(run_watcher.PollingWatcher(interval=0))
+
+	def test_inotify_watcher(self):
+
+		try:
+
+			watcher = run_watcher.InotifyWatcher()
+
+		except OSError:
+
+			self.skipTest('inotify is not available')
+
+		self.check_watcher(watcher)
+
+
+class TestManifest(unittest.TestCase):
+
+	def test_glob(self):
+
+		patterns = ['*', '*/*_QC.txt', '21M14838/*_VariantReport.txt', '21M14838/1_SomaticAmplicon.sh.e*', 'post_processing/results/*/*', 'missing/*.txt', '*/missing.txt']
+
+		for results_dir in Path('test_data').glob('*/*'):
+
+			run_manifest = manifest.Manifest()
+
+			for pattern in patterns:
+
+				self.assertEqual(sorted(run_manifest.glob(results_dir, pattern)), sorted(results_dir.glob(pattern)))
+
+	def test_directory_listed_once(self):
+
+		run_manifest = manifest.Manifest()
+		results_dir = Path('test_data/210823_M00766_0416_000000000-JMTTY/NGHS-102X')
+
+		with mock.patch('os.scandir', wraps=os.scandir) as scandir:
+
+			for i in range(2):
+
+				variant_report = run_manifest.glob(results_dir, '21M14838/*_VariantReport.txt')
+				self.assertEqual(len(variant_report), 1)
+				self.assertTrue(run_manifest.exists(variant_report[0]))
+				self.assertEqual(run_manifest.getsize(variant_report[0]), variant_report[0].stat().st_size)
+
+			self.assertEqual(scandir.call_count, 2)
+
+
+class TestVariantCounter(unittest.TestCase):
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+		self.vcf = Path(self.tmp_dir).joinpath('test.vcf')
+
+		with open(self.vcf, 'w') as f:
+
+			f.write('##fileformat=VCFv4.2\n')
+			f.write('##FILTER=<ID=PASS,Description="All filters passed">\n')
+			f.write('##FILTER=<ID=LowQual,Description="Low quality">\n')
+			f.write('##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">\n')
+			f.write('##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Depth">\n')
+			f.write('##contig=<ID=1,length=1000>\n')
+			f.write('#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\tFORMAT\tS1\tS2\tS3\tS4\n')
+			f.write('1\t1\t.\tA\tG\t50\tPASS\t.\tGT:DP\t0/1:10\t0/0:10\t./.:0\t0/0:10\n')
+			f.write('1\t2\t.\tA\tG\t50\tLowQual\t.\tGT:DP\t1/1:10\t1/1:10\t0/1:10\t0/0:10\n')
+			f.write('1\t3\t.\tA\tG,T\t50\tPASS\t.\tDP:GT\t10:1|2\t10:0|1\t10:.\t10:0|0\n')
+			f.write('1\t4\t.\tA\tG\t50\t.\t.\tGT\t1/1\t1/1\t1/1\t0/0\n')
+			f.write('1\t5\t.\tA\tG\t50\tPASS\t.\tGT:DP\t1:5\t./1:5\t0:5\t0/0:5\n')
+
+		self.vcf_gz = Path(self.tmp_dir).joinpath('test.vcf.gz')
+		pysam.tabix_compress(str(self.vcf), str(self.vcf_gz))
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def test_same_as_parser(self):
+
+		sample_lists = [['S1'], ['S2'], ['S3'], ['S4'], ['S1', 'S2', 'S3', 'S4'], ['S3', 'S4'], ['S4', 'S1']]
+
+		for vcf in [self.vcf, self.vcf_gz]:
+
+			for samples in sample_lists:
+
+				self.assertEqual(variant_counter.get_passing_variant_count(vcf, samples), parsers.get_passing_variant_count(vcf, samples))
+
+	def test_counts(self):
+
+		counts = variant_counter.count_passing_variants(self.vcf_gz, ['S1', 'S2', 'S3', 'S4'], threads=2)
+
+		# GT is only read when it is the first FORMAT key, the same as htslib
+		self.assertEqual(list(counts), [2, 1, 0, 0])
+
+		# the first passing variant is counted as 0 by the original parser
+		self.assertEqual(variant_counter.get_passing_variant_count(self.vcf_gz, ['S1', 'S3']), {'S1': 1})
+		self.assertEqual(variant_counter.get_passing_variant_count(self.vcf_gz, ['S3', 'S4']), {'S3': 0, 'S4': 0})
+
+
+class TestParseCache(unittest.TestCase):
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+		self.coverage_file = Path(self.tmp_dir).joinpath('coverage.csv')
+
+		with open(self.coverage_file, 'w') as f:
+
+			f.write('mean_depth,100\npct_20x,99.5\n')
+
+		parse_cache.configure(Path(self.tmp_dir).joinpath('parse_cache'))
+
+	def tearDown(self):
+
+		parse_cache.configure(None)
+
+		shutil.rmtree(self.tmp_dir)
+
+	def test_hit_does_not_read_file(self):
+
+		parsed = parsers.parse_custom_coverage_metrics(self.coverage_file)
+
+		self.assertEqual(parsed, {'mean_depth': '100', 'pct_20x': '99.5'})
+
+		with mock.patch('pipelines.parsers.open', create=True, side_effect=AssertionError('file was read')):
+
+			self.assertEqual(parsers.parse_custom_coverage_metrics(self.coverage_file), parsed)
+
+	def test_changed_file_is_parsed_again(self):
+
+		self.assertEqual(parsers.parse_custom_coverage_metrics(self.coverage_file)['mean_depth'], '100')
+
+		with open(self.coverage_file, 'w') as f:
+
+			f.write('mean_depth,200\npct_20x,99.5\n')
+
+		self.assertEqual(parsers.parse_custom_coverage_metrics(self.coverage_file)['mean_depth'], '200')
+
+	def test_disabled(self):
+
+		parse_cache.configure(None)
+
+		parsers.parse_custom_coverage_metrics(self.coverage_file)
+
+		self.assertFalse(Path(self.tmp_dir).joinpath('parse_cache').exists())
+
+	def test_sample_sheet_contents_are_checked(self):
+
+		sample_sheet = Path(self.tmp_dir).joinpath('SampleSheet.csv')
+
+		with open(sample_sheet, 'w') as f:
+
+			f.write('[Data]\nSample_ID,Sample_Name,Description\n')
+			f.write('S1,S1,pipelineName=DragenGE;pipelineVersion=2.5.3;panel=NonocusWES38;sex=1\n')
+
+		stat = sample_sheet.stat()
+
+		self.assertEqual(parsers.sample_sheet_parser(sample_sheet)['S1']['panel'], 'NonocusWES38')
+
+		# a copy with the same contents and a new mtime is not parsed again
+		os.utime(sample_sheet, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+		with mock.patch('pipelines.parsers.csv.reader', side_effect=AssertionError('file was parsed')):
+
+			self.assertEqual(parsers.sample_sheet_parser(sample_sheet)['S1']['sex'], '1')
+
+		# an edit which keeps the size and mtime is picked up
+		with open(sample_sheet, 'w') as f:
+
+			f.write('[Data]\nSample_ID,Sample_Name,Description\n')
+			f.write('S1,S1,pipelineName=DragenGE;pipelineVersion=2.5.3;panel=NonocusWES38;sex=2\n')
+
+		os.utime(sample_sheet, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+		self.assertEqual(parsers.sample_sheet_parser(sample_sheet)['S1']['sex'], '2')
+
+	def test_prune(self):
+
+		for i in range(3):
+
+			coverage_file = Path(self.tmp_dir).joinpath(f'coverage_{i}.csv')
+			shutil.copy(self.coverage_file, coverage_file)
+
+			parsers.parse_custom_coverage_metrics(coverage_file)
+
+		entries = sorted(Path(self.tmp_dir).joinpath('parse_cache').glob('*/*.pickle'))
+
+		self.assertEqual(len(entries), 3)
+
+		# one entry too old and one less recently used than the other
+		now = time.time()
+		os.utime(entries[0], (now - 100 * 24 * 60 * 60,) * 2)
+		os.utime(entries[1], (now - 60 * 60,) * 2)
+
+		entry_size = entries[2].stat().st_size
+
+		self.assertEqual(parse_cache.prune(max_bytes=entry_size * 2, max_age=90 * 24 * 60 * 60), 1)
+		self.assertEqual([entry.exists() for entry in entries], [False, True, True])
+
+		self.assertEqual(parse_cache.prune(max_bytes=entry_size, max_age=90 * 24 * 60 * 60), 1)
+		self.assertEqual([entry.exists() for entry in entries], [False, False, True])
+
+
+class TestInteropExtractor(unittest.TestCase):
+
+	def setUp(self):
+
+		self.run_folder = tempfile.mkdtemp()
+
+		write_interop_files(self.run_folder, '210204_A00748_0075_AHVHYCDRXX', {'21M01683': 4500, '21M01688': 2250})
+
+	def tearDown(self):
+
+		shutil.rmtree(self.run_folder)
+
+	def test_extract_interop_data(self):
+
+		read = py_interop_run_metrics.run_metrics.read
+
+		with mock.patch.object(py_interop_run_metrics.run_metrics, 'read', autospec=True, side_effect=read) as mock_read:
+
+			interop_dict = parsers.parse_interop_data(self.run_folder, 3, 2)
+
+		# summary and index metrics come from one read of the InterOp folder
+		self.assertEqual(mock_read.call_count, 1)
+
+		self.assertEqual(list(interop_dict['read_summaries']), [1, 2, 3])
+		self.assertEqual(list(interop_dict['read_summaries'][3]), [1, 2])
+
+		lane_summary = interop_dict['read_summaries'][1][2]
+
+		self.assertEqual(lane_summary['density'], 2000.0)
+		self.assertEqual(lane_summary['percent_pf'], 90.0)
+		self.assertEqual(lane_summary['reads'], 20000)
+		self.assertIsInstance(lane_summary['reads'], int)
+		self.assertIsNone(lane_summary['phasing'])
+
+		# 9000 of the 36000 PF clusters in the run
+		self.assertEqual(interop_dict['index_summaries'], {'21M01683': 50.0, '21M01688': 25.0})
+
+	def test_no_index_metrics(self):
+
+		os.remove(os.path.join(self.run_folder, 'InterOp', 'IndexMetricsOut.bin'))
+
+		interop_dict = interop_extractor.extract_interop_data(self.run_folder, 3, 2)
+
+		self.assertEqual(interop_dict['index_summaries'], {})
+		self.assertEqual(interop_dict['read_summaries'][1][1]['density'], 1000.0)
+
+
+class TestPicardMetrics(unittest.TestCase):
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+		header = '## htsjdk.samtools.metrics.StringHeader\n# CollectMetrics INPUT=sample.bam\n\n'
+
+		self.insert_file = Path(self.tmp_dir).joinpath('sample_InsertMetrics.txt')
+
+		with open(self.insert_file, 'w') as f:
+
+			f.write(header)
+			f.write('## METRICS CLASS\tpicard.analysis.InsertSizeMetrics\n')
+			f.write('MEDIAN_INSERT_SIZE\tMODE_INSERT_SIZE\tSTANDARD_DEVIATION\tPAIR_ORIENTATION\tSAMPLE\tLIBRARY\tREAD_GROUP\n')
+			f.write('180\t175\t?\tFR\t\t\t\n')
+			f.write('\n## HISTOGRAM\tjava.lang.Integer\ninsert_size\tAll_Reads.fr_count\n20\t1\n21\t3\n')
+
+		self.alignment_file = Path(self.tmp_dir).joinpath('sample_AlignmentSummaryMetrics.txt')
+
+		with open(self.alignment_file, 'w') as f:
+
+			f.write(header)
+			f.write('## METRICS CLASS\tpicard.analysis.AlignmentSummaryMetrics\n')
+			f.write('CATEGORY\tTOTAL_READS\tPCT_PF_READS_ALIGNED\tSAMPLE\tLIBRARY\tREAD_GROUP\n')
+			f.write('FIRST_OF_PAIR\t100\t0.98\t\t\t\n')
+			f.write('SECOND_OF_PAIR\t100\t0.97\t\t\t\n')
+			f.write('PAIR\t200\t0.975\t\t\t\n\n\n')
+
+		self.variant_detail_file = Path(self.tmp_dir).joinpath('run.variant_calling_detail_metrics')
+
+		with open(self.variant_detail_file, 'w') as f:
+
+			f.write(header)
+			f.write('## METRICS CLASS\tpicard.vcf.CollectVariantCallingMetrics$VariantCallingDetailMetrics\n')
+			f.write('SAMPLE_ALIAS\tHET_HOMVAR_RATIO\tTOTAL_SNPS\n')
+			f.write('S1\t1.5\t1000\n')
+			f.write('S2\t1.6\t1100\n\n')
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def test_parsers(self):
+
+		self.assertEqual(parsers.parse_insert_metrics_file(self.insert_file), {'median_insert_size': '180', 'mode_insert_size': '175', 'standard_deviation': '?', 'pair_orientation': 'FR'})
+
+		self.assertEqual(parsers.parse_hs_metrics_file(self.insert_file)['sample'], '')
+
+		self.assertEqual(parsers.parse_alignment_metrics_file(self.alignment_file), [
+			{'category': 'FIRST_OF_PAIR', 'total_reads': '100', 'pct_pf_reads_aligned': '0.98'},
+			{'category': 'SECOND_OF_PAIR', 'total_reads': '100', 'pct_pf_reads_aligned': '0.97'},
+			{'category': 'PAIR', 'total_reads': '200', 'pct_pf_reads_aligned': '0.975'},
+		])
+
+		self.assertEqual(parsers.parse_variant_detail_metrics_file(self.variant_detail_file), {
+			'S1': {'het_homvar_ratio': '1.5', 'total_snps': '1000'},
+			'S2': {'het_homvar_ratio': '1.6', 'total_snps': '1100'},
+		})
+
+	def test_exclude(self):
+
+		rows = picard_metrics.read_metrics_file(self.insert_file, exclude=['sample', 'library', 'read_group', 'pair_orientation'])
+
+		self.assertEqual(rows, [{'median_insert_size': '180', 'mode_insert_size': '175', 'standard_deviation': '?'}])
+
+	def test_histogram_is_not_read(self):
+
+		with mock.patch('pipelines.picard_metrics.open', create=True, side_effect=lambda path: LineCounter(path)) as mock_open:
+
+			picard_metrics.read_metrics_file(self.insert_file)
+
+		# header, metrics block and the blank line after it but none of the histogram
+		self.assertEqual(mock_open.call_count, 1)
+		self.assertEqual(LineCounter.lines_read, 7)
+
+
+class TestDragenMetrics(unittest.TestCase):
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+		self.metrics_file = Path(self.tmp_dir).joinpath('sample.wgs_coverage_metrics.csv')
+
+		with open(self.metrics_file, 'w') as f:
+
+			f.write('COVERAGE SUMMARY,,Aligned bases,1000\n')
+			f.write('COVERAGE SUMMARY,,PCT of genome with coverage [ 20x: 50x),98.5\n')
+			f.write('COVERAGE SUMMARY,,PCT of genome with coverage [100x:inf),nan\n')
+			f.write('COVERAGE SUMMARY,,Uniformity of coverage (PCT > 0.2*mean) over genome,NA\n')
+			f.write('\n')
+			f.write('OTHER SECTION,,Aligned bases,5\n')
+
+		self.vc_file = Path(self.tmp_dir).joinpath('run.vc_metrics.csv')
+
+		with open(self.vc_file, 'w') as f:
+
+			f.write('VARIANT CALLER SUMMARY,,Number of samples,2\n')
+			f.write('JOINT CALLER PREFILTER,S1,Total,100,100.00\n')
+			f.write('JOINT CALLER PREFILTER,S1,Het/Hom ratio,1.5\n')
+			f.write('JOINT CALLER PREFILTER,S2,Total,110,100.00\n')
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def test_normalise_key(self):
+
+		self.assertEqual(dragen_metrics.normalise_key('Total input reads'), 'total_input_reads')
+		self.assertEqual(dragen_metrics.normalise_key('Mapped reads R1 (QC-passed)'), 'mapped_reads_r1_qcpassed')
+		self.assertEqual(dragen_metrics.normalise_key('PCT of genome with coverage [ 20x: 50x)', 'coverage'), 'pct_of_genome_with_coverage_20x_50x')
+		self.assertEqual(dragen_metrics.normalise_key('PCT of genome with coverage [100x:inf)', 'coverage'), 'pct_of_genome_with_coverage_100x_inf')
+
+		# each name is only normalised once
+		self.assertEqual(dragen_metrics.normalised_keys['default']['Total input reads'], 'total_input_reads')
+
+	def test_parsers(self):
+
+		self.assertEqual(parsers.parse_dragen_wgs_coverage_metrics_file.uncached(self.metrics_file), {
+			'aligned_bases': '1000',
+			'pct_of_genome_with_coverage_20x_50x': '98.5',
+			'pct_of_genome_with_coverage_100x_inf': 0.0,
+			'uniformity_of_coverage_pct_02mean_over_genome': 'NA',
+		})
+
+		self.assertEqual(parsers.parse_dragen_vc_metrics_file.uncached(self.vc_file), {
+			'S1': {'total': '100', 'hethom_ratio': '1.5'},
+			'S2': {'total': '110'},
+		})
+
+		self.assertEqual(parsers.parse_dragen_alignment_metrics_file.uncached(self.vc_file), {})
+
+
+class TestSampleFetcher(unittest.TestCase):
+
+	def test_results_in_sample_order(self):
+
+		samples = ['S3', 'S1', 'S2', 'S4']
+
+		# every sample waits for the others so this only finishes if they are fetched at the same time
+		barrier = threading.Barrier(len(samples), timeout=10)
+
+		def fetch(sample):
+
+			barrier.wait()
+
+			return {'sample': sample}
+
+		results = sample_fetcher.fetch_samples(samples, fetch, threads=4)
+
+		self.assertEqual(list(results), samples)
+		self.assertEqual(results['S2'], {'sample': 'S2'})
+
+	def test_none_is_left_out(self):
+
+		results = sample_fetcher.fetch_samples(['S1', 'NTC', 'S2'], lambda sample: None if sample == 'NTC' else sample, threads=2)
+
+		self.assertEqual(results, {'S1': 'S1', 'S2': 'S2'})
+
+		self.assertEqual(sample_fetcher.fetch_samples(['S1', 'NTC', 'S2'], lambda sample: None if sample == 'NTC' else sample, threads=1), results)
+
+	def test_errors_name_the_sample(self):
+
+		def fetch(sample):
+
+			if sample in ('S2', 'S3'):
+
+				raise IndexError('list index out of range')
+
+			return sample
+
+		for threads in (1, 4):
+
+			with self.assertRaises(Exception) as context:
+
+				sample_fetcher.fetch_samples(['S1', 'S2', 'S3'], fetch, threads=threads)
+
+			self.assertIn('sample S2', str(context.exception))
+			self.assertIsInstance(context.exception.__cause__, IndexError)
+
+
+class LineCounter:
+	"""
+	File object which counts the lines read from it
+	"""
+
+	lines_read = 0
+
+	def __init__(self, path):
+
+		self.file = open(path)
+		LineCounter.lines_read = 0
+
+	def __enter__(self):
+
+		return self
+
+	def __exit__(self, *args):
+
+		self.file.close()
+
+	def __iter__(self):
+
+		for line in self.file:
+
+			LineCounter.lines_read = LineCounter.lines_read + 1
+
+			yield line
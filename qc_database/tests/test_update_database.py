@@ -0,0 +1,392 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+
+from qc_database import auto_qc
+from qc_database.models import *
+from pipelines import parsers, monitoring, pipeline_config, run_watcher, parse_cache
+from qc_database.management.commands import qc_watcher, update_database
+from qc_database.tests.test_pipelines import write_interop_files
+
+
+class TestUpdateDatabase(TestCase):
+	"""
+	Test the run discovery part of update_database
+	"""
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+		self.raw_data_dir = Path(self.tmp_dir).joinpath('archive')
+		self.run_id = '210204_A00748_0075_AHVHYCDRXX'
+		self.run_dir = self.raw_data_dir.joinpath(self.run_id)
+		self.run_dir.mkdir(parents=True)
+
+		shutil.copy(f'test_data/{self.run_id}/SampleSheet.csv', self.run_dir)
+		self.run_dir.joinpath('run_copy_complete.txt').touch()
+
+		self.config = Path(self.tmp_dir).joinpath('config.yaml')
+
+		with open(self.config, 'w') as f:
+
+			f.write(f'pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    results_dir: {self.tmp_dir}/results/\n')
+
+		# existing run so the run log files are not needed
+		Run.objects.create(run_id=self.run_id)
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def update_database(self, *args, raw_data_dirs=None):
+
+		if raw_data_dirs is None:
+
+			raw_data_dirs = [self.raw_data_dir]
+
+		with override_settings(AUTO_QC_CACHE_DIR=os.path.join(self.tmp_dir, 'cache')):
+
+			call_command('update_database', '--raw_data_dir', *[str(raw_data_dir) for raw_data_dir in raw_data_dirs], '--config', str(self.config), *args, stdout=StringIO())
+
+	def test_run_is_discovered(self):
+
+		self.update_database()
+
+		self.assertEqual(SampleAnalysis.objects.filter(run_id=self.run_id).count(), 4)
+		self.assertEqual(RunAnalysis.objects.filter(run_id=self.run_id).count(), 1)
+
+		scan_state = RunScanState.objects.get(run_path=str(self.run_dir))
+		self.assertEqual(scan_state.run_id, self.run_id)
+
+	def test_sample_analyses_are_linked(self):
+
+		self.update_database()
+
+		run_analysis = RunAnalysis.objects.get(run_id=self.run_id)
+
+		self.assertEqual(SampleAnalysis.objects.filter(run_analysis=run_analysis).count(), 4)
+
+		# sample analyses added before they were linked are linked on the next scan
+		SampleAnalysis.objects.filter(run_id=self.run_id).update(run_analysis=None)
+
+		self.update_database('--rescan')
+
+		self.assertEqual(SampleAnalysis.objects.filter(run_analysis=run_analysis).count(), 4)
+
+	def test_unchanged_unwatched_run_is_skipped(self):
+
+		self.update_database()
+
+		RunAnalysis.objects.filter(run_id=self.run_id).update(watching=False)
+
+		with mock.patch.object(parsers, 'sample_sheet_parser', wraps=parsers.sample_sheet_parser) as sample_sheet_parser:
+
+			self.update_database()
+
+			sample_sheet_parser.assert_not_called()
+
+			# modified sample sheet is picked up again
+			sample_sheet = self.run_dir.joinpath('SampleSheet.csv')
+			mtime = sample_sheet.stat().st_mtime + 10
+			os.utime(sample_sheet, (mtime, mtime))
+
+			self.update_database()
+
+			self.assertEqual(sample_sheet_parser.call_count, 1)
+
+			# as is a forced rescan
+			self.update_database('--rescan')
+
+			self.assertEqual(sample_sheet_parser.call_count, 2)
+
+	def test_watched_run_is_rescanned(self):
+
+		self.update_database()
+
+		with mock.patch.object(parsers, 'sample_sheet_parser', wraps=parsers.sample_sheet_parser) as sample_sheet_parser:
+
+			self.update_database()
+
+			self.assertEqual(sample_sheet_parser.call_count, 1)
+
+	def test_unchanged_run_keeps_verdicts(self):
+
+		self.update_database()
+
+		run_analysis = RunAnalysis.objects.get(run_id=self.run_id)
+
+		auto_qc.get_verdicts([run_analysis])
+
+		self.update_database()
+
+		self.assertTrue(AutoQCVerdict.objects.filter(run_analysis=run_analysis).exists())
+
+		# a changed sex removes the verdict
+		sample_analysis = SampleAnalysis.objects.filter(run_analysis=run_analysis).first()
+		SampleAnalysis.objects.filter(pk=sample_analysis.pk).update(sex='unknown')
+		auto_qc.get_verdicts([run_analysis])
+
+		self.update_database()
+
+		self.assertFalse(AutoQCVerdict.objects.filter(run_analysis=run_analysis).exists())
+
+	def test_workers(self):
+
+		# second run on the same archive
+		run_id = '210204_A00748_0076_AHVHYCDRXX'
+		run_dir = self.raw_data_dir.joinpath(run_id)
+		shutil.copytree(self.run_dir, run_dir)
+		Run.objects.create(run_id=run_id)
+
+		self.update_database('--workers', '2')
+
+		run_analyses = RunAnalysis.objects.all()
+
+		self.assertEqual(len(run_analyses), 2)
+
+		for run_analysis in run_analyses:
+
+			self.assertEqual(run_analysis.demultiplexing_completed, True)
+			self.assertEqual(run_analysis.results_completed, False)
+
+	def test_failed_run_does_not_roll_back_other_runs(self):
+
+		# second run which fails after its sample analyses have been added
+		run_id = '210204_A00748_0076_AHVHYCDRXX'
+		run_dir = self.raw_data_dir.joinpath(run_id)
+		shutil.copytree(self.run_dir, run_dir)
+		Run.objects.create(run_id=run_id)
+
+		get_or_create = RunAnalysis.objects.get_or_create
+
+		def fail_second_run(**kwargs):
+
+			if kwargs['run'].run_id == run_id:
+
+				raise Exception('ERROR: could not add run analysis')
+
+			return get_or_create(**kwargs)
+
+		with mock.patch.object(RunAnalysis.objects, 'get_or_create', side_effect=fail_second_run):
+
+			with self.assertRaises(CommandError):
+
+				self.update_database()
+
+		self.assertEqual(SampleAnalysis.objects.filter(run_id=self.run_id).count(), 4)
+		self.assertEqual(RunAnalysis.objects.get(run_id=self.run_id).demultiplexing_completed, True)
+		self.assertTrue(RunScanState.objects.filter(run_path=str(self.run_dir)).exists())
+
+		# nothing kept from the failed run so it is retried
+		self.assertEqual(SampleAnalysis.objects.filter(run_id=run_id).count(), 0)
+		self.assertFalse(RunScanState.objects.filter(run_path=str(run_dir)).exists())
+
+	def test_invalid_config_fails_before_update(self):
+
+		with open(self.config, 'w') as f:
+
+			f.write(f'pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    results_dir: {self.tmp_dir}/results/\n    qc_checks: [pct_q30]\n')
+
+		with self.assertRaises(CommandError):
+
+			self.update_database()
+
+		self.assertEqual(SampleAnalysis.objects.filter(run_id=self.run_id).count(), 0)
+
+
+	def test_multiple_raw_data_dirs(self):
+
+		# second run on another sequencer's archive
+		run_id = '210204_A00748_0076_AHVHYCDRXX'
+		raw_data_dir = Path(self.tmp_dir).joinpath('archive2')
+		shutil.copytree(self.run_dir, raw_data_dir.joinpath(run_id))
+		Run.objects.create(run_id=run_id)
+
+		with mock.patch.object(monitoring, 'check_run_analysis', wraps=monitoring.check_run_analysis) as check_run_analysis:
+
+			self.update_database(raw_data_dirs=[self.raw_data_dir, raw_data_dir])
+
+			# each watched run analysis is checked once
+			self.assertEqual(check_run_analysis.call_count, 2)
+
+		self.assertEqual(RunAnalysis.objects.count(), 2)
+		self.assertEqual(SampleAnalysis.objects.filter(run_id=run_id).count(), 4)
+
+	def test_update_already_running(self):
+
+		with override_settings(AUTO_QC_CACHE_DIR=os.path.join(self.tmp_dir, 'cache')):
+
+			lock = update_database.Command().acquire_lock()
+
+			self.assertIsNone(update_database.Command().acquire_lock())
+
+		self.update_database()
+
+		self.assertEqual(RunAnalysis.objects.count(), 0)
+
+		lock.close()
+
+		self.update_database()
+
+		self.assertEqual(RunAnalysis.objects.count(), 1)
+
+	def test_timings_and_profile(self):
+
+		profile = os.path.join(self.tmp_dir, 'update.prof')
+
+		with self.assertLogs('pipelines.timing', level='DEBUG') as logs:
+
+			self.update_database('--profile', profile)
+
+		stage_timings = [json.loads(line.split(':', 2)[2]) for line in logs.output if 'stage_timing' in line]
+		summary = json.loads([line for line in logs.output if 'timing_summary' in line][0].split(':', 2)[2])
+
+		stages = set(stage_timing['stage'] for stage_timing in stage_timings)
+
+		for stage in ['discovery', 'add_run', 'sample_sheet_parse', 'check_run_analysis', 'demultiplex_check', 'save_result']:
+
+			self.assertIn(stage, stages)
+			self.assertIn(stage, summary['stages'])
+
+		self.assertIn(self.run_id, summary['runs'])
+		self.assertIn('DragenWGS-master-NexteraDNAFlex', summary['pipelines'])
+
+		self.assertTrue(os.path.exists(profile))
+
+	def test_new_run_interop_metrics(self):
+
+		Run.objects.all().delete()
+
+		write_interop_files(self.run_dir, self.run_id, {'21M01683': 4500, '21M01688': 2250, 'Undetermined': 100})
+
+		with open(self.run_dir.joinpath('RunParameters.xml'), 'w') as f:
+
+			f.write('<?xml version="1.0"?>\n<RunParameters></RunParameters>\n')
+
+		self.update_database()
+
+		run = Run.objects.get(run_id=self.run_id)
+
+		self.assertEqual(run.lanes, 2)
+		self.assertEqual(InteropRunQuality.objects.filter(run=run).count(), 6)
+
+		index_metrics = {index_metric.sample_id: float(index_metric.pct_reads_identified) for index_metric in InteropIndexMetrics.objects.filter(run=run)}
+
+		# only samples in the sample sheet
+		self.assertEqual(index_metrics, {'21M01683': 50.0, '21M01688': 25.0})
+
+	def test_parse_cache(self):
+
+		cache_dirs = []
+
+		def check_run_analyses(command, config, workers, run_analysis_pks=None):
+
+			cache_dirs.append(parse_cache.cache_dir)
+
+		with mock.patch.object(update_database.Command, 'check_run_analyses', check_run_analyses):
+
+			self.update_database()
+			self.update_database('--no-parse-cache')
+
+		self.assertEqual(cache_dirs, [os.path.join(self.tmp_dir, 'cache', 'parse_cache'), None])
+
+		# the cache is only used during an update
+		self.assertIsNone(parse_cache.cache_dir)
+
+class TestQCWatcher(TestCase):
+	"""
+	Test that qc_watcher adds run folders and checks run analyses as their files change
+	"""
+
+	def setUp(self):
+
+		self.tmp_dir = tempfile.mkdtemp()
+
+		self.raw_data_dir = Path(self.tmp_dir).joinpath('archive')
+		self.raw_data_dir.mkdir()
+		self.results_dir = Path(self.tmp_dir).joinpath('results')
+		self.results_dir.mkdir()
+
+		self.run_id = '210204_A00748_0075_AHVHYCDRXX'
+		self.run_dir = self.raw_data_dir.joinpath(self.run_id)
+
+		config = Path(self.tmp_dir).joinpath('config.yaml')
+
+		with open(config, 'w') as f:
+
+			f.write(f'pipelines:\n  DragenWGS-master-NexteraDNAFlex:\n    results_dir: {self.results_dir}/\n')
+
+		Run.objects.create(run_id=self.run_id)
+
+		self.command = qc_watcher.Command()
+		self.command.roots = [self.raw_data_dir]
+		self.command.config = pipeline_config.load_config(config)
+		self.command.workers = 1
+		self.command.watcher = run_watcher.PollingWatcher(interval=0)
+		self.command.watch_targets = {}
+		self.command.run_targets = {}
+		self.command.results_targets = {}
+		self.command.watch_errors = set()
+
+	def tearDown(self):
+
+		shutil.rmtree(self.tmp_dir)
+
+	def next_cycle(self):
+
+		changed = self.command.watcher.wait(0)
+		self.command.update_watches(*self.command.process_changes(changed))
+
+		return changed
+
+	def test_watcher(self):
+
+		self.command.full_scan()
+		self.command.update_watches()
+
+		self.assertEqual(self.command.watcher.watched(), {str(self.raw_data_dir)})
+
+		# run folder is copied
+		self.run_dir.mkdir()
+		shutil.copy(f'test_data/{self.run_id}/SampleSheet.csv', self.run_dir)
+
+		self.assertEqual(self.next_cycle(), {str(self.raw_data_dir)})
+		self.assertEqual(RunAnalysis.objects.count(), 0)
+		self.assertIn(str(self.run_dir), self.command.watcher.watched())
+
+		# copy has finished
+		self.run_dir.joinpath('run_copy_complete.txt').touch()
+
+		self.assertEqual(self.next_cycle(), {str(self.run_dir)})
+
+		run_analysis = RunAnalysis.objects.get(run_id=self.run_id)
+		self.assertEqual(run_analysis.results_completed, False)
+
+		# results folder does not exist yet so the results directory is watched
+		self.assertIn(str(self.results_dir), self.command.watcher.watched())
+
+		with mock.patch.object(monitoring, 'check_run_analysis', wraps=monitoring.check_run_analysis) as check_run_analysis, \
+				mock.patch.object(self.command, 'get_run_targets', wraps=self.command.get_run_targets) as get_run_targets:
+
+			self.results_dir.joinpath(self.run_id).mkdir()
+
+			self.assertEqual(self.next_cycle(), {str(self.results_dir)})
+			self.assertEqual(check_run_analysis.call_count, 1)
+
+			# results changes do not list the run folders again
+			get_run_targets.assert_not_called()
+
+			# nothing has changed
+			self.assertEqual(self.next_cycle(), set())
+			self.assertEqual(check_run_analysis.call_count, 1)
+
+		self.assertIn(str(self.results_dir.joinpath(self.run_id)), self.command.watcher.watched())
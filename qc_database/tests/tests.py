@@ -1,5 +1,18 @@
-from django.test import TestCase
+import random
+import decimal
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+
+from qc_database import auto_qc, management_utils, memo
 from qc_database.models import *
+from rest_framework.test import APIClient
 
 class TestAutoQC(TestCase):
 	"""
@@ -178,4 +191,655 @@ class TestAutoQC(TestCase):
 		self.assertEqual(list4_worst_consequence, "N/A")
 		self.assertEqual(list5_worst_consequence, "PASS")
 		with self.assertRaises(KeyError):
-			SampleAnalysis.determine_worst_consequence(list6)
\ No newline at end of file
+			SampleAnalysis.determine_worst_consequence(list6)
+
+
+def passes_auto_qc_per_sample(run_analysis):
+	"""
+	RunAnalysis.passes_auto_qc as it was before auto_qc.py, using the SampleAnalysis passes_* \
+	methods, with the ntc_contamination_TSO500 check listing the failing sample.
+	"""
+
+	checks_to_do = run_analysis.auto_qc_checks
+
+	if checks_to_do == None:
+
+		return False, ['No Configuration For this Pipeline.']
+
+	checks_to_do = checks_to_do.split(',')
+
+	samples = SampleAnalysis.objects.filter(run = run_analysis.run,
+											pipeline = run_analysis.pipeline,
+											analysis_type = run_analysis.analysis_type).order_by('pk')
+
+	new_samples_list = []
+	reasons_to_fail = []
+
+	if run_analysis.demultiplexing_completed == False:
+
+		reasons_to_fail.append('Demultiplexing not complete for some samples')
+
+	if run_analysis.demultiplexing_valid == False:
+
+		reasons_to_fail.append( 'Demultiplexing not valid for some samples')
+
+	if run_analysis.results_completed == False:
+
+		return False,['Run results not completed']
+
+	if run_analysis.results_valid == False:
+
+		return False,['Run results not valid']
+
+	fail_samples = []
+
+	for sample in samples:
+
+		if sample.results_completed == False:
+
+			reasons_to_fail.append('Results not complete for some samples')
+			fail_samples.append(sample.sample.sample_id)
+
+		if sample.results_valid == False:
+
+			reasons_to_fail.append('Results not valid for some samples')
+			fail_samples.append(sample.sample.sample_id)
+
+		if sample.sample.is_ntc() == False:
+
+			new_samples_list.append(sample)
+
+	if 'pct_q30' in checks_to_do:
+
+		if run_analysis.passes_run_level_qc() == False:
+
+			reasons_to_fail.append('Q30 Fail')
+
+			for sample in new_samples_list:
+
+				fail_samples.append(sample.sample.sample_id)
+
+	if 'relatedness' in checks_to_do:
+
+		if run_analysis.passes_relatedness()[0] == False:
+
+			reasons_to_fail.append(run_analysis.passes_relatedness()[1])
+
+	sample_checks = [
+		('contamination', lambda sample: sample.passes_contamination() == False, 'Contamination Fail'),
+		('ntc_contamination', lambda sample: sample.passes_ntc_contamination() != True, 'NTC Contamination Fail'),
+	]
+
+	for check, fails, reason in sample_checks:
+
+		if check in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if fails(sample):
+
+					reasons_to_fail.append(reason)
+					fail_samples.append(sample.sample.sample_id)
+
+	for check, passes_check, reason in [('min_average_coverage', 'passes_average_coverage', 'CNV Coverage Fail'), ('max_cnv_calls', 'passes_cnv_calling', 'CNV Calling Fail')]:
+
+		if check in checks_to_do and 'DragenGE' in run_analysis.pipeline.pipeline_id:
+
+			for sample in new_samples_list:
+
+				try:
+
+					if getattr(sample, passes_check)() != True:
+
+						reasons_to_fail.append(reason)
+
+				except ObjectDoesNotExist:
+
+					pass
+
+	if 'min_average_coverage' in checks_to_do:
+
+		for sample in new_samples_list:
+
+			if sample.passes_average_coverage() == False:
+
+				reasons_to_fail.append('Average Coverage Fail')
+
+	if 'ntc_contamination_TSO500' in checks_to_do:
+
+		for sample in new_samples_list:
+
+			if "NTC" not in sample.sample_id and sample.passes_percent_ntc_tso500() != True:
+
+				reasons_to_fail.append('NTC Contamination Fail')
+				fail_samples.append(sample.sample.sample_id)
+
+	sample_checks = [
+		('reads_tso500', lambda sample: sample.passes_reads_tso500() != True, 'TSO500 Read Fail', True),
+		('sex_match', lambda sample: sample.passes_sex_check() == False, 'Sex Match Fail', True),
+		('variant_check', lambda sample: sample.passes_variant_count_check() == False, 'Variant Count Fail', False),
+	]
+
+	for check, fails, reason, fail_sample in sample_checks:
+
+		if check in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if fails(sample):
+
+					reasons_to_fail.append(reason)
+
+					if fail_sample:
+
+						fail_samples.append(sample.sample.sample_id)
+
+	if 'sensitivity' in checks_to_do:
+
+		if run_analysis.passes_sensitivity() == False:
+
+			reasons_to_fail.append('Low Sensitivity')
+
+	sample_checks = [
+		('coverage', 'passes_region_coverage_over_20', 'Low Coverage >20x'),
+		('titv', 'passes_titv', 'Titv Ratio out of range for at least one sample'),
+		('fastqc', 'passes_fastqc', 'FASTQC Fail'),
+		('fusion_contamination', 'passes_fusion_contamination', 'Fusion Contamination Fail'),
+		('fusion_alignment', 'passes_fusion_aligned_reads_duplicates', 'Fusion Aligned Reads Unique Fail'),
+	]
+
+	for check, passes_check, reason in sample_checks:
+
+		if check in checks_to_do:
+
+			for sample in new_samples_list:
+
+				if getattr(sample, passes_check)() == False:
+
+					reasons_to_fail.append(reason)
+					fail_samples.append(sample.sample.sample_id)
+
+	if len(reasons_to_fail) == 0:
+
+		return True, ['All Pass']
+
+	return False, list(set(reasons_to_fail)), fail_samples
+
+
+def random_value(rng, field):
+
+	if field.null and rng.random() < 0.02:
+
+		return None
+
+	if field.choices:
+
+		return rng.choice(field.choices)[0]
+
+	if isinstance(field, models.BooleanField):
+
+		return rng.random() < 0.5
+
+	if isinstance(field, models.DecimalField):
+
+		return round(decimal.Decimal(rng.uniform(0, 1.2) * 10 ** min(3, field.max_digits - field.decimal_places - 1)), field.decimal_places)
+
+	if isinstance(field, (models.IntegerField, models.FloatField)):
+
+		return rng.randint(0, 20000)
+
+	return rng.choice(['PASS', 'FAIL', 'WARN', 'XX', 'XY', 'MALE', 'FEMALE', 'unknown', 'NA'])
+
+
+class TestAutoQCBatch(TestCase):
+	"""
+	Test checking several run analyses at once with auto_qc.evaluate_run_analyses
+	"""
+
+	fixtures = ['test_data']
+
+	def get_result(self, passes_auto_qc, run_analysis):
+		"""
+		The result with the reasons sorted, or the name of the exception raised
+		"""
+
+		try:
+
+			result = passes_auto_qc(run_analysis)
+
+		except Exception as e:
+
+			return type(e).__name__
+
+		return (result[0], sorted(result[1])) + tuple(result[2:])
+
+	def test_matches_per_sample_checks(self):
+
+		rng = random.Random(1)
+
+		checks = sorted(set(auto_qc.CHECK_MODELS) | {'pct_q30', 'relatedness', 'sensitivity'})
+		metric_models = sorted(set(model for check_models in auto_qc.CHECK_MODELS.values() for model in check_models), key=lambda model: model.__name__)
+
+		# metric rows for the pipelines which the fixture has none for
+		for sample_analysis in SampleAnalysis.objects.all():
+
+			for model in metric_models:
+
+				if model is SampleFastqcData or model.objects.filter(sample_analysis=sample_analysis).exists():
+
+					continue
+
+				values = {field.name: random_value(rng, field) for field in model._meta.concrete_fields
+							if not field.primary_key and not field.is_relation and not (field.has_default() and rng.random() < 0.3)}
+
+				model.objects.create(sample_analysis=sample_analysis, **values)
+
+		for fastqc in SampleFastqcData.objects.all():
+
+			if rng.random() < 0.05:
+
+				setattr(fastqc, rng.choice(['basic_statistics', 'per_base_sequencing_quality', 'per_sequence_quality_scores', 'per_base_n_content']), 'FAIL')
+				fastqc.save()
+
+		for run_analysis in RunAnalysis.objects.all():
+
+			RelatednessQuality.objects.create(run_analysis=run_analysis, results_valid=rng.random() < 0.5, comment='Unexpected relatedness')
+
+		compared = 0
+
+		for trial in range(25):
+
+			for pk in SampleAnalysis.objects.values_list('pk', flat=True):
+
+				SampleAnalysis.objects.filter(pk=pk).update(min_average_coverage_cutoff=rng.choice([None, 10, 100]),
+															sex=rng.choice(['0', '1', '2', None]),
+															results_valid=rng.random() < 0.995)
+
+			# remove some metric rows
+			model = rng.choice(metric_models)
+			model.objects.filter(pk__in=[row.pk for row in model.objects.all() if rng.random() < 0.02]).delete()
+
+			for run_analysis in RunAnalysis.objects.all():
+
+				run_analysis.auto_qc_checks = rng.choice([None] + [','.join(rng.sample(checks, rng.randint(1, 3)))] * 8)
+				run_analysis.min_variants = rng.choice([None, 100, 100, 100, 1000, 1000])
+				run_analysis.max_variants = 20000
+				run_analysis.min_titv = rng.choice([None, decimal.Decimal('0.5'), decimal.Decimal('0.5'), decimal.Decimal('0.5')])
+				run_analysis.max_titv = decimal.Decimal('1.1')
+				run_analysis.min_coverage = decimal.Decimal('50')
+				run_analysis.min_q30_score = rng.choice([decimal.Decimal('0.5'), decimal.Decimal('0.9')])
+				run_analysis.min_on_target_reads = 5000
+				run_analysis.max_ntc_contamination = rng.choice([None, 10])
+				run_analysis.min_fusion_aligned_reads_unique = 5000
+				run_analysis.max_cnv_calls = 10000
+				run_analysis.results_valid = rng.random() < 0.95
+				run_analysis.demultiplexing_valid = rng.random() < 0.9
+				run_analysis.min_sensitivity = decimal.Decimal('0.5')
+				run_analysis.sensitivity = decimal.Decimal('0.9')
+				run_analysis.sensitivity_lower_ci = rng.choice([decimal.Decimal('0.4'), decimal.Decimal('0.9')])
+				run_analysis.sensitivity_higher_ci = 1
+				run_analysis.save()
+
+				# the pipeline decides which metric tables the checks read
+				pipeline, created = Pipeline.objects.get_or_create(pipeline_id=rng.choice(['GermlineEnrichment', 'DragenWGS', 'DragenGE', 'TSO500_ctdna', 'TSO500']) + f'-{run_analysis.pk}')
+				SampleAnalysis.objects.filter(run_analysis=run_analysis).update(pipeline=pipeline)
+				RunAnalysis.objects.filter(pk=run_analysis.pk).update(pipeline=pipeline)
+
+			run_analyses = list(RunAnalysis.objects.all())
+			batch = auto_qc.AutoQC(run_analyses)
+
+			for run_analysis in run_analyses:
+
+				with self.subTest(trial=trial, run_analysis=run_analysis.pk, checks=run_analysis.auto_qc_checks):
+
+					self.assertEqual(self.get_result(batch.passes_auto_qc, run_analysis), self.get_result(passes_auto_qc_per_sample, run_analysis))
+
+				compared += 1
+
+		self.assertEqual(compared, 25 * len(run_analyses))
+
+	def test_queries_per_table(self):
+
+		# run analysis 16 has every check used by the other run analyses so all of them need the same tables
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		run_analyses = list(RunAnalysis.objects.all())
+
+		with CaptureQueriesContext(connection) as single:
+
+			auto_qc.evaluate_run_analyses([run_analysis])
+
+		with CaptureQueriesContext(connection) as batch:
+
+			auto_qc.evaluate_run_analyses(run_analyses)
+
+		self.assertEqual(len(batch), len(single))
+
+		# samples, interop and one query per metric table
+		self.assertLessEqual(len(batch), 2 + len(set(model for check in ['fastqc', 'variant_check', 'contamination', 'ntc_contamination', 'sex_match'] for model in auto_qc.CHECK_MODELS[check])))
+
+	def test_ntc_contamination_tso500_fail(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+		run_analysis.auto_qc_checks = 'ntc_contamination_TSO500'
+		run_analysis.max_ntc_contamination = 10
+		run_analysis.save()
+
+		samples = SampleAnalysis.objects.filter(
+			run = run_analysis.run,
+			pipeline = run_analysis.pipeline,
+			analysis_type = run_analysis.analysis_type
+			).order_by('pk')
+
+		for sample in samples:
+
+			Tso500Reads.objects.create(sample_analysis=sample, percent_ntc_reads=1)
+
+		self.assertEqual(run_analysis.passes_auto_qc(), (True, ['All Pass']))
+
+		tso500_reads = Tso500Reads.objects.get(sample_analysis=samples[0])
+		tso500_reads.percent_ntc_reads = 50
+		tso500_reads.save()
+
+		# the sample which failed is listed rather than the last sample checked
+		self.assertEqual(run_analysis.passes_auto_qc(), (False, ['NTC Contamination Fail'], [samples[0].sample_id]))
+
+
+class TestAutoQCVerdict(TestCase):
+	"""
+	Test the stored auto QC verdicts
+	"""
+
+	fixtures = ['test_data']
+
+	def test_verdict_is_stored(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		self.assertEqual(run_analysis.passes_auto_qc(), (True, ['All Pass']))
+
+		verdict = AutoQCVerdict.objects.get(run_analysis=run_analysis)
+
+		self.assertEqual(verdict.get_result(), (True, ['All Pass']))
+
+		# only the stored verdict is read
+		with self.assertNumQueries(1):
+
+			self.assertEqual(run_analysis.passes_auto_qc(), (True, ['All Pass']))
+
+	def test_failed_checks_are_stored(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+		run_analysis.auto_qc_checks = 'variant_check'
+		run_analysis.min_variants = None
+		run_analysis.save()
+
+		with self.assertRaises(TypeError):
+
+			run_analysis.passes_auto_qc()
+
+		verdict = AutoQCVerdict.objects.get(run_analysis=run_analysis)
+
+		self.assertIsNone(verdict.passes)
+		self.assertTrue(verdict.reasons[0].startswith('TypeError'))
+
+		# the stored failure is read rather than working out the checks again
+		with self.assertNumQueries(1), self.assertRaises(Exception):
+
+			run_analysis.passes_auto_qc()
+
+		run_analysis.min_variants = 0
+		run_analysis.save()
+
+		self.assertEqual(run_analysis.passes_auto_qc(), (True, ['All Pass']))
+
+	def test_verdict_removed_when_metrics_change(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		run_analysis.passes_auto_qc()
+
+		fastqc = SampleFastqcData.objects.filter(sample_analysis__run=run_analysis.run).first()
+		fastqc.basic_statistics = 'FAIL'
+		fastqc.save()
+
+		self.assertFalse(AutoQCVerdict.objects.filter(run_analysis=run_analysis).exists())
+		self.assertEqual(run_analysis.passes_auto_qc()[1], ['FASTQC Fail'])
+
+	def test_verdict_updated_when_thresholds_change(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		self.assertEqual(run_analysis.passes_auto_qc(), (True, ['All Pass']))
+
+		run_analysis.min_q30_score = 0.99
+		run_analysis.save()
+
+		self.assertEqual(run_analysis.passes_auto_qc()[1], ['Q30 Fail'])
+		self.assertEqual(AutoQCVerdict.objects.get(run_analysis=run_analysis).reasons, ['Q30 Fail'])
+
+	def test_update_database_refreshes_verdict(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+		run_analysis.auto_qc_checks = run_analysis.auto_qc_checks + ',relatedness'
+		run_analysis.save()
+
+		result = {
+			'demultiplexing_completed': True,
+			'demultiplexing_valid': True,
+			'samples': {},
+			'results_completed': True,
+			'results_valid': True,
+			'display_cnv_qc_metrics': False,
+			'metrics': [('relatedness', 'add_relatedness_metrics', (False, ['Unexpected relatedness']), {})],
+		}
+
+		management_utils.save_run_analysis_result(result, run_analysis, [])
+
+		verdict = AutoQCVerdict.objects.get(run_analysis=run_analysis)
+
+		self.assertEqual(verdict.get_result(), (False, ['Unexpected relatedness'], []))
+
+	def test_api_reads_verdicts(self):
+
+		client = APIClient()
+		client.force_authenticate(user=User.objects.get(pk=1))
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		RunAnalysis.objects.exclude(pk=run_analysis.pk).update(watching=False)
+
+		response = client.get('/api/run-analyses/')
+
+		self.assertEqual(response.status_code, 200)
+
+		auto_qc_results = {run_analysis['id']: run_analysis['auto_qc'] for run_analysis in response.json()}
+
+		self.assertEqual(auto_qc_results[16], {'passes': True, 'reasons': ['All Pass'], 'fail_samples': None})
+
+		# only the watched run analysis is worked out when listing every run analysis
+		self.assertEqual(list(AutoQCVerdict.objects.values_list('run_analysis', flat=True)), [16])
+		self.assertIsNone(auto_qc_results[17])
+
+		# every run analysis of a requested run is worked out
+		response = client.get(f'/api/run-analyses/runs/{run_analysis.run_id}/')
+
+		self.assertTrue(all(run_analysis['auto_qc'] is not None for run_analysis in response.json()))
+		self.assertEqual(AutoQCVerdict.objects.filter(run_analysis__run=run_analysis.run).count(), RunAnalysis.objects.filter(run=run_analysis.run).count())
+
+
+class TestRunAnalysisPages(TestCase):
+	"""
+	Test the home and archive pages
+	"""
+
+	fixtures = ['test_data']
+
+	def setUp(self):
+
+		self.client.force_login(User.objects.get(pk=1))
+
+	def test_home_sample_counts(self):
+
+		response = self.client.get('/')
+
+		self.assertEqual(response.status_code, 200)
+
+		for run_analysis in response.context['run_analyses']:
+
+			self.assertEqual((run_analysis.n_samples_completed, run_analysis.n_samples), run_analysis.get_n_samples_completed())
+			self.assertEqual((run_analysis.n_samples_valid, run_analysis.n_samples), run_analysis.get_n_samples_valid())
+			self.assertEqual(sorted(run_analysis.worksheets.split('|')), sorted(run_analysis.get_worksheets().split('|')))
+
+	def test_search_and_sort(self):
+
+		response = self.client.get('/', {'search': 'CJN92', 'sort': 'analysis'})
+
+		self.assertEqual([run_analysis.analysis_type_id for run_analysis in response.context['run_analyses']], ['NGHS-101X', 'NGHS-102X'])
+
+		# worksheets are searched too
+		worksheet = SampleAnalysis.objects.filter(run='190520_M02641_0219_000000000-CGJT6').first().worksheet_id
+
+		response = self.client.get('/', {'search': worksheet})
+
+		self.assertIn(16, [run_analysis.pk for run_analysis in response.context['run_analyses']])
+
+	def test_archive_queries_do_not_grow(self):
+
+		RunAnalysis.objects.update(watching=False)
+
+		with CaptureQueriesContext(connection) as before:
+
+			self.client.get('/archived/')
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+
+		for i in range(30):
+
+			run = Run.objects.create(run_id=f'200101_A00000_{i:04d}_TEST')
+			RunAnalysis.objects.create(run=run, pipeline=run_analysis.pipeline, analysis_type=run_analysis.analysis_type, watching=False)
+
+		with CaptureQueriesContext(connection) as after:
+
+			response = self.client.get('/archived/', {'page': 2})
+
+		self.assertEqual(len(after), len(before))
+		self.assertEqual(response.context['page'].paginator.count, 36)
+		self.assertEqual(len(response.context['run_analyses']), 11)
+
+
+class TestMemo(TestCase):
+	"""
+	Test the memoised QC helper methods
+	"""
+
+	fixtures = ['test_data']
+
+	def test_helpers_are_memoised_in_scope(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+		RelatednessQuality.objects.create(run_analysis=run_analysis, results_valid=True, comment='ok')
+		sample_analysis = ContaminationMetrics.objects.first().sample_analysis
+
+		with memo.scope():
+
+			self.assertEqual(run_analysis.passes_relatedness(), (True, 'ok'))
+			contamination = sample_analysis.get_contamination()
+
+			# a new instance of the same row shares the results
+			with self.assertNumQueries(0):
+
+				self.assertEqual(RunAnalysis(pk=16).passes_relatedness(), (True, 'ok'))
+				self.assertEqual(sample_analysis.get_contamination(), contamination)
+
+		# nothing is kept outside a scope
+		with self.assertNumQueries(1):
+
+			run_analysis.passes_relatedness()
+
+	def test_saving_forgets_results(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+		relatedness = RelatednessQuality.objects.create(run_analysis=run_analysis, results_valid=True, comment='ok')
+		contamination_metrics = ContaminationMetrics.objects.first()
+		sample_analysis = contamination_metrics.sample_analysis
+
+		with memo.scope():
+
+			run_analysis.passes_relatedness()
+			sample_analysis.get_contamination()
+
+			relatedness.results_valid = False
+			relatedness.save()
+
+			contamination_metrics.freemix = 0.5
+			contamination_metrics.save()
+
+			self.assertEqual(run_analysis.passes_relatedness(), (False, 'ok'))
+			self.assertEqual(sample_analysis.get_contamination(), 0.5)
+
+	def test_view_run_analysis_page(self):
+
+		self.client.force_login(User.objects.get(pk=1))
+
+		# the first request stores the auto QC verdict
+		self.client.get('/run_analysis/16/')
+
+		with CaptureQueriesContext(connection) as memoised:
+
+			response = self.client.get('/run_analysis/16/')
+
+		self.assertEqual(response.status_code, 200)
+
+		middleware = [name for name in settings.MIDDLEWARE if name != 'qc_database.memo.MemoMiddleware']
+
+		with self.settings(MIDDLEWARE=middleware):
+
+			client = Client()
+			client.force_login(User.objects.get(pk=1))
+
+			with CaptureQueriesContext(connection) as not_memoised:
+
+				client.get('/run_analysis/16/')
+
+		self.assertLess(len(memoised), len(not_memoised))
+
+
+class TestSampleAnalysisRunAnalysis(TestCase):
+	"""
+	Test the run analysis link on sample analyses
+	"""
+
+	fixtures = ['test_data']
+
+	def test_linked_when_saved(self):
+
+		run_analysis = RunAnalysis.objects.get(pk=16)
+		sample_analysis = SampleAnalysis.objects.filter(run_analysis=run_analysis).first()
+
+		run = Run.objects.create(run_id='200101_A00000_0001_TEST')
+
+		# sample analysis saved first
+		new_sample_analysis = SampleAnalysis.objects.create(sample=sample_analysis.sample, run=run, pipeline=run_analysis.pipeline,
+															analysis_type=run_analysis.analysis_type, worksheet=sample_analysis.worksheet)
+		new_run_analysis = RunAnalysis.objects.create(run=run, pipeline=run_analysis.pipeline, analysis_type=run_analysis.analysis_type)
+
+		self.assertEqual(SampleAnalysis.objects.get(pk=new_sample_analysis.pk).run_analysis, new_run_analysis)
+
+		# run analysis saved first
+		other_sample_analysis = SampleAnalysis.objects.create(sample=Sample.objects.create(sample_id='TEST1'), run=run, pipeline=run_analysis.pipeline,
+																analysis_type=run_analysis.analysis_type, worksheet=sample_analysis.worksheet)
+
+		self.assertEqual(other_sample_analysis.run_analysis, new_run_analysis)
+		self.assertEqual(other_sample_analysis.get_run_analysis(), new_run_analysis)
+		self.assertEqual(new_run_analysis.get_n_samples_completed(), (0, 2))
+
+	def test_backfill(self):
+
+		linked = dict(SampleAnalysis.objects.values_list('pk', 'run_analysis'))
+
+		SampleAnalysis.objects.update(run_analysis=None)
+
+		call_command('backfill_run_analysis', stdout=StringIO())
+
+		self.assertEqual(dict(SampleAnalysis.objects.values_list('pk', 'run_analysis')), linked)
@@ -1,9 +1,8 @@
 from qc_database.models import *
 from django.db.models import Avg, Min, FloatField, IntegerField, DecimalField
-import pandas as pd
-import numpy as np
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+# pandas, numpy and plotly are imported in the functions which use them so that importing the \
+# views does not load them for every page
 
 data_models_dict = {
     # "ModelName": [ModelName, per_sample_metrics_boolean] 
@@ -164,6 +163,8 @@ def write_data(writer, samples, data_models):
 
     Returns written CSV as a pandas DataFrame
     """
+    import pandas as pd
+
     # Fields to exclude from models
     fields_to_remove = ['id', 'run', 'sample_analysis', 'sample', 'pipeline', 'analysis_type', 'worksheet']
     
@@ -292,6 +293,9 @@ def get_plottable_cols(df):
     Returns:
     List of numeric columns suitable for plotting
     """
+    import numpy as np
+    import pandas as pd
+
     # drop NTC for plotting purposes
     df = df[~df['sample_id'].str.contains('NTC', na=False)]
     
@@ -335,6 +339,9 @@ def plotly_dashboard(df, selected_x, selected_y, plot_type):
     Returns:
     plotly.graph_objects.Figure: Interactive plotly figure
     """
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+
     trimmed_x = trim_field_name(selected_x)
     trimmed_y = trim_field_name(selected_y)
     label = plot_types[plot_type]
@@ -1,4 +1,3 @@
-import openpyxl
 from ..models import RunAnalysis
 
 def make_kpi_excel(runs):
@@ -32,6 +31,9 @@ def make_kpi_excel(runs):
 
     # ------------------------------------------------------------------------
     # make excel workbook
+    # openpyxl loads numpy, only import it when a spreadsheet is made
+    import openpyxl
+
     wb = openpyxl.Workbook()
 
     # make excel sheet for all runs
@@ -10,7 +10,8 @@ from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
 from django.db import transaction
 from django.http import HttpResponse, JsonResponse
-from django.db.models import Min
+from django.db.models import Min, Count, Q, Exists, OuterRef
+from django.core.paginator import Paginator
 
 from qc_database.models import *
 from qc_database.forms import *
@@ -21,7 +22,86 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from .serializers import SampleAnalysisSerializer, RunAnalysisSerializer
 
-import plotly.offline as pyo
+
+# sort parameter to the field the home and archive tables are ordered by
+RUN_ANALYSIS_SORT_FIELDS = {
+	'id': 'pk',
+	'run': 'run__run_id',
+	'analysis': 'analysis_type__analysis_type_id',
+	'pipeline': 'pipeline__pipeline_id',
+}
+
+RUN_ANALYSES_PER_PAGE = 25
+
+
+def run_analysis_table(request, run_analyses, sample_details=True):
+	"""
+	Search, sort and paginate run analyses for the home and archive pages.
+
+	The rows of a page are read in one query. If sample_details is set the sample counts are \
+	annotated with conditional counts and the worksheets of the page are read in one more query, \
+	so a page costs the same however many run analyses there are.
+
+	"""
+
+	search = request.GET.get('search', '').strip()
+
+	if search != '':
+
+		worksheets = SampleAnalysis.objects.filter(run_analysis=OuterRef('pk'), worksheet__worksheet_id__icontains=search)
+
+		run_analyses = run_analyses.filter(Q(run__run_id__icontains=search) |
+											Q(pipeline__pipeline_id__icontains=search) |
+											Q(analysis_type__analysis_type_id__icontains=search) |
+											Exists(worksheets))
+
+	sort = request.GET.get('sort', '-run')
+
+	if sort.lstrip('-') not in RUN_ANALYSIS_SORT_FIELDS:
+
+		sort = '-run'
+
+	order = RUN_ANALYSIS_SORT_FIELDS[sort.lstrip('-')]
+
+	if sort.startswith('-'):
+
+		order = '-' + order
+
+	run_analyses = run_analyses.select_related('run', 'pipeline', 'analysis_type').order_by(order, '-pk')
+
+	if sample_details:
+
+		run_analyses = run_analyses.annotate(
+			n_samples = Count('sampleanalysis'),
+			n_samples_completed = Count('sampleanalysis', filter=Q(sampleanalysis__results_completed=True)),
+			n_samples_valid = Count('sampleanalysis', filter=Q(sampleanalysis__results_valid=True)),
+			)
+
+	page = Paginator(run_analyses, RUN_ANALYSES_PER_PAGE).get_page(request.GET.get('page'))
+
+	if sample_details:
+
+		add_worksheets(page)
+
+	return {'run_analyses': page, 'page': page, 'search': search, 'sort': sort}
+
+
+def add_worksheets(run_analyses):
+	"""
+	Set the worksheets attribute of each run analysis to its worksheets joined with |, as get_worksheets returns
+	"""
+
+	worksheets = {}
+
+	sample_analyses = SampleAnalysis.objects.filter(run_analysis__in=[run_analysis.pk for run_analysis in run_analyses]).values_list('run_analysis', 'worksheet').distinct()
+
+	for run_analysis_id, worksheet_id in sample_analyses:
+
+		worksheets.setdefault(run_analysis_id, set()).add(worksheet_id)
+
+	for run_analysis in run_analyses:
+
+		run_analysis.worksheets = '|'.join(sorted(worksheets.get(run_analysis.pk, [])))
 
 
 @transaction.atomic
@@ -32,9 +112,9 @@ def home_auto_qc(request):
 
 	"""
 
-	run_analyses = RunAnalysis.objects.filter(watching=True).order_by('-run')
+	run_analyses = RunAnalysis.objects.filter(watching=True)
 
-	return render(request, 'auto_qc/home.html', {'run_analyses': run_analyses})
+	return render(request, 'auto_qc/home.html', run_analysis_table(request, run_analyses))
 
 
 @transaction.atomic
@@ -47,11 +127,7 @@ def view_run_analysis(request, pk):
 
 	run_analysis = get_object_or_404(RunAnalysis, pk=pk)
 
-	sample_analyses = SampleAnalysis.objects.filter(
-		run = run_analysis.run,
-		pipeline = run_analysis.pipeline,
-		analysis_type = run_analysis.analysis_type
-	).order_by('worksheet', 'sample')
+	sample_analyses = SampleAnalysis.objects.filter(run_analysis = run_analysis).order_by('worksheet', 'sample')
 
 	relatedness = RelatednessQuality.objects.filter(run_analysis = run_analysis)
 
@@ -90,11 +166,11 @@ def view_run_analysis(request, pk):
 
 				if str(sample.pk) in entry_list:
 
-					SampleAnalysis.objects.filter(sample=sample.sample, run=run_analysis.run, pipeline=run_analysis.pipeline,  analysis_type = run_analysis.analysis_type).update(sample_status='Pass')
+					SampleAnalysis.objects.filter(sample=sample.sample, run_analysis=run_analysis).update(sample_status='Pass')
 
 				else:
 
-					SampleAnalysis.objects.filter(sample=sample.sample, run=run_analysis.run, pipeline=run_analysis.pipeline,  analysis_type = run_analysis.analysis_type).update(sample_status='Fail')
+					SampleAnalysis.objects.filter(sample=sample.sample, run_analysis=run_analysis).update(sample_status='Fail')
 
 		if 'run_status' in request.POST:
 
@@ -198,9 +274,9 @@ def view_archived_run_analysis(request):
 	View run analyses which are not being watched,
 
 	"""
-	run_analyses = RunAnalysis.objects.filter(watching=False).order_by('-run').select_related('pipeline','analysis_type', 'run')
+	run_analyses = RunAnalysis.objects.filter(watching=False)
 
-	return render(request, 'auto_qc/archived_run_analysis.html', {'run_analyses': run_analyses})
+	return render(request, 'auto_qc/archived_run_analysis.html', run_analysis_table(request, run_analyses, sample_details=False))
 
 
 @transaction.atomic
@@ -366,7 +442,9 @@ def downloader(request):
 							selected_y=selected_y,
 							plot_type=plot_type_selection,)
 						
-						# Convert the plot to HTML
+						# Convert the plot to HTML, plotly is only loaded when a plot is made
+						import plotly.offline as pyo
+
 						plot_html = pyo.plot(fig, output_type='div', include_plotlyjs=True)
 					# No samples found - write header with message
 				else:
@@ -541,4 +619,10 @@ class RunAnalysisList(generics.ListAPIView):
 		queryset = RunAnalysis.objects.all()
 		if run_name:
 			queryset = queryset.filter(run=run_name)
-		return queryset
\ No newline at end of file
+		return queryset
+
+	def get_serializer_context(self):
+		# auto QC verdicts are worked out for every run analysis of a requested run, otherwise only for watched ones
+		context = super().get_serializer_context()
+		context['refresh_auto_qc'] = self.kwargs.get('run') is not None
+		return context
\ No newline at end of file
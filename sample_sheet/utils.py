@@ -1,7 +1,6 @@
 import csv
 import datetime
 
-import numpy as np
 
 from django.shortcuts import get_object_or_404
 from sample_sheet.models import Worksheet, ReferralType, SampleToWorksheet, Sample, Assay
@@ -70,6 +69,8 @@ def import_worksheet_data(filepath):
     for item in shire_query:
         sampleid_list.append(item['LABNO'])
 
+    import numpy as np
+
     unique_sampleID = np.unique(sampleid_list)
 
     if len(unique_sampleID) != len(sampleid_list):
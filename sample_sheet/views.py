@@ -3,7 +3,6 @@ from datetime import datetime
 from itertools import cycle, islice
 import subprocess
 
-import numpy as np
 
 from django.shortcuts import render, get_object_or_404
 from django.core.management import call_command
@@ -578,6 +577,8 @@ def view_worksheet_samples(request, service_slug, worksheet_id):
 						hpo_id_list = cleaned_data['hpo_ids'].replace(' ','').upper().split(',')
 
 						## make sure values all unique
+						import numpy as np
+
 						hpo_id_list = np.unique(hpo_id_list)
 
 						## remove blank instances in case of careless comma use